@@ -19,6 +19,12 @@ import re
 from google import genai
 from google.genai import types
 
+from core.context_cache import ContextCacheManager
+from core.shared_state import get_shared_state, SharedDict
+
+ORCHESTRATION_MODEL = "gemini-2.5-flash"
+EXECUTION_LOG_TTL = 7 * 24 * 3600
+
 
 class WorkflowStatus(str, Enum):
     """Workflow execution status"""
@@ -95,6 +101,7 @@ class YukiOrchestrator:
             enable_self_healing: Enable automatic error recovery
         """
         self.client = genai.Client(api_key=api_key)
+        self.context_cache = ContextCacheManager(self.client, ttl_seconds=1800)
         self.directives_dir = Path(directives_dir)
         self.max_retries = max_retries
         self.enable_self_healing = enable_self_healing
@@ -102,8 +109,10 @@ class YukiOrchestrator:
         # Lazy-load modules to avoid import errors
         self._modules = {}
         
-        # Execution history
+        # Execution history (full objects, this process) and per-workflow summaries
+        # shared by every worker for status lookups and stats
         self.executions: List[WorkflowExecution] = []
+        self.execution_log = SharedDict(get_shared_state(), "workflow-executions", ttl=EXECUTION_LOG_TTL)
         
         print("🦊 Yuki Orchestrator initialized")
         print(f"   Directives: {self.directives_dir.absolute()}")
@@ -169,6 +178,8 @@ class YukiOrchestrator:
             start_time=time.time()
         )
         
+        self.execution_log[workflow_id] = self._execution_summary(execution)
+        
         print(f"\n{'='*60}")
         print(f"🚀 Starting Workflow: {directive_name}")
         print(f"{'='*60}\n")
@@ -218,6 +229,7 @@ class YukiOrchestrator:
         finally:
             execution.end_time = time.time()
             self.executions.append(execution)
+            self.execution_log[workflow_id] = self._execution_summary(execution)
             
             # Print summary
             self._print_execution_summary(execution)
@@ -292,12 +304,21 @@ class YukiOrchestrator:
             if s.output is not None
         }
         
-        # Ask Gemini to orchestrate this step
-        orchestration_prompt = f"""
-You are executing Step {step.step_number} of a workflow.
+        # The directive is identical for every step: serve it from a context cache
+        directive_prefix = f"""You are executing a Yuki workflow step by step.
 
 **Directive Context:**
 {directive_content}
+"""
+        cache_name = self.context_cache.get_or_create(
+            ORCHESTRATION_MODEL,
+            system_instruction=directive_prefix,
+            display_name=f"directive-{Path(execution.directive_path).stem}",
+        )
+        
+        # Ask Gemini to orchestrate this step
+        step_prompt = f"""
+You are executing Step {step.step_number} of a workflow.
 
 **Current Step:**
 {step_info['name']}
@@ -335,11 +356,13 @@ Be specific with parameters. Use actual values from inputs/previous outputs.
         
         # Get orchestration decision from Gemini
         response = self.client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=orchestration_prompt,
+            model=ORCHESTRATION_MODEL,
+            contents=step_prompt,
             config=types.GenerateContentConfig(
                 temperature=0.3,  # Lower for consistent decisions
-                response_mime_type="application/json"
+                response_mime_type="application/json",
+                cached_content=cache_name,
+                system_instruction=None if cache_name else directive_prefix
             )
         )
         
@@ -419,7 +442,7 @@ Return JSON:
 """
         
         response = self.client.models.generate_content(
-            model="gemini-2.5-flash",
+            model=ORCHESTRATION_MODEL,
             contents=validation_prompt,
             config=types.GenerateContentConfig(
                 response_mime_type="application/json"
@@ -499,29 +522,48 @@ Return JSON:
         
         print(f"{'='*60}\n")
     
+    @staticmethod
+    def _execution_summary(execution: WorkflowExecution) -> Dict[str, Any]:
+        """JSON summary stored in the shared execution log"""
+        return {
+            "workflow_id": execution.workflow_id,
+            "directive_path": execution.directive_path,
+            "status": execution.status.value,
+            "start_time": execution.start_time,
+            "end_time": execution.end_time,
+            "duration": execution.total_duration,
+            "total_cost": execution.total_cost,
+            "steps": len(execution.steps),
+            "retries": sum(s.retries for s in execution.steps),
+            "errors": execution.errors_encountered[-5:]
+        }
+    
+    def get_execution_status(self, workflow_id: str) -> Optional[Dict[str, Any]]:
+        """Summary of a workflow started by any worker (None if unknown or expired)"""
+        return self.execution_log.get(workflow_id)
+    
     def get_execution_stats(self) -> Dict[str, Any]:
-        """Get statistics across all executions"""
+        """Get statistics across all executions (every worker sharing the state)"""
         
-        if not self.executions:
+        summaries = [e for e in self.execution_log.values()
+                     if e["status"] in (WorkflowStatus.COMPLETED.value, WorkflowStatus.FAILED.value)]
+        if not summaries:
             return {"total_executions": 0}
         
-        completed = [e for e in self.executions if e.status == WorkflowStatus.COMPLETED]
-        failed = [e for e in self.executions if e.status == WorkflowStatus.FAILED]
+        completed = [e for e in summaries if e["status"] == WorkflowStatus.COMPLETED.value]
+        failed = [e for e in summaries if e["status"] == WorkflowStatus.FAILED.value]
         
-        total_cost = sum(e.total_cost for e in self.executions)
-        avg_duration = sum(e.total_duration or 0 for e in self.executions) / len(self.executions)
+        total_cost = sum(e["total_cost"] for e in summaries)
+        avg_duration = sum(e["duration"] or 0 for e in summaries) / len(summaries)
         
         return {
-            "total_executions": len(self.executions),
+            "total_executions": len(summaries),
             "completed": len(completed),
             "failed": len(failed),
-            "success_rate": len(completed) / len(self.executions) * 100,
+            "success_rate": len(completed) / len(summaries) * 100,
             "total_cost": total_cost,
             "avg_duration_seconds": avg_duration,
-            "total_retries": sum(
-                sum(s.retries for s in e.steps) 
-                for e in self.executions
-            )
+            "total_retries": sum(e["retries"] for e in summaries)
         }
 
 
@@ -0,0 +1,258 @@
+"""
+Yuki Analysis Cache
+Content-hash keyed results for the age / skin / facial analyzers
+
+The DNA analysis of a photo only depends on the photo's bytes and on the
+analyzer (prompt, model, algorithm), but batch scripts re-run it for every
+(image, target) pair - 9 Gemini calls each time for age + facial. Results are
+now stored under (analyzer, version, sha256 of the image):
+
+- memory:  LRU of encoded results (a hit costs one json.loads, callers get a copy)
+- disk:    SQLite table shared by every script / process on the machine
+- version: each analyzer passes its own version string (bumped when its prompt
+           or algorithm changes, and including its model id); rows of other
+           versions are never returned and are pruned on first use
+- concurrent lookups of the same key share one computation
+- per-analyzer hit / miss counters (stats())
+
+Fallback results (analysis failed, model offline) are never stored.
+
+Usage:
+    from analyzers.analysis_cache import get_analysis_cache
+
+    cache = get_analysis_cache()
+    result = await cache.get_or_compute("age", "1:gemini-3-pro-preview", image_path, compute)
+    cache.stats()   # {"age": {"memory_hits": 3, "disk_hits": 1, "misses": 1, "hit_rate": 0.8, ...}}
+
+Set YUKI_ANALYSIS_CACHE to another database path, or to "memory" to keep
+results in-process only.
+"""
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger("YukiAnalysisCache")
+
+DEFAULT_DB_PATH = "C:/Yuki_Local/analysis_cache.db"
+DEFAULT_MEMORY_SIZE = 256
+HASH_CHUNK = 1 << 20
+
+
+def _json_default(value):
+    # numpy scalars / arrays (skin analyzer RGB values)
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    return str(value)
+
+
+def encode_result(result: Any) -> str:
+    return json.dumps(result, ensure_ascii=False, separators=(",", ":"), default=_json_default)
+
+
+class AnalysisCache:
+    """Two-level (memory LRU + SQLite) cache of analyzer results keyed by image content."""
+
+    def __init__(self, db_path: Optional[str] = DEFAULT_DB_PATH, memory_size: int = DEFAULT_MEMORY_SIZE):
+        self.memory_size = memory_size
+        self._memory: "OrderedDict[Tuple[str, str, str], str]" = OrderedDict()
+        self._digests: Dict[Tuple[str, int, int], str] = {}
+        self._inflight: Dict[Tuple[str, str, str], asyncio.Future] = {}
+        self._pruned = set()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.RLock()
+        self.conn = None
+        if db_path:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            self.conn = sqlite3.connect(str(db_path), check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS analysis_results (
+                    analyzer TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    digest TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (analyzer, version, digest)
+                )
+            """)
+            self.conn.commit()
+
+    # -------------------------------------------------------------------------
+    # KEYS
+    # -------------------------------------------------------------------------
+
+    def content_digest(self, image_path) -> str:
+        """sha256 of the file; remembered per (path, mtime, size) so a batch hashes each photo once."""
+        path = str(image_path)
+        st = os.stat(path)
+        stamp = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+        digest = self._digests.get(stamp)
+        if digest is None:
+            h = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                    h.update(chunk)
+            digest = self._digests[stamp] = h.hexdigest()
+        return digest
+
+    def _count(self, analyzer: str, field: str):
+        with self._lock:
+            counters = self._stats.setdefault(analyzer, {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0})
+            counters[field] += 1
+
+    def _prune(self, analyzer: str, version: str):
+        """Drop rows written by other versions of this analyzer (once per process)."""
+        if self.conn is None or (analyzer, version) in self._pruned:
+            return
+        with self._lock:
+            self._pruned.add((analyzer, version))
+            deleted = self.conn.execute(
+                "DELETE FROM analysis_results WHERE analyzer = ? AND version != ?", (analyzer, version)
+            ).rowcount
+            self.conn.commit()
+        if deleted:
+            logger.info(f"   🧹 [Analysis Cache] Dropped {deleted} stale '{analyzer}' results")
+
+    # -------------------------------------------------------------------------
+    # LOOKUP / STORE
+    # -------------------------------------------------------------------------
+
+    def get(self, analyzer: str, version: str, digest: str) -> Optional[Any]:
+        key = (analyzer, version, digest)
+        with self._lock:
+            encoded = self._memory.get(key)
+            if encoded is not None:
+                self._memory.move_to_end(key)
+                self._count(analyzer, "memory_hits")
+                return json.loads(encoded)
+        self._prune(analyzer, version)
+        if self.conn is not None:
+            with self._lock:
+                row = self.conn.execute(
+                    "SELECT result FROM analysis_results WHERE analyzer = ? AND version = ? AND digest = ?", key
+                ).fetchone()
+            if row is not None:
+                self._remember(key, row[0])
+                self._count(analyzer, "disk_hits")
+                return json.loads(row[0])
+        self._count(analyzer, "misses")
+        return None
+
+    def put(self, analyzer: str, version: str, digest: str, result: Any):
+        key = (analyzer, version, digest)
+        encoded = encode_result(result)
+        self._remember(key, encoded)
+        if self.conn is not None:
+            with self._lock:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO analysis_results VALUES (?, ?, ?, ?, ?)", (*key, encoded, time.time())
+                )
+                self.conn.commit()
+        self._count(analyzer, "stores")
+
+    def _remember(self, key, encoded: str):
+        with self._lock:
+            self._memory[key] = encoded
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    async def get_or_compute(
+        self,
+        analyzer: str,
+        version: str,
+        image_path,
+        compute: Callable[[], Awaitable[Any]],
+        cacheable: Callable[[Any], bool] = lambda result: True,
+    ) -> Any:
+        """
+        Cached result for this image, or `await compute()` (stored if `cacheable(result)`).
+        Errors from compute propagate and are not cached.
+        """
+        digest = self.content_digest(image_path)
+        cached = self.get(analyzer, version, digest)
+        if cached is not None:
+            return cached
+
+        key = (analyzer, version, digest)
+        pending = self._inflight.get(key)
+        if pending is not None and not pending.done():
+            result = await asyncio.shield(pending)
+            return json.loads(encode_result(result))
+
+        future = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await compute()
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # waiters re-raise it; don't warn when there are none
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        future.set_result(result)
+        if result is not None and cacheable(result):
+            self.put(analyzer, version, digest, result)
+        return result
+
+    # -------------------------------------------------------------------------
+    # METRICS
+    # -------------------------------------------------------------------------
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        report = {}
+        with self._lock:
+            for analyzer, counters in self._stats.items():
+                lookups = counters["memory_hits"] + counters["disk_hits"] + counters["misses"]
+                hits = counters["memory_hits"] + counters["disk_hits"]
+                report[analyzer] = {**counters, "hit_rate": round(hits / lookups, 3) if lookups else 0.0}
+        return report
+
+    def log_stats(self):
+        for analyzer, s in self.stats().items():
+            logger.info(f"   📦 [Analysis Cache] {analyzer}: {s['hit_rate']:.0%} hits "
+                        f"({s['memory_hits']} memory, {s['disk_hits']} disk, {s['misses']} misses)")
+
+    def clear(self, analyzer: Optional[str] = None):
+        with self._lock:
+            for key in [k for k in self._memory if analyzer is None or k[0] == analyzer]:
+                del self._memory[key]
+            if self.conn is not None:
+                if analyzer is None:
+                    self.conn.execute("DELETE FROM analysis_results")
+                else:
+                    self.conn.execute("DELETE FROM analysis_results WHERE analyzer = ?", (analyzer,))
+                self.conn.commit()
+
+
+_analysis_cache: Optional[AnalysisCache] = None
+_analysis_cache_lock = threading.Lock()
+
+
+def get_analysis_cache() -> AnalysisCache:
+    """Process-wide cache shared by all analyzer instances."""
+    global _analysis_cache
+    if _analysis_cache is None:
+        with _analysis_cache_lock:
+            if _analysis_cache is None:
+                db_path = os.environ.get("YUKI_ANALYSIS_CACHE", DEFAULT_DB_PATH)
+                if db_path.lower() in ("memory", "off", "none", ""):
+                    db_path = None
+                try:
+                    _analysis_cache = AnalysisCache(db_path)
+                except (OSError, sqlite3.Error) as e:
+                    logger.warning(f"   ⚠️ [Analysis Cache] {db_path} unavailable ({e}), using memory only")
+                    _analysis_cache = AnalysisCache(None)
+    return _analysis_cache
@@ -0,0 +1,301 @@
+"""
+Yuki Color Palette
+CPU colour palettes (k-means in CIE Lab) for whole images, boxes or masks
+
+YukiSpatialAnalyzer.extract_color_palette asks Gemini to *name* colours; this
+measures them. For each region (a BoundingBox, a SegmentationMask, or the whole
+image) pixels are sampled, converted to Lab (perceptually uniform, so
+Euclidean distance ~ Delta E 1976) and clustered with a vectorized k-means.
+Each swatch carries its hex colour and the fraction of the region it covers.
+
+Palettes compare numerically: palette_distance() is an (approximate) earth
+mover's distance in Delta E, so both the colours and their proportions count.
+
+Results are cached in the analysis cache (analyzers/analysis_cache.py) under
+(image sha256, region, k), so re-scoring a batch of renders doesn't recluster.
+
+Usage:
+    from analyzers.color_palette import extract_palette, palette_distance
+
+    ref = extract_palette("makima_ref.png", k=5)
+    gen = extract_palette("gen_01.png", region=(y0, x0, y1, x1), frame_size=(1024, 768))
+    palette_distance(ref, gen)      # Delta E; < ~10 is a close match
+"""
+
+import hashlib
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image as PILImage
+
+from analyzers.analysis_cache import AnalysisCache, get_analysis_cache
+
+PALETTE_VERSION = "1"
+DEFAULT_K = 5
+MAX_SAMPLES = 20000
+MAX_ITERATIONS = 25
+MASK_THRESHOLD = 127
+
+# sRGB (D65) <-> XYZ
+_RGB_TO_XYZ = np.array([[0.4124564, 0.3575761, 0.1804375],
+                        [0.2126729, 0.7151522, 0.0721750],
+                        [0.0193339, 0.1191920, 0.9503041]])
+_XYZ_TO_RGB = np.linalg.inv(_RGB_TO_XYZ)
+_WHITE_D65 = np.array([0.95047, 1.0, 1.08883])
+
+
+@dataclass
+class Swatch:
+    hex: str
+    rgb: Tuple[int, int, int]
+    lab: Tuple[float, float, float]
+    coverage: float
+
+
+# =============================================================================
+# COLOUR SPACE
+# =============================================================================
+
+def srgb_to_lab(rgb: np.ndarray) -> np.ndarray:
+    """(N, 3) uint8 sRGB -> (N, 3) float Lab."""
+    c = np.asarray(rgb, dtype=np.float64) / 255.0
+    linear = np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+    xyz = linear @ _RGB_TO_XYZ.T / _WHITE_D65
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    return np.stack([116 * f[:, 1] - 16, 500 * (f[:, 0] - f[:, 1]), 200 * (f[:, 1] - f[:, 2])], axis=1)
+
+
+def lab_to_srgb(lab: np.ndarray) -> np.ndarray:
+    """(N, 3) Lab -> (N, 3) uint8 sRGB (clipped to gamut)."""
+    lab = np.asarray(lab, dtype=np.float64)
+    fy = (lab[:, 0] + 16) / 116
+    f = np.stack([fy + lab[:, 1] / 500, fy, fy - lab[:, 2] / 200], axis=1)
+    xyz = np.where(f > 6 / 29, f ** 3, 3 * (6 / 29) ** 2 * (f - 4 / 29)) * _WHITE_D65
+    linear = np.clip(xyz @ _XYZ_TO_RGB.T, 0, 1)
+    c = np.where(linear <= 0.0031308, linear * 12.92, 1.055 * linear ** (1 / 2.4) - 0.055)
+    return np.clip(np.round(c * 255), 0, 255).astype(np.uint8)
+
+
+# =============================================================================
+# CLUSTERING
+# =============================================================================
+
+def kmeans(points: np.ndarray, k: int, seed: int = 0, iterations: int = MAX_ITERATIONS) -> Tuple[np.ndarray, np.ndarray]:
+    """Vectorized k-means (k-means++ init). Returns (centers (k', 3), member counts (k',)), k' <= k."""
+    n = len(points)
+    k = min(k, len(np.unique(points, axis=0)))
+    if k == 0:
+        return np.zeros((0, points.shape[1] if points.ndim == 2 else 3)), np.zeros(0, dtype=np.int64)
+    rng = np.random.default_rng(seed)
+    centers = [points[rng.integers(n)]]
+    closest = ((points - centers[0]) ** 2).sum(axis=1)
+    for _ in range(1, k):
+        probs = closest / closest.sum() if closest.sum() > 0 else None
+        centers.append(points[rng.choice(n, p=probs)])
+        closest = np.minimum(closest, ((points - centers[-1]) ** 2).sum(axis=1))
+    centers = np.array(centers)
+
+    for _ in range(iterations):
+        d2 = ((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        labels = d2.argmin(axis=1)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, points)
+        empty = counts == 0
+        new_centers = np.where(empty[:, None], centers, sums / np.maximum(counts, 1)[:, None])
+        if empty.any():  # reseed empty clusters at the worst-fit points
+            worst = np.argsort(d2[np.arange(n), labels])[::-1][:empty.sum()]
+            new_centers[empty] = points[worst]
+        shift = np.abs(new_centers - centers).max()
+        centers = new_centers
+        if shift < 1e-3:
+            break
+    labels = ((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+    counts = np.bincount(labels, minlength=k)
+    keep = counts > 0
+    return centers[keep], counts[keep]
+
+
+# =============================================================================
+# REGIONS
+# =============================================================================
+
+def _region_key(region, frame_size) -> str:
+    if region is None:
+        return "full"
+    if hasattr(region, "crop"):  # CompactMask / SegmentationMask
+        digest = hashlib.sha1(np.ascontiguousarray(region.crop > MASK_THRESHOLD).tobytes()).hexdigest()[:12]
+        return f"mask:{region.y0},{region.x0},{region.y1},{region.x1}:{tuple(region.frame_shape)}:{digest}"
+    return f"box:{','.join(str(int(v)) for v in _box(region))}:{frame_size}"
+
+
+def _box(region) -> Tuple[int, int, int, int]:
+    """(y0, x0, y1, x1) from a BoundingBox or a tuple."""
+    if hasattr(region, "x2"):  # BoundingBox
+        return region.y1, region.x1, region.y2, region.x2
+    return tuple(int(v) for v in region)
+
+
+def frame_array(img: PILImage.Image, frame_size: Optional[Tuple[int, int]] = None) -> np.ndarray:
+    """(H, W, 3) uint8 RGB of the image, resized to frame_size (width, height) if given."""
+    if frame_size and img.size != tuple(frame_size):
+        img.draft("RGB", tuple(frame_size))
+        img = img.convert("RGB").resize(tuple(frame_size), PILImage.Resampling.BILINEAR)
+    return np.asarray(img.convert("RGB"))
+
+
+def _region_frame(region, frame_size: Optional[Tuple[int, int]]) -> Optional[Tuple[int, int]]:
+    """Frame a region's coordinates refer to: the mask's frame_shape, else frame_size."""
+    if hasattr(region, "crop"):
+        return (region.frame_shape[1], region.frame_shape[0])
+    return tuple(frame_size) if frame_size else None
+
+
+def pixels_in_region(arr: np.ndarray, region=None) -> np.ndarray:
+    """(N, 3) pixels of a region of a frame_array."""
+    if region is None:
+        return arr.reshape(-1, 3)
+    if hasattr(region, "crop"):
+        patch = arr[region.y0:region.y1, region.x0:region.x1]
+        return patch[region.crop[:patch.shape[0], :patch.shape[1]] > MASK_THRESHOLD]
+    y0, x0, y1, x1 = _box(region)
+    return arr[max(0, y0):y1, max(0, x0):x1].reshape(-1, 3)
+
+
+def region_pixels(img: PILImage.Image, region=None, frame_size: Optional[Tuple[int, int]] = None) -> np.ndarray:
+    """
+    (N, 3) uint8 RGB pixels of a region. Box / mask coordinates are in the frame the
+    detection ran on: frame_size (width, height) for boxes, the mask's frame_shape
+    for masks; the image is resized to that frame first if needed.
+    """
+    return pixels_in_region(frame_array(img, _region_frame(region, frame_size)), region)
+
+
+def palette_from_pixels(pixels: np.ndarray, k: int = DEFAULT_K, max_samples: int = MAX_SAMPLES, seed: int = 0) -> List[Swatch]:
+    if len(pixels) == 0:
+        return []
+    if len(pixels) > max_samples:
+        pixels = pixels[np.random.default_rng(seed).choice(len(pixels), max_samples, replace=False)]
+    centers, counts = kmeans(srgb_to_lab(pixels), k, seed=seed)
+    order = np.argsort(counts)[::-1]
+    rgb = lab_to_srgb(centers[order])
+    total = counts.sum()
+    return [
+        Swatch(hex="#{:02x}{:02x}{:02x}".format(*c), rgb=tuple(int(v) for v in c),
+               lab=tuple(round(float(v), 2) for v in lab), coverage=round(float(n / total), 4))
+        for c, lab, n in zip(rgb, centers[order], counts[order])
+    ]
+
+
+def _cached_palette(cache: AnalysisCache, version: str, key: str) -> Optional[List[Swatch]]:
+    cached = cache.get("palette", version, key)
+    if cached is None:
+        return None
+    return [Swatch(s["hex"], tuple(s["rgb"]), tuple(s["lab"]), s["coverage"]) for s in cached]
+
+
+def extract_palette(
+    image_path,
+    region=None,
+    k: int = DEFAULT_K,
+    frame_size: Optional[Tuple[int, int]] = None,
+    cache: Optional[AnalysisCache] = None,
+) -> List[Swatch]:
+    """Palette of an image or of one region in it (cached by image content, region and k)."""
+    return extract_region_palettes(image_path, [region], k, frame_size, cache)[_unique_labels([region])[0]]
+
+
+def _unique_labels(regions: Sequence[Any]) -> List[str]:
+    """Region labels, with " #2", " #3", ... appended to repeats (two "glove" boxes)."""
+    seen: Dict[str, int] = {}
+    labels = []
+    for i, region in enumerate(regions):
+        label = getattr(region, "label", None) or str(i)
+        seen[label] = seen.get(label, 0) + 1
+        labels.append(label if seen[label] == 1 else f"{label} #{seen[label]}")
+    return labels
+
+
+def extract_region_palettes(
+    image_path,
+    regions: Sequence[Any],
+    k: int = DEFAULT_K,
+    frame_size: Optional[Tuple[int, int]] = None,
+    cache: Optional[AnalysisCache] = None,
+) -> Dict[str, List[Swatch]]:
+    """
+    {region label: palette} for BoundingBoxes / SegmentationMasks of one image.
+
+    The image is hashed once, and decoded (and resized) at most once per frame
+    size for all the regions that miss the cache. CPU bound: from async code,
+    run it with asyncio.to_thread.
+    """
+    cache = cache or get_analysis_cache()
+    digest = cache.content_digest(image_path)
+    version = f"{PALETTE_VERSION}:k{k}"
+    palettes: Dict[str, List[Swatch]] = {}
+    misses = []
+    for label, region in zip(_unique_labels(regions), regions):
+        key = f"{digest}:{_region_key(region, frame_size)}"
+        palette = _cached_palette(cache, version, key)
+        if palette is None:
+            misses.append((label, region, key))
+        palettes[label] = palette
+    if misses:
+        wanted = {_region_frame(region, frame_size) for _, region, _ in misses}
+        with PILImage.open(image_path) as img:
+            # One frame (the usual case) keeps JPEG draft decoding; several share one full decode
+            source = img if len(wanted) == 1 else img.convert("RGB")
+            frames = {frame: frame_array(source, frame) for frame in wanted}
+            for label, region, key in misses:
+                palette = palette_from_pixels(pixels_in_region(frames[_region_frame(region, frame_size)], region), k)
+                cache.put("palette", version, key, [asdict(s) for s in palette])
+                palettes[label] = palette
+    return palettes
+
+
+# =============================================================================
+# COMPARISON
+# =============================================================================
+
+def _as_arrays(palette: Sequence[Swatch]) -> Tuple[np.ndarray, np.ndarray]:
+    lab = np.array([s.lab for s in palette], dtype=np.float64).reshape(-1, 3)
+    weights = np.array([s.coverage for s in palette], dtype=np.float64)
+    return lab, weights / weights.sum() if weights.sum() else weights
+
+
+def palette_distance(a: Sequence[Swatch], b: Sequence[Swatch]) -> float:
+    """
+    Approximate earth mover's distance in Delta E (0 = same colours in the same proportions):
+    coverage is moved between swatches greedily, closest pairs first.
+    """
+    if not a or not b:
+        return float("inf")
+    lab_a, w_a = _as_arrays(a)
+    lab_b, w_b = _as_arrays(b)
+    d = np.sqrt(((lab_a[:, None, :] - lab_b[None, :, :]) ** 2).sum(axis=2))
+    left_a, left_b = w_a.copy(), w_b.copy()
+    cost = 0.0
+    for flat in np.argsort(d, axis=None, kind="stable"):
+        i, j = divmod(int(flat), d.shape[1])
+        moved = min(left_a[i], left_b[j])
+        if moved > 0:
+            cost += moved * d[i, j]
+            left_a[i] -= moved
+            left_b[j] -= moved
+    return float(cost)
+
+
+def palette_distance_matrix(palettes_a: Sequence[Sequence[Swatch]], palettes_b: Sequence[Sequence[Swatch]]) -> np.ndarray:
+    """(M, K) palette_distance for every pair, e.g. reference palettes vs. a batch of renders."""
+    return np.array([[palette_distance(a, b) for b in palettes_b] for a in palettes_a]).reshape(len(palettes_a), len(palettes_b))
+
+
+def palette_similarity(a: Sequence[Swatch], b: Sequence[Swatch], scale: float = 50.0) -> float:
+    """0..1 (1 = identical); a Delta E of `scale` or more counts as unrelated."""
+    return max(0.0, 1.0 - palette_distance(a, b) / scale)
+
+
+def palette_to_dict(palette: Sequence[Swatch]) -> List[Dict[str, Any]]:
+    return [asdict(s) for s in palette]
@@ -0,0 +1,241 @@
+"""
+Yuki Compact Masks
+Bounding-box-cropped segmentation masks with vectorized set operations
+
+Gemini returns each segmentation mask as a PNG covering only its box. Pasting
+every one into an image-sized array costs height x width bytes per piece
+(~8 MB per piece on a 4K frame, hundreds of MB for a costume breakdown), even
+though a piece usually covers a small part of the frame. Here a mask keeps
+only its box-sized crop (soft 0..255 values) plus the frame size:
+
+- to_full():       full-frame array, materialized only on request
+- area / union / intersection / IoU: computed on box overlaps only
+- iou_matrix():    all pairs at once; box overlap is tested vectorized and
+                   only overlapping pairs touch pixels
+- to_rle() / from_rle(): run-length encoding of the binary mask (JSON friendly)
+- save_masks() / load_masks(): one .npz per image, crops bit-packed
+  (or raw soft values with soft=True), labels / metadata as JSON
+
+Masks are binarized at THRESHOLD (127, the midpoint Gemini's masks are meant
+to be cut at) for area / IoU.
+
+Usage:
+    from analyzers.compact_masks import CompactMask, iou_matrix, save_masks, load_masks
+
+    mask = CompactMask.from_crop("jacket", y0, x0, crop, frame_shape=(h, w))
+    ious = iou_matrix(generated_masks, reference_masks)      # (M, K)
+    save_masks("renders/gen_01.masks.npz", masks)
+"""
+
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type
+
+import numpy as np
+
+THRESHOLD = 127
+FORMAT_VERSION = 1
+
+
+@dataclass
+class CompactMask:
+    """Mask stored as its bounding-box crop; y1 / x1 are exclusive."""
+    label: str
+    y0: int
+    x0: int
+    y1: int
+    x1: int
+    crop: np.ndarray                # [y1 - y0, x1 - x0] uint8, values 0..255
+    frame_shape: Tuple[int, int]    # (img_height, img_width)
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_crop(cls, label: str, y0: int, x0: int, crop: np.ndarray,
+                  frame_shape: Tuple[int, int], metadata: Optional[Dict[str, Any]] = None, **kwargs):
+        crop = np.ascontiguousarray(crop, dtype=np.uint8)
+        return cls(label=label, y0=y0, x0=x0, y1=y0 + crop.shape[0], x1=x0 + crop.shape[1], crop=crop,
+                   frame_shape=tuple(frame_shape), metadata=metadata or {}, **kwargs)
+
+    @classmethod
+    def from_full(cls, label: str, full: np.ndarray, metadata: Optional[Dict[str, Any]] = None, **kwargs):
+        """Crop a full-frame mask to the box of its nonzero pixels."""
+        rows = np.flatnonzero(full.any(axis=1))
+        cols = np.flatnonzero(full.any(axis=0))
+        if rows.size == 0:
+            return cls.from_crop(label, 0, 0, np.zeros((0, 0), np.uint8), full.shape, metadata, **kwargs)
+        y0, y1, x0, x1 = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+        return cls.from_crop(label, int(y0), int(x0), full[y0:y1, x0:x1], full.shape, metadata, **kwargs)
+
+    @property
+    def box(self) -> Tuple[int, int, int, int]:
+        return self.y0, self.x0, self.y1, self.x1
+
+    @property
+    def nbytes(self) -> int:
+        return self.crop.nbytes
+
+    def binary(self, threshold: int = THRESHOLD) -> np.ndarray:
+        return self.crop > threshold
+
+    @property
+    def area(self) -> int:
+        return int(np.count_nonzero(self.binary()))
+
+    def to_full(self, binary: bool = False) -> np.ndarray:
+        """Full-frame [img_height, img_width] array (allocated on every call, not cached)."""
+        full = np.zeros(self.frame_shape, dtype=bool if binary else np.uint8)
+        full[self.y0:self.y1, self.x0:self.x1] = self.binary() if binary else self.crop
+        return full
+
+    def to_rle(self, threshold: int = THRESHOLD) -> Dict[str, Any]:
+        return {"box": list(self.box), "frame_shape": list(self.frame_shape),
+                "counts": rle_encode(self.binary(threshold)).tolist()}
+
+    @classmethod
+    def from_rle(cls, label: str, rle: Dict[str, Any], metadata: Optional[Dict[str, Any]] = None, **kwargs):
+        y0, x0, y1, x1 = rle["box"]
+        crop = rle_decode(np.asarray(rle["counts"]), (y1 - y0, x1 - x0)).astype(np.uint8) * 255
+        return cls.from_crop(label, y0, x0, crop, rle["frame_shape"], metadata, **kwargs)
+
+
+# =============================================================================
+# RUN-LENGTH ENCODING
+# =============================================================================
+
+def rle_encode(binary: np.ndarray) -> np.ndarray:
+    """Row-major run lengths, alternating off / on, starting with off (possibly 0)."""
+    flat = np.asarray(binary, dtype=bool).ravel()
+    if flat.size == 0:
+        return np.zeros(0, dtype=np.int64)
+    changes = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    runs = np.diff(np.concatenate(([0], changes, [flat.size])))
+    return np.concatenate(([0], runs)) if flat[0] else runs
+
+
+def rle_decode(counts: np.ndarray, shape: Tuple[int, int]) -> np.ndarray:
+    values = (np.arange(len(counts)) % 2).astype(bool)
+    return np.repeat(values, counts).reshape(shape)
+
+
+# =============================================================================
+# SET OPERATIONS
+# =============================================================================
+
+def areas(masks: Sequence[CompactMask], threshold: int = THRESHOLD) -> np.ndarray:
+    return np.array([np.count_nonzero(m.crop > threshold) for m in masks], dtype=np.int64)
+
+
+def _boxes(masks: Sequence[CompactMask]) -> np.ndarray:
+    return np.array([m.box for m in masks], dtype=np.int64).reshape(-1, 4)
+
+
+def _check_frames(masks: Sequence[CompactMask]):
+    shapes = {tuple(m.frame_shape) for m in masks}
+    if len(shapes) > 1:
+        raise ValueError(f"Masks come from different frames: {sorted(shapes)}")
+
+
+def intersection_area(a: CompactMask, b: CompactMask, threshold: int = THRESHOLD) -> int:
+    y0, x0 = max(a.y0, b.y0), max(a.x0, b.x0)
+    y1, x1 = min(a.y1, b.y1), min(a.x1, b.x1)
+    if y0 >= y1 or x0 >= x1:
+        return 0
+    pa = a.crop[y0 - a.y0:y1 - a.y0, x0 - a.x0:x1 - a.x0] > threshold
+    pb = b.crop[y0 - b.y0:y1 - b.y0, x0 - b.x0:x1 - b.x0] > threshold
+    return int(np.count_nonzero(pa & pb))
+
+
+def iou(a: CompactMask, b: CompactMask, threshold: int = THRESHOLD) -> float:
+    _check_frames([a, b])
+    inter = intersection_area(a, b, threshold)
+    union = int(np.count_nonzero(a.crop > threshold)) + int(np.count_nonzero(b.crop > threshold)) - inter
+    return inter / union if union else 0.0
+
+
+def iou_matrix(masks_a: Sequence[CompactMask], masks_b: Sequence[CompactMask],
+               threshold: int = THRESHOLD) -> np.ndarray:
+    """(M, K) IoU; pairs whose boxes don't overlap are never compared pixel-wise."""
+    _check_frames(list(masks_a) + list(masks_b))
+    result = np.zeros((len(masks_a), len(masks_b)))
+    if not len(masks_a) or not len(masks_b):
+        return result
+    ba, bb = _boxes(masks_a)[:, None, :], _boxes(masks_b)[None, :, :]
+    overlaps = ((np.minimum(ba[..., 2], bb[..., 2]) > np.maximum(ba[..., 0], bb[..., 0])) &
+                (np.minimum(ba[..., 3], bb[..., 3]) > np.maximum(ba[..., 1], bb[..., 1])))
+    area_a, area_b = areas(masks_a, threshold), areas(masks_b, threshold)
+    for i, j in zip(*np.nonzero(overlaps)):
+        inter = intersection_area(masks_a[i], masks_b[j], threshold)
+        union = area_a[i] + area_b[j] - inter
+        result[i, j] = inter / union if union else 0.0
+    return result
+
+
+def union_box(masks: Sequence[CompactMask]) -> Tuple[int, int, int, int]:
+    boxes = _boxes(masks)
+    return (int(boxes[:, 0].min()), int(boxes[:, 1].min()), int(boxes[:, 2].max()), int(boxes[:, 3].max()))
+
+
+def union(masks: Sequence[CompactMask], label: str = "union", threshold: int = THRESHOLD) -> CompactMask:
+    """Binary union, allocated over the enclosing box of the inputs only."""
+    if not masks:
+        raise ValueError("union() needs at least one mask")
+    _check_frames(masks)
+    y0, x0, y1, x1 = union_box(masks)
+    canvas = np.zeros((y1 - y0, x1 - x0), dtype=bool)
+    for m in masks:
+        canvas[m.y0 - y0:m.y1 - y0, m.x0 - x0:m.x1 - x0] |= m.crop > threshold
+    return CompactMask.from_crop(label, y0, x0, canvas.astype(np.uint8) * 255, masks[0].frame_shape)
+
+
+def coverage(masks: Sequence[CompactMask], threshold: int = THRESHOLD) -> float:
+    """Fraction of the frame covered by the union of the masks."""
+    if not masks:
+        return 0.0
+    h, w = masks[0].frame_shape
+    return union(masks, threshold=threshold).area / float(h * w)
+
+
+# =============================================================================
+# ON-DISK FORMAT
+# =============================================================================
+
+def save_masks(path, masks: Sequence[CompactMask], soft: bool = False):
+    """
+    One compressed .npz: boxes, frame shapes, crops (bit-packed binary, or raw
+    uint8 with soft=True) concatenated with offsets, labels / metadata as JSON.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if soft:
+        flat = [m.crop.ravel() for m in masks]
+    else:
+        flat = [m.binary().ravel() for m in masks]
+    offsets = np.cumsum([0] + [f.size for f in flat]).astype(np.int64)
+    data = np.concatenate(flat) if flat else np.zeros(0, dtype=np.uint8)
+    if not soft:
+        data = np.packbits(data.astype(bool))
+    header = {"version": FORMAT_VERSION, "soft": soft,
+              "labels": [m.label for m in masks], "metadata": [m.metadata for m in masks]}
+    np.savez_compressed(
+        path,
+        header=np.frombuffer(json.dumps(header, default=str).encode("utf-8"), dtype=np.uint8),
+        boxes=_boxes(masks),
+        frames=np.array([m.frame_shape for m in masks], dtype=np.int64).reshape(-1, 2),
+        offsets=offsets,
+        data=data,
+    )
+
+
+def load_masks(path, cls: Type[CompactMask] = CompactMask) -> List[CompactMask]:
+    with np.load(Path(path)) as archive:
+        header = json.loads(archive["header"].tobytes().decode("utf-8"))
+        boxes, frames, offsets, data = archive["boxes"], archive["frames"], archive["offsets"], archive["data"]
+    if not header["soft"]:
+        data = np.unpackbits(data, count=int(offsets[-1])).astype(np.uint8) * 255
+    masks = []
+    for i, (y0, x0, y1, x1) in enumerate(boxes.tolist()):
+        crop = data[offsets[i]:offsets[i + 1]].reshape(y1 - y0, x1 - x0)
+        masks.append(cls.from_crop(header["labels"][i], y0, x0, crop, tuple(frames[i].tolist()),
+                                   header["metadata"][i]))
+    return masks
@@ -0,0 +1,296 @@
+"""
+Yuki Face Geometry
+Vectorized landmark / identity-vector math over many faces at once
+
+Pipelines store landmarks as lists of dicts (Cloud Vision `landmarks_34` with a
+`type` per point, Gemini `landmarks_68` with an iBUG `index`) and identity
+vectors as {name: value} dicts. This module turns them into aligned arrays:
+
+- landmarks:  (B, N, 2) float arrays, NaN where a point is missing
+- identity vectors: (B, K) arrays over a shared, sorted key list
+
+and provides batch operations on them:
+
+- procrustes_align:  similarity-align B shapes to a reference in one SVD call
+- blend_landmarks / blend_vectors:  weighted, NaN-aware averages
+- pairwise_distance:  (M, K) Procrustes distances between two sets of shapes
+- derived_ratios:  KeyRatios / KeyProportions for every face in the batch
+
+Usage:
+    lock = landmarks_to_array(lock_json["landmarks_68"])
+    renders = stack_landmarks([r["landmarks_68"] for r in detections])
+    distances = pairwise_distance(renders, lock[None])[:, 0]
+    ratios = derived_ratios(renders)   # {"eye_width_to_face": (B,), ...}
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Cloud Vision FaceAnnotation.Landmark.Type, in enum order
+CV_LANDMARK_TYPES = [
+    "LEFT_EYE", "RIGHT_EYE", "LEFT_OF_LEFT_EYEBROW", "RIGHT_OF_LEFT_EYEBROW",
+    "LEFT_OF_RIGHT_EYEBROW", "RIGHT_OF_RIGHT_EYEBROW", "MIDPOINT_BETWEEN_EYES", "NOSE_TIP",
+    "UPPER_LIP", "LOWER_LIP", "MOUTH_LEFT", "MOUTH_RIGHT", "MOUTH_CENTER",
+    "NOSE_BOTTOM_RIGHT", "NOSE_BOTTOM_LEFT", "NOSE_BOTTOM_CENTER",
+    "LEFT_EYE_TOP_BOUNDARY", "LEFT_EYE_RIGHT_CORNER", "LEFT_EYE_BOTTOM_BOUNDARY", "LEFT_EYE_LEFT_CORNER",
+    "RIGHT_EYE_TOP_BOUNDARY", "RIGHT_EYE_RIGHT_CORNER", "RIGHT_EYE_BOTTOM_BOUNDARY", "RIGHT_EYE_LEFT_CORNER",
+    "LEFT_EYEBROW_UPPER_MIDPOINT", "RIGHT_EYEBROW_UPPER_MIDPOINT", "LEFT_EAR_TRAGION", "RIGHT_EAR_TRAGION",
+    "LEFT_EYE_PUPIL", "RIGHT_EYE_PUPIL", "FOREHEAD_GLABELLA", "CHIN_GNATHION",
+    "CHIN_LEFT_GONION", "CHIN_RIGHT_GONION", "LEFT_CHEEK_CENTER", "RIGHT_CHEEK_CENTER",
+]
+
+
+@dataclass(frozen=True)
+class LandmarkScheme:
+    """Point layout plus the anatomical anchors the ratios are built from (index groups are averaged)."""
+    name: str
+    size: int
+    anchors: Dict[str, Tuple[int, ...]]
+
+
+def _cv(*names: str) -> Tuple[int, ...]:
+    return tuple(CV_LANDMARK_TYPES.index(n) for n in names)
+
+
+SCHEME_68 = LandmarkScheme("ibug68", 68, {
+    "face_left": (0,), "face_right": (16,), "chin": (8,), "brow_mid": (19, 24),
+    "nose_top": (27,), "nose_bottom": (33,),
+    "eye_a_outer": (36,), "eye_a_inner": (39,), "eye_b_inner": (42,), "eye_b_outer": (45,),
+    "eye_a_center": (36, 37, 38, 39, 40, 41), "eye_b_center": (42, 43, 44, 45, 46, 47),
+    "mouth_left": (48,), "mouth_right": (54,),
+})
+
+SCHEME_34 = LandmarkScheme("cloud_vision", len(CV_LANDMARK_TYPES), {
+    "face_left": _cv("CHIN_LEFT_GONION"), "face_right": _cv("CHIN_RIGHT_GONION"),
+    "chin": _cv("CHIN_GNATHION"), "brow_mid": _cv("LEFT_EYEBROW_UPPER_MIDPOINT", "RIGHT_EYEBROW_UPPER_MIDPOINT"),
+    "nose_top": _cv("MIDPOINT_BETWEEN_EYES"), "nose_bottom": _cv("NOSE_BOTTOM_CENTER"),
+    "eye_a_outer": _cv("LEFT_EYE_LEFT_CORNER"), "eye_a_inner": _cv("LEFT_EYE_RIGHT_CORNER"),
+    "eye_b_inner": _cv("RIGHT_EYE_LEFT_CORNER"), "eye_b_outer": _cv("RIGHT_EYE_RIGHT_CORNER"),
+    "eye_a_center": _cv("LEFT_EYE"), "eye_b_center": _cv("RIGHT_EYE"),
+    "mouth_left": _cv("MOUTH_LEFT"), "mouth_right": _cv("MOUTH_RIGHT"),
+})
+
+RATIO_NAMES = (
+    # KeyRatios (identity lock)
+    "eye_width_to_face", "nose_length_to_face", "mouth_width_to_face", "interocular_distance",
+    # KeyProportions (68-point expansion)
+    "eye_spacing_ratio", "nose_to_chin_ratio", "face_width_height_ratio",
+)
+
+
+# =============================================================================
+# CONVERSION
+# =============================================================================
+
+def scheme_for(landmarks: Sequence[Dict[str, Any]]) -> LandmarkScheme:
+    """Cloud Vision sets carry `type`, 68-point sets carry `index`."""
+    if landmarks and "type" in landmarks[0]:
+        return SCHEME_34
+    return SCHEME_68
+
+
+def landmarks_to_array(landmarks: Sequence[Dict[str, Any]], scheme: Optional[LandmarkScheme] = None) -> np.ndarray:
+    """(N, 2) array in scheme order; missing points are NaN."""
+    scheme = scheme or scheme_for(landmarks)
+    out = np.full((scheme.size, 2), np.nan)
+    for i, point in enumerate(landmarks):
+        if scheme is SCHEME_34:
+            name = point.get("type")
+            slot = CV_LANDMARK_TYPES.index(name) if name in CV_LANDMARK_TYPES else None
+        else:
+            slot = point.get("index", i)
+        if slot is not None and 0 <= slot < scheme.size:
+            out[slot] = (point["x"], point["y"])
+    return out
+
+
+def stack_landmarks(landmark_sets: Sequence[Sequence[Dict[str, Any]]], scheme: Optional[LandmarkScheme] = None) -> np.ndarray:
+    """(B, N, 2) array for many faces in the same scheme."""
+    if not landmark_sets:
+        return np.empty((0, (scheme or SCHEME_68).size, 2))
+    scheme = scheme or scheme_for(landmark_sets[0])
+    return np.stack([landmarks_to_array(s, scheme) for s in landmark_sets])
+
+
+def vectorize_identity(vectors: Sequence[Dict[str, Any]], keys: Optional[List[str]] = None) -> Tuple[List[str], np.ndarray]:
+    """
+    Align {name: value} identity vectors into a (B, K) matrix over `keys`
+    (default: sorted union of numeric keys). Missing / non-numeric entries are NaN.
+    """
+    if keys is None:
+        keys = sorted({k for v in vectors for k, x in v.items()
+                       if isinstance(x, (int, float)) and not isinstance(x, bool)})
+    column = {k: j for j, k in enumerate(keys)}
+    matrix = np.full((len(vectors), len(keys)), np.nan)
+    for i, vector in enumerate(vectors):
+        for k, x in vector.items():
+            j = column.get(k)
+            if j is not None and isinstance(x, (int, float)) and not isinstance(x, bool):
+                matrix[i, j] = x
+    return keys, matrix
+
+
+# =============================================================================
+# BLENDING
+# =============================================================================
+
+def _weights(count: int, weights: Optional[Sequence[float]]) -> np.ndarray:
+    w = np.full(count, 1.0 / count) if weights is None else np.asarray(weights, dtype=float)
+    if w.shape != (count,):
+        raise ValueError(f"Expected {count} weights, got {w.shape[0] if w.ndim else 'scalar'}")
+    return w
+
+
+def blend_vectors(matrix: np.ndarray, weights: Optional[Sequence[float]] = None, renormalize: bool = False) -> np.ndarray:
+    """
+    Weighted sum over rows of a (B, K) matrix. NaN entries contribute nothing;
+    with renormalize=True each column's weights are rescaled over the rows that have it.
+    """
+    w = _weights(matrix.shape[0], weights)[:, None]
+    present = ~np.isnan(matrix)
+    total = np.where(present, matrix, 0.0) * w
+    blended = total.sum(axis=0)
+    if renormalize:
+        mass = (present * w).sum(axis=0)
+        blended = np.divide(blended, mass, out=np.full_like(blended, np.nan), where=mass != 0) * w.sum()
+    blended[~present.any(axis=0)] = np.nan
+    return blended
+
+
+def blend_landmarks(shapes: np.ndarray, weights: Optional[Sequence[float]] = None, align: bool = True) -> np.ndarray:
+    """Weighted mean shape of (B, N, 2) landmarks, Procrustes-aligned to the first shape first."""
+    if align:
+        shapes = procrustes_align(shapes, shapes[0])[0]
+    w = _weights(shapes.shape[0], weights)
+    flat = shapes.reshape(shapes.shape[0], -1)
+    return blend_vectors(flat, w / w.sum(), renormalize=True).reshape(shapes.shape[1:])
+
+
+# =============================================================================
+# ALIGNMENT & DISTANCE
+# =============================================================================
+
+def normalize_shapes(shapes: np.ndarray, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Center and scale (B, N, 2) shapes to unit Frobenius norm over valid points.
+    Returns (normalized shapes with missing points zeroed, centroids (B, 2), scales (B,)).
+    """
+    if mask is None:
+        mask = ~np.isnan(shapes).any(axis=-1)
+    m = mask[..., None].astype(float)
+    counts = np.maximum(m.sum(axis=1), 1.0)
+    filled = np.where(m > 0, shapes, 0.0)
+    centroids = filled.sum(axis=1) / counts
+    centered = (filled - centroids[:, None, :]) * m
+    scales = np.sqrt((centered ** 2).sum(axis=(1, 2)))
+    scales = np.where(scales > 0, scales, 1.0)
+    return centered / scales[:, None, None], centroids, scales
+
+
+def _optimal_rotations(a: np.ndarray, b: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Rotations R (..., 2, 2) minimizing |a @ R - b| and the trace of the singular values."""
+    h = np.swapaxes(a, -1, -2) @ b                     # (..., 2, 2) cross-covariance
+    u, s, vt = np.linalg.svd(h)
+    d = np.sign(np.linalg.det(u @ vt))                 # no reflections
+    s = s.copy()
+    s[..., -1] *= d
+    u = u.copy()
+    u[..., :, -1] *= d[..., None]
+    return u @ vt, s.sum(axis=-1)
+
+
+def procrustes_align(shapes: np.ndarray, reference: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Similarity-align (B, N, 2) shapes onto a (N, 2) reference (all in one batched SVD).
+    Only points present in both the shape and the reference drive the fit.
+    Returns (aligned shapes in the reference's frame, Procrustes disparity per shape in [0, 1]).
+    """
+    shapes = np.asarray(shapes, dtype=float)
+    reference = np.asarray(reference, dtype=float)
+    mask = ~np.isnan(shapes).any(axis=-1) & ~np.isnan(reference).any(axis=-1)[None, :]
+
+    ref = np.broadcast_to(reference, shapes.shape)
+    norm_shapes, _, _ = normalize_shapes(shapes, mask)
+    norm_ref, ref_centroids, ref_scales = normalize_shapes(ref, mask)
+
+    rotations, trace = _optimal_rotations(norm_shapes, norm_ref)
+    disparity = np.clip(1.0 - trace ** 2, 0.0, 1.0)
+
+    # Map every point (including ones that were not used for the fit) into the reference frame
+    _, centroids, scales = normalize_shapes(shapes, mask)
+    full = (np.nan_to_num(shapes) - centroids[:, None, :]) / scales[:, None, None]
+    aligned = (full @ rotations) * trace[:, None, None] * ref_scales[:, None, None] + ref_centroids[:, None, :]
+    aligned[np.isnan(shapes).any(axis=-1)] = np.nan
+    return aligned, disparity
+
+
+def pairwise_distance(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    (M, K) Procrustes distances between shapes a (M, N, 2) and b (K, N, 2):
+    sqrt(1 - trace^2) after optimal translation/scale/rotation, 0 = identical geometry.
+    Points missing on either side of a pair are ignored for that pair.
+    """
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    m, k = a.shape[0], b.shape[0]
+    aa = np.broadcast_to(a[:, None], (m, k) + a.shape[1:]).reshape((m * k,) + a.shape[1:])
+    bb = np.broadcast_to(b[None, :], (m, k) + b.shape[1:]).reshape((m * k,) + b.shape[1:])
+    mask = ~np.isnan(aa).any(axis=-1) & ~np.isnan(bb).any(axis=-1)
+    na, _, _ = normalize_shapes(aa, mask)
+    nb, _, _ = normalize_shapes(bb, mask)
+    _, trace = _optimal_rotations(na, nb)
+    return np.sqrt(np.clip(1.0 - trace ** 2, 0.0, 1.0)).reshape(m, k)
+
+
+def normalized_point_error(shapes: np.ndarray, reference: np.ndarray, scheme: LandmarkScheme = SCHEME_68) -> np.ndarray:
+    """
+    Mean point-to-point error after alignment, in units of the reference's
+    interocular distance (the usual landmark NME). Returns (B,).
+    """
+    aligned, _ = procrustes_align(shapes, reference)
+    iod = np.linalg.norm(_anchor(reference[None], scheme, "eye_a_center")
+                         - _anchor(reference[None], scheme, "eye_b_center"), axis=-1)[0]
+    errors = np.linalg.norm(aligned - reference[None], axis=-1)
+    return np.nanmean(errors, axis=1) / (iod if iod > 0 else np.nan)
+
+
+# =============================================================================
+# RATIOS
+# =============================================================================
+
+def _anchor(shapes: np.ndarray, scheme: LandmarkScheme, name: str) -> np.ndarray:
+    return np.nanmean(shapes[:, list(scheme.anchors[name]), :], axis=1)
+
+
+def derived_ratios(shapes: np.ndarray, scheme: LandmarkScheme = SCHEME_68) -> Dict[str, np.ndarray]:
+    """
+    KeyRatios / KeyProportions for (B, N, 2) shapes, each a (B,) array
+    (NaN where the needed points are missing). Scale- and translation-invariant.
+    """
+    shapes = np.asarray(shapes, dtype=float)
+    p = {name: _anchor(shapes, scheme, name) for name in scheme.anchors}
+
+    def dist(x, y):
+        return np.linalg.norm(p[x] - p[y], axis=-1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        face_width = dist("face_left", "face_right")
+        face_height = dist("brow_mid", "chin")
+        eye_width = (dist("eye_a_outer", "eye_a_inner") + dist("eye_b_outer", "eye_b_inner")) / 2
+        return {
+            "eye_width_to_face": eye_width / face_width,
+            "nose_length_to_face": dist("nose_top", "nose_bottom") / face_height,
+            "mouth_width_to_face": dist("mouth_left", "mouth_right") / face_width,
+            "interocular_distance": dist("eye_a_center", "eye_b_center") / face_width,
+            "eye_spacing_ratio": dist("eye_a_inner", "eye_b_inner") / eye_width,
+            "nose_to_chin_ratio": dist("nose_bottom", "chin") / face_height,
+            "face_width_height_ratio": face_width / face_height,
+        }
+
+
+def ratio_matrix(shapes: np.ndarray, scheme: LandmarkScheme = SCHEME_68, names: Sequence[str] = RATIO_NAMES) -> np.ndarray:
+    """derived_ratios as a (B, len(names)) matrix, columns in `names` order."""
+    ratios = derived_ratios(shapes, scheme)
+    return np.stack([ratios[n] for n in names], axis=1)
@@ -5,6 +5,9 @@ from google import genai
 from google.genai import types
 from PIL import Image
 
+from core.genai_clients import get_genai_client
+from analyzers import face_geometry
+
 # Configuration
 PROJECT_ID = "gifted-cooler-479623-r7"
 LOCATION = "global" # Gemini 3 models often require global or specific regions
@@ -15,7 +18,7 @@ class FaceMathArchitect:
     """
     
     def __init__(self):
-        self.client = genai.Client(vertexai=True, project=PROJECT_ID, location=LOCATION)
+        self.client = get_genai_client(location=LOCATION, project=PROJECT_ID)
 
     def extract_face_schema(self, image_path: str) -> dict:
         """
@@ -58,7 +61,7 @@ class FaceMathArchitect:
         # Attempt 1: Gemini 3 Pro Preview (Global)
         try:
             print("  Attempting with Gemini 3 Pro Preview (Global)...")
-            client_v3 = genai.Client(vertexai=True, project=PROJECT_ID, location="global")
+            client_v3 = get_genai_client(location="global", project=PROJECT_ID)
             response = client_v3.models.generate_content(
                 model="gemini-3-pro-preview",
                 contents=[prompt, image],
@@ -71,7 +74,7 @@ class FaceMathArchitect:
             # Attempt 2: Gemini 2.5 Flash Image (US-Central1) - Fallback
             try:
                 print("  ⚠️ Falling back to Gemini 2.5 Flash Image (US-Central1)...")
-                client_v25 = genai.Client(vertexai=True, project=PROJECT_ID, location="us-central1")
+                client_v25 = get_genai_client(location="us-central1", project=PROJECT_ID)
                 response = client_v25.models.generate_content(
                     model="gemini-2.5-flash-image",
                     contents=[prompt, image],
@@ -84,27 +87,42 @@ class FaceMathArchitect:
     def calculate_blended_schema(self, face_schemas: list, weights: list = None) -> dict:
         """
         Mathematically blends multiple face schemas (e.g., for a 'child of' or 'fusion' cosplay).
+        Identity vectors are aligned into one matrix and blended in a single pass;
+        schemas carrying landmarks also get a Procrustes-aligned blended shape.
         """
         if not face_schemas:
             return {}
-            
-        if weights is None:
-            weights = [1.0 / len(face_schemas)] * len(face_schemas)
-            
-        blended_vector = {}
-        for i, schema in enumerate(face_schemas):
-            vector = schema.get("identity_vector", {})
-            weight = weights[i]
-            for key, value in vector.items():
-                if isinstance(value, (int, float)):
-                    blended_vector[key] = blended_vector.get(key, 0) + (value * weight)
-                    
-        return {
+
+        keys, matrix = face_geometry.vectorize_identity([s.get("identity_vector", {}) for s in face_schemas])
+        blended = face_geometry.blend_vectors(matrix, weights)
+        result = {
             "type": "blended_identity",
             "source_count": len(face_schemas),
-            "blended_identity_vector": blended_vector
+            "blended_identity_vector": {k: float(v) for k, v in zip(keys, blended) if not math.isnan(v)}
         }
 
+        landmark_sets = [s.get("landmarks_68") for s in face_schemas]
+        if all(landmark_sets):
+            shapes = face_geometry.stack_landmarks(landmark_sets, face_geometry.SCHEME_68)
+            shape = face_geometry.blend_landmarks(shapes, weights)
+            result["blended_landmarks_68"] = [
+                {"index": i, "x": float(x), "y": float(y)}
+                for i, (x, y) in enumerate(shape) if not math.isnan(x)
+            ]
+        return result
+
+    def compare_landmarks(self, candidates: list, references: list) -> list:
+        """
+        Procrustes distance matrix (candidates x references) between landmark sets
+        (Cloud Vision landmarks_34 or 68-point). 0.0 = identical geometry.
+        """
+        if not candidates or not references:
+            return []
+        scheme = face_geometry.scheme_for(references[0])
+        distances = face_geometry.pairwise_distance(face_geometry.stack_landmarks(candidates, scheme),
+                                                    face_geometry.stack_landmarks(references, scheme))
+        return distances.tolist()
+
 def test_face_math():
     architect = FaceMathArchitect()
     
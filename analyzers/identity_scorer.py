@@ -0,0 +1,284 @@
+"""
+Yuki Identity Scorer
+CPU-only check that generated renders keep the subject's face geometry.
+
+Compares the subject's landmarks (Cloud Vision `landmarks_34` and/or the
+68-point expansion saved in the V12 identity lock) with the landmarks detected
+on each render:
+- Procrustes distance (translation / scale / rotation removed)
+- mean point error in units of interocular distance
+- the KeyRatios / KeyProportions, vs. the subject's own ratios
+
+Render landmarks come from wherever they already exist - no API calls:
+1. a sidecar `<render>.landmarks.json` ({"landmarks_34": [...]} or {"landmarks_68": [...]})
+2. the Cloud Vision cache (cache/cloud_vision/<md5>.json, same key as CloudVisionAnalyzer)
+3. an optional `detector(path) -> dict` callable (picklable, for the process pool)
+Renders with none of these are reported as "no_landmarks".
+
+Usage:
+    python -m analyzers.identity_scorer Renders_V12 --lock Renders_V12/v12_lock_dave.json
+"""
+
+import os
+import json
+import math
+import hashlib
+import logging
+import argparse
+from pathlib import Path
+from dataclasses import dataclass, field, asdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from analyzers import face_geometry
+
+logger = logging.getLogger("YukiIdentityScorer")
+
+VISION_CACHE_DIR = Path(__file__).resolve().parent.parent / "cache/cloud_vision"
+KEY_RATIO_NAMES = ("eye_width_to_face", "nose_length_to_face", "mouth_width_to_face", "interocular_distance")
+
+# A render at MAX_PROCRUSTES_DISTANCE (or MAX_RATIO_ERROR mean relative ratio error) scores 0 on that term
+MAX_PROCRUSTES_DISTANCE = 0.25
+MAX_RATIO_ERROR = 0.25
+GEOMETRY_WEIGHT = 0.6
+PASS_THRESHOLD = 0.75
+CHUNK_SIZE = 32
+
+
+@dataclass
+class IdentityScore:
+    image: str
+    status: str  # "ok" | "no_landmarks" | "error"
+    scheme: Optional[str] = None
+    score: Optional[float] = None
+    procrustes_distance: Optional[float] = None
+    normalized_error: Optional[float] = None
+    ratio_error: Optional[float] = None
+    ratios: Dict[str, float] = field(default_factory=dict)
+    ratio_deltas: Dict[str, float] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def passed(self) -> bool:
+        return self.score is not None and self.score >= PASS_THRESHOLD
+
+
+@dataclass
+class SubjectGeometry:
+    """Subject landmarks per scheme plus the reference ratios renders are compared against."""
+    landmarks: Dict[str, np.ndarray]
+    reference_ratios: Dict[str, Dict[str, float]]
+
+    @classmethod
+    def from_landmarks(cls, landmarks_34: Optional[list] = None, landmarks_68: Optional[list] = None,
+                       key_ratios: Optional[Dict[str, float]] = None) -> "SubjectGeometry":
+        landmarks, reference = {}, {}
+        for key, points, scheme in (("landmarks_34", landmarks_34, face_geometry.SCHEME_34),
+                                    ("landmarks_68", landmarks_68, face_geometry.SCHEME_68)):
+            if not points:
+                continue
+            shape = face_geometry.landmarks_to_array(points, scheme)
+            ratios = {k: float(v[0]) for k, v in face_geometry.derived_ratios(shape[None], scheme).items()}
+            # The lock's KeyRatios fill in whatever the landmarks can't provide
+            for name, value in (key_ratios or {}).items():
+                if name in ratios and math.isnan(ratios[name]) and isinstance(value, (int, float)):
+                    ratios[name] = float(value)
+            landmarks[key] = shape
+            reference[key] = ratios
+        if not landmarks:
+            raise ValueError("Subject has no landmarks_34 / landmarks_68")
+        return cls(landmarks, reference)
+
+    @classmethod
+    def from_lock(cls, lock: Dict[str, Any], vision_data: Optional[Dict[str, Any]] = None) -> "SubjectGeometry":
+        """From a V12 lock JSON (subject_landmarks saved since V12) and/or the subject's Vision result."""
+        saved = lock.get("subject_landmarks", {})
+        vision_data = vision_data or {}
+        key_ratios = (lock.get("identity_lock", {}).get("geometric_signatures", {}).get("key_ratios") or {})
+        return cls.from_landmarks(
+            landmarks_34=saved.get("landmarks_34") or vision_data.get("landmarks_34"),
+            landmarks_68=saved.get("landmarks_68"),
+            key_ratios=key_ratios,
+        )
+
+
+# =============================================================================
+# RENDER LANDMARKS
+# =============================================================================
+
+def cached_vision_result(image_path: Path, cache_dir: Path = VISION_CACHE_DIR) -> Optional[Dict[str, Any]]:
+    """The CloudVisionAnalyzer cache entry for an image, if it was ever analyzed."""
+    with open(image_path, "rb") as f:
+        digest = hashlib.md5(f.read()).hexdigest()
+    cache_path = Path(cache_dir) / f"{digest}.json"
+    if not cache_path.exists():
+        return None
+    with open(cache_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def find_landmarks(image_path: Path, cache_dir: Path = VISION_CACHE_DIR,
+                   detector: Optional[Callable[[Path], Optional[Dict[str, Any]]]] = None) -> Optional[Dict[str, Any]]:
+    sidecar = image_path.with_suffix(".landmarks.json")
+    if sidecar.exists():
+        with open(sidecar, "r", encoding="utf-8") as f:
+            return json.load(f)
+    cached = cached_vision_result(image_path, cache_dir)
+    if cached and cached.get("landmarks_34"):
+        return cached
+    return detector(image_path) if detector else None
+
+
+# =============================================================================
+# SCORING
+# =============================================================================
+
+def _pick_scheme(subject: SubjectGeometry, detection: Dict[str, Any]) -> Optional[str]:
+    for key in ("landmarks_68", "landmarks_34"):
+        if detection.get(key) and key in subject.landmarks:
+            return key
+    return None
+
+
+def _nan_to_none(value) -> Optional[float]:
+    value = float(value)
+    return None if math.isnan(value) else round(value, 4)
+
+
+def score_batch(subject: SubjectGeometry, images: Sequence[str], detections: Sequence[Optional[Dict[str, Any]]]) -> List[IdentityScore]:
+    """Score many renders; renders sharing a landmark scheme are scored in one vectorized pass."""
+    results: List[Optional[IdentityScore]] = [None] * len(images)
+    groups: Dict[str, List[int]] = {}
+    for i, detection in enumerate(detections):
+        key = _pick_scheme(subject, detection) if detection else None
+        if key is None:
+            results[i] = IdentityScore(image=images[i], status="no_landmarks")
+        else:
+            groups.setdefault(key, []).append(i)
+
+    for key, indices in groups.items():
+        scheme = face_geometry.SCHEME_34 if key == "landmarks_34" else face_geometry.SCHEME_68
+        reference = subject.landmarks[key]
+        shapes = face_geometry.stack_landmarks([detections[i][key] for i in indices], scheme)
+
+        distances = face_geometry.pairwise_distance(shapes, reference[None])[:, 0]
+        errors = face_geometry.normalized_point_error(shapes, reference, scheme)
+        ratios = face_geometry.derived_ratios(shapes, scheme)
+        ref_ratios = subject.reference_ratios[key]
+
+        names = [n for n in face_geometry.RATIO_NAMES if not math.isnan(ref_ratios[n])]
+        measured = np.stack([ratios[n] for n in names], axis=1) if names else np.empty((len(indices), 0))
+        expected = np.array([ref_ratios[n] for n in names])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            relative = np.abs(measured - expected) / np.abs(expected)
+            ratio_error = np.nanmean(np.where(np.isfinite(relative), relative, np.nan), axis=1) if names else np.full(len(indices), np.nan)
+
+        geometry_term = 1.0 - np.clip(distances / MAX_PROCRUSTES_DISTANCE, 0.0, 1.0)
+        ratio_term = 1.0 - np.clip(ratio_error / MAX_RATIO_ERROR, 0.0, 1.0)
+        scores = np.where(np.isnan(ratio_term), geometry_term,
+                          GEOMETRY_WEIGHT * geometry_term + (1 - GEOMETRY_WEIGHT) * ratio_term)
+
+        for row, i in enumerate(indices):
+            results[i] = IdentityScore(
+                image=images[i],
+                status="ok",
+                scheme=key,
+                score=_nan_to_none(scores[row]),
+                procrustes_distance=_nan_to_none(distances[row]),
+                normalized_error=_nan_to_none(errors[row]),
+                ratio_error=_nan_to_none(ratio_error[row]),
+                ratios={n: _nan_to_none(ratios[n][row]) for n in face_geometry.RATIO_NAMES},
+                ratio_deltas={n: _nan_to_none(measured[row, j] - expected[j]) for j, n in enumerate(names)},
+            )
+    return results
+
+
+def score_image(subject: SubjectGeometry, image_path, cache_dir: Path = VISION_CACHE_DIR, detector=None) -> IdentityScore:
+    image_path = Path(image_path)
+    try:
+        detection = find_landmarks(image_path, cache_dir, detector)
+    except Exception as e:
+        return IdentityScore(image=str(image_path), status="error", error=str(e))
+    return score_batch(subject, [str(image_path)], [detection])[0]
+
+
+def _score_chunk(subject: SubjectGeometry, paths: List[str], cache_dir: str, detector) -> List[IdentityScore]:
+    """Process-pool worker: hashing / JSON loading / detection dominate, so each worker takes a whole chunk."""
+    detections, failed = [], {}
+    for i, path in enumerate(paths):
+        try:
+            detections.append(find_landmarks(Path(path), Path(cache_dir), detector))
+        except Exception as e:
+            detections.append(None)
+            failed[i] = str(e)
+    results = score_batch(subject, paths, detections)
+    for i, error in failed.items():
+        results[i] = IdentityScore(image=paths[i], status="error", error=error)
+    return results
+
+
+def score_directory(subject: SubjectGeometry, output_dir, pattern: str = "gen_*.png",
+                    cache_dir: Path = VISION_CACHE_DIR, detector=None,
+                    workers: Optional[int] = None, chunk_size: int = CHUNK_SIZE) -> List[IdentityScore]:
+    """Score every render matching `pattern` in output_dir (workers=0 scores in-process)."""
+    paths = sorted(str(p) for p in Path(output_dir).glob(pattern))
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    if not chunks:
+        return []
+    if workers == 0 or len(chunks) == 1:
+        return [r for chunk in chunks for r in _score_chunk(subject, chunk, str(cache_dir), detector)]
+
+    workers = workers or min(len(chunks), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_score_chunk, subject, chunk, str(cache_dir), detector) for chunk in chunks]
+        return [r for future in futures for r in future.result()]
+
+
+def summarize(results: Sequence[IdentityScore]) -> Dict[str, Any]:
+    scored = [r.score for r in results if r.score is not None]
+    return {
+        "total": len(results),
+        "scored": len(scored),
+        "no_landmarks": sum(r.status == "no_landmarks" for r in results),
+        "errors": sum(r.status == "error" for r in results),
+        "passed": sum(r.passed for r in results),
+        "mean_score": round(float(np.mean(scored)), 4) if scored else None,
+        "min_score": round(float(np.min(scored)), 4) if scored else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score renders against a subject's face geometry (offline)")
+    parser.add_argument("output_dir", type=str)
+    parser.add_argument("--lock", type=str, required=True, help="v12_lock_<name>.json")
+    parser.add_argument("--subject_vision", type=str, help="Cloud Vision JSON for the subject (if the lock predates subject_landmarks)")
+    parser.add_argument("--pattern", type=str, default="gen_*.png")
+    parser.add_argument("--cache_dir", type=str, default=str(VISION_CACHE_DIR))
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--json", type=str, help="Write per-render results here")
+    args = parser.parse_args()
+
+    with open(args.lock, "r", encoding="utf-8") as f:
+        lock = json.load(f)
+    vision_data = None
+    if args.subject_vision:
+        with open(args.subject_vision, "r", encoding="utf-8") as f:
+            vision_data = json.load(f)
+
+    subject = SubjectGeometry.from_lock(lock, vision_data)
+    results = score_directory(subject, args.output_dir, args.pattern, Path(args.cache_dir), workers=args.workers)
+
+    for r in results:
+        mark = "✅" if r.passed else ("⚠️" if r.status == "ok" else "—")
+        print(f"{mark} {Path(r.image).name}: {r.status} score={r.score} procrustes={r.procrustes_distance}")
+    print(json.dumps(summarize(results), indent=2))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"summary": summarize(results), "results": [asdict(r) for r in results]}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,14 +10,20 @@ from google import genai
 from google.genai import types
 from PIL import Image
 
+from analyzers.analysis_cache import AnalysisCache, get_analysis_cache
+
 logger = logging.getLogger("YukiAgeEstimator")
 
 class YukiAgeEstimator:
     """Estimates age from user photos to ensure appropriate character matching"""
     
-    def __init__(self, project_id: str = "gifted-cooler-479623-r7"):
+    # Bump when the prompt or parsing changes (invalidates cached results)
+    ANALYSIS_VERSION = "1"
+    
+    def __init__(self, project_id: str = "gifted-cooler-479623-r7", cache: AnalysisCache = None):
         self.project_id = project_id
         self.model_id = "gemini-3-pro-preview"  # Non-image variant for analysis
+        self.cache = cache or get_analysis_cache()
         
         # Initialize Gemini client (global routing for Gemini 3)
         try:
@@ -52,11 +58,27 @@ class YukiAgeEstimator:
             }
         
         try:
-            # Load image
-            img = Image.open(image_path)
-            
-            # Analyze age with Gemini
-            prompt = """Analyze this person's age and provide the following information:
+            return await self.cache.get_or_compute(
+                "age", f"{self.ANALYSIS_VERSION}:{self.model_id}", image_path,
+                lambda: self._estimate_age_uncached(image_path)
+            )
+        except Exception as e:
+            logger.error(f"      ❌ Age estimation failed: {e}")
+            # Fallback to default
+            return {
+                "estimated_age": 25,
+                "age_range": "20-30",
+                "confidence": "low",
+                "category": "young_adult"
+            }
+    
+    async def _estimate_age_uncached(self, image_path: Path) -> dict:
+        """One Gemini call; raises on failure so the fallback is never cached"""
+        # Load image
+        img = Image.open(image_path)
+        
+        # Analyze age with Gemini
+        prompt = """Analyze this person's age and provide the following information:
 1. Estimated age range (e.g., "18-25", "30-40")
 2. Confidence level (high/medium/low)
 3. Age category (child/teen/young_adult/adult/senior)
@@ -67,48 +89,38 @@ Respond ONLY in this exact JSON format:
     "confidence": "high/medium/low",
     "category": "child/teen/young_adult/adult/senior"
 }"""
-            
-            response = self.client.models.generate_content(
-                model=self.model_id,
-                contents=[img, prompt],
-                config=types.GenerateContentConfig(
-                    response_modalities=["TEXT"]
-                )
+        
+        response = self.client.models.generate_content(
+            model=self.model_id,
+            contents=[img, prompt],
+            config=types.GenerateContentConfig(
+                response_modalities=["TEXT"]
             )
-            
-            # Parse response
-            import json
-            response_text = response.text.strip()
-            
-            # Extract JSON from response (handle code blocks)
-            if "```json" in response_text:
-                response_text = response_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in response_text:
-                response_text = response_text.split("```")[1].split("```")[0].strip()
-            
-            result = json.loads(response_text)
-            
-            # Calculate midpoint age
-            age_range = result.get("age_range", "20-30")
-            min_age, max_age = map(int, age_range.split("-"))
-            estimated_age = (min_age + max_age) // 2
-            
-            result["estimated_age"] = estimated_age
-            result["age_range"] = age_range
-            
-            logger.info(f"      🎂 Estimated Age: {estimated_age} ({age_range}) - {result['category']}")
-            
-            return result
-            
-        except Exception as e:
-            logger.error(f"      ❌ Age estimation failed: {e}")
-            # Fallback to default
-            return {
-                "estimated_age": 25,
-                "age_range": "20-30",
-                "confidence": "low",
-                "category": "young_adult"
-            }
+        )
+        
+        # Parse response
+        import json
+        response_text = response.text.strip()
+        
+        # Extract JSON from response (handle code blocks)
+        if "```json" in response_text:
+            response_text = response_text.split("```json")[1].split("```")[0].strip()
+        elif "```" in response_text:
+            response_text = response_text.split("```")[1].split("```")[0].strip()
+        
+        result = json.loads(response_text)
+        
+        # Calculate midpoint age
+        age_range = result.get("age_range", "20-30")
+        min_age, max_age = map(int, age_range.split("-"))
+        estimated_age = (min_age + max_age) // 2
+        
+        result["estimated_age"] = estimated_age
+        result["age_range"] = age_range
+        
+        logger.info(f"      🎂 Estimated Age: {estimated_age} ({age_range}) - {result['category']}")
+        
+        return result
     
     def get_age_appropriate_instruction(self, age_info: dict, character: str) -> str:
         """
@@ -9,18 +9,107 @@ import logging
 import numpy as np
 from pathlib import Path
 from PIL import Image
-from typing import Dict, Tuple
+from typing import Dict, List, Optional, Tuple
 import colorsys
+from concurrent.futures import ProcessPoolExecutor
+
+from analyzers.analysis_cache import AnalysisCache, get_analysis_cache
+from analyzers.identity_scorer import VISION_CACHE_DIR, cached_vision_result
 
 logger = logging.getLogger("YukiSkinAnalyzer")
 
+# Longest side the image is decoded at for sampling (JPEG draft / PIL reduce)
+SAMPLE_SIZE = 512
+
+
+def face_box_from_vision(image_path: Path, vision_cache_dir: Path = VISION_CACHE_DIR) -> Optional[Tuple[float, float, float, float]]:
+    """(x0, y0, x1, y1) of the Cloud Vision landmarks (original pixels), if the image is in the Vision cache"""
+    try:
+        cv_data = cached_vision_result(image_path, vision_cache_dir)
+    except (OSError, ValueError):
+        return None
+    landmarks = (cv_data or {}).get("landmarks_34") or []
+    if not landmarks:
+        return None
+    xs = [lm["x"] for lm in landmarks]
+    ys = [lm["y"] for lm in landmarks]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def load_reduced(image_path: Path, max_side: int = SAMPLE_SIZE) -> Tuple[np.ndarray, float, float]:
+    """
+    Decode at roughly max_side (JPEG DCT scaling via draft, integer reduce otherwise)
+    Returns (RGB array, x scale, y scale) relative to the original size
+    """
+    with Image.open(image_path) as img:
+        width, height = img.size
+        img.draft("RGB", (max_side, max_side))
+        factor = max(img.size) // max_side
+        if factor > 1:
+            img = img.reduce(factor)
+        img = img.convert("RGB")
+        return np.asarray(img), img.size[0] / width, img.size[1] / height
+
+
+def histogram_median(values: np.ndarray) -> int:
+    """np.median(values).astype(int) for uint8 values, from a 256-bin histogram instead of a sort"""
+    counts = np.bincount(values, minlength=256)
+    cumulative = np.cumsum(counts)
+    n = cumulative[-1]
+    lower = int(np.searchsorted(cumulative, (n - 1) // 2 + 1))
+    upper = int(np.searchsorted(cumulative, n // 2 + 1))
+    return (lower + upper) // 2
+
+
+def measure_skin_rgb(image_path: Path, vision_cache_dir: Path = VISION_CACHE_DIR,
+                     max_side: int = SAMPLE_SIZE) -> Optional[Dict]:
+    """
+    Median skin RGB of the face region (CPU only, picklable for process pools)
+    
+    Face region: the Cloud Vision landmark box when cached, else the centre 50% of the image.
+    Returns None if no usable pixels (all shadows / highlights).
+    """
+    img_array, sx, sy = load_reduced(image_path, max_side)
+    height, width, _ = img_array.shape
+    
+    box = face_box_from_vision(image_path, vision_cache_dir)
+    if box is not None:
+        x0, y0, x1, y1 = box
+        x0, x1 = max(0, int(x0 * sx)), min(width, int(np.ceil(x1 * sx)))
+        y0, y1 = max(0, int(y0 * sy)), min(height, int(np.ceil(y1 * sy)))
+        region = "face_landmarks"
+    if box is None or x1 - x0 < 2 or y1 - y0 < 2:
+        # Sample from center region (likely contains face)
+        x0, x1 = int(width * 0.25), int(width * 0.75)
+        y0, y1 = int(height * 0.25), int(height * 0.75)
+        region = "center"
+    
+    pixels = img_array[y0:y1, x0:x1].reshape(-1, 3)
+    
+    # Remove very dark (shadows) and very bright (highlights) pixels: 50 < mean < 240
+    brightness_sum = pixels.sum(axis=1, dtype=np.uint16)
+    filtered_pixels = pixels[(brightness_sum > 150) & (brightness_sum < 720)]
+    if len(filtered_pixels) == 0:
+        return None
+    
+    return {
+        "dominant_rgb": tuple(histogram_median(filtered_pixels[:, c]) for c in range(3)),
+        "region": region,
+        "sampled_pixels": int(len(filtered_pixels))
+    }
+
 class YukiSkinAnalyzer:
     """
     Async sub-agent for skin tone analysis
     Preserves ethnic and DNA authenticity in character transformations
     """
     
-    def __init__(self):
+    # Bump when the sampling / classification changes (invalidates cached results)
+    ANALYSIS_VERSION = "2"
+    
+    def __init__(self, cache: AnalysisCache = None, vision_cache_dir: Path = VISION_CACHE_DIR):
+        self.cache = cache or get_analysis_cache()
+        self.vision_cache_dir = vision_cache_dir
         # Fitzpatrick Scale Reference (for categorization)
         self.fitzpatrick_ranges = {
             "I": {"name": "Very Fair", "rgb_range": (240, 255), "description": "Pale white, always burns"},
@@ -48,7 +137,10 @@ class YukiSkinAnalyzer:
         try:
             # Run CPU-intensive analysis in executor to avoid blocking
             loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(None, self._analyze_skin_sync, image_path)
+            result = await self.cache.get_or_compute(
+                "skin", self.ANALYSIS_VERSION, image_path,
+                lambda: loop.run_in_executor(None, self._analyze_skin_sync, image_path)
+            )
             
             logger.info(f"      🎨 Skin: {result['category']} (Type {result['fitzpatrick_type']}) - {result['undertone']} undertone")
             return result
@@ -60,37 +152,14 @@ class YukiSkinAnalyzer:
     
     def _analyze_skin_sync(self, image_path: Path) -> Dict:
         """Synchronous skin analysis (runs in executor)"""
-        
-        # Load image
-        img = Image.open(image_path).convert('RGB')
-        img_array = np.array(img)
-        
-        # Extract skin tone (simplified approach - analyze center region assuming face)
-        # In production, you'd use face detection (cv2/mediapipe) for accuracy
-        height, width, _ = img_array.shape
-        
-        # Sample from center region (likely contains face)
-        center_y_start = int(height * 0.25)
-        center_y_end = int(height * 0.75)
-        center_x_start = int(width * 0.25)
-        center_x_end = int(width * 0.75)
-        
-        face_region = img_array[center_y_start:center_y_end, center_x_start:center_x_end]
-        
-        # Calculate dominant skin tone
-        # Filter out extreme values (likely backgrounds/shadows)
-        pixels = face_region.reshape(-1, 3)
-        
-        # Remove very dark (shadows) and very bright (highlights) pixels
-        brightness = np.mean(pixels, axis=1)
-        mask = (brightness > 50) & (brightness < 240)
-        filtered_pixels = pixels[mask]
-        
-        if len(filtered_pixels) == 0:
+        return self._classify(measure_skin_rgb(image_path, self.vision_cache_dir))
+    
+    def _classify(self, measurement: Optional[Dict]) -> Dict:
+        """Full result from a measure_skin_rgb() measurement"""
+        if measurement is None:
             return self._get_fallback_result()
         
-        # Calculate median RGB (more robust than mean)
-        dominant_rgb = tuple(np.median(filtered_pixels, axis=0).astype(int))
+        dominant_rgb = tuple(int(v) for v in measurement["dominant_rgb"])
         
         # Convert to hex
         dominant_hex = "#{:02x}{:02x}{:02x}".format(*dominant_rgb)
@@ -113,9 +182,57 @@ class YukiSkinAnalyzer:
             "fitzpatrick_type": fitzpatrick_type,
             "category": self.fitzpatrick_ranges[fitzpatrick_type]["name"],
             "undertone": undertone,
-            "preservation_prompt": preservation_prompt
+            "preservation_prompt": preservation_prompt,
+            "region": measurement["region"]
         }
     
+    def analyze_many(self, image_paths: List[Path], workers: Optional[int] = None, chunksize: int = 4) -> List[Dict]:
+        """
+        Batch analysis: cached images are answered from the analysis cache, the rest
+        are measured on a process pool (workers=1 measures in-process)
+        
+        Returns:
+            Results in the order of image_paths (fallback result for unreadable images)
+        """
+        version = self.ANALYSIS_VERSION
+        results: List[Optional[Dict]] = [None] * len(image_paths)
+        digests = {}
+        pending = []
+        for i, path in enumerate(image_paths):
+            try:
+                digests[i] = self.cache.content_digest(path)
+            except OSError as e:
+                logger.error(f"      ❌ Skin analysis failed for {path}: {e}")
+                results[i] = self._get_fallback_result()
+                continue
+            cached = self.cache.get("skin", version, digests[i])
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.append(i)
+        
+        if pending:
+            paths = [image_paths[i] for i in pending]
+            if workers == 1 or len(pending) == 1:
+                measurements = [self._safe_measure(p) for p in paths]
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    measurements = list(pool.map(_measure_or_error, paths,
+                                                 [self.vision_cache_dir] * len(paths), chunksize=chunksize))
+            for i, measurement in zip(pending, measurements):
+                if isinstance(measurement, str):
+                    logger.error(f"      ❌ Skin analysis failed for {image_paths[i]}: {measurement}")
+                    results[i] = self._get_fallback_result()
+                    continue
+                results[i] = self._classify(measurement)
+                self.cache.put("skin", version, digests[i], results[i])
+        
+        logger.info(f"      🎨 Skin: {len(image_paths)} images ({len(image_paths) - len(pending)} cached)")
+        return results
+    
+    def _safe_measure(self, path: Path):
+        return _measure_or_error(path, self.vision_cache_dir)
+    
     def _classify_fitzpatrick(self, avg_brightness: float) -> str:
         """Classify skin into Fitzpatrick type based on brightness"""
         for fitz_type, info in self.fitzpatrick_ranges.items():
@@ -180,3 +297,11 @@ Apply only the character's styling (hair, outfit, accessories) while keeping the
             "undertone": "neutral",
             "preservation_prompt": "Preserve the person's natural skin tone and ethnic characteristics."
         }
+
+
+def _measure_or_error(image_path: Path, vision_cache_dir: Path = VISION_CACHE_DIR):
+    """Process-pool worker: measurement dict, None (no usable pixels) or an error string"""
+    try:
+        return measure_skin_rgb(image_path, vision_cache_dir)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
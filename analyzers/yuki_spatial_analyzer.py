@@ -23,6 +23,7 @@ import json
 import re
 import base64
 import io
+import asyncio
 from dataclasses import dataclass, field
 from typing import List, Dict, Any, Optional, Literal, Tuple
 from pathlib import Path
@@ -33,6 +34,9 @@ from google.genai import types
 from PIL import Image as PILImage, ImageDraw, ImageFont, ImageColor
 import numpy as np
 
+from analyzers.compact_masks import CompactMask, iou_matrix, load_masks, save_masks
+from analyzers import color_palette
+
 
 @dataclass
 class BoundingBox:
@@ -52,15 +56,16 @@ class BoundingBox:
 
 
 @dataclass
-class SegmentationMask:
-    """Segmentation mask with bounding box"""
-    label: str
-    y0: int  # Top (pixel coordinates)
-    x0: int  # Left
-    y1: int  # Bottom
-    x1: int  # Right
-    mask: np.ndarray  # [img_height, img_width] with values 0..255
-    metadata: Dict[str, Any] = field(default_factory=dict)
+class SegmentationMask(CompactMask):
+    """
+    Segmentation mask with bounding box (pixel coordinates)
+    Only the box-sized crop is stored; see analyzers/compact_masks.py
+    """
+    
+    @property
+    def mask(self) -> np.ndarray:
+        """[img_height, img_width] with values 0..255 (materialized on each access)"""
+        return self.to_full()
 
 
 @dataclass
@@ -231,7 +236,8 @@ If an object is present multiple times, name them according to their unique char
     async def extract_color_palette(
         self,
         image_path: str,
-        character_name: Optional[str] = None
+        character_name: Optional[str] = None,
+        pixel_palettes: bool = True
     ) -> CostumeAnalysis:
         """
         Extract color palette from costume with component mapping
@@ -239,6 +245,8 @@ If an object is present multiple times, name them according to their unique char
         Args:
             image_path: Path to image
             character_name: Optional character name
+            pixel_palettes: Also measure each component's colours from its pixels
+                (metadata["pixel_palettes"], see local_color_palette)
             
         Returns:
             CostumeAnalysis with color-coded components
@@ -291,15 +299,78 @@ Example labels:
                     if mat in label_lower:
                         materials.add(mat)
         
+        metadata = {"character": character_name}
+        if pixel_palettes and components:
+            # CPU bound (decode + k-means per component): keep it off the event loop
+            palettes = await asyncio.to_thread(
+                color_palette.extract_region_palettes, image_path, components, frame_size=(width, height)
+            )
+            metadata["pixel_palettes"] = {label: color_palette.palette_to_dict(p) for label, p in palettes.items()}
+        
         return CostumeAnalysis(
             components=components,
             accessories=[],
             colors=list(colors),
             materials=list(materials),
             full_text=response.text,
-            metadata={"character": character_name}
+            metadata=metadata
         )
     
+    def local_color_palette(
+        self,
+        image_path: str,
+        regions: Optional[List[Any]] = None,
+        k: int = color_palette.DEFAULT_K,
+        frame_size: Optional[Tuple[int, int]] = None
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Measured colour palettes, no model call (k-means in Lab space, cached by image hash)
+        
+        Args:
+            image_path: Path to image
+            regions: BoundingBoxes / SegmentationMasks returned for this image (None = whole image)
+            k: Swatches per region
+            frame_size: (width, height) the boxes refer to; the analyzers return boxes for
+                the 1024px thumbnail, which is the default for boxes
+            
+        Returns:
+            {label: [{"hex", "rgb", "lab", "coverage"}, ...]} ("image" for the whole image;
+            repeated labels become "glove", "glove #2", ...)
+        """
+        if not regions:
+            return {"image": color_palette.palette_to_dict(color_palette.extract_palette(image_path, k=k))}
+        if frame_size is None and not hasattr(regions[0], "crop"):
+            with PILImage.open(image_path) as img:
+                img.thumbnail([1024, 1024], PILImage.Resampling.LANCZOS)
+                frame_size = img.size
+        palettes = color_palette.extract_region_palettes(image_path, regions, k=k, frame_size=frame_size)
+        return {label: color_palette.palette_to_dict(p) for label, p in palettes.items()}
+    
+    @staticmethod
+    def compare_palettes(
+        reference_image: str,
+        cosplay_images: List[str],
+        k: int = color_palette.DEFAULT_K
+    ) -> List[Dict[str, Any]]:
+        """
+        Whole-image palette match of renders / cosplay photos against a reference (CPU only)
+        
+        Returns:
+            One dict per image: delta_e (lower is closer) and similarity (0..1), best first
+        """
+        reference = color_palette.extract_palette(reference_image, k=k)
+        palettes = [color_palette.extract_palette(path, k=k) for path in cosplay_images]
+        distances = color_palette.palette_distance_matrix([reference], palettes)[0]
+        results = [
+            {
+                "image": str(path),
+                "delta_e": round(float(d), 2),
+                "similarity": round(color_palette.palette_similarity(reference, palette), 4)
+            }
+            for path, palette, d in zip(cosplay_images, palettes, distances)
+        ]
+        return sorted(results, key=lambda r: r["delta_e"])
+    
     async def compare_cosplay_accuracy(
         self,
         reference_image: str,
@@ -373,7 +444,8 @@ Focus on: outfit pieces, colors, accessories, props.
     async def segment_costume_pieces(
         self,
         image_path: str,
-        piece_types: List[str] = None
+        piece_types: List[str] = None,
+        save_to: Optional[str] = None
     ) -> List[SegmentationMask]:
         """
         Get segmentation masks for costume pieces (Gemini 2.5+ only)
@@ -381,6 +453,7 @@ Focus on: outfit pieces, colors, accessories, props.
         Args:
             image_path: Path to image
             piece_types: Optional list of specific pieces to segment
+            save_to: Optional .npz path for the masks (compact_masks format)
             
         Returns:
             List of SegmentationMask objects
@@ -411,8 +484,83 @@ Focus on: outfit pieces, colors, accessories, props.
         # Parse segmentation masks
         masks = self._parse_segmentation_masks(response.text, height, width)
         
+        if save_to:
+            save_masks(save_to, masks)
+        
         return masks
     
+    async def segment_many(
+        self,
+        image_paths: List[str],
+        output_dir: str,
+        piece_types: List[str] = None,
+        concurrency: int = 4
+    ) -> Dict[str, str]:
+        """
+        Segment a batch of images, writing <output_dir>/<image stem>.masks.npz per image
+        
+        Masks are written as each image finishes and not kept in memory; images
+        whose mask file already exists are skipped (resumable).
+        
+        Returns:
+            {image_path: masks_path}
+        """
+        import asyncio
+        
+        output = Path(output_dir)
+        output.mkdir(parents=True, exist_ok=True)
+        semaphore = asyncio.Semaphore(concurrency)
+        results = {}
+        
+        async def run_one(image_path: str):
+            masks_path = output / f"{Path(image_path).stem}.masks.npz"
+            if not masks_path.exists():
+                async with semaphore:
+                    try:
+                        await self.segment_costume_pieces(image_path, piece_types, save_to=str(masks_path))
+                    except Exception as e:
+                        print(f"⚠️ Segmentation failed for {image_path}: {e}")
+                        return
+            results[image_path] = str(masks_path)
+        
+        await asyncio.gather(*(run_one(p) for p in image_paths))
+        return results
+    
+    @staticmethod
+    def load_segmentation(masks_path: str) -> List[SegmentationMask]:
+        """Masks written by segment_costume_pieces(save_to=...) / segment_many"""
+        return load_masks(masks_path, cls=SegmentationMask)
+    
+    @staticmethod
+    def match_masks(
+        masks: List[SegmentationMask],
+        reference_masks: List[SegmentationMask],
+        min_iou: float = 0.5
+    ) -> Dict[str, Any]:
+        """
+        Pair each reference piece with its best-overlapping mask (same frame size,
+        e.g. two renders of one pose)
+        
+        Returns:
+            dict with per-reference matches (label, best label, IoU), mean IoU and
+            the labels with no match above min_iou
+        """
+        ious = iou_matrix(masks, reference_masks)
+        matches = []
+        for j, ref in enumerate(reference_masks):
+            best = int(np.argmax(ious[:, j])) if len(masks) else -1
+            best_iou = float(ious[best, j]) if best >= 0 else 0.0
+            matches.append({
+                "reference": ref.label,
+                "match": masks[best].label if best >= 0 and best_iou > 0 else None,
+                "iou": round(best_iou, 4)
+            })
+        return {
+            "matches": matches,
+            "mean_iou": round(float(np.mean([m["iou"] for m in matches])), 4) if matches else 0.0,
+            "unmatched": [m["reference"] for m in matches if m["iou"] < min_iou]
+        }
+    
     def _parse_segmentation_masks(
         self,
         json_str: str,
@@ -455,20 +603,16 @@ Focus on: outfit pieces, colors, accessories, props.
                 if bbox_height < 1 or bbox_width < 1:
                     continue
                 
-                mask_img = mask_img.resize((bbox_width, bbox_height), resample=PILImage.Resampling.BILINEAR)
-                
-                # Create full-size mask array
-                np_mask = np.zeros((img_height, img_width), dtype=np.uint8)
-                np_mask[abs_y0:abs_y1, abs_x0:abs_x1] = np.array(mask_img)
+                mask_img = mask_img.convert("L").resize((bbox_width, bbox_height), resample=PILImage.Resampling.BILINEAR)
                 
-                masks.append(SegmentationMask(
+                # Keep only the bbox crop (full frame is materialized on demand)
+                masks.append(SegmentationMask.from_crop(
                     label=item.get("label", "Unknown"),
                     y0=abs_y0,
                     x0=abs_x0,
-                    y1=abs_y1,
-                    x1=abs_x1,
-                    mask=np_mask,
-                    metadata=item
+                    crop=np.asarray(mask_img, dtype=np.uint8),
+                    frame_shape=(img_height, img_width),
+                    metadata={k: v for k, v in item.items() if k != "mask"}
                 ))
         
         except Exception as e:
@@ -5,11 +5,16 @@ Reference: https://wiki.anidb.net/w/API
 
 Features:
 - Automatic download and decompression of animetitles.xml.gz
-- Efficient XML parsing to extract titles by language and type
+- Streaming XML parsing (iterparse) to extract titles by language and type
+- Persistent sqlite FTS5 trigram index, rebuilt only when the dump changes
+- Romanization-tolerant fuzzy title search
 - Local caching to avoid repeated large downloads
 """
 
 import gzip
+import json
+import sqlite3
+import unicodedata
 import xml.etree.ElementTree as ET
 import aiohttp
 import asyncio
@@ -17,13 +22,47 @@ import logging
 import os
 import time
 from pathlib import Path
-from typing import List, Dict, Optional, Union
+from typing import Iterator, List, Dict, Optional, Union
 from dataclasses import dataclass
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+XML_LANG = '{http://www.w3.org/XML/1998/namespace}lang'
+
+# Folds applied after accent stripping so Hepburn / Kunrei / wapuro spellings
+# of the same title collapse to one key ("Ōkami" == "Ookami" == "Okami",
+# "Shingeki" == "Singeki", "Tsubasa" == "Tubasa", "Shimbun" == "Shinbun").
+ROMANIZATION_FOLDS = [
+    ("tsu", "tu"),
+    ("sh", "s"),
+    ("ch", "t"),
+    ("j", "z"),
+    ("fu", "hu"),
+    ("wo", "o"),
+    ("mb", "nb"),
+    ("mp", "np"),
+    ("ou", "o"),
+    ("oo", "o"),
+    ("uu", "u"),
+    ("aa", "a"),
+    ("ii", "i"),
+    ("ee", "e"),
+]
+
+
+def normalize_title(text: str) -> str:
+    """Normalize a title into its search key (lowercase, no accents/punctuation, folded romanization)."""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(ch for ch in text if ch.isalnum() and not unicodedata.combining(ch))
+    for src, dst in ROMANIZATION_FOLDS:
+        text = text.replace(src, dst)
+    return text
+
+
 @dataclass
 class AniDBTitle:
     aid: int
@@ -33,10 +72,14 @@ class AniDBTitle:
 class AniDBClient:
     DUMP_URL = "http://anidb.net/api/anime-titles.xml.gz"
     CACHE_FILE = Path("c:/Yuki_Local/cache/animetitles.xml")
+    INDEX_FILE = Path("c:/Yuki_Local/cache/animetitles.idx.sqlite")
+    INDEX_VERSION = "1"
+    FUZZY_MIN_OVERLAP = 0.5  # fraction of query trigrams a fuzzy hit must share
     
     def __init__(self):
         self.CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
         self._titles_cache: Dict[int, AniDBTitle] = {}
+        self._index: Optional[sqlite3.Connection] = None
 
     async def download_titles_dump(self, force: bool = False):
         """
@@ -79,75 +122,235 @@ class AniDBClient:
                 self.CACHE_FILE.write_bytes(xml_content)
                 logger.info(f"Saved AniDB dump to {self.CACHE_FILE}")
 
-    def parse_titles(self) -> List[AniDBTitle]:
-        """Parse the locally cached XML file."""
+    def iter_titles(self) -> Iterator[AniDBTitle]:
+        """
+        Stream AniDBTitle objects from the cached XML dump.
+        Each <anime> element is cleared once consumed, so memory stays flat
+        regardless of dump size.
+        """
         if not self.CACHE_FILE.exists():
             raise FileNotFoundError("AniDB dump not found. Call download_titles_dump() first.")
 
-        logger.info("Parsing AniDB XML...")
-        tree = ET.parse(self.CACHE_FILE)
-        root = tree.getroot()
-        
-        results = []
-        # XML Namespace handling usually not needed for simple parsing if we ignore xmlns
-        # Structure: <anime aid="1"> <title type="main" xml:lang="x-jat">...</title> ... </anime>
-        
-        for anime in root.findall('anime'):
-            aid = int(anime.get('aid'))
+        # Structure: <animetitles> <anime aid="1"> <title type="main" xml:lang="x-jat">...</title> ... </anime>
+        root = None
+        for event, elem in ET.iterparse(self.CACHE_FILE, events=("start", "end")):
+            if event == "start":
+                if root is None:
+                    root = elem
+                continue
+            if elem.tag != "anime":
+                continue
+
+            aid = int(elem.get('aid'))
             titles_map = {}
             primary = "Unknown"
-            
-            for title in anime.findall('title'):
+
+            for title in elem.iter('title'):
                 t_type = title.get('type')
-                lang = title.get('{http://www.w3.org/XML/1998/namespace}lang') # Handle xml:lang
+                lang = title.get(XML_LANG)  # Handle xml:lang
                 text = title.text
-                
+
                 key = f"{t_type}_{lang}" if lang else t_type
                 titles_map[key] = text
-                
+
                 # Determine primary title for display
                 if t_type == 'main':
                     primary = text
                 elif t_type == 'official' and lang == 'en' and primary == "Unknown":
                     primary = text
-            
+
             # Fallback for primary if main not found (rare)
             if primary == "Unknown" and titles_map:
                 primary = list(titles_map.values())[0]
 
-            obj = AniDBTitle(aid=aid, titles=titles_map, primary_title=primary)
+            # Drop the consumed subtree (and its reference from root)
+            elem.clear()
+            if root is not None:
+                root.clear()
+
+            yield AniDBTitle(aid=aid, titles=titles_map, primary_title=primary)
+
+    def parse_titles(self) -> List[AniDBTitle]:
+        """Parse the locally cached XML file."""
+        logger.info("Parsing AniDB XML...")
+        results = []
+        for obj in self.iter_titles():
             results.append(obj)
-            self._titles_cache[aid] = obj
+            self._titles_cache[obj.aid] = obj
             
         logger.info(f"Parsed {len(results)} anime titles.")
         return results
 
+    # =========================================================================
+    # PERSISTENT TITLE INDEX
+    # =========================================================================
+
+    def _dump_signature(self) -> str:
+        """Identify the current dump so the index is rebuilt only when it changes."""
+        stat = self.CACHE_FILE.stat()
+        return f"{self.INDEX_VERSION}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    def _open_index(self) -> sqlite3.Connection:
+        if self._index is None:
+            self._index = sqlite3.connect(str(self.INDEX_FILE), check_same_thread=False)
+            self._index.executescript("""
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE IF NOT EXISTS anime (
+                    aid INTEGER PRIMARY KEY,
+                    primary_title TEXT,
+                    titles TEXT
+                );
+                CREATE TABLE IF NOT EXISTS title_keys (
+                    norm TEXT NOT NULL,
+                    aid INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_title_keys_norm ON title_keys(norm);
+                CREATE VIRTUAL TABLE IF NOT EXISTS title_fts USING fts5(
+                    norm, aid UNINDEXED, tokenize='trigram'
+                );
+            """)
+        return self._index
+
+    def index_is_current(self) -> bool:
+        """True if the on-disk index was built from the current dump."""
+        if not self.CACHE_FILE.exists() or not self.INDEX_FILE.exists():
+            return False
+        row = self._open_index().execute(
+            "SELECT value FROM meta WHERE key = 'dump_signature'"
+        ).fetchone()
+        return bool(row) and row[0] == self._dump_signature()
+
+    def build_index(self, force: bool = False, batch_size: int = 2000) -> int:
+        """
+        Build the persistent title index from the dump (streaming, batched inserts).
+        Skipped when the index already matches the current dump unless force=True.
+        Returns the number of anime indexed.
+        """
+        if not force and self.index_is_current():
+            return self._open_index().execute("SELECT COUNT(*) FROM anime").fetchone()[0]
+
+        logger.info("Building AniDB title index...")
+        conn = self._open_index()
+        count = 0
+        with conn:
+            conn.execute("DELETE FROM anime")
+            conn.execute("DELETE FROM title_keys")
+            conn.execute("DELETE FROM title_fts")
+
+            anime_rows, key_rows = [], []
+            for obj in self.iter_titles():
+                anime_rows.append((obj.aid, obj.primary_title, json.dumps(obj.titles, ensure_ascii=False)))
+                for norm in {normalize_title(t) for t in obj.titles.values() if t}:
+                    if norm:
+                        key_rows.append((norm, obj.aid))
+                count += 1
+                if len(anime_rows) >= batch_size:
+                    self._flush_index_rows(conn, anime_rows, key_rows)
+                    anime_rows, key_rows = [], []
+            self._flush_index_rows(conn, anime_rows, key_rows)
+
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('dump_signature', ?)",
+                (self._dump_signature(),)
+            )
+
+        logger.info(f"Indexed {count} anime titles -> {self.INDEX_FILE}")
+        return count
+
+    @staticmethod
+    def _flush_index_rows(conn: sqlite3.Connection, anime_rows: list, key_rows: list):
+        conn.executemany("INSERT OR REPLACE INTO anime (aid, primary_title, titles) VALUES (?, ?, ?)", anime_rows)
+        conn.executemany("INSERT INTO title_keys (norm, aid) VALUES (?, ?)", key_rows)
+        conn.executemany("INSERT INTO title_fts (norm, aid) VALUES (?, ?)", key_rows)
+
+    async def ensure_index(self):
+        """Download the dump if needed and make sure the index matches it."""
+        await self.download_titles_dump()
+        if not self.index_is_current():
+            await asyncio.to_thread(self.build_index)
+
+    def _load_anime(self, aids: List[int]) -> List[AniDBTitle]:
+        if not aids:
+            return []
+        placeholders = ",".join("?" * len(aids))
+        rows = self._open_index().execute(
+            f"SELECT aid, primary_title, titles FROM anime WHERE aid IN ({placeholders})", aids
+        ).fetchall()
+        by_aid = {
+            aid: AniDBTitle(aid=aid, titles=json.loads(titles), primary_title=primary)
+            for aid, primary, titles in rows
+        }
+        return [by_aid[aid] for aid in aids if aid in by_aid]
+
+    def search_index(self, query: str, limit: int = 10, fuzzy: bool = True) -> List[AniDBTitle]:
+        """
+        Search the persistent index.
+        Ranking: exact key match, then prefix, then substring (shortest title first).
+        If fewer than `limit` hits and fuzzy=True, fill with trigram-overlap matches
+        (typos, dropped words, alternate romanizations).
+        """
+        norm = normalize_title(query)
+        if not norm:
+            return []
+
+        conn = self._open_index()
+        aids: List[int] = []
+
+        def take(rows):
+            for (aid,) in rows:
+                if aid not in aids:
+                    aids.append(aid)
+
+        # Exact + prefix via the b-tree index on title_keys
+        take(conn.execute(
+            "SELECT aid FROM title_keys WHERE norm >= ? AND norm < ? "
+            "GROUP BY aid ORDER BY MIN(norm != ?), MIN(length(norm)) LIMIT ?",
+            (norm, norm + "\uffff", norm, limit)
+        ))
+
+        # Substring via trigram FTS (needs >= 3 chars)
+        if len(aids) < limit and len(norm) >= 3:
+            phrase = '"' + norm.replace('"', '""') + '"'
+            take(conn.execute(
+                "SELECT aid FROM title_fts WHERE title_fts MATCH ? "
+                "GROUP BY aid ORDER BY MIN(length(norm)) LIMIT ?",
+                (phrase, limit * 2)
+            ))
+
+        # Fuzzy: candidates from trigram OR-query, kept if they share enough trigrams
+        if fuzzy and len(aids) < limit and len(norm) >= 4:
+            grams = {norm[i:i + 3] for i in range(len(norm) - 2)}
+            fts_query = " OR ".join('"' + g.replace('"', '""') + '"' for g in sorted(grams))
+            scored: Dict[int, float] = {}
+            for aid, key in conn.execute(
+                "SELECT aid, norm FROM title_fts WHERE title_fts MATCH ? ORDER BY rank LIMIT ?",
+                (fts_query, limit * 20)
+            ):
+                key_grams = {key[i:i + 3] for i in range(len(key) - 2)}
+                overlap = len(grams & key_grams) / len(grams)
+                if overlap >= self.FUZZY_MIN_OVERLAP and overlap > scored.get(aid, 0.0):
+                    scored[aid] = overlap
+            take((aid,) for aid in sorted(scored, key=scored.get, reverse=True))
+
+        return self._load_anime(aids[:limit])
+
     async def search_anime(self, query: str, limit: int = 10) -> List[AniDBTitle]:
-        """Search for anime by title (case-insensitive substring)."""
-        if not self._titles_cache:
-            await self.download_titles_dump()
-            self.parse_titles()
-            
-        query = query.lower()
-        matches = []
-        
-        for anime in self._titles_cache.values():
-            # Search across all titles for this anime
-            if any(query in t.lower() for t in anime.titles.values()):
-                matches.append(anime)
-                if len(matches) >= limit:
-                    break
-        
-        return matches
+        """Search for anime by title (case-, accent- and romanization-insensitive)."""
+        await self.ensure_index()
+        return self.search_index(query, limit=limit)
 
     async def get_random_anime(self, count: int = 5) -> List[AniDBTitle]:
         """Get random anime titles (useful for stress testing)."""
-        if not self._titles_cache:
-            await self.download_titles_dump()
-            self.parse_titles()
-            
-        import random
-        return random.sample(list(self._titles_cache.values()), min(count, len(self._titles_cache)))
+        await self.ensure_index()
+        rows = self._open_index().execute(
+            "SELECT aid FROM anime ORDER BY random() LIMIT ?", (count,)
+        ).fetchall()
+        return self._load_anime([aid for (aid,) in rows])
+
+    def close(self):
+        if self._index is not None:
+            self._index.close()
+            self._index = None
 
 # Example Usage
 if __name__ == "__main__":
@@ -155,14 +358,19 @@ if __name__ == "__main__":
         client = AniDBClient()
         await client.download_titles_dump()
         
-        # Parse
-        titles = client.parse_titles()
-        print(f"Total Anime: {len(titles)}")
+        # Build (or reuse) the persistent index
+        total = client.build_index()
+        print(f"Total Anime: {total}")
         
         # Search Example
         print("\nSearching for 'Crest of the Stars'...")
         results = await client.search_anime("Crest of the Stars")
         for res in results:
             print(f"[{res.aid}] {res.primary_title}")
+
+        start = time.perf_counter()
+        results = client.search_index("Shingeki no Kyojin")
+        print(f"\nFuzzy 'Shingeki no Kyojin' -> {[r.primary_title for r in results[:3]]} "
+              f"({(time.perf_counter() - start) * 1000:.2f} ms)")
             
     asyncio.run(main())
@@ -3,8 +3,9 @@ import json
 import datetime
 import hashlib
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 from dataclasses import dataclass, asdict
+from anime_record_store import RecordStore, RecordMap, anime_index, character_index, import_legacy_json
 from google import genai
 from google.genai import types
 
@@ -65,6 +66,11 @@ class Character:
             self.reference_images = []
         if self.face_schema is None:
             self.face_schema = CharacterFaceSchema()
+        elif isinstance(self.face_schema, dict):
+            self.face_schema = CharacterFaceSchema(**self.face_schema)
+        self.cosplay_generations = [
+            CosplayGeneration(**g) if isinstance(g, dict) else g for g in self.cosplay_generations
+        ]
 
 @dataclass
 class AnimeRanking:
@@ -108,22 +114,30 @@ class Anime:
             self.character_ids = []
         if self.rankings is None:
             self.rankings = AnimeRanking()
+        elif isinstance(self.rankings, dict):
+            self.rankings = AnimeRanking(**self.rankings)
 
 class AnimeDatabase:
     """
     Smart, structured anime database with indexing, search, and Face Math integration
+    
+    Records live one-per-row in SQLite (anime_record_store) next to the legacy
+    JSON path; anime / characters are materialized on first access and save()
+    writes back only the records that changed.
     """
     
     def __init__(self, db_path: str = "c:/Yuki_Local/anime_database.json"):
         self.db_path = Path(db_path)
-        self.anime: Dict[str, Anime] = {}
-        self.characters: Dict[str, Character] = {}
-        self.indices = {
-            "anime_by_title": {},
-            "characters_by_name": {},
-            "characters_by_anime": {},
-            "top_ranked_anime": []
-        }
+        self.store = RecordStore(self.db_path.with_suffix(".db"))
+        self.anime = RecordMap(
+            self.store, "anime",
+            from_dict=lambda d: Anime(**d), to_dict=asdict, index=anime_index
+        )
+        self.characters = RecordMap(
+            self.store, "character",
+            from_dict=lambda d: Character(**d), to_dict=asdict, index=character_index
+        )
+        self._change_listeners: List[Callable[[str, str], None]] = []
         self.load()
     
     def generate_id(self, text: str) -> str:
@@ -134,107 +148,82 @@ class AnimeDatabase:
         """Add anime and update indices"""
         if not anime.id:
             anime.id = self.generate_id(anime.title_english)
-        self.anime[anime.id] = anime
-        self._update_anime_indices(anime)
+        self.anime.put(anime.id, anime)
         return anime.id
     
     def add_character(self, character: Character) -> str:
         """Add character and update indices"""
         if not character.id:
             character.id = self.generate_id(f"{character.anime_id}_{character.name_full}")
-        self.characters[character.id] = character
-        self._update_character_indices(character)
+        self.characters.put(character.id, character)
+        self.notify_changed(character.id, "added")
         return character.id
     
-    def _update_anime_indices(self, anime: Anime):
-        """Update search indices for anime"""
-        self.indices["anime_by_title"][anime.title_english.lower()] = anime.id
-        if anime.title_romaji:
-            self.indices["anime_by_title"][anime.title_romaji.lower()] = anime.id
+    def set_face_schema(self, character_id: str, schema: CharacterFaceSchema):
+        """Attach an extracted face schema to a character"""
+        self.characters[character_id].face_schema = schema
+        self.notify_changed(character_id, "schema_updated")
     
-    def _update_character_indices(self, character: Character):
-        """Update search indices for character"""
-        self.indices["characters_by_name"][character.name_full.lower()] = character.id
-        if character.anime_id not in self.indices["characters_by_anime"]:
-            self.indices["characters_by_anime"][character.anime_id] = []
-        self.indices["characters_by_anime"][character.anime_id].append(character.id)
+    def add_cosplay_generation(self, character_id: str, generation: CosplayGeneration):
+        """Record a cosplay generation for a character"""
+        self.characters[character_id].cosplay_generations.append(generation)
+        self.notify_changed(character_id, "generation_added")
     
-    def rebuild_indices(self):
-        """Rebuild all search indices"""
-        self.indices = {
-            "anime_by_title": {},
-            "characters_by_name": {},
-            "characters_by_anime": {},
-            "top_ranked_anime": []
-        }
-        for anime in self.anime.values():
-            self._update_anime_indices(anime)
-        for character in self.characters.values():
-            self._update_character_indices(character)
-        self._rebuild_top_ranked()
+    def on_change(self, callback: Callable[[str, str], None]):
+        """Subscribe to character changes: callback(character_id, reason)"""
+        self._change_listeners.append(callback)
     
-    def _rebuild_top_ranked(self):
-        """Rebuild top ranked anime list"""
-        ranked = [(a.id, a.rankings.get_average_rank()) for a in self.anime.values() if a.rankings]
-        ranked.sort(key=lambda x: x[1])
-        self.indices["top_ranked_anime"] = [aid for aid, _ in ranked[:100]]
+    def notify_changed(self, character_id: str, reason: str):
+        """Tell listeners (e.g. the automation work queue) a character changed"""
+        for callback in self._change_listeners:
+            try:
+                callback(character_id, reason)
+            except Exception as e:
+                print(f"⚠️ Change listener failed for {character_id}: {e}")
+    
+    def rebuild_indices(self):
+        """Rebuild all search indices (titles, names, anime -> characters, ranking)"""
+        self.save()
+        self.store.reindex("anime", anime_index)
+        self.store.reindex("character", character_index)
     
     def search_anime(self, title: str) -> Optional[Anime]:
         """Search for anime by title"""
-        aid = self.indices["anime_by_title"].get(title.lower())
-        return self.anime.get(aid) if aid else None
+        return self.anime.get(self.store.lookup("anime", title))
     
     def search_character(self, name: str) -> Optional[Character]:
         """Search for character by name"""
-        cid = self.indices["characters_by_name"].get(name.lower())
-        return self.characters.get(cid) if cid else None
+        return self.characters.get(self.store.lookup("character", name))
     
     def get_characters_for_anime(self, anime_id: str) -> List[Character]:
         """Get all characters for an anime"""
-        char_ids = self.indices["characters_by_anime"].get(anime_id, [])
-        return [self.characters[cid] for cid in char_ids if cid in self.characters]
+        return self.characters.get_many(self.store.children("character", anime_id))
     
     def get_top_anime(self, limit: int = 50) -> List[Anime]:
         """Get top ranked anime"""
-        return [self.anime[aid] for aid in self.indices["top_ranked_anime"][:limit]]
+        return self.anime.get_many(self.store.top_ranked("anime", limit))
     
-    def save(self):
-        """Save database to JSON"""
-        data = {
-            "schema_version": "1.0",
-            "last_updated": datetime.datetime.now().isoformat(),
-            "anime": {aid: asdict(a) for aid, a in self.anime.items()},
-            "characters": {cid: asdict(c) for cid, c in self.characters.items()},
-            "indices": self.indices,
-            "stats": {
-                "total_anime": len(self.anime),
-                "total_characters": len(self.characters),
-                "characters_with_face_schemas": sum(1 for c in self.characters.values() if c.face_schema.extracted)
-            }
-        }
-        with open(self.db_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-        print(f"Database saved to {self.db_path}")
+    def save(self) -> int:
+        """Write back changed records (in-place edits since they were loaded)"""
+        written = self.anime.flush() + self.characters.flush()
+        if written:
+            print(f"Database saved to {self.store.db_path} ({written} records changed)")
+        return written
     
     def load(self):
-        """Load database from JSON"""
-        if not self.db_path.exists():
-            print("No existing database found. Starting fresh.")
-            return
-        
-        with open(self.db_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        # Load anime
-        for aid, anime_dict in data.get("anime", {}).items():
-            self.anime[aid] = Anime(**anime_dict)
-        
-        # Load characters
-        for cid, char_dict in data.get("characters", {}).items():
-            self.characters[cid] = Character(**char_dict)
-        
-        self.indices = data.get("indices", self.indices)
-        print(f"Loaded database with {len(self.anime)} anime and {len(self.characters)} characters")
+        """Open the record store, migrating the legacy JSON database on first run"""
+        if self.store.count("anime") == 0 and self.store.count("character") == 0:
+            if not self.db_path.exists():
+                print("No existing database found. Starting fresh.")
+                return
+            with open(self.db_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            counts = import_legacy_json(self.store, {
+                "anime": ("anime", self.anime),
+                "characters": ("character", self.characters),
+            }, data)
+            print(f"Migrated {self.db_path} to {self.store.db_path}: {counts}")
+        print(f"Opened database with {len(self.anime)} anime and {len(self.characters)} characters")
 
 # ============================================================================
 # EXAMPLE USAGE
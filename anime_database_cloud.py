@@ -10,7 +10,11 @@ import hashlib
 from pathlib import Path
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
 from google.cloud import storage
+from anime_record_store import (
+    RecordStore, RecordMap, anime_index, character_index, encode_record, import_legacy_json
+)
 
 # ============================================================================
 # CONFIGURATION
@@ -18,7 +22,10 @@ from google.cloud import storage
 
 PROJECT_ID = "gifted-cooler-479623-r7"
 GCS_BUCKET_NAME = "yuki-anime-database"
-GCS_BACKUP_PATH = "database/anime_database.json"
+GCS_BACKUP_PATH = "database/anime_database.json"  # legacy single-blob backup (read for migration)
+GCS_RECORDS_PREFIX = "database/records"            # one blob per record: {prefix}/{kind}/{id}.json
+GCS_SYNC_WORKERS = 8
+RECORD_KINDS = ("anime", "character")
 
 # ============================================================================
 # HELPER FUNCTIONS (Same as before)
@@ -165,7 +172,8 @@ class Anime:
 class CloudAnimeDatabase:
     """
     Cloud-native anime database
-    Local-first with automatic GCS backup
+    Local-first (per-record SQLite) with incremental GCS backup:
+    save() uploads only the records that changed since the last sync
     """
     
     def __init__(
@@ -190,17 +198,18 @@ class CloudAnimeDatabase:
                 print(f"⚠️  Cloud backup disabled: {e}")
                 self.enable_cloud_backup = False
         
-        # Database state
-        self.anime: Dict[str, Anime] = {}
-        self.characters: Dict[str, Character] = {}
-        self.indices = {
-            "anime_by_title": {},
-            "characters_by_name": {},
-            "characters_by_anime": {},
-            "top_ranked_anime": []
-        }
+        # Database state: records are materialized on first access
+        self.store = RecordStore(self.local_path.with_suffix(".db"))
+        self.anime = RecordMap(
+            self.store, "anime",
+            from_dict=lambda d: dict_to_dataclass(Anime, d), to_dict=dataclass_to_dict, index=anime_index
+        )
+        self.characters = RecordMap(
+            self.store, "character",
+            from_dict=lambda d: dict_to_dataclass(Character, d), to_dict=dataclass_to_dict, index=character_index
+        )
         
-        # Load (preferably from cloud, fallback to local)
+        # Load (local store; restored from cloud only when empty)
         self.load()
     
     def _ensure_bucket_exists(self):
@@ -219,6 +228,9 @@ class CloudAnimeDatabase:
         except Exception as e:
             print(f"⚠️  Could not create bucket: {e}")
     
+    def _record_map(self, kind: str) -> RecordMap:
+        return self.anime if kind == "anime" else self.characters
+    
     def generate_id(self, text: str) -> str:
         """Generate a unique ID from text"""
         return hashlib.md5(text.encode()).hexdigest()[:12]
@@ -228,8 +240,7 @@ class CloudAnimeDatabase:
         try:
             if not anime.id:
                 anime.id = self.generate_id(anime.title_english)
-            self.anime[anime.id] = anime
-            self._update_anime_indices(anime)
+            self.anime.put(anime.id, anime)
             return anime.id
         except Exception as e:
             print(f"Error adding anime: {e}")
@@ -240,64 +251,26 @@ class CloudAnimeDatabase:
         try:
             if not character.id:
                 character.id = self.generate_id(f"{character.anime_id}_{character.name_full}")
-            self.characters[character.id] = character
-            self._update_character_indices(character)
+            self.characters.put(character.id, character)
             return character.id
         except Exception as e:
             print(f"Error adding character: {e}")
             return ""
     
-    def _update_anime_indices(self, anime: Anime):
-        """Update search indices for anime"""
-        try:
-            self.indices["anime_by_title"][anime.title_english.lower()] = anime.id
-            if anime.title_romaji:
-                self.indices["anime_by_title"][anime.title_romaji.lower()] = anime.id
-        except Exception as e:
-            print(f"Error updating anime indices: {e}")
-    
-    def _update_character_indices(self, character: Character):
-        """Update search indices for character"""
-        try:
-            self.indices["characters_by_name"][character.name_full.lower()] = character.id
-            if character.anime_id not in self.indices["characters_by_anime"]:
-                self.indices["characters_by_anime"][character.anime_id] = []
-            if character.id not in self.indices["characters_by_anime"][character.anime_id]:
-                self.indices["characters_by_anime"][character.anime_id].append(character.id)
-        except Exception as e:
-            print(f"Error updating character indices: {e}")
-    
     def rebuild_indices(self):
         """Rebuild all search indices"""
         try:
-            self.indices = {
-                "anime_by_title": {},
-                "characters_by_name": {},
-                "characters_by_anime": {},
-                "top_ranked_anime": []
-            }
-            for anime in self.anime.values():
-                self._update_anime_indices(anime)
-            for character in self.characters.values():
-                self._update_character_indices(character)
-            self._rebuild_top_ranked()
+            self.anime.flush()
+            self.characters.flush()
+            self.store.reindex("anime", anime_index)
+            self.store.reindex("character", character_index)
         except Exception as e:
             print(f"Error rebuilding indices: {e}")
     
-    def _rebuild_top_ranked(self):
-        """Rebuild top ranked anime list"""
-        try:
-            ranked = [(a.id, a.rankings.get_average_rank()) for a in self.anime.values() if a.rankings]
-            ranked.sort(key=lambda x: x[1])
-            self.indices["top_ranked_anime"] = [aid for aid, _ in ranked[:100]]
-        except Exception as e:
-            print(f"Error rebuilding top ranked: {e}")
-    
     def search_anime(self, title: str) -> Optional[Anime]:
         """Search for anime by title"""
         try:
-            aid = self.indices["anime_by_title"].get(title.lower())
-            return self.anime.get(aid) if aid else None
+            return self.anime.get(self.store.lookup("anime", title))
         except Exception as e:
             print(f"Error searching anime: {e}")
             return None
@@ -305,8 +278,7 @@ class CloudAnimeDatabase:
     def search_character(self, name: str) -> Optional[Character]:
         """Search for character by name"""
         try:
-            cid = self.indices["characters_by_name"].get(name.lower())
-            return self.characters.get(cid) if cid else None
+            return self.characters.get(self.store.lookup("character", name))
         except Exception as e:
             print(f"Error searching character: {e}")
             return None
@@ -314,8 +286,7 @@ class CloudAnimeDatabase:
     def get_characters_for_anime(self, anime_id: str) -> List[Character]:
         """Get all characters for an anime"""
         try:
-            char_ids = self.indices["characters_by_anime"].get(anime_id, [])
-            return [self.characters[cid] for cid in char_ids if cid in self.characters]
+            return self.characters.get_many(self.store.children("character", anime_id))
         except Exception as e:
             print(f"Error getting characters: {e}")
             return []
@@ -323,70 +294,74 @@ class CloudAnimeDatabase:
     def get_top_anime(self, limit: int = 50) -> List[Anime]:
         """Get top ranked anime"""
         try:
-            return [self.anime[aid] for aid in self.indices["top_ranked_anime"][:limit] if aid in self.anime]
+            return self.anime.get_many(self.store.top_ranked("anime", limit))
         except Exception as e:
             print(f"Error getting top anime: {e}")
             return []
     
     def save(self, cloud_backup: bool = True):
         """
-        Save database (local-first, then cloud backup)
+        Save database (local-first, then incremental cloud backup)
         """
         try:
-            # Prepare data
-            data = {
-                "schema_version": "1.0",
-                "last_updated": datetime.datetime.now().isoformat(),
-                "anime": {aid: dataclass_to_dict(a) for aid, a in self.anime.items()},
-                "characters": {cid: dataclass_to_dict(c) for cid, c in self.characters.items()},
-                "indices": self.indices,
-                "stats": {
-                    "total_anime": len(self.anime),
-                    "total_characters": len(self.characters),
-                    "characters_with_face_schemas": sum(1 for c in self.characters.values() if c.face_schema.extracted)
-                },
-                "cloud_backup_enabled": self.enable_cloud_backup
-            }
-            
-            # Save locally first (fast)
-            with open(self.local_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            print(f"💾 Saved locally: {self.local_path}")
+            # Write back changed records locally first (fast)
+            written = self.anime.flush() + self.characters.flush()
+            if written:
+                print(f"💾 Saved locally: {written} records changed in {self.store.db_path}")
             
-            # Backup to GCS (if enabled)
+            # Backup to GCS (if enabled) - only records not yet synced
             if self.enable_cloud_backup and cloud_backup:
-                self._upload_to_gcs(data)
+                self._sync_to_gcs()
             
         except Exception as e:
             print(f"❌ Error saving database: {e}")
     
-    def _upload_to_gcs(self, data: Dict):
-        """Upload database to GCS"""
-        try:
-            self._ensure_bucket_exists()
-            
-            blob = self.bucket.blob(GCS_BACKUP_PATH)
-            blob.upload_from_string(
-                json.dumps(data, indent=2, ensure_ascii=False),
-                content_type='application/json'
-            )
-            print(f"☁️  Backed up to: gs://{self.bucket_name}/{GCS_BACKUP_PATH}")
-        except Exception as e:
-            print(f"⚠️  Cloud backup failed: {e}")
+    def _record_blob_path(self, kind: str, record_id: str) -> str:
+        return f"{GCS_RECORDS_PREFIX}/{kind}/{record_id}.json"
+    
+    def _sync_to_gcs(self) -> int:
+        """Upload records changed since the last sync (one small blob each, in parallel)"""
+        pending = [(kind, *row) for kind in RECORD_KINDS for row in self.store.unsynced(kind)]
+        if not pending:
+            return 0
+        
+        self._ensure_bucket_exists()
+        
+        def upload(item):
+            kind, record_id, payload, version = item
+            try:
+                self.bucket.blob(self._record_blob_path(kind, record_id)).upload_from_string(
+                    payload, content_type='application/json'
+                )
+                self.store.mark_synced(kind, record_id, version)
+                return True
+            except Exception as e:
+                print(f"⚠️  Cloud backup failed for {kind}/{record_id}: {e}")
+                return False
+        
+        with ThreadPoolExecutor(max_workers=GCS_SYNC_WORKERS) as pool:
+            uploaded = sum(pool.map(upload, pending))
+        self.store.set_meta("last_cloud_sync", datetime.datetime.now().isoformat())
+        print(f"☁️  Synced {uploaded}/{len(pending)} changed records to gs://{self.bucket_name}/{GCS_RECORDS_PREFIX}")
+        return uploaded
     
     def load(self):
         """
-        Load database (cloud-first if available, fallback to local)
+        Open the local store; when it is empty, restore from cloud
+        (per-record backup, else legacy blob), then from the legacy local JSON
         """
-        data = None
+        if self.store.count("anime") or self.store.count("character"):
+            print(f"💾 Opened local store: {len(self.anime)} anime, {len(self.characters)} characters")
+            return
         
-        # Try cloud first
-        if self.enable_cloud_backup:
-            data = self._load_from_gcs()
+        if self.enable_cloud_backup and self._download_records_from_gcs():
+            return
         
-        # Fallback to local
+        data = self._load_from_gcs() if self.enable_cloud_backup else None
+        source = "cloud"
         if not data:
             data = self._load_from_local()
+            source = "local"
         
         if not data:
             print("No existing database found. Starting fresh.")
@@ -394,27 +369,49 @@ class CloudAnimeDatabase:
         
         # Parse data
         try:
-            # Load anime
-            for aid, anime_dict in data.get("anime", {}).items():
-                anime = dict_to_dataclass(Anime, anime_dict)
-                if anime:
-                    self.anime[aid] = anime
-            
-            # Load characters
-            for cid, char_dict in data.get("characters", {}).items():
-                char = dict_to_dataclass(Character, char_dict)
-                if char:
-                    self.characters[cid] = char
-            
-            self.indices = data.get("indices", self.indices)
-            
-            source = "cloud" if data.get("cloud_backup_enabled") else "local"
-            print(f"✓ Loaded from {source}: {len(self.anime)} anime, {len(self.characters)} characters")
+            import_legacy_json(self.store, {
+                "anime": ("anime", self.anime),
+                "characters": ("character", self.characters),
+            }, data)
+            print(f"✓ Migrated from {source}: {len(self.anime)} anime, {len(self.characters)} characters")
         except Exception as e:
             print(f"❌ Error loading database: {e}")
     
+    def _download_records_from_gcs(self) -> bool:
+        """Fill the local store from per-record blobs (already in sync afterwards)"""
+        try:
+            blobs = list(self.storage_client.list_blobs(self.bucket_name, prefix=f"{GCS_RECORDS_PREFIX}/"))
+        except Exception as e:
+            print(f"⚠️  Could not list cloud records: {e}")
+            return False
+        if not blobs:
+            return False
+        
+        def download(blob):
+            try:
+                kind, filename = blob.name[len(GCS_RECORDS_PREFIX) + 1:].split("/", 1)
+                return kind, filename[:-len(".json")], json.loads(blob.download_as_bytes())
+            except Exception as e:
+                print(f"⚠️  Could not restore {blob.name}: {e}")
+                return None
+        
+        with ThreadPoolExecutor(max_workers=GCS_SYNC_WORKERS) as pool:
+            downloaded = [item for item in pool.map(download, blobs) if item and item[0] in RECORD_KINDS]
+        
+        for kind in RECORD_KINDS:
+            record_map = self._record_map(kind)
+            rows = [
+                (record_id, encode_record(data), record_map.index(data))
+                for k, record_id, data in downloaded if k == kind
+            ]
+            self.store.put_many(kind, rows)
+            self.store.mark_current_synced(kind, [row[0] for row in rows])
+        
+        print(f"☁️  Restored from cloud: {len(self.anime)} anime, {len(self.characters)} characters")
+        return True
+    
     def _load_from_gcs(self) -> Optional[Dict]:
-        """Load database from GCS"""
+        """Load legacy single-blob database from GCS"""
         try:
             blob = self.bucket.blob(GCS_BACKUP_PATH)
             if blob.exists():
@@ -426,7 +423,7 @@ class CloudAnimeDatabase:
         return None
     
     def _load_from_local(self) -> Optional[Dict]:
-        """Load database from local file"""
+        """Load legacy database from local JSON file"""
         try:
             if self.local_path.exists():
                 with open(self.local_path, 'r', encoding='utf-8') as f:
@@ -437,17 +434,22 @@ class CloudAnimeDatabase:
         return None
     
     def restore_from_cloud(self):
-        """Force restore from cloud backup"""
+        """Force restore from cloud backup (overwrites local records that exist in the cloud)"""
         if not self.enable_cloud_backup:
             print("Cloud backup not enabled")
             return False
         
+        self.anime.evict(flush=False)
+        self.characters.evict(flush=False)
+        if self._download_records_from_gcs():
+            return True
         data = self._load_from_gcs()
         if data:
-            # Save to local
-            with open(self.local_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            print(f"✓ Restored from cloud to {self.local_path}")
+            import_legacy_json(self.store, {
+                "anime": ("anime", self.anime),
+                "characters": ("character", self.characters),
+            }, data)
+            print(f"✓ Restored from cloud to {self.store.db_path}")
             return True
         return False
 
@@ -0,0 +1,386 @@
+"""
+Anime Record Store
+Per-record SQLite storage behind AnimeDatabase / CloudAnimeDatabase
+
+The JSON databases used to load every anime and character into dataclasses at
+construction and rewrite the whole file (and the whole GCS blob) on every save.
+Here each record is one row:
+
+- records:  (kind, id) -> JSON, content digest, version / synced_version
+- index columns (parent_id, rank) and an aliases table (title / name -> id)
+  are maintained on write, so lookups never need the records in memory
+- RecordMap is a dict-like view that materializes dataclasses on first access
+  and keeps them in an identity map; flush() writes back only records whose
+  serialized form changed
+- version > synced_version marks a record the cloud copy hasn't seen yet
+
+Usage:
+    store = RecordStore("c:/Yuki_Local/anime_database.db")
+    characters = RecordMap(store, "character", from_dict=..., to_dict=..., index=...)
+    character = characters.get(character_id)   # one row read
+    character.face_schema = ...
+    characters.flush()                         # one row written
+"""
+
+import json
+import sqlite3
+import hashlib
+import datetime
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+SCHEMA_VERSION = 2
+FETCH_CHUNK = 500
+
+
+def record_digest(payload: str) -> str:
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def encode_record(data: Dict) -> str:
+    return json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+# Index extractors shared by AnimeDatabase and CloudAnimeDatabase (same record layout)
+
+def average_rank(rankings: Optional[Dict]) -> float:
+    """AnimeRanking.get_average_rank() on the serialized form"""
+    ranks = [
+        source["rank"] for source in (rankings or {}).values()
+        if isinstance(source, dict) and "rank" in source
+    ]
+    return sum(ranks) / len(ranks) if ranks else 999999
+
+
+def anime_index(data: Dict) -> Dict:
+    return {
+        "rank": average_rank(data.get("rankings")),
+        "aliases": [data.get("title_english"), data.get("title_romaji")],
+    }
+
+
+def character_index(data: Dict) -> Dict:
+    return {"parent_id": data.get("anime_id"), "aliases": [data.get("name_full")]}
+
+
+class RecordStore:
+    """SQLite table of JSON records with persistent lookup indices"""
+
+    def __init__(self, db_path: str):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_tables()
+
+    def _create_tables(self):
+        with self._lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS records (
+                    kind TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    digest TEXT NOT NULL,
+                    parent_id TEXT,
+                    rank REAL,
+                    version INTEGER NOT NULL DEFAULT 1,
+                    synced_version INTEGER NOT NULL DEFAULT 0,
+                    updated_at TEXT,
+                    PRIMARY KEY (kind, id)
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS aliases (
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    PRIMARY KEY (kind, key)
+                )
+            """)
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_records_parent ON records(kind, parent_id)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_records_rank ON records(kind, rank)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_records_unsynced ON records(kind) WHERE version > synced_version")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_aliases_id ON aliases(kind, id)")
+            self.conn.execute("INSERT OR IGNORE INTO meta VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),))
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    # ------------------------------------------------------------------ reads
+
+    def get(self, kind: str, record_id: str) -> Optional[Tuple[Dict, str]]:
+        """(data, digest) for one record"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT data, digest FROM records WHERE kind=? AND id=?", (kind, record_id)
+            ).fetchone()
+        return (json.loads(row["data"]), row["digest"]) if row else None
+
+    def contains(self, kind: str, record_id: str) -> bool:
+        with self._lock:
+            return self.conn.execute(
+                "SELECT 1 FROM records WHERE kind=? AND id=?", (kind, record_id)
+            ).fetchone() is not None
+
+    def count(self, kind: str) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM records WHERE kind=?", (kind,)).fetchone()[0]
+
+    def ids(self, kind: str) -> List[str]:
+        with self._lock:
+            return [r[0] for r in self.conn.execute("SELECT id FROM records WHERE kind=? ORDER BY rowid", (kind,))]
+
+    def iter_records(self, kind: str, ids: Optional[List[str]] = None) -> Iterator[Tuple[str, Dict, str]]:
+        """(id, data, digest) in chunks - one query per FETCH_CHUNK records, not per record"""
+        if ids is None:
+            ids = self.ids(kind)
+        for start in range(0, len(ids), FETCH_CHUNK):
+            chunk = ids[start:start + FETCH_CHUNK]
+            marks = ",".join("?" * len(chunk))
+            with self._lock:
+                rows = {
+                    r["id"]: r for r in self.conn.execute(
+                        f"SELECT id, data, digest FROM records WHERE kind=? AND id IN ({marks})", (kind, *chunk)
+                    )
+                }
+            for record_id in chunk:
+                row = rows.get(record_id)
+                if row is not None:
+                    yield record_id, json.loads(row["data"]), row["digest"]
+
+    def lookup(self, kind: str, key: str) -> Optional[str]:
+        """id registered under an alias (lower-cased title / name)"""
+        with self._lock:
+            row = self.conn.execute("SELECT id FROM aliases WHERE kind=? AND key=?", (kind, key.lower())).fetchone()
+        return row[0] if row else None
+
+    def children(self, kind: str, parent_id: str) -> List[str]:
+        with self._lock:
+            return [r[0] for r in self.conn.execute(
+                "SELECT id FROM records WHERE kind=? AND parent_id=? ORDER BY rowid", (kind, parent_id)
+            )]
+
+    def top_ranked(self, kind: str, limit: int) -> List[str]:
+        with self._lock:
+            return [r[0] for r in self.conn.execute(
+                "SELECT id FROM records WHERE kind=? AND rank IS NOT NULL ORDER BY rank, rowid LIMIT ?", (kind, limit)
+            )]
+
+    # ------------------------------------------------------------------ writes
+
+    def put_many(self, kind: str, records: List[Tuple[str, str, Dict]]) -> int:
+        """
+        Upsert (id, payload, index) rows in one transaction.
+        index: {"parent_id", "rank", "aliases": [...]}. Unchanged payloads are skipped.
+        Returns the number of rows actually written.
+        """
+        written = 0
+        now = datetime.datetime.now().isoformat()
+        with self._lock, self.conn:
+            for record_id, payload, index in records:
+                digest = record_digest(payload)
+                row = self.conn.execute(
+                    "SELECT digest FROM records WHERE kind=? AND id=?", (kind, record_id)
+                ).fetchone()
+                if row and row["digest"] == digest:
+                    continue
+                self.conn.execute("""
+                    INSERT INTO records (kind, id, data, digest, parent_id, rank, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(kind, id) DO UPDATE SET
+                        data=excluded.data, digest=excluded.digest, parent_id=excluded.parent_id,
+                        rank=excluded.rank, updated_at=excluded.updated_at, version=version + 1
+                """, (kind, record_id, payload, digest, index.get("parent_id"), index.get("rank"), now))
+                self.conn.execute("DELETE FROM aliases WHERE kind=? AND id=?", (kind, record_id))
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO aliases (kind, key, id) VALUES (?, ?, ?)",
+                    [(kind, alias.lower(), record_id) for alias in index.get("aliases", []) if alias]
+                )
+                written += 1
+        return written
+
+    def reindex(self, kind: str, index_fn: Callable[[Dict], Dict]):
+        """Recompute index columns and aliases from the stored JSON"""
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM aliases WHERE kind=?", (kind,))
+            for row in self.conn.execute("SELECT id, data FROM records WHERE kind=? ORDER BY rowid", (kind,)).fetchall():
+                index = index_fn(json.loads(row["data"]))
+                self.conn.execute(
+                    "UPDATE records SET parent_id=?, rank=? WHERE kind=? AND id=?",
+                    (index.get("parent_id"), index.get("rank"), kind, row["id"])
+                )
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO aliases (kind, key, id) VALUES (?, ?, ?)",
+                    [(kind, alias.lower(), row["id"]) for alias in index.get("aliases", []) if alias]
+                )
+
+    # ------------------------------------------------------------------ cloud sync
+
+    def unsynced(self, kind: str) -> List[Tuple[str, str, int]]:
+        """(id, payload, version) for records changed since the last sync"""
+        with self._lock:
+            return [(r["id"], r["data"], r["version"]) for r in self.conn.execute(
+                "SELECT id, data, version FROM records WHERE kind=? AND version > synced_version", (kind,)
+            )]
+
+    def mark_synced(self, kind: str, record_id: str, version: int):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE records SET synced_version=? WHERE kind=? AND id=? AND synced_version < ?",
+                (version, kind, record_id, version)
+            )
+
+    def mark_current_synced(self, kind: str, record_ids: List[str]):
+        """Records just restored from the cloud copy are in sync as stored"""
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "UPDATE records SET synced_version=version WHERE kind=? AND id=?",
+                [(kind, record_id) for record_id in record_ids]
+            )
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self._lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+
+class RecordMap:
+    """
+    Dict-like, lazily materialized view of one record kind.
+
+    Objects are built on first access and cached (identity map), so in-place
+    edits followed by flush() persist exactly like with the old in-memory dicts.
+    """
+
+    def __init__(
+        self,
+        store: RecordStore,
+        kind: str,
+        from_dict: Callable[[Dict], Any],
+        to_dict: Callable[[Any], Dict],
+        index: Callable[[Dict], Dict],
+    ):
+        self.store = store
+        self.kind = kind
+        self.from_dict = from_dict
+        self.to_dict = to_dict
+        self.index = index
+        self._cache: Dict[str, Any] = {}
+        self._digests: Dict[str, str] = {}  # digest as last read/written, "" for new records
+
+    def _materialize(self, record_id: str, data: Dict, digest: str):
+        obj = self.from_dict(data)
+        if obj is None:
+            return None
+        self._cache[record_id] = obj
+        self._digests[record_id] = digest
+        return obj
+
+    def get(self, record_id: Optional[str], default=None):
+        if record_id is None:
+            return default
+        obj = self._cache.get(record_id)
+        if obj is not None:
+            return obj
+        row = self.store.get(self.kind, record_id)
+        return self._materialize(record_id, *row) if row else default
+
+    def __getitem__(self, record_id: str):
+        obj = self.get(record_id)
+        if obj is None:
+            raise KeyError(record_id)
+        return obj
+
+    def put(self, record_id: str, obj) -> bool:
+        """Cache and write one record immediately (keeps lookups consistent without a full flush)"""
+        self._cache[record_id] = obj
+        data = self.to_dict(obj)
+        payload = encode_record(data)
+        written = self.store.put_many(self.kind, [(record_id, payload, self.index(data))])
+        self._digests[record_id] = record_digest(payload)
+        return bool(written)
+
+    def __setitem__(self, record_id: str, obj):
+        self._cache[record_id] = obj
+        self._digests.setdefault(record_id, "")
+
+    def __contains__(self, record_id) -> bool:
+        return record_id in self._cache or self.store.contains(self.kind, record_id)
+
+    def _pending_ids(self) -> List[str]:
+        return [rid for rid, digest in self._digests.items() if digest == ""]
+
+    def keys(self) -> List[str]:
+        stored = self.store.ids(self.kind)
+        known = set(stored)
+        return stored + [rid for rid in self._pending_ids() if rid not in known]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return self.store.count(self.kind) + sum(
+            1 for rid in self._pending_ids() if not self.store.contains(self.kind, rid)
+        )
+
+    def get_many(self, record_ids: List[str]) -> List[Any]:
+        """Materialize several records with chunked reads (cached ones are not re-read)"""
+        missing = [rid for rid in record_ids if rid not in self._cache]
+        for record_id, data, digest in self.store.iter_records(self.kind, missing):
+            self._materialize(record_id, data, digest)
+        return [self._cache[rid] for rid in record_ids if rid in self._cache]
+
+    def values(self) -> List[Any]:
+        return self.get_many(self.keys())
+
+    def items(self) -> List[Tuple[str, Any]]:
+        keys = self.keys()
+        self.get_many(keys)
+        return [(rid, self._cache[rid]) for rid in keys if rid in self._cache]
+
+    def flush(self) -> int:
+        """Write back materialized records whose content changed; returns rows written"""
+        batch, digests = [], {}
+        for record_id, obj in self._cache.items():
+            data = self.to_dict(obj)
+            payload = encode_record(data)
+            digest = record_digest(payload)
+            if digest != self._digests.get(record_id):
+                batch.append((record_id, payload, self.index(data)))
+                digests[record_id] = digest
+        written = self.store.put_many(self.kind, batch) if batch else 0
+        self._digests.update(digests)
+        return written
+
+    def evict(self, flush: bool = True):
+        """Drop cached objects (after flush, unless discarding edits) to release memory on long runs"""
+        if flush:
+            self.flush()
+        self._cache.clear()
+        self._digests.clear()
+
+
+def import_legacy_json(store: RecordStore, maps: Dict[str, Tuple[str, RecordMap]], data: Dict) -> Dict[str, int]:
+    """
+    One-time migration from the monolithic anime_database.json layout.
+    maps: JSON section ("anime" / "characters") -> (kind, RecordMap used for from_dict/to_dict/index)
+    """
+    counts = {}
+    for section, (kind, record_map) in maps.items():
+        rows = []
+        for record_id, raw in (data.get(section) or {}).items():
+            normalized = record_map.to_dict(record_map.from_dict(raw))
+            rows.append((record_id, encode_record(normalized), record_map.index(normalized)))
+        counts[section] = store.put_many(kind, rows)
+    store.set_meta("migrated_from_json_at", datetime.datetime.now().isoformat())
+    return counts
@@ -9,11 +9,11 @@ Yuki Cosplay API - Unified Server
 import os
 import uvicorn
 import asyncio
-from fastapi import FastAPI, HTTPException, UploadFile, File, BackgroundTasks, Request, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, UploadFile, File, BackgroundTasks, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
 # from yuki_rate_limiter import limiter
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any, Union
 import time
@@ -23,35 +23,17 @@ import uuid
 import datetime
 import hashlib
 import json
-from google.cloud import storage, bigquery
-from google import genai
-from google.genai import types
-import google.auth
-import google.auth.transport.requests
 import requests
 
-# Import Yuki's Agent Tools
-from tools import (
-    get_current_time,
-    add_numbers,
-    generate_cosplay_image,
-    generate_cosplay_video,
-    research_topic,
-    list_files,
-    read_file,
-    write_file,
-    search_web,
-    fetch_url,
-    identify_anime_screenshot,
-    detect_objects,
-    segment_image,
-    analyze_video,
-    analyze_pdf,
-    upload_to_gcs,
-    download_from_gcs,
-)
-from yuki_local import YUKI_SYSTEM_PROMPT, Colors
-from yuki_cost_tracker import YukiCostTracker
+# google-cloud / google-genai / the agent tools load on first use or in the
+# background after startup - see core/lazy_resources.py and /ready
+from core.persona import YUKI_SYSTEM_PROMPT, Colors
+from core.tool_executor import ToolExecutor
+from core.genai_clients import client_for_model, warmup_clients, get_client_stats, registry as genai_registry
+from core.lazy_resources import ResourceRegistry
+from core.model_router import ModelRouter, Budgets, BudgetExceededError, Route
+from core.response_cache import ResponseCache, ConditionalGetMiddleware, FileSnapshot
+from core.shared_state import get_shared_state
 
 # =============================================================================
 # CONFIGURATION
@@ -69,6 +51,18 @@ GCS_BUCKET_GENERATIONS = "yuki-cosplay-generations"
 # ... (omitted constants same as before) ...
 GCS_CDN_BUCKET = "yuki-cdn"
 
+# Repo-level data (the API may run from api/ or from the repo root)
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(API_DIR)
+
+def _data_path(*parts: str) -> str:
+    """First of api/<parts> or <repo>/<parts> that exists (the repo one if neither)."""
+    local = os.path.join(API_DIR, *parts)
+    return local if os.path.exists(local) else os.path.join(REPO_DIR, *parts)
+
+CHANGELOG_PATH = _data_path("changelog", "entries.json")
+KNOWLEDGE_DB_PATH = os.path.join(REPO_DIR, "database", "yuki_knowledge.db")
+
 # BigQuery
 BQ_DATASET = "yuki_production"
 BQ_TABLE_GENERATIONS = "generations"
@@ -84,34 +78,86 @@ IMAGEN_4 = "imagen-4.0-generate-001"
 REASONING_ENDPOINT = "https://us-central1-aiplatform.googleapis.com/v1/projects/gifted-cooler-479623-r7/locations/us-central1/reasoningEngines/7435157111765467136:query"
 REASONING_SERVICE_ACCOUNT = "service-914641083224@gcp-sa-aiplatform-re.iam.gserviceaccount.com"
 
-# Initialize Clients
-storage_client = storage.Client(project=PROJECT_ID)
-bq_client = bigquery.Client(project=PROJECT_ID)
-
 # Dynamic Client Initialization Helper
 def get_genai_client(model_name: str = "gemini-3-flash-preview"):
     """
     Dynamically routes to 'global' for Gemini 3 models, else uses us-central1.
+    Clients come from the process-wide registry, so repeated calls reuse one connection pool.
     """
-    client_location = "us-central1"
-    if "gemini-3" in model_name or "gemini-exp" in model_name:
-        client_location = "global"
-        
-    return genai.Client(vertexai=True, project=PROJECT_ID, location=client_location)
+    return client_for_model(model_name, project=PROJECT_ID)
+
+def _create_storage_client():
+    from google.cloud import storage
+    return storage.Client(project=PROJECT_ID)
+
+def _create_bq_client():
+    from google.cloud import bigquery
+    return bigquery.Client(project=PROJECT_ID)
+
+def _create_cost_tracker():
+    from yuki_cost_tracker import YukiCostTracker
+    # Spend / rpm counters shared by every gunicorn worker so budgets hold globally
+    return YukiCostTracker(PROJECT_ID, shared_state=get_shared_state())
+
+def _create_auth():
+    # Auth for Reasoning Engine
+    import google.auth
+    import google.auth.transport.requests
+    credentials, _ = google.auth.default(scopes=['https://www.googleapis.com/auth/cloud-platform'])
+    return credentials, google.auth.transport.requests.Request()
+
+TOOL_NAMES = (
+    "get_current_time", "add_numbers", "generate_cosplay_image", "generate_cosplay_video",
+    "research_topic", "list_files", "read_file", "write_file", "search_web", "fetch_url",
+    "identify_anime_screenshot", "detect_objects", "segment_image", "analyze_video",
+    "analyze_pdf", "upload_to_gcs", "download_from_gcs",
+)
+
+def _load_tools() -> list:
+    # Yuki's Agent Tools
+    import tools
+    return [getattr(tools, name) for name in TOOL_NAMES]
+
+resources = ResourceRegistry()
+storage_resource = resources.register("storage", _create_storage_client)
+bigquery_resource = resources.register("bigquery", _create_bq_client)
+genai_client_resource = resources.register("genai_client", get_genai_client)
+genai_endpoints_resource = resources.register("genai_endpoints", lambda: warmup_clients(project=PROJECT_ID), required=False)
+cost_tracker_resource = resources.register("cost_tracker", _create_cost_tracker)
+model_router_resource = resources.register("model_router", lambda: ModelRouter(get_cost_tracker(), budgets=Budgets.from_env()))
+auth_resource = resources.register("auth", _create_auth, required=False)
+tools_resource = resources.register("tools", _load_tools)
+tool_executor_resource = resources.register("tool_executor", lambda: ToolExecutor(
+    {func.__name__: func for func in get_tools_list()},
+    max_workers=int(os.getenv("YUKI_TOOL_WORKERS", "8")),
+))
+
+# Startup warm-up order: chat path first, then storage / analytics
+WARMUP_RESOURCES = ["genai_client", "tools", "tool_executor", "cost_tracker", "model_router",
+                    "genai_endpoints", "storage", "bigquery", "auth"]
+
+def get_storage_client():
+    return storage_resource.get()
+
+def get_bq_client():
+    return bigquery_resource.get()
 
-# Initialize default client
-genai_client = get_genai_client()
+def get_cost_tracker():
+    return cost_tracker_resource.get()
 
-# Initialize Cost Tracker
-cost_tracker = YukiCostTracker(PROJECT_ID)
+def get_model_router() -> ModelRouter:
+    return model_router_resource.get()
 
-# Auth for Reasoning Engine
-credentials, _ = google.auth.default(scopes=['https://www.googleapis.com/auth/cloud-platform'])
-auth_request = google.auth.transport.requests.Request()
+def get_tools_list() -> list:
+    return tools_resource.get()
+
+def get_tool_executor() -> ToolExecutor:
+    return tool_executor_resource.get()
 
 def get_auth_token():
     """Refreshes and returns the GCP access token."""
     try:
+        credentials, auth_request = auth_resource.get()
         credentials.refresh(auth_request)
         return credentials.token
     except Exception as e:
@@ -128,6 +174,18 @@ app = FastAPI(
     version="1.1.0"
 )
 
+# Read-heavy GET routes: cached responses, strong ETags, 304 on If-None-Match.
+# Added before CORS so CORS headers are applied per request, never cached.
+# Invalidations go through the shared state so they reach every worker.
+response_cache = ResponseCache(shared=get_shared_state())
+response_cache.register("/changelog", ttl=300, files=[CHANGELOG_PATH], tags=["changelog"])
+response_cache.register("/changelog/{entry_id}", ttl=300, files=[CHANGELOG_PATH], tags=["changelog"])
+response_cache.register("/v1/models", ttl=3600, tags=["models"])
+response_cache.register("/.well-known/agent.json", ttl=3600, max_age=300, tags=["agent-card"])
+response_cache.register("/api/v1/semantic-search", ttl=600, tags=["semantic-search"],
+                        files=[KNOWLEDGE_DB_PATH, KNOWLEDGE_DB_PATH + "-wal"])
+app.add_middleware(ConditionalGetMiddleware, cache=response_cache)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -287,6 +345,7 @@ class ChatCompletionRequest(BaseModel):
     include_thoughts: Optional[bool] = Field(default=False, alias="includeThoughts")
     thinking_level: Optional[str] = Field(default="high", alias="thinkingLevel")
     thinking_budget: Optional[int] = Field(default=None, alias="thinkingBudget")
+    user: Optional[str] = None
 
     class Config:
         allow_population_by_field_name = True
@@ -304,31 +363,6 @@ class ChatCompletionResponse(BaseModel):
     choices: List[ChatCompletionResponseChoice]
     usage: Dict[str, int]
 
-# =============================================================================
-# TOOLS SETUP
-# =============================================================================
-
-tools_list = [
-    get_current_time,
-    add_numbers,
-    generate_cosplay_image,
-    generate_cosplay_video,
-    research_topic,
-    list_files,
-    read_file,
-    write_file,
-    search_web,
-    fetch_url,
-    identify_anime_screenshot,
-    detect_objects,
-    segment_image,
-    analyze_video,
-    analyze_pdf,
-    upload_to_gcs,
-    download_from_gcs,
-]
-tool_map = {func.__name__: func for func in tools_list}
-
 # =============================================================================
 # HELPER FUNCTIONS
 # =============================================================================
@@ -337,7 +371,7 @@ def generate_id(text: str) -> str:
     return hashlib.md5(f"{text}_{datetime.datetime.utcnow()}".encode()).hexdigest()[:12]
 
 def upload_bytes_to_gcs(file_data: bytes, bucket_name: str, blob_name: str) -> str:
-    bucket = storage_client.bucket(bucket_name)
+    bucket = get_storage_client().bucket(bucket_name)
     blob = bucket.blob(blob_name)
     blob.upload_from_string(file_data)
     blob.make_public()
@@ -346,7 +380,7 @@ def upload_bytes_to_gcs(file_data: bytes, bucket_name: str, blob_name: str) -> s
 def log_to_bigquery(table: str, row: dict):
     try:
         table_ref = f"{PROJECT_ID}.{BQ_DATASET}.{table}"
-        errors = bq_client.insert_rows_json(table_ref, [row])
+        errors = get_bq_client().insert_rows_json(table_ref, [row])
         if errors:
             print(f"BigQuery insert errors: {errors}")
     except Exception as e:
@@ -356,32 +390,44 @@ def get_optimized_prompt(target_character: str, style: str) -> str:
     # Simplified fallback for now to avoid complexity in this file
     return f"Ultra-realistic cosplay of {target_character}, {style} style, 8k resolution, cinematic lighting."
 
-async def process_generation(generation_id: str, request: GenerationRequest):
+async def process_generation(generation_id: str, request: GenerationRequest, route: Optional[Route] = None):
     start_time = datetime.datetime.utcnow()
     try:
+        from google.genai import types
         prompt = get_optimized_prompt(request.target_character, request.style)
+        model_name = route.model if route else GEMINI_3_PRO_IMAGE
+        image_size = route.resolution if route else request.resolution
         
         # Get correct client for Gemini 3
-        client = get_genai_client(GEMINI_3_PRO_IMAGE)
+        client = get_genai_client(model_name)
         
         # Call Gemini 3 Image (Direct)
         response = client.models.generate_content(
-            model=GEMINI_3_PRO_IMAGE,
+            model=model_name,
             contents=[prompt],
             config=types.GenerateContentConfig(
                 response_modalities=['IMAGE'],
                 image_config=types.ImageConfig(
                     aspect_ratio=request.aspect_ratio,
-                    image_size="1024x1024" # Default for now
+                    image_size=image_size
                 )
             )
         )
+        get_cost_tracker().log_generation(
+            model=model_name,
+            operation="generation",
+            count=1,
+            user_id=request.user_id,
+            latency_s=(datetime.datetime.utcnow() - start_time).total_seconds(),
+            resolution=image_size
+        )
         
         # Extract Image (This part depends on actual API response structure)
         # Assuming we handle it or logic similar to tools.py
         # For this unified file, let's just log success placeholder
         cdn_url = "https://placeholder-image-url.com/generated.png"
         
+        get_shared_state().set_job(generation_id, "completed", cdn_url=cdn_url)
         log_to_bigquery(BQ_TABLE_GENERATIONS, {
             "generation_id": generation_id,
             "user_id": request.user_id,
@@ -392,6 +438,7 @@ async def process_generation(generation_id: str, request: GenerationRequest):
         })
         
     except Exception as e:
+        get_shared_state().set_job(generation_id, "failed", error_message=str(e))
         log_to_bigquery(BQ_TABLE_GENERATIONS, {
             "generation_id": generation_id,
             "status": "failed",
@@ -421,6 +468,43 @@ async def root():
 async def health():
     return {"status": "ok"}
 
+@app.get("/ready")
+async def ready(response: Response):
+    """Readiness probe: 503 until the required lazy resources are built; lists what is warm."""
+    report = resources.readiness()
+    if not report["ready"]:
+        response.status_code = 503
+    return report
+
+@app.get("/v1/debug/genai-clients")
+async def genai_client_stats():
+    """Shared GenAI client registry: clients built vs reused."""
+    return get_client_stats()
+
+@app.get("/v1/debug/response-cache")
+async def response_cache_stats():
+    """GET response cache: hits / misses / 304s and current entries."""
+    return response_cache.stats()
+
+@app.get("/v1/debug/shared-state")
+async def shared_state_stats():
+    """Cross-worker store: answering worker pid, keys per namespace, live counters."""
+    return get_shared_state().stats()
+
+@app.on_event("startup")
+async def warmup_resources():
+    # Build clients/tools in the background: the server accepts requests (and /health) immediately
+    if os.getenv("YUKI_WARMUP", "1") == "0":
+        return
+    async def warm():
+        results = await asyncio.to_thread(resources.warm, WARMUP_RESOURCES)
+        print(f"{Colors.ICE_BLUE}Warm-up: {results}{Colors.RESET}")
+    app.state.warmup_task = asyncio.create_task(warm())
+
+@app.on_event("shutdown")
+def close_genai_clients():
+    genai_registry.close_all()
+
 # --- A2A Identity Card ---
 
 @app.get("/.well-known/agent.json")
@@ -468,6 +552,12 @@ async def list_models():
 async def chat_completions(request: ChatCompletionRequest):
     print(f"\n{Colors.NEON_PINK}[🦊 YUKI AGENT] Request: {request.model}{Colors.RESET}")
     start_time = time.time()
+    from google.genai import types
+    from core.chat_stream import ChatCompletionStream, SSE_HEADERS, tool_response_content
+    genai_client = genai_client_resource.get()
+    tools_list = await asyncio.to_thread(get_tools_list)
+    tool_executor = get_tool_executor()
+    cost_tracker = get_cost_tracker()
     
     # 1. Convert OpenAI Messages to Gemini Content
     gemini_contents = []
@@ -486,13 +576,24 @@ async def chat_completions(request: ChatCompletionRequest):
         elif role == "assistant":
              gemini_contents.append(types.Content(role="model", parts=parts))
 
-    # 2. Config
-    model_name = GEMINI_3_PRO
-    if "gemini" in request.model:
-        model_name = request.model
+    # 2. Config - model / thinking level from the router; a gemini model in the
+    # request caps the route (models outside the chat ladder are used as-is)
+    requested = request.model if "gemini" in request.model else None
+    route = None
+    if requested is None or requested in {o.model for o in get_model_router().ladders["chat"]}:
+        last_user = next((m.content for m in reversed(request.messages)
+                          if m.role == "user" and isinstance(m.content, str)), "")
+        try:
+            route = get_model_router().route("chat", text=last_user, user_id=request.user, model=requested)
+        except BudgetExceededError as e:
+            raise HTTPException(status_code=429, detail=str(e))
+    model_name = route.model if route else requested
     
-    # Map Reasoning Effort / Thinking Level
-    thinking_level = (request.thinking_level or "high").upper()
+    # Map Reasoning Effort / Thinking Level (an explicit thinkingLevel wins over the route)
+    if "thinking_level" in request.__fields_set__ or route is None:
+        thinking_level = (request.thinking_level or "high").upper()
+    else:
+        thinking_level = route.thinking_level.upper()
     
     thinking_config = types.ThinkingConfig(
         include_thoughts=request.include_thoughts,
@@ -503,6 +604,9 @@ async def chat_completions(request: ChatCompletionRequest):
 
     config = types.GenerateContentConfig(
         tools=tools_list,
+        # function_calls come back to the loop below and run through tool_executor (concurrently);
+        # left on, the SDK would call the tools itself, one by one, inside generate_content
+        automatic_function_calling=types.AutomaticFunctionCallingConfig(disable=True),
         temperature=request.temperature if request.temperature != 0.7 else 1.0, 
         top_p=request.top_p,
         candidate_count=1,
@@ -510,6 +614,28 @@ async def chat_completions(request: ChatCompletionRequest):
         thinking_config=thinking_config
     )
 
+    # Streaming (SSE) - same tool loop, chunks forwarded as they arrive
+    if request.stream:
+        def log_stream_usage(usage_metadata):
+            cost_tracker.log_generation(
+                model=model_name,
+                operation="chat_completion_stream",
+                tokens_in=usage_metadata.prompt_token_count or 0,
+                tokens_out=usage_metadata.candidates_token_count or 0,
+                thoughts_tokens=getattr(usage_metadata, 'thoughts_token_count', 0) or 0,
+                cached_tokens=getattr(usage_metadata, 'cached_content_token_count', 0) or 0,
+                user_id=request.user,
+                latency_s=time.time() - start_time
+            )
+
+        stream = ChatCompletionStream(
+            genai_client, model_name, gemini_contents, config, tool_executor,
+            response_model=request.model,
+            include_thoughts=request.include_thoughts,
+            on_usage=log_stream_usage,
+        )
+        return StreamingResponse(stream.events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
     # 3. Execution Loop
     final_text = ""
     finish_reason = "stop"
@@ -556,27 +682,12 @@ async def chat_completions(request: ChatCompletionRequest):
             # Execute Tools
             gemini_contents.append(candidate.content)
             
-            for call in function_calls:
-                func_name = call.name
-                func_args = call.args
-                print(f"{Colors.FOX_FIRE}[⚙️ TOOL EXEC] {func_name}{Colors.RESET}")
-                
-                result = "Error: Tool not found"
-                if func_name in tool_map:
-                    try:
-                        result = tool_map[func_name](**func_args)
-                    except Exception as e:
-                        result = f"Error executing {func_name}: {e}"
-                
-                gemini_contents.append(types.Content(
-                    role="tool",
-                    parts=[types.Part(
-                        function_response=types.FunctionResponse(
-                            name=func_name,
-                            response={"result": result}
-                        )
-                    )]
-                ))
+            # Independent calls from one turn run concurrently (bounded pool, per-tool timeouts)
+            report = await tool_executor.run_turn(function_calls, turn=turn_count)
+            print(f"{Colors.FOX_FIRE}[⚙️ TOOL EXEC] {report.summary()}{Colors.RESET}")
+
+            for item in report.calls:
+                gemini_contents.append(tool_response_content(item.name, item.result))
 
     except Exception as e:
         final_text = f"Internal Error: {str(e)}"
@@ -597,7 +708,10 @@ async def chat_completions(request: ChatCompletionRequest):
             operation="chat_completion",
             tokens_in=prompt_tokens,
             tokens_out=completion_tokens,
-            thoughts_tokens=thoughts_tokens
+            thoughts_tokens=thoughts_tokens,
+            cached_tokens=getattr(response.usage_metadata, 'cached_content_token_count', 0) or 0,
+            user_id=request.user,
+            latency_s=time.time() - start_time
         )
 
     return ChatCompletionResponse(
@@ -787,9 +901,18 @@ async def cancel_generation(generation_id: str):
 
 @app.post("/api/v1/generate", response_model=GenerationResponse)
 async def generate_cosplay(request: GenerationRequest, background_tasks: BackgroundTasks):
+    # Budget / load check before queuing: 429 instead of a failed background job
+    try:
+        route = get_model_router().route("image", text=request.target_character, user_id=request.user_id,
+                                         resolution=request.resolution)
+    except BudgetExceededError as e:
+        raise HTTPException(status_code=429, detail=str(e))
     try:
         generation_id = generate_id(f"{request.user_id}_{request.target_character}")
-        background_tasks.add_task(process_generation, generation_id, request)
+        # Status is visible to whichever worker the client polls next
+        get_shared_state().set_job(generation_id, "processing", user_id=request.user_id,
+                                   target_character=request.target_character, started_at=time.time())
+        background_tasks.add_task(process_generation, generation_id, request, route)
         return GenerationResponse(
             generation_id=generation_id,
             status="processing",
@@ -882,25 +1005,36 @@ async def generation_progress(websocket: WebSocket, generation_id: str):
             # We'll reproduce the BQ query logic here to avoid overhead of self-requests
             
             try:
-                query = f"SELECT * FROM `{PROJECT_ID}.{BQ_DATASET}.{BQ_TABLE_GENERATIONS}` WHERE generation_id = @gen_id LIMIT 1"
-                job_config = bigquery.QueryJobConfig(query_parameters=[bigquery.ScalarQueryParameter("gen_id", "STRING", generation_id)])
-                results = list(bq_client.query(query, job_config=job_config).result())
+                # Jobs started by any worker are in the shared state: no BigQuery round trip per poll
+                job = get_shared_state().get_job(generation_id)
+                if job:
+                    status_data = {
+                        "generation_id": generation_id,
+                        "status": job["status"],
+                        "cdn_url": job.get("cdn_url"),
+                        "message": job.get("error_message") or "Processing..."
+                    }
+                else:
+                    query = f"SELECT * FROM `{PROJECT_ID}.{BQ_DATASET}.{BQ_TABLE_GENERATIONS}` WHERE generation_id = @gen_id LIMIT 1"
+                    from google.cloud import bigquery
+                    job_config = bigquery.QueryJobConfig(query_parameters=[bigquery.ScalarQueryParameter("gen_id", "STRING", generation_id)])
+                    results = list(get_bq_client().query(query, job_config=job_config).result())
                 
-                status_data = {
-                    "generation_id": generation_id,
-                    "status": "processing", 
-                    "message": "Connecting..."
-                }
-
-                if results:
-                    row = dict(results[0])
                     status_data = {
                         "generation_id": generation_id,
-                        "status": row.get("status", "processing"),
-                        "output_url": row.get("output_gcs"),
-                        "cdn_url": row.get("cdn_url"),
-                        "message": "Processing..."
+                        "status": "processing", 
+                        "message": "Connecting..."
                     }
+
+                    if results:
+                        row = dict(results[0])
+                        status_data = {
+                            "generation_id": generation_id,
+                            "status": row.get("status", "processing"),
+                            "output_url": row.get("output_gcs"),
+                            "cdn_url": row.get("cdn_url"),
+                            "message": "Processing..."
+                        }
                 
                 await websocket.send_json(status_data)
                 
@@ -931,6 +1065,22 @@ async def generation_progress(websocket: WebSocket, generation_id: str):
 # CHANGELOG ENDPOINTS
 # =============================================================================
 
+def _index_changelog(path: str) -> Dict[str, Any]:
+    """Entries plus id / type indexes and lowercased search text (rebuilt when the file changes)."""
+    with open(path, "r") as f:
+        data = json.load(f)
+    entries = data.get("entries", [])
+    by_id: Dict[str, Dict[str, Any]] = {}
+    by_type: Dict[str, List[int]] = {}
+    for i, entry in enumerate(entries):
+        by_id.setdefault(entry.get("id"), entry)
+        by_type.setdefault(entry.get("type"), []).append(i)
+    text = [(e.get("title", "").lower(), e.get("description", "").lower()) for e in entries]
+    return {"entries": entries, "by_id": by_id, "by_type": by_type, "text": text}
+
+changelog_snapshot = FileSnapshot(CHANGELOG_PATH, _index_changelog)
+
+
 @app.get("/changelog")
 async def get_changelog(
     type: Optional[str] = None,  # Filter by type: new, improvement, fix
@@ -941,26 +1091,21 @@ async def get_changelog(
     Marketing-friendly: each entry has a direct link ID.
     """
     try:
-        import json
-        changelog_path = os.path.join(os.path.dirname(__file__), "changelog", "entries.json")
-        
-        with open(changelog_path, "r") as f:
-            data = json.load(f)
-        
-        entries = data.get("entries", [])
+        index = changelog_snapshot.get()
+        entries = index["entries"]
         total = len(entries)
         
         # Filter by type
-        if type:
-            entries = [e for e in entries if e.get("type") == type]
+        positions = index["by_type"].get(type, []) if type else range(total)
         
         # Search filter
         if search:
             search_lower = search.lower()
-            entries = [e for e in entries if 
-                      search_lower in e.get("title", "").lower() or 
-                      search_lower in e.get("description", "").lower()]
+            positions = [i for i in positions if
+                         search_lower in index["text"][i][0] or
+                         search_lower in index["text"][i][1]]
         
+        entries = [entries[i] for i in positions]
         return {
             "entries": entries,
             "total": total,
@@ -979,15 +1124,9 @@ async def get_changelog_entry(entry_id: str):
     Useful for direct marketing links.
     """
     try:
-        import json
-        changelog_path = os.path.join(os.path.dirname(__file__), "changelog", "entries.json")
-        
-        with open(changelog_path, "r") as f:
-            data = json.load(f)
-        
-        for entry in data.get("entries", []):
-            if entry.get("id") == entry_id:
-                return entry
+        entry = changelog_snapshot.get()["by_id"].get(entry_id)
+        if entry is not None:
+            return entry
         
         raise HTTPException(status_code=404, detail="Entry not found")
     except FileNotFoundError:
@@ -1003,19 +1142,19 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 
 # Serve static directory
-static_dir = os.path.join(os.path.dirname(__file__), "static")
+static_dir = _data_path("static")
 if os.path.exists(static_dir):
     app.mount("/static", StaticFiles(directory=static_dir), name="static")
 
 # Serve changelog JSON directly
-changelog_dir = os.path.join(os.path.dirname(__file__), "changelog")
+changelog_dir = os.path.dirname(CHANGELOG_PATH)
 if os.path.exists(changelog_dir):
     app.mount("/changelog-assets", StaticFiles(directory=changelog_dir), name="changelog-assets")
 
 @app.get("/changelog-page")
 async def changelog_page():
     """Serve the changelog HTML page"""
-    html_path = os.path.join(os.path.dirname(__file__), "static", "changelog.html")
+    html_path = os.path.join(static_dir, "changelog.html")
     if os.path.exists(html_path):
         return FileResponse(html_path)
     raise HTTPException(status_code=404, detail="Changelog page not found")
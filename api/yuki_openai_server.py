@@ -3,7 +3,7 @@ print("DEBUG: Pre-imports", flush=True)
 import os
 import uvicorn
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import time
 import uuid
@@ -37,6 +37,11 @@ from tools import (
 print("DEBUG: Importing yuki_local...", flush=True)
 from yuki_local import YUKI_SYSTEM_PROMPT, Colors
 from yuki_cost_tracker import YukiCostTracker
+from core.chat_stream import ChatCompletionStream, SSE_HEADERS, tool_response_content
+from core.tool_executor import ToolExecutor
+from core.genai_clients import get_genai_client
+from core.model_router import ModelRouter, Budgets, BudgetExceededError
+from core.shared_state import get_shared_state
 
 # Configuration
 PROJECT_ID = "gifted-cooler-479623-r7"
@@ -55,15 +60,12 @@ app.add_middleware(
 
 # Initialize Gemini Client
 print("DEBUG: Initializing GenAI Client...", flush=True)
-client = genai.Client(
-    vertexai=True,
-    project=PROJECT_ID,
-    location=LOCATION,
-)
+client = get_genai_client(location=LOCATION, project=PROJECT_ID)
 print("DEBUG: Client Initialized.", flush=True)
 
-# Initialize Cost Tracker
-cost_tracker = YukiCostTracker(PROJECT_ID)
+# Initialize Cost Tracker (spend shared with the other servers / workers) and the model router
+cost_tracker = YukiCostTracker(PROJECT_ID, shared_state=get_shared_state())
+model_router = ModelRouter(cost_tracker, budgets=Budgets.from_env())
 
 # Tool Definitions
 tools_list = [
@@ -87,6 +89,7 @@ tools_list = [
 ]
 # Map for execution
 tool_map = {func.__name__: func for func in tools_list}
+tool_executor = ToolExecutor(tool_map, max_workers=int(os.getenv("YUKI_TOOL_WORKERS", "8")))
 
 # Pydantic Models for OpenAI API
 class ChatMessage(BaseModel):
@@ -107,6 +110,7 @@ class ChatCompletionRequest(BaseModel):
     thinking_level: Optional[str] = Field(default=None, alias="thinkingLevel")
     include_thoughts: Optional[bool] = Field(default=False, alias="includeThoughts")
     thinking_budget: Optional[int] = Field(default=None, alias="thinkingBudget")
+    user: Optional[str] = None
 
     class Config:
         allow_population_by_field_name = True
@@ -227,13 +231,24 @@ async def chat_completions(request: ChatCompletionRequest):
         elif role == "assistant":
              gemini_contents.append(types.Content(role="model", parts=parts))
 
-    # 2. Configure Generation
-    model_name = "gemini-3-pro-preview"
-    if "gemini" in request.model:
-        model_name = request.model
+    # 2. Configure Generation - model / thinking level from the router; a gemini model in
+    # the request caps the route (models outside the chat ladder are used as-is)
+    requested = request.model if "gemini" in request.model else None
+    route = None
+    if requested is None or requested in {o.model for o in model_router.ladders["chat"]}:
+        last_user = next((m.content for m in reversed(request.messages)
+                          if m.role == "user" and isinstance(m.content, str)), "")
+        try:
+            route = model_router.route("chat", text=last_user, user_id=request.user, model=requested)
+        except BudgetExceededError as e:
+            raise HTTPException(status_code=429, detail=str(e))
+    else:
+        print(f"{Colors.FOX_FIRE}[ROUTER] {requested} is not on the chat ladder; using it unrouted{Colors.RESET}")
+    model_name = route.model if route else requested
     
-    # Map Reasoning Effort / Thinking Level
-    thinking_level = (request.thinking_level or request.reasoning_effort or "high").upper()
+    # Map Reasoning Effort / Thinking Level (an explicit level wins over the route)
+    thinking_level = (request.thinking_level or request.reasoning_effort
+                      or (route.thinking_level if route else None) or "high").upper()
     
     thinking_config = types.ThinkingConfig(
         include_thoughts=request.include_thoughts,
@@ -244,6 +259,9 @@ async def chat_completions(request: ChatCompletionRequest):
 
     config = types.GenerateContentConfig(
         tools=tools_list,
+        # function_calls come back to the loop below and run through tool_executor (concurrently);
+        # left on, the SDK would call the tools itself, one by one, inside generate_content
+        automatic_function_calling=types.AutomaticFunctionCallingConfig(disable=True),
         temperature=request.temperature if request.temperature != 0.7 else 1.0, # Default to 1.0 for Gemini 3
         top_p=request.top_p,
         candidate_count=1,
@@ -251,6 +269,27 @@ async def chat_completions(request: ChatCompletionRequest):
         thinking_config=thinking_config
     )
 
+    # Streaming (SSE) - same tool loop, chunks forwarded as they arrive
+    if request.stream:
+        def log_stream_usage(usage_metadata):
+            cost_tracker.log_generation(
+                model=model_name,
+                operation="chat_completion_stream",
+                tokens_in=usage_metadata.prompt_token_count or 0,
+                tokens_out=usage_metadata.candidates_token_count or 0,
+                thoughts_tokens=getattr(usage_metadata, 'thoughts_token_count', 0) or 0,
+                cached_tokens=getattr(usage_metadata, 'cached_content_token_count', 0) or 0,
+                user_id=request.user
+            )
+
+        stream = ChatCompletionStream(
+            client, model_name, gemini_contents, config, tool_executor,
+            response_model=request.model,
+            include_thoughts=request.include_thoughts,
+            on_usage=log_stream_usage,
+        )
+        return StreamingResponse(stream.events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
     # 3. Execution Loop (Handle Tool Calls)
     final_text = ""
     finish_reason = "stop"
@@ -296,29 +335,12 @@ async def chat_completions(request: ChatCompletionRequest):
             # Append model's request to history
             gemini_contents.append(candidate.content)
             
-            for call in function_calls:
-                func_name = call.name
-                func_args = call.args
-                print(f"{Colors.FOX_FIRE}[⚙️ TOOL EXEC] {func_name}{Colors.RESET}")
-                
-                if func_name in tool_map:
-                    try:
-                        result = tool_map[func_name](**func_args)
-                    except Exception as e:
-                        result = f"Error executing {func_name}: {e}"
-                else:
-                    result = f"Error: Tool {func_name} not found."
+            # Independent calls from one turn run concurrently (bounded pool, per-tool timeouts)
+            report = await tool_executor.run_turn(function_calls, turn=turn_count)
+            print(f"{Colors.FOX_FIRE}[⚙️ TOOL EXEC] {report.summary()}{Colors.RESET}")
 
-                # Append result
-                gemini_contents.append(types.Content(
-                    role="tool",
-                    parts=[types.Part(
-                        function_response=types.FunctionResponse(
-                            name=func_name,
-                            response={"result": result}
-                        )
-                    )]
-                ))
+            for item in report.calls:
+                gemini_contents.append(tool_response_content(item.name, item.result))
 
     except Exception as e:
         print(f"{Colors.ERROR_RED}Error in generation: {e}{Colors.RESET}")
@@ -340,7 +362,9 @@ async def chat_completions(request: ChatCompletionRequest):
             operation="chat_completion",
             tokens_in=prompt_tokens,
             tokens_out=completion_tokens,
-            thoughts_tokens=thoughts_tokens
+            thoughts_tokens=thoughts_tokens,
+            cached_tokens=getattr(response.usage_metadata, 'cached_content_token_count', 0) or 0,
+            user_id=request.user
         )
 
     # 4. Construct Response
@@ -1,40 +1,247 @@
+"""
+Yuki Asset Server
+Serves Cosplay_Lab/Renders to the Expo app (URLs come from /v1/user/images in server.py)
+
+- async (aiohttp): gallery loads don't queue behind one another
+- files go out through sendfile (zero-copy) via web.FileResponse, which also
+  handles Range / 206, ETag + If-None-Match and Last-Modified + If-Modified-Since (aiohttp >= 3.9)
+- Cache-Control: versioned URLs (?v=<asset_version>) never change for a given
+  version, so they are cached for a year as immutable; bare URLs revalidate (cheap 304)
+- /thumb/<path>?w=320: resized WebP thumbnails, generated once per (file version, width)
+  in a thread pool and kept in a disk cache
+
+Usage:
+    python assets_server.py [port] [directory]
+"""
 
-import http.server
-import socketserver
 import os
 import sys
+import asyncio
+import hashlib
+import logging
+import uuid
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import quote
+
+logger = logging.getLogger("YukiAssets")
 
 # Configuration
-PORT = 8083
-DIRECTORY = r"C:\Yuki_Local\Cosplay_Lab\Renders"
-
-class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
-    def end_headers(self):
-        self.send_header('Access-Control-Allow-Origin', '*')
-        super().end_headers()
-    
-    def translate_path(self, path):
-        # Ensure we serve from the specific DIRECTORY
-        # SimpleHTTPRequestHandler uses os.getcwd() by default or we can override
-        path = super().translate_path(path)
-        rel_path = os.path.relpath(path, os.getcwd())
-        return os.path.join(DIRECTORY, rel_path)
-
-# Change working directory so SimpleHTTPRequestHandler serves from there
-# This is easier than overriding translate_path complexly
-try:
-    os.chdir(DIRECTORY)
-except FileNotFoundError:
-    print(f"Error: Directory not found: {DIRECTORY}")
-    sys.exit(1)
-
-Handler = CORSRequestHandler
-
-with socketserver.TCPServer(("", PORT), Handler) as httpd:
-    print(f"Serving assets at http://localhost:{PORT}")
-    print(f"Root Directory: {DIRECTORY}")
-    print("Press Ctrl+C to stop.")
+PORT = int(os.getenv("YUKI_ASSETS_PORT", "8083"))
+DIRECTORY = os.getenv("YUKI_ASSETS_DIR", r"C:\Yuki_Local\Cosplay_Lab\Renders")
+THUMB_CACHE_DIR = os.getenv("YUKI_THUMB_CACHE", r"C:\Yuki_Local\Cosplay_Lab\Cache\thumbs")
+BASE_URL = os.getenv("YUKI_ASSETS_URL", f"http://localhost:{PORT}")
+
+THUMB_WIDTHS = (128, 256, 320, 512, 768, 1024)  # snapped, so the cache can't be filled with arbitrary sizes
+THUMB_QUALITY = 80
+THUMB_WORKERS = 4
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "public, no-cache"
+
+
+# =============================================================================
+# URL HELPERS (no aiohttp needed)
+# =============================================================================
+
+def asset_version(path) -> Optional[str]:
+    """Short token that changes whenever the file does (mtime + size, no hashing of 4K PNGs)."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return f"{st.st_mtime_ns:x}{st.st_size:x}"[-12:]
+
+
+def asset_url(filename: str, directory: str = DIRECTORY, base_url: str = BASE_URL, thumb_width: Optional[int] = None) -> str:
+    """Versioned URL for a render (cacheable as immutable by the app)."""
+    version = asset_version(os.path.join(directory, filename))
+    path = quote(filename.replace("\\", "/"))
+    if thumb_width:
+        url = f"{base_url}/thumb/{path}?w={thumb_width}"
+        return f"{url}&v={version}" if version else url
+    return f"{base_url}/{path}?v={version}" if version else f"{base_url}/{path}"
+
+
+def resolve_asset(root: Path, rel_path: str) -> Optional[Path]:
+    """File under root for a request path, or None (missing, directory or outside root)."""
     try:
-        httpd.serve_forever()
-    except KeyboardInterrupt:
-        pass
+        candidate = (root / rel_path.lstrip("/\\")).resolve()
+    except (OSError, ValueError):
+        return None
+    if candidate != root and root not in candidate.parents:
+        return None
+    return candidate if candidate.is_file() else None
+
+
+def snap_width(width: int) -> int:
+    for allowed in THUMB_WIDTHS:
+        if width <= allowed:
+            return allowed
+    return THUMB_WIDTHS[-1]
+
+
+def cache_control_for(request_version: Optional[str], current_version: Optional[str]) -> str:
+    if request_version and request_version == current_version:
+        return IMMUTABLE_CACHE
+    return REVALIDATE_CACHE
+
+
+# =============================================================================
+# THUMBNAILS
+# =============================================================================
+
+def render_thumbnail(source: Path, target: Path, width: int, quality: int = THUMB_QUALITY):
+    """Decode at reduced size where the codec allows it, resize, write WebP atomically."""
+    from PIL import Image
+
+    with Image.open(source) as img:
+        img.draft("RGB", (width, width * 4))  # JPEG: DCT-domain downscale while decoding
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+        if img.width > width:
+            img.thumbnail((width, max(1, round(img.height * width / img.width))),
+                          Image.Resampling.LANCZOS, reducing_gap=3.0)
+        tmp = target.with_name(f"{target.stem}.{uuid.uuid4().hex[:8]}.tmp")  # never shared between renders
+        try:
+            img.save(tmp, "WEBP", quality=quality, method=4)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+    tmp.replace(target)
+
+
+class ThumbnailCache:
+    """Disk cache of WebP thumbnails keyed by (source path, width, source version)."""
+
+    def __init__(self, cache_dir: str = THUMB_CACHE_DIR, workers: int = THUMB_WORKERS):
+        from concurrent.futures import ThreadPoolExecutor
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumb")
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"hits": 0, "generated": 0, "errors": 0}
+
+    def path_for(self, source: Path, width: int, version: str) -> Path:
+        key = hashlib.sha1(str(source).encode("utf-8")).hexdigest()[:16]
+        return self.cache_dir / f"{key}_{width}_{version}.webp"
+
+    async def get(self, source: Path, width: int) -> Path:
+        version = asset_version(source) or "0"
+        target = self.path_for(source, width, version)
+        if target.exists():
+            self.stats["hits"] += 1
+            return target
+
+        # Single flight: concurrent requests for the same thumbnail share one render
+        key = str(target)
+        pending = self._inflight.get(key)
+        if pending is None:
+            loop = asyncio.get_running_loop()
+            pending = loop.run_in_executor(self.executor, self._render, source, target, width)
+            self._inflight[key] = pending
+            pending.add_done_callback(lambda done: self._render_done(key, done))
+        return await asyncio.shield(pending)
+
+    def _render_done(self, key: str, future: asyncio.Future):
+        """The render, not a (possibly cancelled) request awaiting it, ends the single flight."""
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.cancelled():
+            future.exception()  # retrieved even when every waiting request went away
+
+    def _render(self, source: Path, target: Path, width: int) -> Path:
+        try:
+            render_thumbnail(source, target, width)
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        self.stats["generated"] += 1
+        # Drop thumbnails of older versions of this file at this width
+        prefix = target.name.rsplit("_", 1)[0]
+        for stale in self.cache_dir.glob(f"{prefix}_*.webp"):
+            if stale != target:
+                stale.unlink(missing_ok=True)
+        return target
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+# =============================================================================
+# APP
+# =============================================================================
+
+def create_app(directory: str = DIRECTORY, thumb_cache_dir: str = THUMB_CACHE_DIR) -> "web.Application":
+    # Imported here: server.py only needs the URL helpers and shouldn't pay for aiohttp at startup
+    from aiohttp import web
+
+    root = Path(directory).resolve()
+    thumbs = ThumbnailCache(thumb_cache_dir)
+    routes = web.RouteTableDef()
+
+    def file_response(path: Path, request: "web.Request", version: Optional[str]) -> "web.FileResponse":
+        response = web.FileResponse(path, chunk_size=256 * 1024)
+        response.headers["Cache-Control"] = cache_control_for(request.query.get("v"), version)
+        return response
+
+    @routes.get("/health")
+    async def health(request):
+        return web.json_response({"status": "ok", "root": str(root), "thumbnails": thumbs.stats})
+
+    @routes.get("/thumb/{path:.+}")
+    async def thumbnail(request):
+        source = resolve_asset(root, request.match_info["path"])
+        if source is None:
+            raise web.HTTPNotFound()
+        try:
+            width = snap_width(int(request.query.get("w", 320)))
+        except ValueError:
+            raise web.HTTPBadRequest(text="w must be an integer")
+        try:
+            thumb = await thumbs.get(source, width)
+        except Exception as e:
+            logger.warning(f"Thumbnail failed for {source.name}: {e}")
+            raise web.HTTPUnsupportedMediaType(text="Could not create thumbnail")
+        return file_response(thumb, request, asset_version(source))
+
+    @routes.get("/{path:.+}")
+    async def asset(request):
+        path = resolve_asset(root, request.match_info["path"])
+        if path is None:
+            raise web.HTTPNotFound()
+        return file_response(path, request, asset_version(path))
+
+    async def add_cors(request, response):
+        response.headers["Access-Control-Allow-Origin"] = "*"
+        response.headers["Access-Control-Expose-Headers"] = "ETag, Content-Range, Accept-Ranges, Content-Length"
+
+    async def close_thumbs(app):
+        thumbs.close()
+
+    app = web.Application()
+    app.add_routes(routes)
+    app.on_response_prepare.append(add_cors)
+    app.on_cleanup.append(close_thumbs)
+    app["thumbnails"] = thumbs
+    return app
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else PORT
+    directory = sys.argv[2] if len(sys.argv) > 2 else DIRECTORY
+    if not os.path.isdir(directory):
+        print(f"Error: Directory not found: {directory}")
+        sys.exit(1)
+
+    print(f"Serving assets at http://localhost:{port}")
+    print(f"Root Directory: {directory}")
+    print(f"Thumbnail cache: {THUMB_CACHE_DIR}")
+    print("Press Ctrl+C to stop.")
+    from aiohttp import web
+    web.run_app(create_app(directory), port=port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -53,13 +53,13 @@ class CharacterFaceMathProcessor:
             json.dump(schema_data, f, indent=2)
         
         # Update character in database
-        character.face_schema = CharacterFaceSchema(
+        self.db.set_face_schema(character_id, CharacterFaceSchema(
             extracted=True,
             extraction_date=datetime.datetime.now().isoformat(),
             model_used="gemini-3-pro-preview",  # or the fallback model
             schema_data=schema_data,
             reference_image_hashes=[ref_image]
-        )
+        ))
         
         self.db.save()
         print(f"  ✅ Schema extracted and saved: {schema_path}")
@@ -155,7 +155,7 @@ class CharacterFaceMathProcessor:
                 output_path=filepath,
                 source_image_hash=source_image_path
             )
-            character.cosplay_generations.append(generation)
+            self.db.add_cosplay_generation(character_id, generation)
         
         self.db.save()
         print(f"  ✅ Generated {len(generated_files)} variations")
@@ -0,0 +1,204 @@
+"""
+Yuki Chat Streaming
+OpenAI-compatible Server-Sent Events for /v1/chat/completions
+
+Shared by server.py, api/yuki_api.py and api/yuki_openai_server.py.
+Runs the same multi-turn function-calling loop as the blocking endpoints,
+but on generate_content_stream, so the client sees the first token as soon
+as Gemini emits it instead of after every tool turn has finished.
+
+Chunk format (one `data:` line per chunk, terminated by `data: [DONE]`):
+- delta.content            -> answer text
+- delta.reasoning_content  -> thought parts (only when include_thoughts is set)
+- delta.tool_calls         -> function calls requested by the model (executed server-side)
+- delta.tool_result        -> Yuki extension: result of a server-side tool call
+"""
+
+import json
+import time
+import uuid
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from google.genai import types
+
+from core.tool_executor import ToolExecutor
+
+logger = logging.getLogger("YukiChatStream")
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",  # Disable proxy buffering (nginx / Cloud Run front ends)
+}
+
+
+def sse_event(payload: Any) -> str:
+    """Encode one SSE data frame."""
+    if isinstance(payload, str):
+        return f"data: {payload}\n\n"
+    return f"data: {json.dumps(payload, ensure_ascii=False, default=str)}\n\n"
+
+
+def tool_response_content(func_name: str, result: Any) -> types.Content:
+    """Wrap a tool result as the `tool` turn Gemini expects."""
+    return types.Content(
+        role="tool",
+        parts=[types.Part(
+            function_response=types.FunctionResponse(
+                name=func_name,
+                response={"result": result}
+            )
+        )]
+    )
+
+
+class ChatCompletionStream:
+    """
+    Async generator of OpenAI chat.completion.chunk SSE frames.
+
+    Usage:
+        stream = ChatCompletionStream(client, model_name, contents, config, tool_executor,
+                                      response_model=request.model,
+                                      include_thoughts=request.include_thoughts)
+        return StreamingResponse(stream.events(), media_type="text/event-stream",
+                                 headers=SSE_HEADERS)
+    """
+
+    def __init__(
+        self,
+        client,
+        model_name: str,
+        contents: List[types.Content],
+        config: types.GenerateContentConfig,
+        tool_executor: ToolExecutor,
+        response_model: Optional[str] = None,
+        include_thoughts: bool = False,
+        max_turns: int = 15,
+        on_usage: Optional[Callable[[Any], None]] = None,
+    ):
+        self.client = client
+        self.model_name = model_name
+        self.contents = contents
+        self.config = config
+        self.tool_executor = tool_executor
+        self.response_model = response_model or model_name
+        self.include_thoughts = include_thoughts
+        self.max_turns = max_turns
+        self.on_usage = on_usage
+
+        self.completion_id = f"chatcmpl-{uuid.uuid4()}"
+        self.created = int(time.time())
+        self.usage = {"prompt_tokens": 0, "completion_tokens": 0, "thoughts_tokens": 0, "total_tokens": 0}
+
+    def _chunk(self, delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+        return sse_event({
+            "id": self.completion_id,
+            "object": "chat.completion.chunk",
+            "created": self.created,
+            "model": self.response_model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        })
+
+    def _record_usage(self, usage_metadata):
+        """Accumulate usage across turns (each turn reports its own totals)."""
+        if not usage_metadata:
+            return
+        prompt = usage_metadata.prompt_token_count or 0
+        completion = usage_metadata.candidates_token_count or 0
+        thoughts = getattr(usage_metadata, "thoughts_token_count", 0) or 0
+        self.usage["prompt_tokens"] += prompt
+        self.usage["completion_tokens"] += completion
+        self.usage["thoughts_tokens"] += thoughts
+        self.usage["total_tokens"] += prompt + completion + thoughts
+        if self.on_usage:
+            try:
+                self.on_usage(usage_metadata)
+            except Exception as e:
+                logger.warning(f"Usage callback failed: {e}")
+
+    async def _run_tools(self, function_calls, turn: int) -> AsyncIterator[str]:
+        """Execute the turn's function calls concurrently and append their results."""
+        report = await self.tool_executor.run_turn(function_calls, turn=turn)
+        for item in report.calls:
+            self.contents.append(tool_response_content(item.name, item.result))
+            yield self._chunk({"tool_result": {
+                "name": item.name,
+                "status": item.status,
+                "duration": round(item.duration, 3),
+                "result": item.result,
+            }})
+
+    async def events(self) -> AsyncIterator[str]:
+        finish_reason = "stop"
+        yield self._chunk({"role": "assistant", "content": ""})
+
+        try:
+            for turn in range(self.max_turns):
+                model_parts: List[types.Part] = []
+                function_calls = []
+                turn_usage = None
+
+                stream = await self.client.aio.models.generate_content_stream(
+                    model=self.model_name,
+                    contents=self.contents,
+                    config=self.config
+                )
+                async for chunk in stream:
+                    if chunk.usage_metadata:
+                        turn_usage = chunk.usage_metadata
+                    if not chunk.candidates:
+                        continue
+                    candidate = chunk.candidates[0]
+                    if not candidate.content or not candidate.content.parts:
+                        continue
+
+                    for part in candidate.content.parts:
+                        # Keep every part (incl. thought signatures) for the next turn's history
+                        model_parts.append(part)
+                        if part.function_call:
+                            function_calls.append(part.function_call)
+                            yield self._chunk({"tool_calls": [{
+                                "index": len(function_calls) - 1,
+                                "id": f"call_{uuid.uuid4().hex[:24]}",
+                                "type": "function",
+                                "function": {
+                                    "name": part.function_call.name,
+                                    "arguments": json.dumps(part.function_call.args or {}, default=str),
+                                },
+                            }]})
+                        elif part.thought:
+                            if self.include_thoughts and part.text:
+                                yield self._chunk({"reasoning_content": part.text})
+                        elif part.text:
+                            yield self._chunk({"content": part.text})
+
+                self._record_usage(turn_usage)
+
+                if not function_calls:
+                    if not model_parts:
+                        finish_reason = "error"
+                        yield self._chunk({"content": "Error: No response from the model."})
+                    break
+
+                self.contents.append(types.Content(role="model", parts=model_parts))
+                async for event in self._run_tools(function_calls, turn=turn + 1):
+                    yield event
+            else:
+                finish_reason = "length"
+
+        except Exception as e:
+            logger.error(f"Streaming generation failed: {e}")
+            finish_reason = "error"
+            yield self._chunk({"content": f"Internal Error: {str(e)}"})
+
+        yield self._chunk({}, finish_reason=finish_reason)
+        yield sse_event({
+            "id": self.completion_id,
+            "object": "chat.completion.chunk",
+            "created": self.created,
+            "model": self.response_model,
+            "choices": [],
+            "usage": self.usage,
+        })
+        yield sse_event("[DONE]")
@@ -0,0 +1,397 @@
+"""
+Yuki Context Cache Manager
+Explicit Gemini context caching (cachedContents) for stable prompt prefixes
+
+Stable prefixes that are resent on every call:
+- YUKI_SYSTEM_PROMPT + tool declarations (every /v1/chat/completions turn)
+- Directive markdown (every YukiOrchestrator step)
+- Subject photos (every pipeline generation for the same subject)
+
+The manager creates one cachedContent per (model, prefix fingerprint), reuses
+it while its TTL is valid, extends or recreates it when it nears expiry, and
+remembers prefixes the API refused to cache (too small / unsupported model)
+so callers silently fall back to sending the prefix inline.
+
+Cached input tokens are billed at `caching_input_per_1m` (see YukiCostTracker).
+
+Configuration mirrors the ADK ContextCacheConfig:
+- min_tokens:      skip prefixes below this estimated size
+- ttl_seconds:     lifetime of a created cache
+- cache_intervals: max uses before the cache is recreated
+"""
+
+import time
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger("YukiContextCache")
+
+# Rough prefix sizing for the min_tokens check (real count comes back from the API)
+CHARS_PER_TOKEN = 4
+TOKENS_PER_IMAGE = 258
+
+_MISS = object()  # ContextCacheManager._lookup: no usable entry
+
+
+@dataclass
+class CacheEntry:
+    """A live cachedContent resource."""
+    name: str
+    key: str
+    model: str
+    expire_time: float
+    created_at: float
+    token_count: int = 0
+    uses: int = 0
+
+    def remaining(self, now: Optional[float] = None) -> float:
+        return self.expire_time - (now or time.time())
+
+
+# =============================================================================
+# BACKENDS
+# =============================================================================
+
+class GenAICacheBackend:
+    """cachedContents via google-genai (`client.caches`)."""
+
+    def __init__(self, client):
+        from google.genai import types
+        self.client = client
+        self.types = types
+
+    def create(self, model: str, ttl_seconds: int, display_name: str,
+               contents: Optional[List[Any]] = None,
+               system_instruction: Optional[str] = None,
+               tools: Optional[List[Any]] = None):
+        cache = self.client.caches.create(
+            model=model,
+            config=self.types.CreateCachedContentConfig(
+                display_name=display_name,
+                system_instruction=system_instruction,
+                contents=contents,
+                tools=tools,
+                ttl=f"{int(ttl_seconds)}s",
+            )
+        )
+        usage = getattr(cache, "usage_metadata", None)
+        return cache.name, getattr(usage, "total_token_count", 0) or 0
+
+    def extend(self, name: str, ttl_seconds: int):
+        self.client.caches.update(
+            name=name,
+            config=self.types.UpdateCachedContentConfig(ttl=f"{int(ttl_seconds)}s")
+        )
+
+    def delete(self, name: str):
+        self.client.caches.delete(name=name)
+
+
+class LocalCacheBackend:
+    """
+    In-process stand-in for tests and offline benchmarks.
+    Records every create/extend/delete so callers can assert on cache behaviour.
+    """
+
+    def __init__(self, min_tokens: int = 0):
+        self.min_tokens = min_tokens
+        self.caches: Dict[str, Dict[str, Any]] = {}
+        self.calls: List[str] = []
+        self._counter = 0
+
+    def create(self, model: str, ttl_seconds: int, display_name: str,
+               contents: Optional[List[Any]] = None,
+               system_instruction: Optional[str] = None,
+               tools: Optional[List[Any]] = None):
+        tokens = estimate_prefix_tokens(contents, system_instruction)
+        if tokens < self.min_tokens:
+            raise ValueError(f"Cached content too small: {tokens} < {self.min_tokens} tokens")
+        self._counter += 1
+        name = f"cachedContents/local-{self._counter}"
+        self.caches[name] = {"model": model, "display_name": display_name,
+                             "expire_time": time.time() + ttl_seconds, "tokens": tokens}
+        self.calls.append(f"create:{name}")
+        return name, tokens
+
+    def extend(self, name: str, ttl_seconds: int):
+        self.caches[name]["expire_time"] = time.time() + ttl_seconds
+        self.calls.append(f"extend:{name}")
+
+    def delete(self, name: str):
+        self.caches.pop(name, None)
+        self.calls.append(f"delete:{name}")
+
+
+# =============================================================================
+# FINGERPRINTING
+# =============================================================================
+
+def _fingerprint_item(item: Any, h) -> None:
+    if item is None:
+        return
+    if isinstance(item, str):
+        h.update(b"t:" + item.encode("utf-8"))
+    elif isinstance(item, (bytes, bytearray)):
+        h.update(b"b:" + hashlib.sha256(item).digest())
+    elif isinstance(item, (list, tuple)):
+        for sub in item:
+            _fingerprint_item(sub, h)
+    elif callable(item) and hasattr(item, "__name__"):
+        h.update(b"f:" + item.__name__.encode("utf-8"))
+    else:
+        # genai Content / Part / Tool: hash image bytes directly, everything else by its JSON form
+        inline = getattr(item, "inline_data", None)
+        if inline is not None and getattr(inline, "data", None):
+            h.update(b"i:" + hashlib.sha256(inline.data).digest())
+        elif getattr(item, "parts", None):
+            h.update(b"r:" + str(getattr(item, "role", "")).encode("utf-8"))
+            _fingerprint_item(item.parts, h)
+        elif hasattr(item, "model_dump_json"):
+            h.update(b"j:" + item.model_dump_json(exclude_none=True).encode("utf-8"))
+        else:
+            h.update(b"o:" + repr(item).encode("utf-8"))
+
+
+def fingerprint(*items: Any) -> str:
+    """Stable hash of a prefix (text, image bytes, Content/Part objects, tools)."""
+    h = hashlib.sha256()
+    for item in items:
+        _fingerprint_item(item, h)
+        h.update(b"|")
+    return h.hexdigest()[:32]
+
+
+def estimate_prefix_tokens(contents: Optional[List[Any]] = None, system_instruction: Optional[str] = None) -> int:
+    """Cheap size estimate used for the min_tokens gate."""
+    chars, images = len(system_instruction or ""), 0
+
+    def walk(item):
+        nonlocal chars, images
+        if item is None:
+            return
+        if isinstance(item, str):
+            chars += len(item)
+        elif isinstance(item, (list, tuple)):
+            for sub in item:
+                walk(sub)
+        elif getattr(item, "inline_data", None) is not None:
+            images += 1
+        elif getattr(item, "parts", None):
+            walk(item.parts)
+        elif getattr(item, "text", None):
+            chars += len(item.text)
+
+    walk(contents)
+    return chars // CHARS_PER_TOKEN + images * TOKENS_PER_IMAGE
+
+
+# =============================================================================
+# MANAGER
+# =============================================================================
+
+class ContextCacheManager:
+    """
+    Create-or-reuse cachedContents for stable prefixes.
+
+    Usage:
+        cache = ContextCacheManager(client)
+        name = cache.get_or_create(model, system_instruction=YUKI_SYSTEM_PROMPT, tools=decls)
+        if name:
+            config = types.GenerateContentConfig(cached_content=name, ...)
+        else:
+            config = types.GenerateContentConfig(system_instruction=YUKI_SYSTEM_PROMPT, tools=decls, ...)
+    """
+
+    def __init__(
+        self,
+        client=None,
+        backend=None,
+        min_tokens: int = 1024,
+        ttl_seconds: int = 1800,
+        cache_intervals: int = 500,
+        refresh_margin_seconds: int = 60,
+        max_entries: int = 64,
+    ):
+        if backend is None:
+            backend = GenAICacheBackend(client) if client is not None else LocalCacheBackend()
+        self.backend = backend
+        self.min_tokens = min_tokens
+        self.ttl_seconds = ttl_seconds
+        self.cache_intervals = cache_intervals
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.max_entries = max_entries
+
+        self._entries: Dict[str, CacheEntry] = {}
+        self._uncacheable: Dict[str, float] = {}  # key -> retry-after timestamp
+        self._lock = threading.Lock()  # guards the dicts and stats; never held across API calls
+        self._key_locks: Dict[str, threading.Lock] = {}  # one in-flight create/extend per prefix
+        self.stats = {"hits": 0, "creates": 0, "extends": 0, "fallbacks": 0, "evictions": 0}
+
+    def _key(self, model: str, contents, system_instruction, tools) -> str:
+        return f"{model}:{fingerprint(system_instruction, contents, tools)}"
+
+    def _lookup(self, key: str) -> Any:
+        """Fresh cache name, None for a known-uncacheable prefix, else _MISS (call with _lock held)."""
+        if self._uncacheable.get(key, 0) > time.time():
+            self.stats["fallbacks"] += 1
+            return None
+        entry = self._entries.get(key)
+        if entry and entry.uses < self.cache_intervals and entry.remaining() > self.refresh_margin_seconds:
+            entry.uses += 1
+            self.stats["hits"] += 1
+            return entry.name
+        return _MISS
+
+    def get_or_create(
+        self,
+        model: str,
+        contents: Optional[List[Any]] = None,
+        system_instruction: Optional[str] = None,
+        tools: Optional[List[Any]] = None,
+        ttl_seconds: Optional[int] = None,
+        display_name: str = "yuki-prefix",
+    ) -> Optional[str]:
+        """
+        Return a cachedContent name covering this prefix, or None if the
+        prefix should be sent inline (too small, unsupported, or creation failed).
+
+        Callers for the same prefix wait on a single in-flight create / extend;
+        other prefixes (and cache hits) are not blocked by the API round trip.
+        """
+        ttl = ttl_seconds or self.ttl_seconds
+        key = self._key(model, contents, system_instruction, tools)
+
+        with self._lock:
+            found = self._lookup(key)
+            if found is not _MISS:
+                return found
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                found = self._lookup(key)  # another caller may have just created it
+                if found is not _MISS:
+                    return found
+                entry = self._entries.get(key)
+            return self._refresh_or_create(key, entry, model, contents, system_instruction, tools, ttl, display_name)
+
+    def _refresh_or_create(self, key, entry, model, contents, system_instruction, tools, ttl, display_name) -> Optional[str]:
+        """Slow path of get_or_create: runs under the key's lock, outside _lock."""
+        now = time.time()
+        if entry and entry.uses < self.cache_intervals:
+            # Near expiry: extend in place rather than paying for a new prefill
+            try:
+                self.backend.extend(entry.name, ttl)
+            except Exception as e:
+                logger.warning(f"Cache extend failed for {entry.name}: {e}")
+            else:
+                with self._lock:
+                    entry.expire_time = now + ttl
+                    entry.uses += 1
+                    self.stats["extends"] += 1
+                return entry.name
+        if entry:
+            with self._lock:
+                stale = self._pop(key)
+            self._delete(stale)
+
+        if estimate_prefix_tokens(contents, system_instruction) < self.min_tokens:
+            with self._lock:
+                self._uncacheable[key] = now + ttl
+                self.stats["fallbacks"] += 1
+            return None
+
+        try:
+            name, tokens = self.backend.create(
+                model=model, ttl_seconds=ttl, display_name=display_name,
+                contents=contents, system_instruction=system_instruction, tools=tools
+            )
+        except Exception as e:
+            logger.info(f"Context cache unavailable for {model} ({display_name}): {e}")
+            with self._lock:
+                self._uncacheable[key] = now + ttl
+                self.stats["fallbacks"] += 1
+            return None
+
+        with self._lock:
+            self._entries[key] = CacheEntry(
+                name=name, key=key, model=model, expire_time=now + ttl,
+                created_at=now, token_count=tokens, uses=1
+            )
+            self.stats["creates"] += 1
+            evicted = self._evict_overflow()
+        for victim in evicted:
+            self._delete(victim)
+        logger.info(f"Created context cache {name} ({tokens} tokens, ttl {ttl}s) for {display_name}")
+        return name
+
+    def _pop(self, key: str) -> Optional[CacheEntry]:
+        """Forget an entry (call with _lock held); delete it with _delete after releasing the lock."""
+        return self._entries.pop(key, None)
+
+    def _delete(self, entry: Optional[CacheEntry]):
+        if entry is None:
+            return
+        try:
+            self.backend.delete(entry.name)
+        except Exception as e:
+            logger.debug(f"Cache delete failed for {entry.name}: {e}")
+
+    def _evict_overflow(self) -> List[CacheEntry]:
+        """Storage is billed per hour: keep at most max_entries, dropping the least used."""
+        evicted = []
+        while len(self._entries) > self.max_entries:
+            victim = min(self._entries.values(), key=lambda e: (e.uses, e.created_at))
+            evicted.append(self._pop(victim.key))
+            self.stats["evictions"] += 1
+        return evicted
+
+    def purge_expired(self) -> int:
+        """Forget entries whose TTL has passed (the API deletes them on its own)."""
+        now = time.time()
+        with self._lock:
+            expired = [k for k, e in self._entries.items() if e.remaining(now) <= 0]
+            for k in expired:
+                self._entries.pop(k, None)
+            self._uncacheable = {k: t for k, t in self._uncacheable.items() if t > now}
+            self._key_locks = {k: lock for k, lock in self._key_locks.items()
+                               if k in self._entries or lock.locked()}
+        return len(expired)
+
+    def invalidate(self, model: str, contents=None, system_instruction=None, tools=None):
+        """Delete the cache for a prefix that changed (e.g. edited directive)."""
+        with self._lock:
+            entry = self._pop(self._key(model, contents, system_instruction, tools))
+        self._delete(entry)
+
+    def clear(self):
+        with self._lock:
+            entries = [self._pop(key) for key in list(self._entries)]
+            self._uncacheable.clear()
+        for entry in entries:
+            self._delete(entry)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.stats,
+                "live_caches": len(self._entries),
+                "cached_tokens": sum(e.token_count for e in self._entries.values()),
+            }
+
+
+def function_declarations_tool(client, callables: List[Callable]):
+    """
+    Convert Python tool callables into a single declarations-only Tool.
+    Cached contents must carry tools as declarations (callables can't be cached),
+    and the chat loop then executes the returned function_calls itself.
+    """
+    from google.genai import types
+    declarations = [
+        types.FunctionDeclaration.from_callable(client=client, callable=fn)
+        for fn in callables if fn is not None
+    ]
+    return types.Tool(function_declarations=declarations)
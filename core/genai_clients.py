@@ -0,0 +1,213 @@
+"""
+Yuki GenAI Client Registry
+Process-wide google-genai clients shared across tools, analyzers and agents
+
+Every genai.Client construction repeats credential discovery (ADC / metadata
+server) and builds a fresh HTTP connection pool. Tools used to do that on each
+invocation; the registry builds one client per (mode, project, location) and
+hands the same instance to every caller, so TLS connections and refreshed
+credentials are reused across requests and threads.
+
+Usage:
+    from core.genai_clients import get_genai_client, client_for_model
+    client = get_genai_client(location="us-central1")
+    client = client_for_model("gemini-3-pro-preview")  # -> global endpoint
+"""
+
+import os
+import time
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger("YukiGenAIClients")
+
+DEFAULT_PROJECT = os.getenv("GOOGLE_CLOUD_PROJECT", "gifted-cooler-479623-r7")
+DEFAULT_LOCATION = "global"
+WARMUP_LOCATIONS = ("global", "us-central1")
+
+
+def location_for_model(model: str) -> str:
+    """Gemini 3 / experimental models are served from global, everything else from us-central1."""
+    if "gemini-3" in model or "gemini-exp" in model:
+        return "global"
+    return "us-central1"
+
+
+@dataclass(frozen=True)
+class ClientKey:
+    mode: str                 # vertex | api_key
+    project: Optional[str]
+    location: Optional[str]
+    credential: str = ""      # api-key fingerprint (never the key itself)
+
+    def label(self) -> str:
+        if self.mode == "api_key":
+            return f"api_key:{self.credential}"
+        return f"vertex:{self.project}/{self.location}"
+
+
+def _default_factory(key: ClientKey, api_key: Optional[str] = None):
+    from google import genai
+    base_url = os.getenv("YUKI_GENAI_BASE_URL")
+    if base_url:
+        # Load tests: every client talks to the local mock server (tools/mock_genai_server.py)
+        from google.genai import types
+        return genai.Client(api_key=api_key or "mock-key", http_options=types.HttpOptions(base_url=base_url))
+    if key.mode == "api_key":
+        return genai.Client(api_key=api_key)
+    return genai.Client(vertexai=True, project=key.project, location=key.location)
+
+
+class GenAIClientRegistry:
+    """
+    Thread-safe create-once cache of genai clients.
+
+    - get() returns the shared client for a key, constructing it on first use only
+    - construction happens under a per-key lock, so concurrent first calls for the
+      same key build one client while other keys are not blocked
+    - stats track creations vs reuses (and time spent constructing)
+    """
+
+    def __init__(self, factory: Optional[Callable[..., Any]] = None):
+        self._factory = factory or _default_factory
+        self._clients: Dict[ClientKey, Any] = {}
+        self._key_locks: Dict[ClientKey, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._counts: Dict[ClientKey, Dict[str, float]] = {}
+        self.stats = {"created": 0, "reused": 0, "errors": 0, "create_seconds": 0.0}
+
+    def set_factory(self, factory: Callable[..., Any]):
+        """Swap how clients are built (e.g. mock clients for load tests); drops existing clients and their counts."""
+        with self._lock:
+            self._factory = factory
+            self._clients = {}
+            self._counts = {}
+
+    @staticmethod
+    def make_key(
+        location: Optional[str] = DEFAULT_LOCATION,
+        project: Optional[str] = None,
+        api_key: Optional[str] = None,
+    ) -> ClientKey:
+        if api_key:
+            return ClientKey("api_key", None, None, hashlib.sha256(api_key.encode()).hexdigest()[:12])
+        return ClientKey("vertex", project or DEFAULT_PROJECT, location or DEFAULT_LOCATION)
+
+    def get(
+        self,
+        location: Optional[str] = DEFAULT_LOCATION,
+        project: Optional[str] = None,
+        api_key: Optional[str] = None,
+    ):
+        key = self.make_key(location, project, api_key)
+
+        # Fast path: no locking once the client exists (dict reads are atomic)
+        client = self._clients.get(key)
+        if client is not None:
+            self._count(key, "reused")
+            return client
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._count(key, "reused")
+                return client
+            start = time.perf_counter()
+            try:
+                client = self._factory(key, api_key=api_key)
+            except Exception:
+                with self._lock:
+                    self.stats["errors"] += 1
+                raise
+            elapsed = time.perf_counter() - start
+            self._clients[key] = client
+            with self._lock:
+                self.stats["create_seconds"] += elapsed
+            self._count(key, "created")
+            logger.info(f"Created GenAI client {key.label()} in {elapsed * 1000:.0f}ms")
+            return client
+
+    def _count(self, key: ClientKey, field_name: str):
+        with self._lock:
+            self.stats[field_name] += 1
+            counts = self._counts.setdefault(key, {"created": 0, "reused": 0})
+            counts[field_name] += 1
+
+    def warmup(
+        self,
+        locations: Iterable[str] = WARMUP_LOCATIONS,
+        project: Optional[str] = None,
+        api_key: Optional[str] = None,
+    ) -> Dict[str, str]:
+        """
+        Build clients before the first request arrives (call at server start).
+        Failures are reported, not raised: a missing credential shouldn't stop the server.
+        """
+        results = {}
+        targets = [(None, api_key)] if api_key else [(loc, None) for loc in locations]
+        for location, key_value in targets:
+            key = self.make_key(location, project, key_value)
+            try:
+                self.get(location=location, project=project, api_key=key_value)
+                results[key.label()] = "ok"
+            except Exception as e:
+                logger.warning(f"GenAI client warmup failed for {key.label()}: {e}")
+                results[key.label()] = f"error: {e}"
+        return results
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.stats["created"] + self.stats["reused"]
+            return {
+                **self.stats,
+                "create_seconds": round(self.stats["create_seconds"], 3),
+                "reuse_ratio": round(self.stats["reused"] / total, 4) if total else 0.0,
+                "clients": {k.label(): dict(v) for k, v in self._counts.items()},
+            }
+
+    def close_all(self):
+        """Close pooled connections (server shutdown)."""
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            close = getattr(client, "close", None)
+            if callable(close):
+                try:
+                    close()
+                except Exception as e:
+                    logger.debug(f"GenAI client close failed: {e}")
+
+
+registry = GenAIClientRegistry()
+
+
+def get_genai_client(
+    location: Optional[str] = DEFAULT_LOCATION,
+    project: Optional[str] = None,
+    api_key: Optional[str] = None,
+):
+    """Shared client for Vertex (project, location) or for an API key."""
+    return registry.get(location=location, project=project, api_key=api_key)
+
+
+def client_for_model(model: str, project: Optional[str] = None):
+    """Shared Vertex client for the endpoint serving `model`."""
+    return registry.get(location=location_for_model(model), project=project)
+
+
+def warmup_clients(
+    locations: Iterable[str] = WARMUP_LOCATIONS,
+    project: Optional[str] = None,
+    api_key: Optional[str] = None,
+) -> Dict[str, str]:
+    return registry.warmup(locations=locations, project=project, api_key=api_key)
+
+
+def get_client_stats() -> Dict[str, Any]:
+    return registry.get_stats()
@@ -0,0 +1,170 @@
+"""
+Yuki Lazy Resources
+Deferred construction of heavy clients / modules for fast server cold starts
+
+Servers used to import google.cloud.*, yuki_tools and vertexai and build their
+storage / BigQuery / GenAI clients at module load, so every Cloud Run cold start
+paid for all of it before the first request could be accepted. Resources are
+now declared up front and built on first use (or by a background warm-up after
+the server is already listening); readiness endpoints report what is warm.
+
+Each app keeps its own registry (server.py and api/yuki_api.py can share a
+process under the load harness).
+
+Usage:
+    from core.lazy_resources import ResourceRegistry
+
+    resources = ResourceRegistry()
+    storage_resource = resources.register("storage", _create_storage_client)
+    storage_resource.get().bucket(...)        # built once, thread-safe
+
+    # startup: warm in the background, don't block serving
+    asyncio.create_task(asyncio.to_thread(resources.warm, ["genai_client", "tools"]))
+    resources.readiness()                     # -> /ready
+"""
+
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger("YukiLazyResources")
+
+
+class ResourceUnavailable(RuntimeError):
+    """The resource's last build failed and its retry backoff hasn't expired yet."""
+
+
+class LazyResource:
+    """
+    A value built by `factory` on first get().
+
+    A failed build is retried on the next call, or - with retry_backoff - only
+    after retry_backoff seconds (doubling per consecutive failure, capped at
+    max_backoff); until then get() raises ResourceUnavailable without calling
+    the factory, so per-request lookups of a broken optional resource stay cheap.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any], required: bool = True,
+                 retry_backoff: float = 0.0, max_backoff: float = 3600.0):
+        self.name = name
+        self.factory = factory
+        self.required = required
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self._value = None
+        self._ready = False
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._retry_at = 0.0
+        self.error: Optional[str] = None
+        self.init_seconds: Optional[float] = None
+        self.initialized_at: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def get(self):
+        if self._ready:
+            return self._value
+        if self._failures and time.monotonic() < self._retry_at:
+            raise ResourceUnavailable(f"{self.name} unavailable ({self.error}); "
+                                      f"retry in {self._retry_at - time.monotonic():.0f}s")
+        with self._lock:
+            if not self._ready:
+                if self._failures and time.monotonic() < self._retry_at:
+                    raise ResourceUnavailable(f"{self.name} unavailable ({self.error})")
+                start = time.perf_counter()
+                try:
+                    self._value = self.factory()
+                except Exception as e:
+                    self.error = f"{type(e).__name__}: {e}"
+                    self._failures += 1
+                    if self.retry_backoff:
+                        delay = min(self.retry_backoff * 2 ** (self._failures - 1), self.max_backoff)
+                        self._retry_at = time.monotonic() + delay
+                    raise
+                self.init_seconds = time.perf_counter() - start
+                self.initialized_at = time.time()
+                self.error = None
+                self._failures = 0
+                self._ready = True
+                logger.info(f"Initialized {self.name} in {self.init_seconds:.3f}s")
+        return self._value
+
+    def get_or_none(self):
+        """get(), logging instead of raising (for optional features)."""
+        try:
+            return self.get()
+        except ResourceUnavailable as e:
+            logger.debug(str(e))
+            return None
+        except Exception as e:
+            logger.warning(f"{self.name} unavailable: {e}")
+            return None
+
+    def reset(self):
+        with self._lock:
+            self._value, self._ready = None, False
+            self._failures, self._retry_at = 0, 0.0
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self._ready,
+            "required": self.required,
+            "init_seconds": round(self.init_seconds, 3) if self.init_seconds is not None else None,
+            "error": self.error,
+        }
+
+
+class ResourceRegistry:
+    """Named lazy resources of one app."""
+
+    def __init__(self):
+        self._resources: Dict[str, LazyResource] = {}
+        self._lock = threading.Lock()
+        self.created_at = time.time()
+        self.warmup_seconds: Optional[float] = None
+
+    def register(self, name: str, factory: Callable[[], Any], required: bool = True,
+                 retry_backoff: float = 0.0) -> LazyResource:
+        with self._lock:
+            resource = self._resources.get(name)
+            if resource is None:
+                resource = self._resources[name] = LazyResource(name, factory, required, retry_backoff)
+            return resource
+
+    def get(self, name: str) -> LazyResource:
+        return self._resources[name]
+
+    def warm(self, names: Optional[Iterable[str]] = None) -> Dict[str, str]:
+        """Build the named resources (all by default); never raises."""
+        start = time.perf_counter()
+        results = {}
+        for name in (list(names) if names is not None else list(self._resources)):
+            resource = self._resources.get(name)
+            if resource is None:
+                results[name] = "unknown"
+                continue
+            try:
+                resource.get()
+                results[name] = "ok"
+            except Exception as e:
+                logger.warning(f"Warm-up failed for {name}: {e}")
+                results[name] = f"error: {e}"
+        self.warmup_seconds = time.perf_counter() - start
+        return results
+
+    def readiness(self) -> Dict[str, Any]:
+        resources = {name: r.status() for name, r in self._resources.items()}
+        return {
+            "ready": all(r.ready for r in self._resources.values() if r.required),
+            "uptime_seconds": round(time.time() - self.created_at, 3),
+            "warmup_seconds": round(self.warmup_seconds, 3) if self.warmup_seconds is not None else None,
+            "resources": resources,
+        }
+
+    def names(self) -> List[str]:
+        return list(self._resources)
+
@@ -0,0 +1,299 @@
+"""
+Yuki Model Router
+Per-request model / thinking level / image resolution under budgets and load
+
+Entry points used to hard-code their model (Pro + thinking "high" for every
+chat turn, 4K for every image) and nothing consulted estimate_cost before a
+call. The router picks a rung on a per-task ladder, best first:
+
+    chat:      gemini-3-pro/high -> gemini-3-pro/low -> gemini-3-flash/high -> gemini-3-flash/low
+    analysis:  gemini-3-flash/high -> gemini-3-flash/low
+    image:     gemini-3-pro-image 4K -> 2K -> 1K
+
+1. rules:   the first matching RoutingRule sets the starting rung (short
+            small-talk starts on Flash, research / code stays on Pro);
+            an explicit model / resolution from the caller caps the start
+2. load:    rungs whose model is over its latency SLO or near its rpm limit
+            (YukiCostTracker.live_stats) are skipped
+3. budgets: past `soft_fraction` of the user's or the global daily budget the
+            router starts one rung lower; rungs whose estimated cost
+            (yuki_models_spec.estimate_cost) exceeds what is left are skipped,
+            and BudgetExceededError is raised when none fits
+
+Usage:
+    from core.model_router import ModelRouter, Budgets, BudgetExceededError
+
+    router = ModelRouter(cost_tracker, budgets=Budgets.from_env())
+    route = router.route("chat", text=user_message, user_id="u123")
+    config = types.GenerateContentConfig(thinking_config=route.thinking_config(), ...)
+    client.models.generate_content(model=route.model, ...)
+
+Budgets come from YUKI_BUDGET_GLOBAL_DAILY / YUKI_BUDGET_USER_DAILY (USD per day).
+"""
+
+import os
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from core.yuki_models_spec import estimate_cost, get_model, mode_for_model
+
+logger = logging.getLogger("YukiModelRouter")
+
+GEMINI_3_PRO = "gemini-3-pro-preview"
+GEMINI_3_FLASH = "gemini-3-flash-preview"
+GEMINI_3_PRO_IMAGE = "gemini-3-pro-image-preview"
+
+
+class BudgetExceededError(RuntimeError):
+    """No rung of the ladder fits in the remaining user / global budget."""
+
+
+@dataclass(frozen=True)
+class RouteOption:
+    model: str
+    thinking_level: Optional[str] = None    # "high" | "low" (text models)
+    resolution: Optional[str] = None        # "1K" | "2K" | "4K" (image models)
+
+
+@dataclass
+class RoutingRule:
+    """Starting rung for requests of `task` whose text matches (any keyword, length bounds)."""
+    name: str
+    task: str
+    start: int = 0
+    keywords: Tuple[str, ...] = ()
+    min_chars: int = 0
+    max_chars: Optional[int] = None
+
+    def matches(self, task: str, text: str) -> bool:
+        if task != self.task or len(text) < self.min_chars:
+            return False
+        if self.max_chars is not None and len(text) > self.max_chars:
+            return False
+        if self.keywords:
+            lowered = text.lower()
+            return any(k in lowered for k in self.keywords)
+        return True
+
+
+@dataclass
+class Budgets:
+    """Daily USD limits; None means unlimited."""
+    global_daily_usd: Optional[float] = None
+    user_daily_usd: Optional[float] = None
+    per_user: Dict[str, float] = field(default_factory=dict)   # overrides user_daily_usd
+    soft_fraction: float = 0.8
+
+    @classmethod
+    def from_env(cls) -> "Budgets":
+        def _float(name):
+            value = os.getenv(name)
+            return float(value) if value else None
+        return cls(global_daily_usd=_float("YUKI_BUDGET_GLOBAL_DAILY"),
+                   user_daily_usd=_float("YUKI_BUDGET_USER_DAILY"))
+
+    def user_limit(self, user_id: Optional[str]) -> Optional[float]:
+        if user_id is None:
+            return None
+        return self.per_user.get(user_id, self.user_daily_usd)
+
+
+@dataclass
+class Route:
+    task: str
+    model: str
+    thinking_level: Optional[str]
+    resolution: Optional[str]
+    estimated_cost: float
+    rung: int
+    reasons: List[str] = field(default_factory=list)
+
+    @property
+    def degraded(self) -> bool:
+        """True when load or budget moved the request below the rung its rules asked for."""
+        return any(r.startswith(("load:", "budget")) for r in self.reasons)
+
+    def thinking_config(self, **kwargs):
+        """types.ThinkingConfig for this route (None for image routes)."""
+        if not self.thinking_level:
+            return None
+        from google.genai import types
+        return types.ThinkingConfig(thinking_level=self.thinking_level, **kwargs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"task": self.task, "model": self.model, "thinking_level": self.thinking_level,
+                "resolution": self.resolution, "estimated_cost": self.estimated_cost,
+                "degraded": self.degraded, "reasons": list(self.reasons)}
+
+
+DEFAULT_LADDERS: Dict[str, List[RouteOption]] = {
+    "chat": [
+        RouteOption(GEMINI_3_PRO, "high"),
+        RouteOption(GEMINI_3_PRO, "low"),
+        RouteOption(GEMINI_3_FLASH, "high"),
+        RouteOption(GEMINI_3_FLASH, "low"),
+    ],
+    "analysis": [
+        RouteOption(GEMINI_3_FLASH, "high"),
+        RouteOption(GEMINI_3_FLASH, "low"),
+    ],
+    "image": [
+        RouteOption(GEMINI_3_PRO_IMAGE, resolution="4K"),
+        RouteOption(GEMINI_3_PRO_IMAGE, resolution="2K"),
+        RouteOption(GEMINI_3_PRO_IMAGE, resolution="1K"),
+    ],
+}
+
+DEEP_KEYWORDS = ("research", "analyze", "analyse", "compare", "explain", "plan", "debug", "code",
+                 "step by step", "why", "calculate", "cost")
+
+DEFAULT_RULES: List[RoutingRule] = [
+    RoutingRule("deep_reasoning", "chat", start=0, keywords=DEEP_KEYWORDS),
+    RoutingRule("long_context", "chat", start=0, min_chars=4000),
+    RoutingRule("small_talk", "chat", start=2, max_chars=160),
+]
+
+# Expected output tokens by task and thinking tokens by level (cost estimates only)
+OUTPUT_TOKENS = {"chat": 800, "analysis": 1500, "image": 0}
+THINKING_TOKENS = {"high": 4000, "low": 600, None: 0}
+LATENCY_SLO_S = {"chat": 30.0, "analysis": 20.0, "image": 90.0}
+
+
+class ModelRouter:
+    """Rule + load + budget driven choice of RouteOption per request."""
+
+    def __init__(
+        self,
+        tracker: Optional[Any] = None,
+        budgets: Optional[Budgets] = None,
+        ladders: Optional[Dict[str, List[RouteOption]]] = None,
+        rules: Optional[Sequence[RoutingRule]] = None,
+        latency_slo_s: Optional[Dict[str, float]] = None,
+        rate_headroom: float = 0.8,
+        window_s: float = 300.0,
+    ):
+        self.tracker = tracker
+        self.budgets = budgets or Budgets()
+        self.ladders = ladders or DEFAULT_LADDERS
+        self.rules = list(DEFAULT_RULES if rules is None else rules)
+        self.latency_slo_s = latency_slo_s or LATENCY_SLO_S
+        self.rate_headroom = rate_headroom
+        self.window_s = window_s
+
+    # -------------------------------------------------------------------------
+    # COST / LOAD
+    # -------------------------------------------------------------------------
+
+    def estimate(self, task: str, option: RouteOption, input_tokens: int = 0, images: int = 1) -> float:
+        mode = mode_for_model(option.model)
+        if mode is None:
+            return 0.0
+        if task == "image":
+            return estimate_cost(mode, input_tokens=input_tokens, images=images, resolution=option.resolution)
+        output_tokens = OUTPUT_TOKENS.get(task, 800) + THINKING_TOKENS.get(option.thinking_level, 0)
+        return estimate_cost(mode, input_tokens=input_tokens, output_tokens=output_tokens)
+
+    def _overloaded(self, task: str, model: str, live: Dict[str, dict]) -> Optional[str]:
+        stats = live.get(model)
+        if not stats:
+            return None
+        slo = self.latency_slo_s.get(task)
+        p95 = stats.get("p95_latency_s")
+        if slo is not None and p95 is not None and p95 > slo:
+            return f"load:{model} p95 {p95:.1f}s > {slo:.0f}s"
+        mode = mode_for_model(model)
+        rpm_limit = get_model(mode).get("rate_limits", {}).get("rpm") if mode else None
+        if rpm_limit and stats.get("rpm", 0) > rpm_limit * self.rate_headroom:
+            return f"load:{model} {stats['rpm']:.0f} rpm near limit {rpm_limit}"
+        return None
+
+    def _remaining(self, user_id: Optional[str]) -> Tuple[Optional[float], Optional[float]]:
+        """(user remaining, global remaining) in USD; None = unlimited."""
+        spend = getattr(self.tracker, "spend_today", None)
+        user_limit = self.budgets.user_limit(user_id)
+        user_left = global_left = None
+        if user_limit is not None:
+            user_left = user_limit - (spend(user_id) if spend else 0.0)
+        if self.budgets.global_daily_usd is not None:
+            global_left = self.budgets.global_daily_usd - (spend(None) if spend else 0.0)
+        return user_left, global_left
+
+    # -------------------------------------------------------------------------
+    # ROUTING
+    # -------------------------------------------------------------------------
+
+    def _start(self, task: str, ladder: List[RouteOption], text: str, model: Optional[str],
+               resolution: Optional[str], reasons: List[str]) -> int:
+        start = 0
+        for rule in self.rules:
+            if rule.matches(task, text):
+                start = min(rule.start, len(ladder) - 1)
+                reasons.append(f"rule:{rule.name}")
+                break
+        # Caller preferences cap the start: never route above what was asked for
+        for i, option in enumerate(ladder):
+            if (model is None or option.model == model) and (resolution is None or option.resolution == resolution):
+                if i > start:
+                    reasons.append(f"requested:{model or resolution}")
+                return max(start, i)
+        requested = " ".join(str(v) for v in (model, resolution) if v)
+        logger.warning(f"   🔀 [Router] requested {requested} is not on the {task} ladder; routing from rung {start}")
+        reasons.append(f"unroutable:{requested}")
+        return start
+
+    def route(
+        self,
+        task: str,
+        text: str = "",
+        user_id: Optional[str] = None,
+        input_tokens: Optional[int] = None,
+        model: Optional[str] = None,
+        resolution: Optional[str] = None,
+        images: int = 1,
+    ) -> Route:
+        """Pick the rung for one request; raises BudgetExceededError when nothing fits."""
+        ladder = self.ladders.get(task)
+        if not ladder:
+            raise ValueError(f"No routing ladder for task '{task}'")
+        if input_tokens is None:
+            from prompts.token_estimator import get_token_estimator
+            input_tokens = get_token_estimator().estimate(text) if text else 0
+        resolution = resolution.upper() if resolution else None
+
+        reasons: List[str] = []
+        rung = self._start(task, ladder, text, model, resolution, reasons)
+
+        live = self.tracker.live_stats(self.window_s) if hasattr(self.tracker, "live_stats") else {}
+        while rung < len(ladder) - 1:
+            overloaded = self._overloaded(task, ladder[rung].model, live)
+            if not overloaded:
+                break
+            reasons.append(overloaded)
+            rung += 1
+
+        user_left, global_left = self._remaining(user_id)
+        soft = self.budgets.soft_fraction
+        user_limit = self.budgets.user_limit(user_id)
+        near_user = user_left is not None and user_limit and user_left < user_limit * (1 - soft)
+        near_global = global_left is not None and global_left < self.budgets.global_daily_usd * (1 - soft)
+        if (near_user or near_global) and rung < len(ladder) - 1:
+            rung += 1
+            reasons.append("budget_soft:" + ("user" if near_user else "global"))
+
+        for i in range(rung, len(ladder)):
+            option = ladder[i]
+            cost = self.estimate(task, option, input_tokens, images)
+            if (user_left is None or cost <= user_left) and (global_left is None or cost <= global_left):
+                if i > rung:
+                    reasons.append(f"budget_hard:{i - rung} rung(s) down")
+                route = Route(task, option.model, option.thinking_level, option.resolution,
+                              round(cost, 6), i, reasons)
+                if route.degraded:
+                    logger.info(f"   🔀 [Router] {task} -> {option.model} "
+                                f"{option.thinking_level or option.resolution} ({', '.join(reasons)})")
+                return route
+
+        scope = "user" if user_left is not None and user_left < (global_left if global_left is not None else float("inf")) else "global"
+        raise BudgetExceededError(f"Daily {scope} budget exhausted for {task} request"
+                                  + (f" (user {user_id})" if scope == "user" else ""))
@@ -0,0 +1,412 @@
+"""
+Yuki Operation Tracker
+One poll loop for every long-running operation (Veo generations, Files API processing)
+
+Callers used to poll their own operation with a fixed sleep (10s for Veo, 2s
+blocking for uploads). The tracker multiplexes all in-flight operations:
+
+- a single background event loop polls whatever is due, concurrently, with a
+  cap on simultaneous status calls
+- intervals adapt per operation: start at the kind's initial interval and back
+  off towards its max while the operation stays pending
+- track() returns a Future: `await tracker.wait(...)` from async code,
+  `tracker.wait_sync(...)` from sync tools; both take a timeout that only stops
+  waiting (the operation keeps being tracked)
+- cancel() stops tracking (and cancels server-side where the API allows it)
+- operations tracked with persist=True are written to disk; after a restart,
+  register_adapter() resumes them and hands completed results to on_complete,
+  so a paid Veo generation isn't orphaned
+
+Usage:
+    from core.operation_tracker import get_operation_tracker, VeoOperationAdapter
+    tracker = get_operation_tracker()
+    future = tracker.track(operation, VeoOperationAdapter(client), metadata={"prompt": p})
+    operation = await tracker.wait(future, timeout=600)
+"""
+
+import json
+import time
+import asyncio
+import logging
+import threading
+import concurrent.futures
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger("YukiOperationTracker")
+
+DEFAULT_STATE_PATH = Path("./temp/pending_operations.json")
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+EXPIRED = "expired"
+
+
+class OperationFailed(Exception):
+    """The operation finished with an error (or was abandoned after its deadline)."""
+
+
+# =============================================================================
+# ADAPTERS
+# =============================================================================
+
+class VeoOperationAdapter:
+    """Veo generate_videos operations (client.operations)."""
+
+    kind = "veo"
+    initial_interval = 10.0   # Veo takes 1-6 minutes: no point asking sooner
+    max_interval = 30.0
+    backoff = 1.25
+
+    def __init__(self, client):
+        self.client = client
+
+    def op_id(self, handle) -> str:
+        return handle.name
+
+    def restore(self, op_id: str):
+        from google.genai import types
+        return types.GenerateVideosOperation(name=op_id)
+
+    def refresh(self, handle):
+        return self.client.operations.get(handle)
+
+    def check(self, handle):
+        """(done, error)"""
+        error = getattr(handle, "error", None)
+        return bool(handle.done), (str(error) if error else None)
+
+    def cancel(self, handle):
+        # No cancel endpoint for Veo operations: stop tracking only
+        return None
+
+
+class FileProcessingAdapter:
+    """Files API uploads that are PROCESSING before they can be used."""
+
+    kind = "file"
+    initial_interval = 1.0
+    max_interval = 10.0
+    backoff = 1.5
+
+    def __init__(self, client):
+        self.client = client
+
+    def op_id(self, handle) -> str:
+        return handle if isinstance(handle, str) else handle.name
+
+    def restore(self, op_id: str):
+        return op_id
+
+    def refresh(self, handle):
+        return self.client.files.get(name=self.op_id(handle))
+
+    @staticmethod
+    def state_name(handle) -> str:
+        state = getattr(handle, "state", None)
+        return getattr(state, "name", state) or "PROCESSING"
+
+    def check(self, handle):
+        if isinstance(handle, str):
+            return False, None
+        state = self.state_name(handle)
+        if state == "PROCESSING":
+            return False, None
+        if state == "FAILED":
+            return True, f"File processing failed: {self.op_id(handle)}"
+        return True, None
+
+    def cancel(self, handle):
+        self.client.files.delete(name=self.op_id(handle))
+
+
+# =============================================================================
+# TRACKER
+# =============================================================================
+
+@dataclass
+class TrackedOperation:
+    op_id: str
+    kind: str
+    handle: Any
+    adapter: Any
+    future: concurrent.futures.Future
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    persist: bool = False
+    started_at: float = field(default_factory=time.time)
+    deadline: Optional[float] = None
+    interval: float = 1.0
+    next_poll_at: float = 0.0
+    polls: int = 0
+    errors: int = 0
+    status: str = PENDING
+    resumed: bool = False
+
+    def to_record(self) -> Dict[str, Any]:
+        return {"op_id": self.op_id, "kind": self.kind, "metadata": self.metadata,
+                "started_at": self.started_at, "deadline": self.deadline}
+
+
+class OperationTracker:
+    """Multiplexed, adaptive poller for long-running operations."""
+
+    def __init__(self, state_path: Optional[Path] = DEFAULT_STATE_PATH, max_concurrent_polls: int = 8):
+        self.state_path = Path(state_path) if state_path else None
+        self.max_concurrent_polls = max_concurrent_polls
+        self._ops: Dict[str, TrackedOperation] = {}
+        self._adapters: Dict[str, Any] = {}
+        self._on_complete: Dict[str, Dict[Any, Callable]] = {}  # kind -> {key: callback}
+        self._lock = threading.RLock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"tracked": 0, "completed": 0, "failed": 0, "cancelled": 0,
+                      "expired": 0, "resumed": 0, "polls": 0, "poll_errors": 0}
+
+    # ------------------------------------------------------------------ loop
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is not None:
+                return
+            self._loop = asyncio.new_event_loop()
+            self._wakeup = asyncio.Event()
+            self._thread = threading.Thread(target=self._run_loop, name="operation-tracker", daemon=True)
+            self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._poll_loop())
+
+    def _wake(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _poll_loop(self):
+        semaphore = asyncio.Semaphore(self.max_concurrent_polls)
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            with self._lock:
+                pending = [op for op in self._ops.values() if op.status == PENDING]
+                for op in pending:
+                    if op.deadline and now >= op.deadline:
+                        self._settle(op, EXPIRED, error=f"Operation {op.op_id} exceeded its deadline")
+                due = [op for op in pending if op.status == PENDING and op.next_poll_at <= now]
+
+            if due:
+                await asyncio.gather(*(self._poll(op, semaphore) for op in due))
+                continue
+
+            with self._lock:
+                upcoming = [op.next_poll_at for op in self._ops.values() if op.status == PENDING]
+                upcoming += [op.deadline for op in self._ops.values() if op.status == PENDING and op.deadline]
+            delay = max(0.0, min(upcoming) - time.time()) if upcoming else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _poll(self, op: TrackedOperation, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            try:
+                handle = await asyncio.to_thread(op.adapter.refresh, op.handle)
+            except Exception as e:
+                # Transient (network / quota): keep tracking at the backed-off interval
+                with self._lock:
+                    op.errors += 1
+                    self.stats["poll_errors"] += 1
+                    self._schedule_next(op)
+                logger.warning(f"Polling {op.kind} {op.op_id} failed ({op.errors}x): {e}")
+                return
+
+        with self._lock:
+            op.handle = handle
+            op.polls += 1
+            self.stats["polls"] += 1
+            if op.status != PENDING:
+                return  # cancelled while the request was in flight
+            done, error = op.adapter.check(handle)
+            if not done:
+                self._schedule_next(op)
+                return
+            self._settle(op, FAILED if error else DONE, error=error)
+
+        if op.resumed and not error:
+            with self._lock:
+                callbacks = list(self._on_complete.get(op.kind, {}).values())
+            for callback in callbacks:
+                try:
+                    await asyncio.to_thread(callback, handle, op.metadata)
+                except Exception as e:
+                    logger.error(f"Completion handler failed for resumed {op.kind} {op.op_id}: {e}")
+
+    def _schedule_next(self, op: TrackedOperation):
+        op.interval = min(op.interval * op.adapter.backoff, op.adapter.max_interval)
+        op.next_poll_at = time.time() + op.interval
+
+    def _settle(self, op: TrackedOperation, status: str, error: Optional[str] = None):
+        """Caller holds the lock."""
+        op.status = status
+        self._ops.pop(op.op_id, None)
+        stat = {DONE: "completed", FAILED: "failed", CANCELLED: "cancelled", EXPIRED: "expired"}[status]
+        self.stats[stat] += 1
+        elapsed = time.time() - op.started_at
+        if status == DONE:
+            logger.info(f"{op.kind} {op.op_id} done after {elapsed:.0f}s ({op.polls} polls)")
+            if not op.future.done():
+                op.future.set_result(op.handle)
+        elif status == CANCELLED:
+            op.future.cancel()
+        elif not op.future.done():
+            logger.warning(f"{op.kind} {op.op_id} {status} after {elapsed:.0f}s: {error}")
+            op.future.set_exception(OperationFailed(error or status))
+        if op.persist:
+            self._save()
+
+    # ------------------------------------------------------------------ public API
+
+    def track(
+        self,
+        handle: Any,
+        adapter: Any,
+        metadata: Optional[Dict[str, Any]] = None,
+        persist: bool = False,
+        max_age_seconds: Optional[float] = None,
+    ) -> concurrent.futures.Future:
+        """Start tracking an operation; returns a Future resolving to its final handle."""
+        op_id = adapter.op_id(handle)
+        with self._lock:
+            existing = self._ops.get(op_id)
+            if existing is not None:
+                return existing.future
+            op = TrackedOperation(
+                op_id=op_id, kind=adapter.kind, handle=handle, adapter=adapter,
+                future=concurrent.futures.Future(), metadata=dict(metadata or {}), persist=persist,
+                deadline=time.time() + max_age_seconds if max_age_seconds else None,
+                interval=adapter.initial_interval,
+            )
+            done, error = adapter.check(handle)
+            if done:  # already finished (e.g. tiny upload)
+                self._settle(op, FAILED if error else DONE, error=error)
+                return op.future
+            op.next_poll_at = time.time() + op.interval
+            self._ops[op_id] = op
+            self.stats["tracked"] += 1
+            if persist:
+                self._save()
+        self._ensure_loop()
+        self._wake()
+        return op.future
+
+    async def wait(self, future: concurrent.futures.Future, timeout: Optional[float] = None):
+        """Await a tracked operation. Timeout stops waiting, not tracking."""
+        return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout=timeout)
+
+    def wait_sync(self, future: concurrent.futures.Future, timeout: Optional[float] = None):
+        """Blocking wait for sync callers (tools); raises TimeoutError on timeout."""
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            raise TimeoutError(f"Operation still running after {timeout}s")
+
+    def cancel(self, op_id: str) -> bool:
+        """Stop tracking (and cancel server-side where supported)."""
+        with self._lock:
+            op = self._ops.get(op_id)
+            if op is None:
+                return False
+            self._settle(op, CANCELLED)
+        try:
+            op.adapter.cancel(op.handle)
+        except Exception as e:
+            logger.warning(f"Server-side cancel failed for {op.kind} {op_id}: {e}")
+        self._wake()
+        return True
+
+    def register_adapter(self, adapter: Any, on_complete: Optional[Callable[[Any, Dict], None]] = None,
+                         key: Optional[str] = None) -> int:
+        """
+        Make `adapter` available for resuming persisted operations of its kind.
+        on_complete(handle, metadata) runs for resumed operations once they finish
+        (nobody is awaiting them any more). Registering again under the same `key`
+        replaces the earlier callback, so per-instance registrations don't pile up.
+        Returns the number of operations resumed.
+        """
+        with self._lock:
+            self._adapters[adapter.kind] = adapter
+            if on_complete is not None:
+                self._on_complete.setdefault(adapter.kind, {})[key or on_complete] = on_complete
+            return self.resume(adapter.kind)
+
+    def resume(self, kind: str) -> int:
+        """Re-track persisted operations of `kind` left over from a previous process."""
+        adapter = self._adapters.get(kind)
+        if adapter is None:
+            return 0
+        resumed = 0
+        for record in self._load():
+            if record.get("kind") != kind:
+                continue
+            with self._lock:
+                if record["op_id"] in self._ops:
+                    continue
+                op = TrackedOperation(
+                    op_id=record["op_id"], kind=kind, handle=adapter.restore(record["op_id"]),
+                    adapter=adapter, future=concurrent.futures.Future(), metadata=record.get("metadata", {}),
+                    persist=True, started_at=record.get("started_at", time.time()),
+                    deadline=record.get("deadline"), interval=adapter.initial_interval,
+                    next_poll_at=time.time(), resumed=True,
+                )
+                self._ops[op.op_id] = op
+                self.stats["resumed"] += 1
+                resumed += 1
+        if resumed:
+            logger.info(f"Resumed {resumed} {kind} operation(s) from {self.state_path}")
+            self._ensure_loop()
+            self._wake()
+        return resumed
+
+    def pending(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{**op.to_record(), "polls": op.polls, "interval": op.interval,
+                     "age_seconds": round(time.time() - op.started_at, 1)} for op in self._ops.values()]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "in_flight": len(self._ops)}
+
+    # ------------------------------------------------------------------ persistence
+
+    def _load(self) -> List[Dict[str, Any]]:
+        if not self.state_path or not self.state_path.exists():
+            return []
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("operations", [])
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read {self.state_path}: {e}")
+            return []
+
+    def _save(self):
+        """Caller holds the lock. Keeps records of kinds not registered in this process."""
+        if not self.state_path:
+            return
+        live = {op.op_id: op.to_record() for op in self._ops.values() if op.persist}
+        registered = set(self._adapters) | {op.kind for op in self._ops.values()}
+        carried = [r for r in self._load() if r.get("kind") not in registered and r["op_id"] not in live]
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"saved_at": time.time(), "operations": carried + list(live.values())}, f, indent=2)
+        tmp.replace(self.state_path)
+
+
+tracker = OperationTracker()
+
+
+def get_operation_tracker() -> OperationTracker:
+    return tracker
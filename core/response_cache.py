@@ -0,0 +1,332 @@
+"""
+Yuki Response Cache
+Conditional GET (strong ETags, 304) and TTL caching for read-heavy GET routes
+
+/changelog, /v1/models, the agent card, GET semantic search and /v1/user/images
+rebuilt identical JSON on every hit (the changelog endpoints re-read and
+json.load the file each time). This module provides:
+
+- FileSnapshot:   parsed file contents, re-read only when (mtime, size) changes
+- ResponseCache:  per-route policies - TTL, files the response depends on
+                  (an entry is stale as soon as one of them changes), tags for
+                  explicit invalidation, and path prefixes whose POST / PUT /
+                  PATCH / DELETE requests invalidate the route
+- ConditionalGetMiddleware: pure ASGI (BaseHTTPMiddleware breaks streaming /
+                  WebSockets). GETs to registered routes are served from the
+                  cache; every cached response carries a strong ETag (sha256
+                  of the body) and If-None-Match matches get an empty 304
+
+Only 200 responses without Cache-Control: no-store are cached. Unregistered
+routes pass through untouched.
+
+Under gunicorn every worker has its own entries. Pass `shared` (a
+core.shared_state.SharedState) and invalidations become cross-worker: each
+route has a version counter in the shared store, invalidate() /
+unsafe requests bump it, and entries stored under an older version are stale
+in every worker.
+
+Usage:
+    from core.response_cache import ResponseCache, ConditionalGetMiddleware, FileSnapshot
+
+    response_cache = ResponseCache()
+    response_cache.register("/changelog/{entry_id}", ttl=300, files=[CHANGELOG_PATH], tags=["changelog"])
+    app.add_middleware(ConditionalGetMiddleware, cache=response_cache)
+
+    response_cache.invalidate("changelog")     # explicit hook
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+logger = logging.getLogger("YukiResponseCache")
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_MAX_BODY_BYTES = 2 * 1024 * 1024
+UNSAFE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+CACHE_HEADER = b"x-yuki-cache"
+
+
+def file_stamp(path: str) -> Optional[Tuple[int, int]]:
+    """(mtime_ns, size), or None if the file doesn't exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def strong_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check (weak comparison, as RFC 9110 requires for this header)."""
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidates or any(c.removeprefix("W/") == etag for c in candidates)
+
+
+# =============================================================================
+# FILE SNAPSHOTS
+# =============================================================================
+
+def _load_json(path: str) -> Any:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class FileSnapshot:
+    """Value built from a file by `loader(path)`, rebuilt only when the file's mtime / size change."""
+
+    def __init__(self, path: str, loader: Callable[[str], Any] = _load_json):
+        self.path = path
+        self.loader = loader
+        self._stamp = None
+        self._value = None
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    @property
+    def stamp(self) -> Optional[Tuple[int, int]]:
+        return file_stamp(self.path)
+
+    def get(self) -> Any:
+        """Current value; raises FileNotFoundError when the file is missing."""
+        stamp = file_stamp(self.path)
+        if stamp is None:
+            raise FileNotFoundError(self.path)
+        if stamp != self._stamp:
+            with self._lock:
+                if stamp != self._stamp:
+                    self._value = self.loader(self.path)
+                    self._stamp = stamp
+                    self.loads += 1
+        return self._value
+
+
+# =============================================================================
+# CACHE
+# =============================================================================
+
+@dataclass
+class CachePolicy:
+    route: str                                  # "/changelog/{entry_id}" style template
+    ttl: float
+    tags: Tuple[str, ...] = ()
+    files: Tuple[str, ...] = ()
+    invalidated_by: Tuple[str, ...] = ()        # path prefixes of unsafe requests that invalidate
+    max_age: int = 0                            # client Cache-Control max-age; 0 = always revalidate
+    pattern: "re.Pattern" = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.pattern = re.compile("^" + re.sub(r"\\\{[^/]+?\\\}", "[^/]+", re.escape(self.route)) + "$")
+
+    def stamps(self) -> Tuple:
+        return tuple(file_stamp(p) for p in self.files)
+
+    @property
+    def cache_control(self) -> str:
+        return f"public, max-age={self.max_age}" if self.max_age else "no-cache"
+
+
+@dataclass
+class CachedResponse:
+    policy: CachePolicy
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+    etag: str
+    expires: float
+    stamps: Tuple
+    version: float = 0.0
+
+
+class ResponseCache:
+    """In-process response store keyed by (path, normalized query string)."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_body_bytes: int = DEFAULT_MAX_BODY_BYTES,
+                 shared: Optional[Any] = None):
+        self.max_entries = max_entries
+        self.max_body_bytes = max_body_bytes
+        self.shared = shared
+        self.policies: List[CachePolicy] = []
+        self._entries: "OrderedDict[Tuple[str, str], CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "not_modified": 0, "stores": 0, "invalidated": 0}
+
+    def register(self, route: str, ttl: float, tags: Sequence[str] = (), files: Sequence[str] = (),
+                 invalidated_by: Sequence[str] = (), max_age: int = 0) -> CachePolicy:
+        policy = CachePolicy(route, ttl, tuple(tags), tuple(str(f) for f in files), tuple(invalidated_by), max_age)
+        self.policies.append(policy)
+        return policy
+
+    def policy_for(self, path: str) -> Optional[CachePolicy]:
+        for policy in self.policies:
+            if policy.pattern.match(path):
+                return policy
+        return None
+
+    @staticmethod
+    def key(path: str, query_string: bytes) -> Tuple[str, str]:
+        query = sorted(parse_qsl(query_string.decode("latin-1"), keep_blank_values=True))
+        return path, urlencode(query)
+
+    def version(self, policy: CachePolicy) -> float:
+        """Shared invalidation counter of a route (0 without a shared store)."""
+        return self.shared.counter(f"response-cache:{policy.route}") if self.shared is not None else 0.0
+
+    def _bump(self, policies: Sequence[CachePolicy]):
+        if self.shared is not None:
+            for policy in policies:
+                self.shared.incr(f"response-cache:{policy.route}")
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self._stats[name] += n
+
+    def lookup(self, key: Tuple[str, str]) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry.expires < time.monotonic() or entry.stamps != entry.policy.stamps()
+                                      or entry.version != self.version(entry.policy)):
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+            else:
+                self._stats["misses"] += 1
+        return entry
+
+    def store(self, key: Tuple[str, str], policy: CachePolicy, status: int,
+              headers: List[Tuple[bytes, bytes]], body: bytes, stamps: Tuple,
+              version: float = 0.0) -> CachedResponse:
+        """Cache a response; `stamps` / `version` are the policy's, read before it was computed."""
+        entry = CachedResponse(policy, status, headers, body, strong_etag(body),
+                               time.monotonic() + policy.ttl, stamps, version)
+        if len(body) <= self.max_body_bytes:
+            with self._lock:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                self._stats["stores"] += 1
+        return entry
+
+    def _drop(self, predicate: Callable[[Tuple[str, str], CachedResponse], bool]) -> int:
+        with self._lock:
+            doomed = [k for k, e in self._entries.items() if predicate(k, e)]
+            for k in doomed:
+                del self._entries[k]
+            self._stats["invalidated"] += len(doomed)
+        return len(doomed)
+
+    def invalidate(self, *tags: str) -> int:
+        """Drop cached responses of every route carrying one of these tags (in every worker when shared)."""
+        self._bump([p for p in self.policies if any(t in p.tags for t in tags)])
+        return self._drop(lambda k, e: any(t in e.policy.tags for t in tags))
+
+    def invalidate_path(self, prefix: str) -> int:
+        return self._drop(lambda k, e: k[0].startswith(prefix))
+
+    def on_unsafe_request(self, path: str) -> int:
+        """A POST / PUT / PATCH / DELETE to `path` went through: drop routes invalidated by it."""
+        self._bump([p for p in self.policies if any(path.startswith(prefix) for prefix in p.invalidated_by)])
+        return self._drop(lambda k, e: any(path.startswith(p) for p in e.policy.invalidated_by))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {**self._stats, "entries": len(self._entries),
+                    "hit_rate": round(self._stats["hits"] / lookups, 3) if lookups else 0.0}
+
+
+# =============================================================================
+# MIDDLEWARE
+# =============================================================================
+
+_REPLACED_HEADERS = {b"etag", b"cache-control", b"content-length", CACHE_HEADER}
+
+
+class ConditionalGetMiddleware:
+    """ASGI middleware: cached GETs, strong ETags and 304s for the routes registered on `cache`."""
+
+    def __init__(self, app, cache: ResponseCache):
+        self.app = app
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        method, path = scope["method"], scope["path"]
+
+        if method in UNSAFE_METHODS:
+            await self.app(scope, receive, send)
+            self.cache.on_unsafe_request(path)
+            return
+
+        policy = self.cache.policy_for(path) if method == "GET" else None
+        if policy is None:
+            return await self.app(scope, receive, send)
+
+        if_none_match = None
+        for name, value in scope.get("headers", []):
+            if name == b"if-none-match":
+                if_none_match = value.decode("latin-1")
+        key = self.cache.key(path, scope.get("query_string", b""))
+
+        entry = self.cache.lookup(key)
+        if entry is not None:
+            return await self._send(entry, if_none_match, send, b"hit")
+
+        stamps = policy.stamps()
+        version = self.cache.version(policy)
+        start: Dict[str, Any] = {}
+        chunks: List[bytes] = []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+        status = start.get("status", 500)
+        headers = [(k.lower(), v) for k, v in start.get("headers", [])]
+        body = b"".join(chunks)
+        no_store = any(k == b"cache-control" and b"no-store" in v.lower() for k, v in headers)
+        if status != 200 or no_store:
+            await send({"type": "http.response.start", "status": status, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+            return
+        entry = self.cache.store(key, policy, status, headers, body, stamps, version)
+        await self._send(entry, if_none_match, send, b"miss")
+
+    async def _send(self, entry: CachedResponse, if_none_match: Optional[str], send, state: bytes):
+        headers = [(k, v) for k, v in entry.headers if k not in _REPLACED_HEADERS]
+        headers += [(b"etag", entry.etag.encode("latin-1")),
+                    (b"cache-control", entry.policy.cache_control.encode("latin-1")),
+                    (CACHE_HEADER, state)]
+        if etag_matches(if_none_match, entry.etag):
+            self.cache._count("not_modified")
+            headers = [(k, v) for k, v in headers if k != b"content-type"]
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        headers.append((b"content-length", str(len(entry.body)).encode("latin-1")))
+        await send({"type": "http.response.start", "status": entry.status, "headers": headers})
+        await send({"type": "http.response.body", "body": entry.body})
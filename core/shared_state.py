@@ -0,0 +1,516 @@
+"""
+Yuki Shared State
+Cross-worker caches, job status and counters for the gunicorn deployment
+
+gunicorn_config.py forks cpu_count*2+1 Uvicorn workers, but job status
+(generations, Veo operations, workflow executions), invalidations and budget /
+rate counters lived in per-process dicts: a status poll landing on another
+worker saw nothing, an invalidation only reached one worker's cache and every
+worker enforced its own copy of the daily budget. This module keeps that state
+in one SQLite database (WAL mode: readers never block the single writer) that
+every worker on the machine opens:
+
+- key / value:  JSON values in namespaces, optional TTL, set-if-absent and
+                atomic dict merges (update) - the GET / SET EX / SETNX / HSET
+                subset of Redis the platform needs, so a Redis backend can
+                replace it without touching callers
+- SharedDict:   MutableMapping view over one namespace, a drop-in for the old
+                per-process dicts (values come back as decoded JSON)
+- jobs:         set_job / get_job status records for background work
+- counters:     atomic incr (INSERT ... ON CONFLICT DO UPDATE), optionally in
+                fixed time buckets, for spend totals, rpm and rate limits (hit);
+                seed() initialises them once from an external source (the cost log)
+- preload():    called in the gunicorn master (preload_app) to build read-only
+                indexes once, then gc.freeze() so forked workers share those
+                pages copy-on-write instead of each rebuilding them
+
+Connections are per process: one inherited across fork() is never used, the
+child opens its own on first access.
+
+Usage:
+    from core.shared_state import get_shared_state, SharedDict
+
+    state = get_shared_state()
+    state.set_job(generation_id, "processing", user_id="u1")
+    state.get_job(generation_id)            # from any worker
+    operations = SharedDict(state, "video-operations", ttl=3600)
+    if not state.hit(f"rate:{client_ip}", limit=60, window_s=60):
+        ...  # 429
+
+Set YUKI_SHARED_STATE to another database path, or to "memory" to keep state
+in-process only (single worker / tests).
+"""
+
+import gc
+import os
+import json
+import time
+import logging
+import sqlite3
+import importlib
+import threading
+import weakref
+from collections.abc import MutableMapping
+from dataclasses import asdict, is_dataclass
+from enum import Enum
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("YukiSharedState")
+
+DEFAULT_DB_PATH = Path("./temp/yuki_shared_state.db")
+DEFAULT_JOB_TTL = 7 * 24 * 3600
+PURGE_EVERY_WRITES = 500
+BUSY_TIMEOUT_S = 10.0
+SEEDED_NAMESPACE = "counters:seeded"
+
+# An expired row restarts from zero instead of resurrecting its old value
+_INCR_SQL = (
+    "INSERT INTO counters (name, bucket, value, expires_at) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT(name, bucket) DO UPDATE SET "
+    "value = CASE WHEN counters.expires_at IS NOT NULL AND counters.expires_at <= ? "
+    "THEN excluded.value ELSE counters.value + excluded.value END, "
+    "expires_at = excluded.expires_at"
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    value REAL NOT NULL,
+    expires_at REAL,
+    PRIMARY KEY (name, bucket)
+);
+"""
+
+
+def _json_default(value):
+    if is_dataclass(value):
+        return asdict(value)
+    if isinstance(value, Enum):
+        return value.value
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    return str(value)
+
+
+def encode_value(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=_json_default)
+
+
+# Instances to reset in a forked child (their lock may have been held by another thread at fork time)
+_instances: "weakref.WeakSet[SharedState]" = weakref.WeakSet()
+
+
+def _reset_all_after_fork():
+    for state in list(_instances):
+        state.reset_after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_all_after_fork)
+
+
+# =============================================================================
+# STORE
+# =============================================================================
+
+class SharedState:
+    """SQLite-WAL backed key/value, job and counter store shared by every process on the machine."""
+
+    def __init__(self, db_path: Optional[str] = DEFAULT_DB_PATH, purge_every: int = PURGE_EVERY_WRITES):
+        self.db_path = str(db_path) if db_path and str(db_path) != "memory" else None
+        self.purge_every = purge_every
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid = os.getpid()
+        self._writes = 0
+        if self.db_path:
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        _instances.add(self)
+
+    @property
+    def shared(self) -> bool:
+        """False in memory mode: state is visible to this process only."""
+        return self.db_path is not None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is not None and self._pid == os.getpid():
+            return self._conn
+        # First use, or a connection inherited across fork(): never touch the parent's handle
+        self._pid = os.getpid()
+        conn = sqlite3.connect(self.db_path or ":memory:", timeout=BUSY_TIMEOUT_S,
+                               isolation_level=None, check_same_thread=False)
+        if self.db_path:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        self._conn = conn
+        return conn
+
+    def reset_after_fork(self):
+        """Drop the inherited connection and lock (called automatically in forked children)."""
+        self._lock = threading.RLock()
+        self._conn = None
+        self._pid = os.getpid()
+        self._writes = 0
+
+    def _write(self, sql: str, params: Sequence = ()) -> sqlite3.Cursor:
+        with self._lock:
+            cursor = self._connect().execute(sql, params)
+            self._after_write()
+            return cursor
+
+    def _after_write(self):
+        """Opportunistic purge of expired rows (lock held)."""
+        self._writes += 1
+        if self.purge_every and self._writes % self.purge_every == 0:
+            self._purge(time.time())
+
+    def _read(self, sql: str, params: Sequence = ()) -> List[tuple]:
+        with self._lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    @staticmethod
+    def _expires(ttl: Optional[float], now: float) -> Optional[float]:
+        return now + ttl if ttl is not None else None
+
+    # -------------------------------------------------------------------------
+    # KEY / VALUE
+    # -------------------------------------------------------------------------
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        rows = self._read(
+            "SELECT value FROM kv WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, key, time.time()))
+        return json.loads(rows[0][0]) if rows else default
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        now = time.time()
+        self._write(
+            "INSERT INTO kv (namespace, key, value, expires_at, updated_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(namespace, key) DO UPDATE SET value = excluded.value, "
+            "expires_at = excluded.expires_at, updated_at = excluded.updated_at",
+            (namespace, key, encode_value(value), self._expires(ttl, now), now))
+
+    def add(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """Set only if the key is absent (or expired); True if this call set it."""
+        now = time.time()
+        return self._write(
+            "INSERT INTO kv (namespace, key, value, expires_at, updated_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(namespace, key) DO UPDATE SET value = excluded.value, "
+            "expires_at = excluded.expires_at, updated_at = excluded.updated_at "
+            "WHERE kv.expires_at IS NOT NULL AND kv.expires_at <= ?",
+            (namespace, key, encode_value(value), self._expires(ttl, now), now, now)).rowcount == 1
+
+    def update(self, namespace: str, key: str, ttl: Optional[float] = None, **fields) -> Dict[str, Any]:
+        """Merge `fields` into the dict stored at key (created if missing) in one transaction."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT value, expires_at FROM kv WHERE namespace = ? AND key = ? "
+                    "AND (expires_at IS NULL OR expires_at > ?)", (namespace, key, now)).fetchone()
+                value = json.loads(row[0]) if row else {}
+                if not isinstance(value, dict):
+                    raise TypeError(f"{namespace}/{key} holds {type(value).__name__}, not a dict")
+                value.update(fields)
+                expires_at = self._expires(ttl, now) if ttl is not None or not row else row[1]
+                conn.execute(
+                    "INSERT OR REPLACE INTO kv (namespace, key, value, expires_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    (namespace, key, encode_value(value), expires_at, now))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            self._after_write()
+        return value
+
+    def delete(self, namespace: str, key: str) -> bool:
+        return self._write("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key)).rowcount > 0
+
+    def items(self, namespace: str) -> List[Tuple[str, Any]]:
+        rows = self._read(
+            "SELECT key, value FROM kv WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?) ORDER BY key",
+            (namespace, time.time()))
+        return [(k, json.loads(v)) for k, v in rows]
+
+    def keys(self, namespace: str) -> List[str]:
+        rows = self._read(
+            "SELECT key FROM kv WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?) ORDER BY key",
+            (namespace, time.time()))
+        return [r[0] for r in rows]
+
+    def count(self, namespace: str) -> int:
+        return self._read(
+            "SELECT COUNT(*) FROM kv WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, time.time()))[0][0]
+
+    def clear(self, namespace: Optional[str] = None) -> int:
+        if namespace is None:
+            with self._lock:
+                removed = self._connect().execute("DELETE FROM kv").rowcount
+                removed += self._connect().execute("DELETE FROM counters").rowcount
+            return removed
+        return self._write("DELETE FROM kv WHERE namespace = ?", (namespace,)).rowcount
+
+    # -------------------------------------------------------------------------
+    # JOBS
+    # -------------------------------------------------------------------------
+
+    def set_job(self, job_id: str, status: str, ttl: Optional[float] = DEFAULT_JOB_TTL, **fields) -> Dict[str, Any]:
+        """Create or update a job record; earlier fields are kept unless overwritten."""
+        return self.update("jobs", job_id, ttl=ttl, status=status, updated_at=time.time(), **fields)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.get("jobs", job_id)
+
+    # -------------------------------------------------------------------------
+    # COUNTERS
+    # -------------------------------------------------------------------------
+
+    def incr(self, name: str, amount: float = 1.0, bucket_s: Optional[float] = None,
+             ttl: Optional[float] = None) -> float:
+        """
+        Atomically add `amount`; returns the new value.
+
+        With bucket_s the counter is kept per fixed time bucket (rate windows);
+        ttl defaults to one bucket past the current one.
+        """
+        now = time.time()
+        bucket = int(now // bucket_s) if bucket_s else 0
+        if ttl is None and bucket_s:
+            expires_at = (bucket + 2) * bucket_s
+        else:
+            expires_at = self._expires(ttl, now)
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(_INCR_SQL, (name, bucket, amount, expires_at, now))
+                value = conn.execute("SELECT value FROM counters WHERE name = ? AND bucket = ?",
+                                     (name, bucket)).fetchone()[0]
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            self._after_write()
+        return value
+
+    def seed(self, marker: str, totals: Callable[[], Dict[str, float]], ttl: Optional[float] = None) -> bool:
+        """
+        Add starting values to (unbucketed) counters once per marker; True if this call seeded.
+
+        The marker check, totals() and the increments share one write transaction,
+        so no incr from another process lands in between: a caller that increments
+        before it persists (e.g. before appending to a log that totals() reads) is
+        counted exactly once. totals() runs with the database write lock held.
+        """
+        now = time.time()
+        expires_at = self._expires(ttl, now)
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                seeded = conn.execute(
+                    "SELECT 1 FROM kv WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                    (SEEDED_NAMESPACE, marker, now)).fetchone() is not None
+                if not seeded:
+                    for name, amount in totals().items():
+                        conn.execute(_INCR_SQL, (name, 0, amount, expires_at, now))
+                    conn.execute(
+                        "INSERT OR REPLACE INTO kv (namespace, key, value, expires_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                        (SEEDED_NAMESPACE, marker, encode_value(True), expires_at, now))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            self._after_write()
+        return not seeded
+
+    def counter(self, name: str, span_s: Optional[float] = None, bucket_s: Optional[float] = None) -> float:
+        """
+        Current value; with bucket_s, the sum of the buckets overlapping the last span_s
+        seconds (the oldest one only partly), or of the current bucket without span_s.
+        """
+        return self.counters(name, span_s, bucket_s, exact=True).get(name, 0.0)
+
+    def counters(self, prefix: str, span_s: Optional[float] = None, bucket_s: Optional[float] = None,
+                 exact: bool = False) -> Dict[str, float]:
+        """Values of every counter whose name starts with `prefix` (see counter(), covered_span())."""
+        now = time.time()
+        first = self._first_bucket(now, span_s, bucket_s) if bucket_s else 0
+        match, params = ("name = ?", (prefix,)) if exact else ("substr(name, 1, ?) = ?", (len(prefix), prefix))
+        rows = self._read(
+            f"SELECT name, SUM(value) FROM counters WHERE {match} AND bucket >= ? "
+            "AND (expires_at IS NULL OR expires_at > ?) GROUP BY name",
+            (*params, first, now))
+        return {name: value for name, value in rows}
+
+    @staticmethod
+    def _first_bucket(now: float, span_s: Optional[float], bucket_s: float) -> int:
+        return int((now - span_s) // bucket_s) if span_s else int(now // bucket_s)
+
+    @classmethod
+    def covered_span(cls, span_s: float, bucket_s: float, now: Optional[float] = None) -> float:
+        """
+        Seconds actually summed by counters(span_s=..., bucket_s=...): from the start of the
+        oldest (partial) bucket to now, so between span_s and span_s + bucket_s. Divide by
+        this, not span_s, to turn a bucketed count into a rate.
+        """
+        now = time.time() if now is None else now
+        return now - cls._first_bucket(now, span_s, bucket_s) * bucket_s
+
+    def hit(self, name: str, limit: float, window_s: float, amount: float = 1.0) -> bool:
+        """Fixed-window rate limit: count one hit, True while the window's total is within `limit`."""
+        return self.incr(name, amount, bucket_s=window_s) <= limit
+
+    # -------------------------------------------------------------------------
+    # MAINTENANCE
+    # -------------------------------------------------------------------------
+
+    def _purge(self, now: float) -> int:
+        conn = self._connect()
+        removed = conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)).rowcount
+        removed += conn.execute("DELETE FROM counters WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                                (now,)).rowcount
+        return removed
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            return self._purge(time.time())
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        namespaces = self._read(
+            "SELECT namespace, COUNT(*) FROM kv WHERE expires_at IS NULL OR expires_at > ? GROUP BY namespace",
+            (now,))
+        counters = self._read("SELECT COUNT(*) FROM counters WHERE expires_at IS NULL OR expires_at > ?", (now,))
+        return {"path": self.db_path or "memory", "pid": os.getpid(),
+                "namespaces": dict(namespaces), "counters": counters[0][0]}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+
+class SharedDict(MutableMapping):
+    """
+    Dict-like view of one SharedState namespace.
+
+    Values round-trip through JSON: dataclasses and enums come back as dicts /
+    plain values, and mutating a returned value doesn't write it back.
+    """
+
+    def __init__(self, state: SharedState, namespace: str, ttl: Optional[float] = None):
+        self.state = state
+        self.namespace = namespace
+        self.ttl = ttl
+
+    _MISSING = object()
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.state.get(self.namespace, key, self._MISSING)
+        if value is self._MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any):
+        self.state.set(self.namespace, key, value, ttl=self.ttl)
+
+    def __delitem__(self, key: str):
+        if not self.state.delete(self.namespace, key):
+            raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self.state.get(self.namespace, key, self._MISSING) is not self._MISSING
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.state.keys(self.namespace))
+
+    def __len__(self) -> int:
+        return self.state.count(self.namespace)
+
+    def items(self):
+        return self.state.items(self.namespace)
+
+    def values(self):
+        return [v for _, v in self.state.items(self.namespace)]
+
+    def update_fields(self, key: str, **fields) -> Dict[str, Any]:
+        """Atomic merge into the dict stored at key (see SharedState.update)."""
+        return self.state.update(self.namespace, key, ttl=self.ttl, **fields)
+
+    def clear(self):
+        self.state.clear(self.namespace)
+
+    def __repr__(self) -> str:
+        return f"SharedDict({self.namespace!r}, {len(self)} keys)"
+
+
+# =============================================================================
+# PRELOAD (gunicorn master)
+# =============================================================================
+
+def _resolve(target: str):
+    """'package.module:attr.attr' -> object ('package.module' -> the module)"""
+    module_name, _, attr_path = target.partition(":")
+    obj = importlib.import_module(module_name)
+    for part in filter(None, attr_path.split(".")):
+        obj = getattr(obj, part)
+    return obj
+
+
+def preload(targets: Sequence[str], freeze: bool = True) -> Dict[str, str]:
+    """
+    Call each 'module:callable' target once (a bare 'module' is only imported),
+    then move everything allocated so far into gc's permanent generation.
+
+    Run in the master before workers fork: the indexes are built once and the
+    frozen objects are never touched by the collector, so their pages stay
+    shared copy-on-write instead of being dirtied by every worker's gc pass.
+    A failing target is logged and skipped - workers build it lazily instead.
+    """
+    results = {}
+    for target in targets:
+        start = time.perf_counter()
+        try:
+            obj = _resolve(target)
+            if ":" in target:
+                obj()
+            results[target] = f"ok {time.perf_counter() - start:.2f}s"
+        except Exception as e:
+            results[target] = f"failed: {e}"
+            logger.warning(f"Preload of {target} failed: {e}")
+    if freeze and hasattr(gc, "freeze"):
+        gc.collect()
+        gc.freeze()
+    return results
+
+
+_shared_state = None
+_shared_state_lock = threading.Lock()
+
+
+def get_shared_state() -> SharedState:
+    """Process-wide store (YUKI_SHARED_STATE: database path, or "memory")."""
+    global _shared_state
+    if _shared_state is None:
+        with _shared_state_lock:
+            if _shared_state is None:
+                _shared_state = SharedState(os.getenv("YUKI_SHARED_STATE") or DEFAULT_DB_PATH)
+    return _shared_state
@@ -0,0 +1,164 @@
+"""
+Yuki Tool Executor
+Concurrent execution of the function calls in one model turn
+
+Gemini can return several independent function_calls in a single turn
+(e.g. search_web + fetch_url + research_topic). The chat servers used to run
+them one after another on the event-loop thread; this runs them together on
+a bounded thread pool with per-tool timeouts, and reports how much wall-clock
+the parallel dispatch saved.
+"""
+
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger("YukiToolExecutor")
+
+# Seconds to wait for each tool before giving up on it.
+# Long-running generators get generous limits; cheap local tools stay short.
+DEFAULT_TOOL_TIMEOUTS = {
+    "generate_cosplay_video": 600.0,
+    "analyze_video": 300.0,
+    "generate_cosplay_image": 180.0,
+    "research_topic": 120.0,
+    "analyze_pdf": 120.0,
+    "segment_image": 90.0,
+    "detect_objects": 90.0,
+    "identify_anime_screenshot": 90.0,
+    "search_web": 60.0,
+    "fetch_url": 30.0,
+    "upload_to_gcs": 60.0,
+    "download_from_gcs": 60.0,
+    "get_current_time": 5.0,
+    "add_numbers": 5.0,
+}
+
+
+@dataclass
+class ToolCallResult:
+    name: str
+    result: Any
+    status: str = "ok"  # ok | error | timeout | not_found
+    duration: float = 0.0
+
+
+@dataclass
+class TurnLatencyReport:
+    """Per-turn latency: wall-clock for the whole turn vs. the serial sum of tool times."""
+    turn: int
+    calls: List[ToolCallResult] = field(default_factory=list)
+    wall_time: float = 0.0
+
+    @property
+    def serial_time(self) -> float:
+        return sum(c.duration for c in self.calls)
+
+    @property
+    def speedup(self) -> float:
+        return self.serial_time / self.wall_time if self.wall_time > 0 else 1.0
+
+    def summary(self) -> str:
+        per_tool = ", ".join(f"{c.name}={c.duration:.2f}s[{c.status}]" for c in self.calls)
+        return (f"turn {self.turn}: {len(self.calls)} tools in {self.wall_time:.2f}s "
+                f"(serial {self.serial_time:.2f}s, speedup x{self.speedup:.1f}) | {per_tool}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "turn": self.turn,
+            "wall_time": round(self.wall_time, 3),
+            "serial_time": round(self.serial_time, 3),
+            "speedup": round(self.speedup, 2),
+            "calls": [{"name": c.name, "status": c.status, "duration": round(c.duration, 3)} for c in self.calls],
+        }
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class ToolExecutor:
+    """
+    Runs a turn's function calls concurrently on a bounded thread pool.
+
+    - max_workers bounds how many tools run at once across all requests
+    - each call is awaited with its own timeout (DEFAULT_TOOL_TIMEOUTS / default_timeout),
+      counted from when a worker starts it, so queueing behind other tools doesn't eat into it
+    - cancelling the awaiting task (client disconnect) cancels calls that have not started;
+      calls already running in a worker thread finish in the background and are discarded
+    """
+
+    def __init__(
+        self,
+        tool_map: Dict[str, Callable],
+        max_workers: int = 8,
+        timeouts: Optional[Dict[str, float]] = None,
+        default_timeout: float = 120.0,
+    ):
+        self.tool_map = tool_map
+        self.timeouts = {**DEFAULT_TOOL_TIMEOUTS, **(timeouts or {})}
+        self.default_timeout = default_timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="yuki-tool")
+        self.reports: List[TurnLatencyReport] = []
+
+    def timeout_for(self, func_name: str) -> float:
+        return self.timeouts.get(func_name, self.default_timeout)
+
+    def _invoke(self, func: Callable, args: Dict[str, Any]):
+        """Worker-thread body: time the tool itself, not the queueing."""
+        start = time.perf_counter()
+        try:
+            return func(**args), "ok", time.perf_counter() - start
+        except Exception as e:
+            return f"Error executing {func.__name__}: {e}", "error", time.perf_counter() - start
+
+    async def run_call(self, call) -> ToolCallResult:
+        func_name = call.name
+        func = self.tool_map.get(func_name)
+        if func is None:
+            return ToolCallResult(func_name, f"Error: Tool {func_name} not found.", status="not_found")
+
+        loop = asyncio.get_running_loop()
+        timeout = self.timeout_for(func_name)
+        started = loop.create_future()
+
+        def invoke(args):
+            loop.call_soon_threadsafe(_resolve, started)
+            return self._invoke(func, args)
+
+        future = loop.run_in_executor(self._pool, invoke, dict(call.args or {}))
+        try:
+            # The timeout covers the tool's own run time, not the wait for a free worker
+            await asyncio.wait({started, future}, return_when=asyncio.FIRST_COMPLETED)
+            start = time.perf_counter()
+            result, status, duration = await asyncio.wait_for(future, timeout=timeout)
+            return ToolCallResult(func_name, result, status=status, duration=duration)
+        except asyncio.TimeoutError:
+            logger.warning(f"Tool {func_name} timed out after {timeout:g}s")
+            return ToolCallResult(
+                func_name, f"Error: {func_name} timed out after {timeout:g}s",
+                status="timeout", duration=time.perf_counter() - start
+            )
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        finally:
+            started.cancel()
+
+    async def run_turn(self, function_calls, turn: int = 0) -> TurnLatencyReport:
+        """Execute every call of one model turn concurrently; results keep call order."""
+        start = time.perf_counter()
+        results = await asyncio.gather(*(self.run_call(call) for call in function_calls))
+        report = TurnLatencyReport(turn=turn, calls=list(results), wall_time=time.perf_counter() - start)
+        self.reports.append(report)
+        if len(self.reports) > 1000:
+            del self.reports[:-1000]
+        logger.info(f"[TOOLS] {report.summary()}")
+        return report
+
+    def shutdown(self, wait: bool = False):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
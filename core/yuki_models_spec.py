@@ -7,7 +7,7 @@ Based on Who Visions LLC GCP Contract CSV (December 2025)
 Unk's pricing is outdated - this uses actual contract values
 """
 
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 # CORRECTED PRICING from Who Visions LLC Contract CSV
 YUKI_MODELS: Dict[str, Dict[str, Any]] = {
@@ -124,21 +124,32 @@ YUKI_MODELS: Dict[str, Dict[str, Any]] = {
 }
 
 
+# model id -> mode key ("gemini-3-pro-preview" -> "gemini_3_pro")
+MODEL_MODES: Dict[str, str] = {spec["model_id"]: mode for mode, spec in YUKI_MODELS.items()}
+
+
 # Utility functions
 def get_model(mode: str) -> Dict[str, Any]:
     """Retrieve model spec."""
     return YUKI_MODELS.get(mode, YUKI_MODELS["gemini_3_flash"])
 
 
-def estimate_cost(mode: str, input_tokens: int = 0, output_tokens: int = 0, images: int = 0) -> float:
+def mode_for_model(model_id: str) -> Optional[str]:
+    """Mode key for an API model id (None if it isn't in YUKI_MODELS)."""
+    return MODEL_MODES.get(model_id)
+
+
+def estimate_cost(mode: str, input_tokens: int = 0, output_tokens: int = 0, images: int = 0,
+                  resolution: Optional[str] = None) -> float:
     """
     Estimate cost using CONTRACT PRICING.
     
     Args:
         mode: Model mode key
         input_tokens: Number of input tokens
-        output_tokens: Number of output tokens
+        output_tokens: Number of output tokens (including thinking)
         images: Number of images (generation or input)
+        resolution: Output image size for Gemini image models ("1K", "2K", "4K")
     """
     spec = get_model(mode)
     pricing = spec.get("pricing", {})
@@ -162,6 +173,9 @@ def estimate_cost(mode: str, input_tokens: int = 0, output_tokens: int = 0, imag
             total_cost += images * pricing["generation_per_image"]
         elif "image_output" in pricing:
             total_cost += images * pricing["image_output"]
+        elif "image_output_1k_2k" in pricing:
+            per_image = pricing["image_output_4k"] if (resolution or "").upper() == "4K" else pricing["image_output_1k_2k"]
+            total_cost += images * per_image
         elif "image_input_per_1m" in pricing:
             total_cost += (images / 1_000_000) * pricing["image_input_per_1m"]
     
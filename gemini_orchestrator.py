@@ -6,20 +6,27 @@ Inspired by Claude's sub-agent delegation pattern
 
 import os
 import json
+import time
 import asyncio
-from typing import List, Dict, Optional
+from typing import AsyncIterator, Callable, List, Dict, Optional
 from pathlib import Path
 from google import genai
 from google.genai import types
 from dataclasses import dataclass, asdict
 import datetime
 
+from core.genai_clients import get_genai_client
+
 # Configuration
 PROJECT_ID = "gifted-cooler-479623-r7"
 ORCHESTRATOR_MODEL = "gemini-3-pro-preview"  # The "Opus equivalent"
 WORKER_MODEL = "gemini-2.5-flash"  # The "Haiku equivalent" for sub-agents
 LOCATION = "global"
 
+# Sub-agent execution limits
+MAX_CONCURRENT_SUB_AGENTS = int(os.getenv("YUKI_MAX_SUB_AGENTS", "8"))
+SUB_AGENT_TIMEOUT_SECONDS = float(os.getenv("YUKI_SUB_AGENT_TIMEOUT", "120"))
+
 @dataclass
 class SubAgentTask:
     """Represents a task delegated to a sub-agent"""
@@ -32,6 +39,7 @@ class SubAgentTask:
     started_at: Optional[str] = None
     completed_at: Optional[str] = None
     worker_model: str = WORKER_MODEL
+    duration_seconds: Optional[float] = None
 
 @dataclass
 class OrchestratorSession:
@@ -59,12 +67,28 @@ class GeminiOrchestrator:
     Pattern: User → Orchestrator → N Sub-Agents → Orchestrator → User
     """
     
-    def __init__(self):
-        self.client = genai.Client(vertexai=True, project=PROJECT_ID, location=LOCATION)
-        self.sessions_dir = Path("c:/Yuki_Local/orchestration_sessions")
+    def __init__(
+        self,
+        max_concurrency: int = MAX_CONCURRENT_SUB_AGENTS,
+        task_timeout: float = SUB_AGENT_TIMEOUT_SECONDS,
+        sessions_dir: str = "c:/Yuki_Local/orchestration_sessions"
+    ):
+        self.client = self.get_client(LOCATION)
+        self.max_concurrency = max_concurrency
+        self.task_timeout = task_timeout
+        self.sessions_dir = Path(sessions_dir)
         self.sessions_dir.mkdir(exist_ok=True)
         self.active_session: Optional[OrchestratorSession] = None
     
+    def get_client(self, location: str) -> genai.Client:
+        """One client (and HTTP connection pool) per location, shared process-wide"""
+        return get_genai_client(location=location, project=PROJECT_ID)
+    
+    @staticmethod
+    def worker_location(model: str) -> str:
+        """Gemini 2.5 workers are served from us-central1, Gemini 3 from global"""
+        return "us-central1" if "2.5" in model else "global"
+    
     def create_orchestration_plan(self, objective: str, context: Dict) -> OrchestratorSession:
         """
         Use Gemini 3 to create a plan for accomplishing an objective
@@ -132,15 +156,17 @@ class GeminiOrchestrator:
         print(f"  ✓ Created plan with {session.total_tasks} sub-tasks")
         return session
     
-    async def execute_sub_agent_task(self, task: SubAgentTask) -> Dict:
+    async def execute_sub_agent_task(self, task: SubAgentTask, timeout: Optional[float] = None) -> Dict:
         """
         Execute a single sub-agent task
-        Sub-agents use Gemini 2.5 Flash for speed
+        Sub-agents use Gemini 2.5 Flash for speed (async call, shared client, per-task timeout)
         """
         print(f"\n  [⚡ SUB-AGENT {task.task_id}] Starting: {task.task_type}")
         
         task.status = "running"
         task.started_at = datetime.datetime.now().isoformat()
+        start = time.perf_counter()
+        timeout = timeout or self.task_timeout
         
         try:
             # Sub-agent prompt (prompted BY the orchestrator, not by the user)
@@ -161,43 +187,91 @@ class GeminiOrchestrator:
             """
             
             # Use the appropriate location for the worker model
-            worker_location = "us-central1" if "2.5" in task.worker_model else "global"
-            worker_client = genai.Client(vertexai=True, project=PROJECT_ID, location=worker_location)
+            worker_client = self.get_client(self.worker_location(task.worker_model))
             
-            response = worker_client.models.generate_content(
-                model=task.worker_model,
-                contents=sub_agent_prompt,
-                config=types.GenerateContentConfig(
-                    response_mime_type="application/json"
-                )
+            response = await asyncio.wait_for(
+                worker_client.aio.models.generate_content(
+                    model=task.worker_model,
+                    contents=sub_agent_prompt,
+                    config=types.GenerateContentConfig(
+                        response_mime_type="application/json"
+                    )
+                ),
+                timeout=timeout
             )
             
             result = json.loads(response.text)
             
             task.status = "completed"
             task.result = result
-            task.completed_at = datetime.datetime.now().isoformat()
-            
-            print(f"  [✓ SUB-AGENT {task.task_id}] Completed")
+            print(f"  [✓ SUB-AGENT {task.task_id}] Completed in {time.perf_counter() - start:.1f}s")
             return result
             
+        except asyncio.TimeoutError:
+            task.status = "failed"
+            task.result = {"error": f"Timed out after {timeout:g}s"}
+            print(f"  [⏱ SUB-AGENT {task.task_id}] Timed out after {timeout:g}s")
+            return task.result
         except Exception as e:
             task.status = "failed"
             task.result = {"error": str(e)}
-            task.completed_at = datetime.datetime.now().isoformat()
             print(f"  [❌ SUB-AGENT {task.task_id}] Failed: {e}")
             return {"error": str(e)}
+        finally:
+            task.completed_at = datetime.datetime.now().isoformat()
+            task.duration_seconds = round(time.perf_counter() - start, 3)
+    
+    async def iter_completed_tasks(
+        self,
+        session: OrchestratorSession,
+        max_concurrency: Optional[int] = None
+    ) -> AsyncIterator[SubAgentTask]:
+        """
+        Run the plan's sub-agents (at most max_concurrency at once) and yield
+        each task as soon as it finishes, fastest first.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or self.max_concurrency)
+        
+        async def run(task: SubAgentTask) -> SubAgentTask:
+            async with semaphore:
+                await self.execute_sub_agent_task(task)
+            return task
+        
+        pending = [asyncio.create_task(run(task)) for task in session.tasks if task.status != "completed"]
+        try:
+            for next_done in asyncio.as_completed(pending):
+                task = await next_done
+                session.completed_tasks = sum(1 for t in session.tasks if t.status == "completed")
+                session.failed_tasks = sum(1 for t in session.tasks if t.status == "failed")
+                yield task
+        finally:
+            # Consumer stopped early (or was cancelled): don't leave sub-agents running
+            for p in pending:
+                p.cancel()
     
-    async def execute_plan_parallel(self, session: OrchestratorSession) -> Dict:
+    async def execute_plan_parallel(
+        self,
+        session: OrchestratorSession,
+        on_result: Optional[Callable[[SubAgentTask], None]] = None
+    ) -> Dict:
         """
         Execute all sub-agent tasks in parallel
         This is the "scale compute to scale impact" pattern
+        
+        on_result is called with each task as it completes (partial results).
         """
-        print(f"\n[🔄 ORCHESTRATOR] Executing {session.total_tasks} sub-agents in parallel...")
+        print(f"\n[🔄 ORCHESTRATOR] Executing {session.total_tasks} sub-agents in parallel "
+              f"(max {self.max_concurrency} concurrent, {self.task_timeout:g}s timeout)...")
+        start = time.perf_counter()
+        
+        # Execute all tasks concurrently, surfacing results as they land
+        async for task in self.iter_completed_tasks(session):
+            if on_result:
+                on_result(task)
         
-        # Execute all tasks concurrently
-        tasks = [self.execute_sub_agent_task(task) for task in session.tasks]
-        results = await asyncio.gather(*tasks)
+        wall_time = time.perf_counter() - start
+        slowest = max((t.duration_seconds or 0 for t in session.tasks), default=0)
+        serial = sum(t.duration_seconds or 0 for t in session.tasks)
         
         # Update session stats
         session.completed_tasks = sum(1 for t in session.tasks if t.status == "completed")
@@ -208,29 +282,32 @@ class GeminiOrchestrator:
         
         print(f"\n[✅ ORCHESTRATOR] Completed {session.completed_tasks}/{session.total_tasks} tasks")
         print(f"  Failed: {session.failed_tasks}")
+        print(f"  Wall-clock: {wall_time:.1f}s (slowest sub-agent {slowest:.1f}s, serial sum {serial:.1f}s)")
         
         return {
             "session_id": session.session_id,
             "total_tasks": session.total_tasks,
             "completed": session.completed_tasks,
             "failed": session.failed_tasks,
-            "results": results
+            "wall_time_seconds": round(wall_time, 3),
+            "results": [t.result for t in session.tasks]
         }
     
-    def synthesize_results(self, session: OrchestratorSession) -> str:
-        """
-        Use Gemini 3 to synthesize sub-agent results into a final response
-        """
-        print(f"\n[🧠 ORCHESTRATOR] Synthesizing results...")
+    def _synthesis_prompt(self, session: OrchestratorSession) -> str:
+        finished = [asdict(t) for t in session.tasks if t.status in ("completed", "failed")]
+        pending = [t.task_id for t in session.tasks if t.status not in ("completed", "failed")]
         
-        synthesis_prompt = f"""
+        return f"""
         You are an orchestration agent using Gemini 3 Pro Preview.
         
         ORIGINAL OBJECTIVE:
         {session.objective}
         
-        SUB-AGENT RESULTS:
-        {json.dumps([asdict(t) for t in session.tasks], indent=2)}
+        SUB-AGENT RESULTS ({len(finished)}/{session.total_tasks} finished):
+        {json.dumps(finished, indent=2)}
+        
+        STILL RUNNING:
+        {", ".join(pending) if pending else "None"}
         
         TASK:
         Synthesize these sub-agent results into a cohesive response for the user.
@@ -242,14 +319,41 @@ class GeminiOrchestrator:
         
         Be concise but comprehensive.
         """
+    
+    def synthesize_results(self, session: OrchestratorSession) -> str:
+        """
+        Use Gemini 3 to synthesize sub-agent results into a final response
+        Works on partial sessions too (unfinished tasks are listed as still running)
+        """
+        print(f"\n[🧠 ORCHESTRATOR] Synthesizing results...")
         
         response = self.client.models.generate_content(
             model=ORCHESTRATOR_MODEL,
-            contents=synthesis_prompt
+            contents=self._synthesis_prompt(session)
         )
         
         return response.text
     
+    async def stream_synthesis(self, session: OrchestratorSession) -> AsyncIterator[str]:
+        """
+        Run the plan and stream the synthesis: sub-agent results are reported
+        as they complete, then the final synthesis text is streamed chunk by chunk.
+        """
+        async for task in self.iter_completed_tasks(session):
+            yield f"[{task.status}] {task.task_id} ({task.duration_seconds or 0:.1f}s)\n"
+        
+        session.completed_at = datetime.datetime.now().isoformat()
+        self._save_session(session)
+        
+        print(f"\n[🧠 ORCHESTRATOR] Synthesizing results...")
+        stream = await self.client.aio.models.generate_content_stream(
+            model=ORCHESTRATOR_MODEL,
+            contents=self._synthesis_prompt(session)
+        )
+        async for chunk in stream:
+            if chunk.text:
+                yield chunk.text
+    
     def _save_session(self, session: OrchestratorSession):
         """Save orchestration session to disk"""
         session_file = self.sessions_dir / f"{session.session_id}.json"
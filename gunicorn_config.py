@@ -39,3 +39,26 @@ max_requests_jitter = 50
 
 # Preload app for better performance
 preload_app = True
+
+# Read-only indexes built once in the master; workers (including the ones
+# max_requests recycles) share them copy-on-write. Mutable state - job status,
+# cache invalidations, budget / rate counters - lives in core/shared_state.py,
+# never in a worker's memory. Add targets with YUKI_PRELOAD="module:callable,...".
+preload_targets = [
+    "yuki_tools",                                           # genai / storage / numpy / PIL imports
+    "prompts.token_estimator:get_token_estimator",          # router token estimates
+    "prompts.prompt_engineering_system:get_prompt_engineering",  # compiled templates + search indexes
+] + [t.strip() for t in os.getenv('YUKI_PRELOAD', '').split(',') if t.strip()]
+
+
+def on_starting(server):
+    """Master, after preload_app imported the app and before the first fork"""
+    from core.shared_state import preload
+    for target, result in preload(preload_targets).items():
+        server.log.info(f"Preload {target}: {result}")
+
+
+def post_fork(server, worker):
+    """Worker: connections inherited from the master are reopened on first use"""
+    from core.shared_state import get_shared_state
+    get_shared_state().reset_after_fork()
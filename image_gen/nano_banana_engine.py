@@ -258,18 +258,20 @@ class NanoBananaAutomation:
     def __init__(self):
         self.engine = NanoBananaEngine()
         self.db_path = Path("c:/Yuki_Local/anime_database.json")
+        self._db = None
     
     def auto_generate_character_variations(self, character_id: str) -> Dict:
         """
         Automatically generate character in multiple scenarios/styles
         No LoRA training needed!
         """
-        # Load character from database
-        with open(self.db_path) as f:
-            db = json.load(f)
+        # Load just this character (record store, no full-database read)
+        if self._db is None:
+            from anime_database import AnimeDatabase
+            self._db = AnimeDatabase(str(self.db_path))
         
-        character = db["characters"].get(character_id)
-        if not character or not character.get("reference_images"):
+        character = self._db.characters.get(character_id)
+        if not character or not character.reference_images:
             return {"error": "Character not found or no reference images"}
         
         # Define scenario variations
@@ -284,12 +286,12 @@ class NanoBananaAutomation:
             "Modern streetwear in urban environment"
         ]
         
-        base_image = character["reference_images"][0]
+        base_image = character.reference_images[0]
         
         return self.engine.character_consistency_generation(
             base_character_image=base_image,
             target_scenarios=scenarios,
-            character_name=character["name_full"]
+            character_name=character.name_full
         )
     
     def auto_create_learning_materials(self, topic: str) -> Dict:
@@ -28,6 +28,9 @@ from google import genai
 from google.genai import types
 from google.cloud import vision
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from core.context_cache import ContextCacheManager
+
 # =============================================================================
 # CONFIGURATION
 # =============================================================================
@@ -312,7 +315,9 @@ async def generate_image(
 
     reference_path: Path,
 
-    subject_parts: List[types.Part]
+    subject_parts: List[types.Part],
+
+    context_cache: Optional[ContextCacheManager] = None
 
 ) -> Optional[bytes]:
 
@@ -362,13 +367,21 @@ async def generate_image(
     with open(reference_path, "rb") as f:
         ref_part = types.Part.from_bytes(data=f.read(), mime_type="image/jpeg")
     
+    # Subject photos are the same for every character in a batch: cache them once
+    subject_prefix = [types.Content(role="user", parts=[types.Part(text="=== SUBJECT PHOTOS ==="), *subject_parts])]
+    cache_name = None
+    if context_cache:
+        cache_name = context_cache.get_or_create(
+            IMAGE_MODEL, contents=subject_prefix, display_name=f"subject-{subject_name}"
+        )
+    
     contents = [
-        "=== SUBJECT PHOTOS ===",
-        *subject_parts,
         f"=== REFERENCE CHARACTER: {target_character} ===",
         ref_part,
         generation_prompt
     ]
+    if not cache_name:
+        contents = ["=== SUBJECT PHOTOS ===", *subject_parts] + contents
     
     print(f"   🚀 Generating with {IMAGE_MODEL}...")
     try:
@@ -377,7 +390,8 @@ async def generate_image(
             contents=contents,
             config=types.GenerateContentConfig(
                 response_modalities=['IMAGE', 'TEXT'],
-                temperature=1.0
+                temperature=1.0,
+                cached_content=cache_name
             )
         )
         
@@ -399,6 +413,8 @@ class V12Pipeline:
     def __init__(self, project_id: str = PROJECT_ID):
         self.client = genai.Client(vertexai=True, project=project_id, location=LOCATION)
         self.cv_analyzer = CloudVisionAnalyzer()
+        # Short TTL: subject caches are only worth keeping for the length of a batch
+        self.context_cache = ContextCacheManager(self.client, ttl_seconds=900)
     
     async def run(
         self,
@@ -450,14 +466,20 @@ class V12Pipeline:
             # Stage 3
             identity_lock = await deep_analysis_pro(self.client, subject_name, cv_data, expansion_data, subject_parts)
             if not identity_lock: return
-            
+
+            # Keep the measured geometry with the lock so renders can be scored offline (analyzers/identity_scorer.py)
+            identity_lock["subject_landmarks"] = {
+                "landmarks_34": cv_data.get("landmarks_34", []),
+                "landmarks_68": expansion_data.get("landmarks_68", [])
+            }
+
             # Save Lock
             with open(lock_path, "w", encoding="utf-8") as f:
                 json.dump(identity_lock, f, indent=2)
             print(f"\n💾 Saved identity lock: {lock_path}")
             
         # Stage 4
-        image_data = await generate_image(self.client, subject_name, target_character, identity_lock, reference_path, subject_parts)
+        image_data = await generate_image(self.client, subject_name, target_character, identity_lock, reference_path, subject_parts, self.context_cache)
         
         if image_data:
             # --- DB & SECURE FILENAME LOGGING ---
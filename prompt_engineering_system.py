@@ -11,13 +11,16 @@ Features:
 """
 
 import hashlib
+import itertools
 import json
 import re
+import threading
 from dataclasses import dataclass, field, asdict
 from datetime import datetime
 from enum import Enum
-from typing import Dict, List, Optional, Any, Tuple
-from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Any, Set, Tuple
+from collections import defaultdict, OrderedDict
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -95,6 +98,104 @@ class PromptComponent:
         return ", ".join(parts)
 
 
+# =============================================================================
+# COMPILED TEMPLATES
+# =============================================================================
+
+PLACEHOLDER_PATTERN = re.compile(r'\{([^{}]+)\}')
+
+
+class CompiledTemplate:
+    """
+    Template text split once into literal / placeholder parts
+    
+    render() is a single join; placeholders without a value are kept as "{name}",
+    exactly like the old str.replace loop.
+    """
+    __slots__ = ("text", "parts", "slots", "placeholders")
+    
+    def __init__(self, text: str):
+        self.text = text
+        pieces = PLACEHOLDER_PATTERN.split(text)
+        # Odd indexes are placeholder names
+        self.parts = pieces
+        self.slots = tuple((i, pieces[i]) for i in range(1, len(pieces), 2))
+        self.placeholders = tuple(dict.fromkeys(name for _, name in self.slots))
+    
+    def render(self, values: Dict[str, Any]) -> Tuple[str, List[str]]:
+        """Rendered text and the placeholders that had no value"""
+        parts = list(self.parts)
+        missing = []
+        for i, name in self.slots:
+            if name in values:
+                parts[i] = str(values[name])
+            else:
+                parts[i] = "{" + name + "}"
+                missing.append(name)
+        return "".join(parts), missing
+
+
+@lru_cache(maxsize=1024)
+def compile_template(text: str) -> CompiledTemplate:
+    """Compiled form of a template text (cached by text, so edited templates recompile)"""
+    return CompiledTemplate(text)
+
+
+class LRUDict(OrderedDict):
+    """dict that keeps only the `maxsize` most recently set / read keys"""
+    
+    def __init__(self, maxsize: int = 1024):
+        super().__init__()
+        self.maxsize = maxsize
+    
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+    
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+    
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        while len(self) > self.maxsize:
+            self.popitem(last=False)
+
+
+# Bumped whenever a searchable template field changes after construction, so
+# PromptEngineering can reindex and drop cached searches on the next lookup.
+_template_revisions = itertools.count(1)
+_template_revision = 0
+
+_SEARCHABLE_FIELDS = frozenset({"name", "description", "category", "tags", "quality_score"})
+
+
+def _bump_template_revision():
+    global _template_revision
+    _template_revision = next(_template_revisions)
+
+
+class _WatchedList(list):
+    """list that bumps the template revision on in-place mutation (template.tags.append(...))"""
+
+
+def _watched(name: str):
+    base = getattr(list, name)
+    
+    def method(self, *args, **kwargs):
+        result = base(self, *args, **kwargs)
+        _bump_template_revision()
+        return result
+    method.__name__ = name
+    return method
+
+
+for _name in ("append", "extend", "insert", "remove", "pop", "clear", "sort", "reverse",
+              "__setitem__", "__delitem__", "__iadd__"):
+    setattr(_WatchedList, _name, _watched(_name))
+
+
 @dataclass
 class PromptTemplate:
     """Reusable prompt template with variables"""
@@ -111,14 +212,20 @@ class PromptTemplate:
     created_at: str = field(default_factory=lambda: datetime.utcnow().isoformat())
     updated_at: str = field(default_factory=lambda: datetime.utcnow().isoformat())
     
+    def __setattr__(self, name, value):
+        if name == "tags" and not isinstance(value, _WatchedList):
+            value = _WatchedList(value)
+        # First assignment (dataclass __init__) is not a change
+        changed = name in _SEARCHABLE_FIELDS and name in self.__dict__
+        super().__setattr__(name, value)
+        if changed:
+            _bump_template_revision()
+    
     def render(self, **kwargs) -> str:
         """Render template with provided variables"""
-        prompt = self.template
-        for var, value in kwargs.items():
-            prompt = prompt.replace(f"{{{var}}}", str(value))
+        prompt, remaining = compile_template(self.template).render(kwargs)
         
         # Check if all variables were replaced
-        remaining = re.findall(r'\{([^}]+)\}', prompt)
         if remaining:
             logger.warning(f"Template has unfilled variables: {remaining}")
         
@@ -147,6 +254,35 @@ class GeneratedPrompt:
         return hashlib.md5(self.prompt.encode()).hexdigest()
 
 
+# Quality scoring: one compiled alternation per component (substring semantics)
+def _any_of(*terms: str) -> "re.Pattern":
+    return re.compile("|".join(re.escape(t) for t in terms))
+
+
+SCORE_CHECKS = (
+    (0.2, _any_of("character", "person", "portrait", "figure")),             # subject
+    (0.15, _any_of("in ", "at ", "setting", "environment", "background")),   # setting
+    (0.15, _any_of("style", "aesthetic", "art", "realistic", "anime")),      # style
+    (0.15, _any_of("shot", "angle", "view", "composition", "framing")),      # composition
+    (0.1, _any_of("light", "lighting", "golden hour", "studio")),            # lighting
+)
+QUALITY_WEIGHT = 0.25
+QUALITY_TERMS = ("detailed", "professional", "4k", "ultra", "high quality")
+
+
+@lru_cache(maxsize=4096)
+def _score_text(prompt: str) -> float:
+    prompt_lower = prompt.lower()
+    score = sum(weight for weight, pattern in SCORE_CHECKS if pattern.search(prompt_lower))
+    quality_count = sum(1 for w in QUALITY_TERMS if w in prompt_lower)
+    score += QUALITY_WEIGHT * min(quality_count / 2, 1.0)
+    return round(score, 2)
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
 class PromptEngineering:
     """
     Advanced prompt engineering and optimization system
@@ -159,17 +295,28 @@ class PromptEngineering:
     - A/B testing support
     """
     
-    def __init__(self, storage_backend: Optional[Any] = None):
+    def __init__(self, storage_backend: Optional[Any] = None, max_generated: int = 1024,
+                 max_searches: int = 256):
         """
         Initialize prompt engineering system
         
         Args:
             storage_backend: Optional cloud storage (Firestore, etc.)
+            max_generated: How many recent generated prompts to keep (LRU)
+            max_searches: How many distinct search results to keep (LRU)
         """
         self.storage = storage_backend
         self.templates: Dict[str, PromptTemplate] = {}
-        self.generated: Dict[str, GeneratedPrompt] = {}
+        self.generated: Dict[str, GeneratedPrompt] = LRUDict(max_generated)
+        self._lock = threading.RLock()
+        # Inverted indexes (maintained by add_template)
+        self._by_category: Dict[PromptCategory, Set[str]] = defaultdict(set)
+        self._by_tag: Dict[str, Set[str]] = defaultdict(set)
+        self._by_trigram: Dict[str, Set[str]] = defaultdict(set)
+        self._indexed: Dict[str, Tuple[PromptCategory, Tuple[str, ...], Set[str]]] = {}
+        self._search_cache: Dict[Tuple, List[str]] = LRUDict(max_searches)
         self._load_default_templates()
+        self._revision_seen = _template_revision
     
     def _load_default_templates(self):
         """Load default Nano Banana Pro templates"""
@@ -263,10 +410,45 @@ class PromptEngineering:
             template.id = template.generate_id()
         
         template.updated_at = datetime.utcnow().isoformat()
-        self.templates[template.id] = template
+        with self._lock:
+            self.templates[template.id] = template
+            self._index_template(template)
+        compile_template(template.template)
         
         logger.info(f"Added template: {template.name} ({template.id})")
     
+    def _index_template(self, template: PromptTemplate):
+        """(Re)build the category / tag / name+description trigram postings of one template"""
+        self._unindex_template(template.id)
+        grams = _trigrams(template.name.lower()) | _trigrams(template.description.lower())
+        self._by_category[template.category].add(template.id)
+        for tag in template.tags:
+            self._by_tag[tag].add(template.id)
+        for gram in grams:
+            self._by_trigram[gram].add(template.id)
+        self._indexed[template.id] = (template.category, tuple(template.tags), grams)
+        self._search_cache.clear()
+    
+    def _unindex_template(self, template_id: str):
+        previous = self._indexed.pop(template_id, None)
+        if previous is None:
+            return
+        category, tags, grams = previous
+        self._by_category[category].discard(template_id)
+        for tag in tags:
+            self._by_tag[tag].discard(template_id)
+        for gram in grams:
+            self._by_trigram[gram].discard(template_id)
+    
+    def remove_template(self, template_id: str) -> bool:
+        """Remove a template (and its index entries)"""
+        with self._lock:
+            if self.templates.pop(template_id, None) is None:
+                return False
+            self._unindex_template(template_id)
+            self._search_cache.clear()
+            return True
+    
     def get_template(self, template_id: str) -> Optional[PromptTemplate]:
         """Get template by ID"""
         return self.templates.get(template_id)
@@ -277,27 +459,56 @@ class PromptEngineering:
         tags: Optional[List[str]] = None,
         query: Optional[str] = None
     ) -> List[PromptTemplate]:
-        """Search templates by category, tags, or query"""
-        results = list(self.templates.values())
+        """
+        Search templates by category, tags, or query
+        
+        Category / tags are answered from the inverted indexes; a query of 3+
+        characters narrows candidates by trigram postings before the substring
+        check on name / description. Results are cached (LRU) until templates
+        change, including direct edits of tags / quality_score / name on a
+        stored template.
+        """
+        key = (category, tuple(tags) if tags else None, query.lower() if query else None)
+        with self._lock:
+            if self._revision_seen != _template_revision:
+                self._revision_seen = _template_revision
+                for template in self.templates.values():
+                    self._index_template(template)
+                self._search_cache.clear()
+            cached = self._search_cache.get(key)
+            if cached is None:
+                cached = self._search_ids(category, tags, key[2])
+                self._search_cache[key] = cached
+            return [self.templates[t] for t in cached if t in self.templates]
+    
+    def _search_ids(self, category, tags, query_lower) -> List[str]:
+        candidates: Optional[Set[str]] = None
         
         if category:
-            results = [t for t in results if t.category == category]
+            candidates = set(self._by_category.get(category, ()))
         
         if tags:
-            results = [
-                t for t in results
-                if any(tag in t.tags for tag in tags)
-            ]
-        
-        if query:
-            query_lower = query.lower()
-            results = [
-                t for t in results
-                if query_lower in t.name.lower()
-                or query_lower in t.description.lower()
-            ]
+            tagged = set().union(*(self._by_tag.get(tag, set()) for tag in tags))
+            candidates = tagged if candidates is None else candidates & tagged
+        
+        if query_lower:
+            if len(query_lower) >= 3:
+                postings = [self._by_trigram.get(g, set()) for g in _trigrams(query_lower)]
+                matched = set.intersection(*postings) if postings else set()
+                candidates = matched if candidates is None else candidates & matched
+            elif candidates is None:
+                candidates = set(self.templates)
+            candidates = {
+                t for t in candidates
+                if query_lower in self.templates[t].name.lower()
+                or query_lower in self.templates[t].description.lower()
+            }
         
-        return sorted(results, key=lambda t: t.quality_score, reverse=True)
+        if candidates is None:
+            candidates = set(self.templates)
+        # Stable order: insertion order, then by quality (as the old sorted() scan)
+        ordered = [t for t in self.templates if t in candidates]
+        return sorted(ordered, key=lambda t: self.templates[t].quality_score, reverse=True)
     
     def generate_prompt(
         self,
@@ -323,12 +534,77 @@ class PromptEngineering:
         # Update template usage
         template.usage_count += 1
         
-        # Store generated prompt
-        self.generated[generated.cache_key()] = generated
+        # Store generated prompt (bounded LRU)
+        with self._lock:
+            self.generated[generated.cache_key()] = generated
         
-        logger.info(f"Generated prompt from template {template.name}")
+        logger.debug(f"Generated prompt from template {template.name}")
         return generated
     
+    def render_many(
+        self,
+        requests: Iterable[Tuple[str, Dict[str, Any]]],
+        strict: bool = False
+    ) -> List[str]:
+        """
+        Batch rendering of (template_id, variables) pairs - no GeneratedPrompt objects,
+        no per-prompt logging, one compiled template per distinct template
+        
+        Args:
+            requests: (template_id, variables) pairs
+            strict: Raise ValueError on unfilled placeholders instead of one summary warning
+        
+        Returns:
+            Rendered prompts in request order
+        """
+        compiled: Dict[str, Tuple[PromptTemplate, CompiledTemplate]] = {}
+        usage: Dict[str, int] = defaultdict(int)
+        unfilled: Dict[str, Set[str]] = defaultdict(set)
+        rendered = []
+        for template_id, variables in requests:
+            entry = compiled.get(template_id)
+            if entry is None:
+                template = self.get_template(template_id)
+                if not template:
+                    raise ValueError(f"Template not found: {template_id}")
+                entry = compiled[template_id] = (template, compile_template(template.template))
+            text, missing = entry[1].render(variables)
+            if missing:
+                if strict:
+                    raise ValueError(f"Template {template_id} has unfilled variables: {missing}")
+                unfilled[template_id].update(missing)
+            usage[template_id] += 1
+            rendered.append(text)
+        
+        for template_id, count in usage.items():
+            compiled[template_id][0].usage_count += count
+        for template_id, missing in unfilled.items():
+            logger.warning(f"Template {template_id} has unfilled variables: {sorted(missing)}")
+        return rendered
+    
+    def generate_many(
+        self,
+        requests: Iterable[Tuple[str, Dict[str, Any]]],
+        store: bool = False
+    ) -> List[GeneratedPrompt]:
+        """render_many() wrapped in GeneratedPrompt objects (optionally kept in the LRU)"""
+        requests = list(requests)
+        texts = self.render_many(requests)
+        results = [
+            GeneratedPrompt(
+                prompt=text,
+                template_id=template_id,
+                category=self.templates[template_id].category,
+                variables=dict(variables)
+            )
+            for text, (template_id, variables) in zip(texts, requests)
+        ]
+        if store:
+            with self._lock:
+                for generated in results:
+                    self.generated[generated.cache_key()] = generated
+        return results
+    
     def generate_cosplay_prompt(
         self,
         character_name: str,
@@ -408,54 +684,12 @@ class PromptEngineering:
     def score_prompt(self, prompt: str) -> float:
         """
         Score prompt quality (0-1) based on best practices
-        """
-        score = 0.0
-        checks = 0
-        
-        # Component checks
-        components = {
-            "subject": 0.2,
-            "setting": 0.15,
-            "style": 0.15,
-            "composition": 0.15,
-            "lighting": 0.1,
-            "quality": 0.25
-        }
-        
-        prompt_lower = prompt.lower()
-        
-        # Subject
-        checks += 1
-        if any(w in prompt_lower for w in ["character", "person", "portrait", "figure"]):
-            score += components["subject"]
-        
-        # Setting
-        checks += 1
-        if any(w in prompt_lower for w in ["in ", "at ", "setting", "environment", "background"]):
-            score += components["setting"]
         
-        # Style
-        checks += 1
-        if any(w in prompt_lower for w in ["style", "aesthetic", "art", "realistic", "anime"]):
-            score += components["style"]
-        
-        # Composition
-        checks += 1
-        if any(w in prompt_lower for w in ["shot", "angle", "view", "composition", "framing"]):
-            score += components["composition"]
-        
-        # Lighting
-        checks += 1
-        if any(w in prompt_lower for w in ["light", "lighting", "golden hour", "studio"]):
-            score += components["lighting"]
-        
-        # Quality terms
-        checks += 1
-        quality_count = sum(1 for w in ["detailed", "professional", "4k", "ultra", "high quality"]
-                          if w in prompt_lower)
-        score += components["quality"] * min(quality_count / 2, 1.0)
-        
-        return round(score, 2)
+        Weights: subject 0.2, setting 0.15, style 0.15, composition 0.15,
+        lighting 0.1, quality terms 0.25 (full marks at two terms).
+        Memoized per prompt text.
+        """
+        return _score_text(prompt)
     
     def export_templates(self, filepath: str):
         """Export all templates to JSON file"""
@@ -486,6 +720,20 @@ class PromptEngineering:
         logger.info(f"Imported {len(data)} templates from {filepath}")
 
 
+_prompt_engineering: Optional[PromptEngineering] = None
+_prompt_engineering_lock = threading.Lock()
+
+
+def get_prompt_engineering() -> PromptEngineering:
+    """Process-wide PromptEngineering with the default templates (batch engine / API hot paths)"""
+    global _prompt_engineering
+    if _prompt_engineering is None:
+        with _prompt_engineering_lock:
+            if _prompt_engineering is None:
+                _prompt_engineering = PromptEngineering()
+    return _prompt_engineering
+
+
 # Example usage
 if __name__ == "__main__":
     # Initialize system
@@ -0,0 +1,241 @@
+"""
+Yuki Token Estimator
+Local Gemini token counts for prompt shaping, with a calibrated error margin
+
+count_tokens is a network round trip (40-150 ms) and YukiPromptOptimizer used
+to make up to three per prompt. Token counts of our prompts are close to a
+linear function of a few cheap text features (words, long-word surplus,
+digits, punctuation, non-ASCII characters, newlines), so:
+
+- estimate():  features x coefficients, memoized by prompt hash
+- margin:      relative error bound measured on the calibration corpus
+- fits():      True / False when the estimate is clearly under / over the
+               budget (outside the margin), None when only the real tokenizer
+               can tell - callers make the remote call only then
+- record():    exact counts from count_tokens replace the estimate for that
+               prompt (and are kept as calibration samples)
+
+Coefficients come from prompts/token_calibration.json (written by
+tools/calibrate_tokens.py against count_tokens on our prompt corpus). Without
+it the default coefficients are unvalidated: estimate() still works for
+sizing, but fits() answers None (ask count_tokens) unless the prompt's exact
+count has been recorded.
+
+Usage:
+    from prompts.token_estimator import get_token_estimator
+
+    estimator = get_token_estimator()
+    estimator.estimate(prompt)          # ~tokens, no network
+    estimator.fits(prompt, 8000)        # True / False / None (ask count_tokens)
+"""
+
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("YukiTokenEstimator")
+
+DEFAULT_CALIBRATION_PATH = Path(__file__).with_name("token_calibration.json")
+DEFAULT_MEMO_SIZE = 4096
+MAX_SAMPLES = 2000
+LONG_WORD = 7
+
+FEATURES = ("words", "long_word_chars", "digits", "punctuation", "non_ascii", "newlines")
+
+_WORD = re.compile(r"[A-Za-z]+")
+_DIGIT = re.compile(r"[0-9]")
+_PUNCT = re.compile(r"[!-/:-@\[-`{-~]")
+_NON_ASCII = re.compile(r"[^\x00-\x7f]")
+
+
+def text_features(text: str) -> Tuple[float, ...]:
+    """Feature vector in FEATURES order."""
+    words = _WORD.findall(text)
+    return (
+        float(len(words)),
+        float(sum(len(w) - LONG_WORD for w in words if len(w) > LONG_WORD)),
+        float(len(_DIGIT.findall(text))),
+        float(len(_PUNCT.findall(text))),
+        float(len(_NON_ASCII.findall(text))),
+        float(text.count("\n")),
+    )
+
+
+def prompt_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+@dataclass
+class Calibration:
+    """Linear model: tokens ~ intercept + sum(coefficients[f] * feature f)."""
+    coefficients: Dict[str, float] = field(default_factory=lambda: {
+        "words": 1.0, "long_word_chars": 0.25, "digits": 1.0,
+        "punctuation": 0.8, "non_ascii": 1.0, "newlines": 0.5,
+    })
+    intercept: float = 0.0
+    margin: float = 0.2          # relative error bound
+    samples: int = 0
+    model: str = "gemini-3-pro-preview"
+
+    @property
+    def fitted(self) -> bool:
+        """True for coefficients fitted on real counts (fit_calibration); the defaults are unvalidated."""
+        return self.samples > 0
+
+    def predict(self, features: Sequence[float]) -> float:
+        return self.intercept + sum(self.coefficients.get(name, 0.0) * value for name, value in zip(FEATURES, features))
+
+    @classmethod
+    def load(cls, path) -> "Calibration":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(**{k: v for k, v in data.items() if k in cls.__dataclass_fields__})
+
+    def save(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(asdict(self), f, indent=2)
+
+
+def fit_calibration(samples: Sequence[Tuple[str, int]], model: str = "gemini-3-pro-preview",
+                    margin_quantile: float = 0.98, min_margin: float = 0.03) -> Calibration:
+    """
+    Least-squares fit of the coefficients on (text, true token count) samples.
+    Features that come out negative are dropped and the fit repeated, so every
+    coefficient stays >= 0. The margin is the `margin_quantile` relative error
+    on the samples, padded by 25%.
+    """
+    import numpy as np
+
+    if len(samples) < len(FEATURES) + 1:
+        raise ValueError(f"Need at least {len(FEATURES) + 1} samples to calibrate, got {len(samples)}")
+    X = np.array([text_features(text) for text, _ in samples])
+    y = np.array([tokens for _, tokens in samples], dtype=np.float64)
+    active = list(range(len(FEATURES)))
+    while True:
+        design = np.column_stack([np.ones(len(X)), X[:, active]])
+        solution = np.linalg.lstsq(design, y, rcond=None)[0]
+        negative = [active[i] for i, c in enumerate(solution[1:]) if c < 0]
+        if not negative:
+            break
+        active = [i for i in active if i not in negative]
+    coefficients = {name: 0.0 for name in FEATURES}
+    for i, c in zip(active, solution[1:]):
+        coefficients[FEATURES[i]] = round(float(c), 5)
+    calibration = Calibration(coefficients=coefficients, intercept=round(max(float(solution[0]), 0.0), 3),
+                              samples=len(samples), model=model)
+    predicted = np.array([calibration.predict(x) for x in X])
+    relative = np.abs(predicted - y) / np.maximum(y, 1.0)
+    calibration.margin = round(max(float(np.quantile(relative, margin_quantile)) * 1.25, min_margin), 4)
+    return calibration
+
+
+class TokenEstimator:
+    """Memoized local token estimates plus the fits-in-budget decision."""
+
+    def __init__(self, calibration: Optional[Calibration] = None, memo_size: int = DEFAULT_MEMO_SIZE):
+        self.calibration = calibration or Calibration()
+        self.memo_size = memo_size
+        self._memo: "OrderedDict[str, Tuple[int, bool]]" = OrderedDict()   # hash -> (tokens, exact)
+        self._samples: List[Tuple[str, int]] = []
+        self._lock = threading.Lock()
+        self._stats = {"estimates": 0, "memo_hits": 0, "decided_locally": 0, "needs_remote": 0, "recorded": 0}
+
+    def _lookup(self, text: str) -> Tuple[str, Optional[Tuple[int, bool]]]:
+        key = prompt_hash(text)
+        with self._lock:
+            entry = self._memo.get(key)
+            if entry is not None:
+                self._memo.move_to_end(key)
+                self._stats["memo_hits"] += 1
+        return key, entry
+
+    def _remember(self, key: str, entry: Tuple[int, bool]):
+        with self._lock:
+            self._memo[key] = entry
+            self._memo.move_to_end(key)
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+
+    def _entry(self, text: str) -> Tuple[int, bool]:
+        key, entry = self._lookup(text)
+        if entry is None:
+            entry = (max(int(round(self.calibration.predict(text_features(text)))), 0), False)
+            self._remember(key, entry)
+            with self._lock:
+                self._stats["estimates"] += 1
+        return entry
+
+    def estimate(self, text: str) -> int:
+        """Estimated (or, if recorded, exact) token count."""
+        return self._entry(text)[0]
+
+    def is_exact(self, text: str) -> bool:
+        return self._entry(text)[1]
+
+    def bounds(self, text: str) -> Tuple[int, int]:
+        """(low, high) token counts the real tokenizer is expected to fall between."""
+        tokens, exact = self._entry(text)
+        if exact:
+            return tokens, tokens
+        margin = self.calibration.margin
+        return int(tokens * (1 - margin)), int(tokens * (1 + margin)) + 1
+
+    def fits(self, text: str, budget: int) -> Optional[bool]:
+        """
+        True / False if the budget decision is certain locally, None if count_tokens is needed
+        (always, for estimates from an unfitted calibration).
+        """
+        low, high = self.bounds(text)
+        decidable = self.calibration.fitted or low == high   # low == high: recorded exact count
+        if decidable and (high <= budget or low > budget):
+            with self._lock:
+                self._stats["decided_locally"] += 1
+            return high <= budget
+        with self._lock:
+            self._stats["needs_remote"] += 1
+        return None
+
+    def record(self, text: str, tokens: int):
+        """Exact count from count_tokens: memoized as exact, kept as a calibration sample."""
+        self._remember(prompt_hash(text), (int(tokens), True))
+        with self._lock:
+            self._stats["recorded"] += 1
+            if len(self._samples) < MAX_SAMPLES:
+                self._samples.append((text, int(tokens)))
+
+    def samples(self) -> List[Tuple[str, int]]:
+        with self._lock:
+            return list(self._samples)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, memo_size=len(self._memo))
+
+
+_token_estimator: Optional[TokenEstimator] = None
+_token_estimator_lock = threading.Lock()
+
+
+def get_token_estimator() -> TokenEstimator:
+    """Process-wide estimator using the shipped / YUKI_TOKEN_CALIBRATION calibration file."""
+    global _token_estimator
+    if _token_estimator is None:
+        with _token_estimator_lock:
+            if _token_estimator is None:
+                path = os.environ.get("YUKI_TOKEN_CALIBRATION", str(DEFAULT_CALIBRATION_PATH))
+                calibration = None
+                if os.path.exists(path):
+                    try:
+                        calibration = Calibration.load(path)
+                    except (OSError, ValueError, TypeError) as e:
+                        logger.warning(f"   ⚠️ [Token Estimator] Bad calibration {path} ({e}), using defaults")
+                _token_estimator = TokenEstimator(calibration)
+    return _token_estimator
@@ -1,9 +1,10 @@
 import os
 import shutil
 import asyncio
-from fastapi import FastAPI, UploadFile, File, BackgroundTasks, HTTPException
+import sqlite3
+from fastapi import FastAPI, UploadFile, File, BackgroundTasks, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel, Field
 import subprocess
 import uvicorn
@@ -13,6 +14,17 @@ import base64
 import time
 import uuid
 
+# Heavy dependencies (google-genai, yuki_tools, the agent) load on first use or in the
+# background after startup - see core/lazy_resources.py and /ready
+from core.tool_executor import ToolExecutor
+from core.genai_clients import get_genai_client, warmup_clients, get_client_stats, registry as genai_registry
+from core.lazy_resources import ResourceRegistry
+from core.persona import YUKI_SYSTEM_PROMPT, Colors
+from core.response_cache import ResponseCache, ConditionalGetMiddleware
+from core.shared_state import get_shared_state
+from core.model_router import ModelRouter, Budgets, BudgetExceededError
+from assets_server import asset_url
+
 # Early Cloud detection
 IS_CLOUD = os.getenv("K_SERVICE") is not None
 
@@ -27,55 +39,18 @@ except ImportError:
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("YukiServer")
 
-# Conditional heavy imports
-YukiAgent = None
-tools_imports_ok = False
-
-try:
-    from google import genai
-    from google.genai import types
-    logger.info("GenAI SDK imported successfully")
-except ImportError as e:
-    logger.error(f"Failed to import GenAI SDK: {e}")
-    genai = None
-    types = None
-
-try:
-    from yuki_local import YUKI_SYSTEM_PROMPT, Colors
-    logger.info("yuki_local imported successfully")
-except Exception as e:
-    logger.warning(f"Could not import yuki_local: {e}")
-    YUKI_SYSTEM_PROMPT = "You are Yuki, a helpful AI assistant."
-    class Colors:
-        ICE_BLUE = FOX_FIRE = NEON_PINK = ERROR_RED = RESET = ""
+app = FastAPI()
 
-try:
-    from yuki_tools import (
-        get_current_time, add_numbers, generate_cosplay_image, generate_cosplay_video,
-        research_topic, list_files, read_file, write_file, search_web, fetch_url,
-        identify_anime_screenshot, detect_objects, segment_image, analyze_video,
-        analyze_pdf, upload_to_gcs, download_from_gcs,
-    )
-    tools_imports_ok = True
-    logger.info("yuki_tools imported successfully")
-except Exception as e:
-    logger.warning(f"Could not import yuki_tools: {e}")
-    # Define stub functions
-    def get_current_time(): return "Tool not available"
-    def add_numbers(a, b): return a + b
-    generate_cosplay_image = generate_cosplay_video = research_topic = None
-    list_files = read_file = write_file = search_web = fetch_url = None
-    identify_anime_screenshot = detect_objects = segment_image = None
-    analyze_video = analyze_pdf = upload_to_gcs = download_from_gcs = None
-
-if not IS_CLOUD:
-    try:
-        from agent import YukiAgent
-        import sqlite3
-    except ImportError as e:
-        logger.warning(f"Could not import local modules: {e}")
+MEMORY_DB_PATH = r"C:\Yuki_Local\Cosplay_Lab\Brain\yuki_memory.db"
 
-app = FastAPI()
+# Gallery polling: cached per email, stale as soon as the memory DB changes
+# (pipelines write it from other processes) or a generation is posted.
+# Added before CORS so CORS headers are applied per request, never cached.
+# Invalidations go through the shared state so they reach every gunicorn worker.
+response_cache = ResponseCache(shared=get_shared_state())
+response_cache.register("/v1/user/images", ttl=30, tags=["user-images"],
+                        files=[MEMORY_DB_PATH, MEMORY_DB_PATH + "-wal"], invalidated_by=["/generate"])
+app.add_middleware(ConditionalGetMiddleware, cache=response_cache)
 
 # Allow Expo/Localhost access
 app.add_middleware(
@@ -114,67 +89,158 @@ try:
 except Exception as e:
     logger.warning(f"Could not create directories: {e}")
 
-# Initialize Agent (Skip on Cloud Run - not needed for chat API)
-yuki_agent = None
-if not IS_CLOUD:
-    logger.info("Initializing Yuki Agent (Gemini 3)...")
+# =============================================================================
+# LAZY RESOURCES
+# =============================================================================
+
+TOOL_NAMES = (
+    "get_current_time", "add_numbers", "generate_cosplay_image", "generate_cosplay_video",
+    "research_topic", "list_files", "read_file", "write_file", "search_web", "fetch_url",
+    "identify_anime_screenshot", "detect_objects", "segment_image", "analyze_video",
+    "analyze_pdf", "upload_to_gcs", "download_from_gcs",
+)
+
+def _load_tools() -> list:
     try:
-        yuki_agent = YukiAgent(
-            model="gemini-3-pro-preview",
-            tools=[get_current_time, add_numbers],
-            project=PROJECT_ID,
-            location="global",
-        )
-        yuki_agent.set_up()
-        logger.info("Yuki Agent initialized successfully.")
+        import yuki_tools
+        tools = [getattr(yuki_tools, name) for name in TOOL_NAMES]
+        logger.info("yuki_tools imported successfully")
+        return tools
     except Exception as e:
-        logger.error(f"Failed to initialize Yuki Agent: {e}")
-        yuki_agent = None
-else:
-    logger.info("Cloud Run mode: Skipping YukiAgent (using GenAI Client only)")
+        logger.warning(f"Could not import yuki_tools: {e}")
+        # Stub tools
+        def get_current_time(): return "Tool not available"
+        def add_numbers(a, b): return a + b
+        return [get_current_time, add_numbers]
 
-# Initialize GenAI Client for /v1/chat/completions
-logger.info("Initializing GenAI Client...")
-try:
+def _create_genai_client():
     api_key = os.getenv("YUKI_API_KEY")
     if api_key:
         # 🔑 API Key mode (Don't provide project/location as they are for Vertex mode)
-        genai_client = genai.Client(api_key=api_key)
         logger.info("Found YUKI_API_KEY, using for authentication.")
-    else:
-        # ☁️ Vertex AI mode
-        genai_client = genai.Client(
-            vertexai=True,
-            project=PROJECT_ID,
-            location="global",
+        return get_genai_client(api_key=api_key)
+    # ☁️ Vertex AI mode
+    logger.info("No API key found, falling back to Vertex AI default auth.")
+    return get_genai_client(location="global", project=PROJECT_ID)
+
+def _create_cost_tracker():
+    from yuki_cost_tracker import YukiCostTracker
+    # Spend / rpm counters shared by every gunicorn worker so budgets hold globally
+    return YukiCostTracker(PROJECT_ID, shared_state=get_shared_state())
+
+def _create_context_cache():
+    # Context cache for the stable chat prefix (system prompt + tool declarations)
+    from core.context_cache import ContextCacheManager
+    client = get_chat_client()
+    return ContextCacheManager(client, ttl_seconds=3600) if client else None
+
+def _create_yuki_agent():
+    # Skip on Cloud Run - not needed for chat API
+    if IS_CLOUD:
+        return None
+    from agent import YukiAgent
+    logger.info("Initializing Yuki Agent (Gemini 3)...")
+    tools = {func.__name__: func for func in get_tools_list()}
+    agent = YukiAgent(
+        model="gemini-3-pro-preview",
+        tools=[tools[name] for name in ("get_current_time", "add_numbers")],
+        project=PROJECT_ID,
+        location="global",
+    )
+    agent.set_up()
+    return agent
+
+resources = ResourceRegistry()
+tools_resource = resources.register("tools", _load_tools)
+tool_executor_resource = resources.register("tool_executor", lambda: ToolExecutor(
+    {func.__name__: func for func in get_tools_list()},
+    max_workers=int(os.getenv("YUKI_TOOL_WORKERS", "8")),
+))
+genai_client_resource = resources.register("genai_client", _create_genai_client)
+genai_endpoints_resource = resources.register("genai_endpoints", lambda: warmup_clients(project=PROJECT_ID), required=False)
+context_cache_resource = resources.register("context_cache", _create_context_cache, required=False)
+cost_tracker_resource = resources.register("cost_tracker", _create_cost_tracker)
+model_router_resource = resources.register("model_router", lambda: ModelRouter(get_cost_tracker(), budgets=Budgets.from_env()))
+# /chat looks the agent up per request: after a failed set_up() (e.g. no local
+# credentials) requests go straight to the GenAI fallback until the backoff expires
+yuki_agent_resource = resources.register("yuki_agent", _create_yuki_agent, required=False, retry_backoff=300)
+_tool_declarations = None
+
+# Startup warm-up order: what the first chat request needs first
+WARMUP_RESOURCES = ["genai_client", "tools", "tool_executor", "cost_tracker", "model_router", "context_cache",
+                    "genai_endpoints", "yuki_agent"]
+
+def get_tools_list() -> list:
+    return tools_resource.get()
+
+def get_tool_executor() -> ToolExecutor:
+    return tool_executor_resource.get()
+
+def get_cost_tracker():
+    return cost_tracker_resource.get()
+
+def get_model_router() -> ModelRouter:
+    return model_router_resource.get()
+
+def get_chat_client():
+    """Shared GenAI client for chat, or None if it can't be built (endpoints answer 503)."""
+    return genai_client_resource.get_or_none()
+
+def get_context_cache():
+    return context_cache_resource.get_or_none()
+
+def get_yuki_agent():
+    return yuki_agent_resource.get_or_none()
+
+def get_tool_declarations():
+    """Declarations-only Tool for cached contents (built once)."""
+    global _tool_declarations
+    if _tool_declarations is None:
+        from core.context_cache import function_declarations_tool
+        _tool_declarations = function_declarations_tool(get_chat_client(), get_tools_list())
+    return _tool_declarations
+
+def log_chat_usage(model_name: str, usage_metadata, user_id: Optional[str], operation: str,
+                   latency_s: Optional[float] = None):
+    """Record one generate_content call's tokens / cost (the router's budgets read this spend)."""
+    if usage_metadata is None:
+        return
+    try:
+        get_cost_tracker().log_generation(
+            model=model_name,
+            operation=operation,
+            tokens_in=usage_metadata.prompt_token_count or 0,
+            tokens_out=usage_metadata.candidates_token_count or 0,
+            thoughts_tokens=getattr(usage_metadata, 'thoughts_token_count', 0) or 0,
+            cached_tokens=getattr(usage_metadata, 'cached_content_token_count', 0) or 0,
+            user_id=user_id,
+            latency_s=latency_s,
         )
-        logger.info("No API key found, falling back to Vertex AI default auth.")
-    logger.info("GenAI Client initialized.")
-except Exception as e:
-    logger.error(f"Failed to initialize GenAI Client: {e}")
-    genai_client = None
-
-# Tool Definitions for GenAI
-tools_list = [
-    get_current_time,
-    add_numbers,
-    generate_cosplay_image,
-    generate_cosplay_video,
-    research_topic,
-    list_files,
-    read_file,
-    write_file,
-    search_web,
-    fetch_url,
-    identify_anime_screenshot,
-    detect_objects,
-    segment_image,
-    analyze_video,
-    analyze_pdf,
-    upload_to_gcs,
-    download_from_gcs,
-]
-tool_map = {func.__name__: func for func in tools_list}
+    except Exception as e:
+        logger.warning(f"Cost logging failed for {model_name}: {e}")
+
+def apply_prefix_cache(gen_config: Dict[str, Any], model_name: str) -> Dict[str, Any]:
+    """
+    Swap the resent system prompt + tools for a cachedContent when one is available.
+    Falls back to the inline prefix if caching is unsupported or the prefix is too small.
+    """
+    context_cache = get_context_cache()
+    if not context_cache:
+        return gen_config
+    try:
+        cache_name = context_cache.get_or_create(
+            model_name,
+            system_instruction=gen_config["system_instruction"],
+            tools=[get_tool_declarations()],
+            display_name="yuki-chat-prefix",
+        )
+    except Exception as e:
+        logger.warning(f"Context cache lookup failed: {e}")
+        cache_name = None
+    if cache_name:
+        gen_config = {k: v for k, v in gen_config.items() if k not in ("system_instruction", "tools")}
+        gen_config["cached_content"] = cache_name
+    return gen_config
 
 # Structured Output Models
 class YukiResponse(BaseModel):
@@ -202,6 +268,7 @@ class ChatCompletionRequest(BaseModel):
     thinking_level: Optional[str] = Field(default=None, alias="thinkingLevel")
     include_thoughts: Optional[bool] = Field(default=False, alias="includeThoughts")
     thinking_budget: Optional[int] = Field(default=None, alias="thinkingBudget")
+    user: Optional[str] = None
 
     class Config:
         allow_population_by_field_name = True
@@ -306,18 +373,22 @@ async def run_generation_script(input_path: str, prompt: str, request_id: str):
             logger.error(f"[Script Error]: {stderr.decode()}")
             
         logger.info(f"Generation complete for {request_id}")
+        response_cache.invalidate("user-images")
         
     except Exception as e:
         logger.error(f"Failed to run script: {e}")
 
 @app.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(request: ChatRequest):
+    yuki_agent = await asyncio.to_thread(get_yuki_agent)
     # Fallback to GenAI Client if Agent is not initialized (Cloud Run Mode)
     if not yuki_agent:
+        genai_client = await asyncio.to_thread(get_chat_client)
         if not genai_client:
             raise HTTPException(status_code=503, detail="Service Unavailable: Neither Yuki Agent nor GenAI Client initialized.")
         
         try:
+            from google.genai import types
             logger.info(f"☁️ [Cloud Mode] Using GenAI Client for chat: {request.message}")
             # Use Gemini 3 Flash for fast, lightweight responses in Cloud Mode
             response = genai_client.models.generate_content(
@@ -380,8 +451,13 @@ async def list_models():
 
 @app.post("/v1/chat/completions", response_model=ChatCompletionResponse)
 async def chat_completions(request: ChatCompletionRequest):
+    genai_client = await asyncio.to_thread(get_chat_client)
     if not genai_client:
         raise HTTPException(status_code=503, detail="GenAI Client is not initialized")
+    from google.genai import types
+    from core.chat_stream import ChatCompletionStream, SSE_HEADERS, tool_response_content
+    tools_list = await asyncio.to_thread(get_tools_list)
+    tool_executor = get_tool_executor()
 
     print(f"\n{Colors.NEON_PINK}[🦊 YUKI SERVER] Request received for model: {request.model}{Colors.RESET}")
     
@@ -440,13 +516,28 @@ async def chat_completions(request: ChatCompletionRequest):
     # Log Sequence
     logger.info(f"🚀 Dispatching Gemini Request: {len(gemini_contents)} turns | roles: {[c.role for c in gemini_contents]}")
 
-    # 2. Configure Generation
+    # 2. Configure Generation - model / thinking level from the router (rules, load,
+    # budgets); a gemini model in the request caps the route, models outside the
+    # chat ladder are used as-is
     is_yuki = "yuki" in request.model.lower()
-    model_name = "gemini-3-flash-preview"
-    if request.model and "gemini" in request.model and "yuki" not in request.model:
-        model_name = request.model
-    
-    thinking_level = (request.thinking_level or request.reasoning_effort or "medium").upper()
+    requested = request.model if "gemini" in request.model and not is_yuki else None
+    router = get_model_router()
+    route = None
+    if requested is None or requested in {o.model for o in router.ladders["chat"]}:
+        last_user = next((m.content for m in reversed(request.messages)
+                          if m.role == "user" and isinstance(m.content, str)), "")
+        try:
+            route = await asyncio.to_thread(router.route, "chat", text=last_user, user_id=request.user,
+                                            model=requested)
+        except BudgetExceededError as e:
+            raise HTTPException(status_code=429, detail=str(e))
+    else:
+        logger.info(f"Model {requested} is not on the chat ladder; using it unrouted")
+    model_name = route.model if route else requested
+
+    # An explicit thinkingLevel / reasoningEffort wins over the route
+    thinking_level = (request.thinking_level or request.reasoning_effort
+                      or (route.thinking_level if route else None) or "medium").upper()
     
     thinking_config = types.ThinkingConfig(
         include_thoughts=request.include_thoughts,
@@ -457,14 +548,17 @@ async def chat_completions(request: ChatCompletionRequest):
 
     gen_config = {
         "tools": tools_list,
+        # The loop below runs function_calls through tool_executor (concurrently);
+        # left on, the SDK would call the tools itself, one by one, inside generate_content
+        "automatic_function_calling": types.AutomaticFunctionCallingConfig(disable=True),
         "temperature": request.temperature if request.temperature != 0.7 else 1.0, 
         "top_p": request.top_p,
         "candidate_count": 1,
         "system_instruction": YUKI_SYSTEM_PROMPT,
     }
     
-    # Enable thinking/reasoning if applicable
-    if "pro" in model_name.lower() and not is_yuki:
+    # Enable thinking/reasoning if applicable (routed requests always carry the route's level)
+    if route or ("pro" in model_name.lower() and not is_yuki):
         gen_config["thinking_config"] = thinking_config
 
     # Apply Structured Output for Yuki
@@ -473,8 +567,19 @@ async def chat_completions(request: ChatCompletionRequest):
         gen_config["response_json_schema"] = YukiResponse.model_json_schema()
         logger.info("Enabling Structured Output (YukiResponse)")
 
+    gen_config = await asyncio.to_thread(apply_prefix_cache, gen_config, model_name)
     config = types.GenerateContentConfig(**gen_config)
 
+    # 3a. Streaming (SSE) - same tool loop, chunks forwarded as they arrive
+    if request.stream:
+        stream = ChatCompletionStream(
+            genai_client, model_name, gemini_contents, config, tool_executor,
+            response_model=request.model,
+            include_thoughts=request.include_thoughts,
+            on_usage=lambda usage: log_chat_usage(model_name, usage, request.user, "chat_completion_stream"),
+        )
+        return StreamingResponse(stream.events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
     # 3. Execution Loop
     final_text = ""
     finish_reason = "stop"
@@ -485,11 +590,14 @@ async def chat_completions(request: ChatCompletionRequest):
         while turn_count < MAX_TURNS:
             turn_count += 1
             
+            call_start = time.time()
             response = genai_client.models.generate_content(
                 model=model_name,
                 contents=gemini_contents,
                 config=config
             )
+            log_chat_usage(model_name, response.usage_metadata, request.user, "chat_completion",
+                           time.time() - call_start)
             
             if not response.candidates:
                 finish_reason = "error"
@@ -525,28 +633,12 @@ async def chat_completions(request: ChatCompletionRequest):
             
             gemini_contents.append(candidate.content)
             
-            for call in function_calls:
-                func_name = call.name
-                func_args = call.args
-                print(f"{Colors.FOX_FIRE}[⚙️ TOOL EXEC] {func_name}{Colors.RESET}")
-                
-                if func_name in tool_map:
-                    try:
-                        result = tool_map[func_name](**func_args)
-                    except Exception as e:
-                        result = f"Error executing {func_name}: {e}"
-                else:
-                    result = f"Error: Tool {func_name} not found."
-
-                gemini_contents.append(types.Content(
-                    role="tool",
-                    parts=[types.Part(
-                        function_response=types.FunctionResponse(
-                            name=func_name,
-                            response={"result": result}
-                        )
-                    )]
-                ))
+            # Independent calls from one turn run concurrently (bounded pool, per-tool timeouts)
+            report = await tool_executor.run_turn(function_calls, turn=turn_count)
+            print(f"{Colors.FOX_FIRE}[⚙️ TOOL EXEC] {report.summary()}{Colors.RESET}")
+
+            for item in report.calls:
+                gemini_contents.append(tool_response_content(item.name, item.result))
 
     except Exception as e:
         logger.error(f"Error in generation: {e}")
@@ -656,6 +748,7 @@ async def _gemini_pro_image_fallback(content: bytes, mime_type: str, prompt: str
     import base64
     from google.genai import types
     
+    genai_client = get_chat_client()
     if not genai_client:
         return {"status": "error", "message": "GenAI client not initialized"}
     
@@ -712,7 +805,7 @@ def health_check():
     return {
         "status": "online", 
         "system": "Yuki AI Server", 
-        "agent_status": "ready" if yuki_agent else "offline",
+        "agent_status": "ready" if yuki_agent_resource.ready and yuki_agent_resource.get() else "offline",
         "project": PROJECT_ID,
         "config": "stabilized-v2"
     }
@@ -721,13 +814,37 @@ def health_check():
 def debug_info():
     return {
         "reasoning_engine": RE_ID,
-        "model_default": "gemini-3-flash-preview"
+        "model_default": "gemini-3-flash-preview",
+        "context_cache": context_cache_resource.get().get_stats() if context_cache_resource.ready and context_cache_resource.get() else None,
+        "genai_clients": get_client_stats()
     }
 
+@app.get("/ready")
+def readiness(response: Response):
+    """Readiness probe: 503 until the required lazy resources are built; lists what is warm."""
+    report = resources.readiness()
+    if not report["ready"]:
+        response.status_code = 503
+    return report
+
+@app.on_event("startup")
+async def warmup_resources():
+    # Build clients/tools in the background: the server accepts requests (and /health) immediately
+    if os.getenv("YUKI_WARMUP", "1") == "0":
+        return
+    async def warm():
+        results = await asyncio.to_thread(resources.warm, WARMUP_RESOURCES)
+        logger.info(f"Warm-up: {results}")
+    app.state.warmup_task = asyncio.create_task(warm())
+
+@app.on_event("shutdown")
+def close_genai_clients():
+    genai_registry.close_all()
+
 @app.get("/v1/user/images")
 async def get_user_images(email: str):
     try:
-        conn = sqlite3.connect(r"C:\Yuki_Local\Cosplay_Lab\Brain\yuki_memory.db")
+        conn = sqlite3.connect(MEMORY_DB_PATH)
         cursor = conn.cursor()
         
         # 1. Get Subject ID from email
@@ -753,13 +870,13 @@ async def get_user_images(email: str):
         images = []
         for row in rows:
             filename = row[0]
-            # Construct accessible URL
-            url = f"http://localhost:8083/{filename}"
+            # Versioned asset-server URLs: the app can cache them as immutable
             images.append({
                 "filename": filename,
                 "prompt": row[1],
                 "timestamp": row[2],
-                "uri": url,
+                "uri": asset_url(filename),
+                "thumbnail_uri": asset_url(filename, thumb_width=320),
                 "id": filename # use filename as ID
             })
             
@@ -108,12 +108,16 @@ class YukiEvolver:
         Returns score 0.0 - 1.0
         """
         try:
-            # In a real run, we'd do:
-            # if not self.spatial: self.spatial = YukiSpatialAnalyzer()
-            # comparison = await self.spatial.compare_cosplay_accuracy(user_img_path, generated_img_path, "User")
-            # return comparison['accuracy_score'] / 100.0
-            
-            # Mocking for stability/speed in this test script unless explicitly enabled
+            # Offline landmark geometry when both faces are in the Cloud Vision cache (no API calls)
+            from analyzers.identity_scorer import SubjectGeometry, cached_vision_result, score_image
+            user_data = cached_vision_result(Path(user_img_path))
+            if user_data and user_data.get("landmarks_34"):
+                subject = SubjectGeometry.from_landmarks(landmarks_34=user_data["landmarks_34"])
+                result = score_image(subject, generated_img_path)
+                if result.score is not None:
+                    return result.score
+
+            # Mocking for stability/speed in this test script when no landmarks are cached
             return random.uniform(0.7, 0.99)
         except Exception:
             return 0.0
@@ -0,0 +1,76 @@
+import json
+import asyncio
+
+import pytest
+
+from analyzers.analysis_cache import AnalysisCache
+
+
+def test_compute_once_then_memory_disk_and_version_invalidation(tmp_path):
+    image = tmp_path / "dave.jpg"
+    image.write_bytes(b"photo bytes")
+    copy = tmp_path / "dave_copy.jpg"
+    copy.write_bytes(b"photo bytes")
+    db = tmp_path / "analysis.db"
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"estimated_age": 31, "rgb": (1, 2, 3)}
+
+    async def scenario(cache, path, version="1"):
+        return await asyncio.gather(*(cache.get_or_compute("age", version, path, compute) for _ in range(4)))
+
+    cache = AnalysisCache(db)
+    results = asyncio.run(scenario(cache, image))
+    assert len(calls) == 1 and all(r["estimated_age"] == 31 for r in results)
+    assert asyncio.run(scenario(cache, copy))[0] == {"estimated_age": 31, "rgb": [1, 2, 3]}  # same content
+    assert len(calls) == 1 and cache.stats()["age"]["memory_hits"] == 4
+
+    other_process = AnalysisCache(db)
+    assert asyncio.run(other_process.get_or_compute("age", "1", image, compute))["estimated_age"] == 31
+    assert other_process.stats()["age"] == {"memory_hits": 0, "disk_hits": 1, "misses": 0, "stores": 0, "hit_rate": 1.0}
+
+    bumped = AnalysisCache(db)
+    asyncio.run(bumped.get_or_compute("age", "2", image, compute))
+    assert len(calls) == 2
+    rows = bumped.conn.execute("SELECT version FROM analysis_results").fetchall()
+    assert rows == [("2",)]
+
+
+def test_facial_analyzer_caches_only_complete_results(tmp_path):
+    pytest.importorskip("PIL")
+    pytest.importorskip("numpy")
+    pytest.importorskip("google.genai")
+    from PIL import Image
+    from yuki_facial_analyzer import YukiFacialAnalyzer
+
+    image = tmp_path / "subject.png"
+    Image.new("RGB", (8, 8), (200, 160, 130)).save(image)
+
+    class Response:
+        text = json.dumps({"color": "brown", "shape": "oval", "detected": "male"})
+
+    class Models:
+        calls = 0
+        fail = True
+
+        def generate_content(self, **kwargs):
+            Models.calls += 1
+            if Models.fail and Models.calls == 1:
+                raise RuntimeError("429 resource exhausted")
+            return Response()
+
+    analyzer = YukiFacialAnalyzer(cache=AnalysisCache(tmp_path / "analysis.db"))
+    analyzer.client = type("Client", (), {"models": Models()})()
+
+    first = asyncio.run(analyzer.analyze_all_features(image))
+    assert Models.calls == 7 and first["complete"] is False
+    assert all("_fallback" not in v for v in first.values() if isinstance(v, dict))
+
+    Models.fail = False
+    second = asyncio.run(analyzer.analyze_all_features(image))
+    third = asyncio.run(analyzer.analyze_all_features(image))
+    assert Models.calls == 14 and second["complete"] and third == second
+    assert analyzer.cache.stats()["facial"]["hit_rate"] == pytest.approx(1 / 3, abs=1e-3)
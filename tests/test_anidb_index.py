@@ -0,0 +1,47 @@
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from database.clients.anidb_client import AniDBClient, normalize_title
+
+SAMPLE_DUMP = """<?xml version="1.0" encoding="UTF-8"?>
+<animetitles>
+<anime aid="1"><title type="main" xml:lang="x-jat">Shingeki no Kyojin</title><title type="official" xml:lang="en">Attack on Titan</title></anime>
+<anime aid="2"><title type="main" xml:lang="x-jat">Ookami to Koushinryou</title><title type="official" xml:lang="en">Spice and Wolf</title></anime>
+<anime aid="3"><title type="main" xml:lang="x-jat">Seikai no Monshou</title><title type="official" xml:lang="en">Crest of the Stars</title></anime>
+</animetitles>
+"""
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(AniDBClient, "CACHE_FILE", tmp_path / "animetitles.xml")
+    monkeypatch.setattr(AniDBClient, "INDEX_FILE", tmp_path / "animetitles.idx.sqlite")
+    (tmp_path / "animetitles.xml").write_text(SAMPLE_DUMP, encoding="utf-8")
+    c = AniDBClient()
+    yield c
+    c.close()
+
+
+def test_normalize_title_folds_romanization():
+    assert normalize_title("Ōkami") == normalize_title("Ookami") == normalize_title("okami")
+    assert normalize_title("Shingeki no Kyojin") == normalize_title("singeki no kyozin")
+
+
+def test_build_index_is_reused_for_same_dump(client):
+    assert client.build_index() == 3
+    assert client.index_is_current()
+
+
+def test_search_index(client):
+    client.build_index()
+    assert [t.aid for t in client.search_index("attack")] == [1]
+    assert [t.aid for t in client.search_index("Ōkami to Kōshinryō")] == [2]
+    assert [t.aid for t in client.search_index("crest of teh stars")] == [3]
+    assert client.search_index("xyz") == []
+
+
+def test_iter_titles_streams_primary_titles(client):
+    assert [t.primary_title for t in client.iter_titles()] == [
+        "Shingeki no Kyojin", "Ookami to Koushinryou", "Seikai no Monshou"
+    ]
@@ -0,0 +1,98 @@
+import json
+
+import pytest
+
+from anime_record_store import RecordStore, RecordMap, anime_index, character_index
+
+
+def make_map(store, kind="character"):
+    return RecordMap(
+        store, kind,
+        from_dict=dict, to_dict=dict,
+        index=character_index if kind == "character" else anime_index,
+    )
+
+
+def test_put_lookup_children_and_ranking(tmp_path):
+    store = RecordStore(tmp_path / "db.db")
+    anime, chars = make_map(store, "anime"), make_map(store)
+    anime.put("a1", {"id": "a1", "title_english": "Bleach", "rankings": {"myanimelist": {"rank": 40}}})
+    anime.put("a2", {"id": "a2", "title_english": "Monster", "title_romaji": "Monsutaa",
+                     "rankings": {"myanimelist": {"rank": 10}, "imdb": {"rank": 20}}})
+    chars.put("c1", {"id": "c1", "name_full": "Ichigo Kurosaki", "anime_id": "a1"})
+    chars.put("c2", {"id": "c2", "name_full": "Rukia Kuchiki", "anime_id": "a1"})
+
+    assert store.lookup("anime", "MONSUTAA") == "a2"
+    assert store.lookup("character", "ichigo kurosaki") == "c1"
+    assert store.children("character", "a1") == ["c1", "c2"]
+    assert store.top_ranked("anime", 1) == ["a2"]
+
+    # Renaming drops the old alias
+    chars["c1"]["name_full"] = "Ichigo"
+    chars.flush()
+    assert store.lookup("character", "ichigo kurosaki") is None
+    assert store.lookup("character", "ichigo") == "c1"
+
+
+def test_reopen_is_lazy_and_flush_writes_only_changes(tmp_path):
+    store = RecordStore(tmp_path / "db.db")
+    chars = make_map(store)
+    for i in range(50):
+        chars.put(f"c{i}", {"id": f"c{i}", "name_full": f"Name {i}", "anime_id": "a"})
+    store.close()
+
+    store = RecordStore(tmp_path / "db.db")
+    chars = make_map(store)
+    assert len(chars) == 50 and not chars._cache
+    assert "c7" in chars and not chars._cache
+
+    chars["c7"]["role"] = "Main"
+    chars.get("c8")
+    assert len(chars._cache) == 2
+    assert chars.flush() == 1
+    assert chars.flush() == 0
+    assert store.get("character", "c7")[0]["role"] == "Main"
+
+
+def test_unsynced_tracks_versions(tmp_path):
+    store = RecordStore(tmp_path / "db.db")
+    chars = make_map(store)
+    chars.put("c1", {"id": "c1", "name_full": "A"})
+    chars.put("c2", {"id": "c2", "name_full": "B"})
+    for record_id, _, version in store.unsynced("character"):
+        store.mark_synced("character", record_id, version)
+    assert store.unsynced("character") == []
+
+    chars["c2"]["name_full"] = "B2"
+    chars.flush()
+    [(record_id, payload, version)] = store.unsynced("character")
+    assert record_id == "c2" and version == 2 and json.loads(payload)["name_full"] == "B2"
+
+
+def test_anime_database_migrates_legacy_json(tmp_path):
+    pytest.importorskip("google.genai")
+    from anime_database import AnimeDatabase, Character, CharacterFaceSchema
+
+    legacy = tmp_path / "anime_database.json"
+    legacy.write_text(json.dumps({
+        "anime": {"a1": {"id": "a1", "title_english": "Bleach", "title_romaji": None, "title_native": None,
+                         "year": 2004, "type": "TV", "episodes": 366, "status": "Finished", "genres": [],
+                         "studio": None, "rankings": {"myanimelist": {"rank": 5}}, "character_ids": []}},
+        "characters": {"c1": {"id": "c1", "name_full": "Ichigo Kurosaki", "name_given": "Ichigo",
+                              "name_family": "Kurosaki", "aliases": [], "anime_id": "a1", "role": "Main",
+                              "face_schema": {"extracted": True, "schema_data": {"k": 1}}}},
+    }))
+
+    db = AnimeDatabase(str(legacy))
+    character = db.search_character("ichigo kurosaki")
+    assert isinstance(character.face_schema, CharacterFaceSchema) and character.face_schema.extracted
+    assert db.get_top_anime(5)[0].rankings.get_average_rank() == 5
+
+    db.add_character(Character(id="", name_full="Rukia", name_given="Rukia", name_family="",
+                               aliases=[], anime_id="a1", role="Supporting"))
+    character.age = 15
+    assert db.save() == 1
+
+    reopened = AnimeDatabase(str(legacy))
+    assert [c.name_full for c in reopened.get_characters_for_anime("a1")] == ["Ichigo Kurosaki", "Rukia"]
+    assert reopened.characters["c1"].age == 15
@@ -0,0 +1,138 @@
+import os
+import asyncio
+import threading
+
+import pytest
+
+from assets_server import (
+    IMMUTABLE_CACHE, REVALIDATE_CACHE, ThumbnailCache, asset_url, asset_version,
+    cache_control_for, create_app, resolve_asset, snap_width,
+)
+
+
+def test_version_changes_with_file(tmp_path):
+    render = tmp_path / "cosplay_frieren.png"
+    render.write_bytes(b"a" * 10)
+    first = asset_version(render)
+    render.write_bytes(b"b" * 20)
+    os.utime(render, ns=(1, 2))
+    assert asset_version(render) != first
+    assert asset_version(tmp_path / "missing.png") is None
+
+
+def test_asset_urls(tmp_path):
+    (tmp_path / "sub dir").mkdir()
+    (tmp_path / "sub dir" / "a.png").write_bytes(b"x")
+    version = asset_version(tmp_path / "sub dir" / "a.png")
+
+    url = asset_url("sub dir/a.png", directory=str(tmp_path), base_url="http://h")
+    assert url == f"http://h/sub%20dir/a.png?v={version}"
+    thumb = asset_url("sub dir/a.png", directory=str(tmp_path), base_url="http://h", thumb_width=320)
+    assert thumb == f"http://h/thumb/sub%20dir/a.png?w=320&v={version}"
+    assert asset_url("gone.png", directory=str(tmp_path), base_url="http://h") == "http://h/gone.png"
+
+
+def test_resolve_asset_stays_inside_root(tmp_path):
+    root = (tmp_path / "renders").resolve()
+    root.mkdir()
+    (root / "a.png").write_bytes(b"x")
+    (tmp_path / "secret.txt").write_text("no")
+
+    assert resolve_asset(root, "a.png") == root / "a.png"
+    assert resolve_asset(root, "/a.png") == root / "a.png"
+    assert resolve_asset(root, "../secret.txt") is None
+    assert resolve_asset(root, ".") is None
+    assert resolve_asset(root, "missing.png") is None
+
+
+def test_cache_policy_and_width_snapping():
+    assert cache_control_for("abc", "abc") == IMMUTABLE_CACHE
+    assert cache_control_for("old", "abc") == REVALIDATE_CACHE
+    assert cache_control_for(None, "abc") == REVALIDATE_CACHE
+    assert [snap_width(w) for w in (1, 300, 320, 5000)] == [128, 320, 320, 1024]
+
+
+def make_render(root, name="cosplay_frieren.png", size=(640, 480)):
+    Image = pytest.importorskip("PIL.Image")
+    root.mkdir(parents=True, exist_ok=True)
+    Image.new("RGB", size, (200, 30, 40)).save(root / name)
+    return root / name
+
+
+def with_client(tmp_path, check):
+    pytest.importorskip("aiohttp")
+    from aiohttp.test_utils import TestClient, TestServer
+
+    async def main():
+        app = create_app(str(tmp_path / "renders"), str(tmp_path / "thumbs"))
+        async with TestClient(TestServer(app)) as client:
+            await check(client, app)
+
+    asyncio.run(main())
+
+
+def test_range_etag_and_cache_headers(tmp_path):
+    render = make_render(tmp_path / "renders")
+    body = render.read_bytes()
+    version = asset_version(render)
+
+    async def check(client, app):
+        response = await client.get(f"/cosplay_frieren.png?v={version}")
+        assert response.status == 200 and await response.read() == body
+        assert response.headers["Cache-Control"] == IMMUTABLE_CACHE
+        etag = response.headers["ETag"]
+
+        response = await client.get("/cosplay_frieren.png", headers={"If-None-Match": etag})
+        assert response.status == 304 and response.headers["Cache-Control"] == REVALIDATE_CACHE
+
+        response = await client.get("/cosplay_frieren.png", headers={"Range": "bytes=0-99"})
+        assert response.status == 206 and await response.read() == body[:100]
+        assert response.headers["Content-Range"] == f"bytes 0-99/{len(body)}"
+
+        assert (await client.get("/missing.png")).status == 404
+
+    with_client(tmp_path, check)
+
+
+def test_concurrent_thumbnail_requests_share_one_render(tmp_path):
+    make_render(tmp_path / "renders")
+
+    async def check(client, app):
+        responses = await asyncio.gather(*(client.get("/thumb/cosplay_frieren.png?w=300") for _ in range(6)))
+        bodies = {await r.read() for r in responses}
+        assert [r.status for r in responses] == [200] * 6 and len(bodies) == 1
+        assert bodies.pop()[8:12] == b"WEBP"
+        assert app["thumbnails"].stats["generated"] == 1
+        assert not list((tmp_path / "thumbs").glob("*.tmp"))
+
+    with_client(tmp_path, check)
+
+
+def test_cancelled_request_does_not_start_a_second_render(tmp_path, monkeypatch):
+    import assets_server
+
+    source = make_render(tmp_path / "renders")
+    release = threading.Event()
+    real_render = assets_server.render_thumbnail
+    calls = []
+
+    def slow_render(*args, **kwargs):
+        calls.append(args)
+        release.wait(5)
+        real_render(*args, **kwargs)
+
+    monkeypatch.setattr(assets_server, "render_thumbnail", slow_render)
+    thumbs = ThumbnailCache(str(tmp_path / "thumbs"))
+
+    async def main():
+        first = asyncio.create_task(thumbs.get(source, 320))
+        await asyncio.sleep(0.05)
+        first.cancel()                      # the request that started the render goes away
+        second = asyncio.create_task(thumbs.get(source, 320))
+        await asyncio.sleep(0.05)
+        release.set()
+        return await second
+
+    thumb = asyncio.run(main())
+    thumbs.close()
+    assert len(calls) == 1 and thumb.exists() and not thumbs._inflight
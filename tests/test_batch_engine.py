@@ -0,0 +1,159 @@
+import json
+import asyncio
+
+import pytest
+
+from yuki_batch_engine import BatchEngine, BatchSpec, PipelineBackend, is_transient
+
+
+class CountingAnalysis:
+    name = "counting"
+    calls = []
+
+    async def analyze(self, subject):
+        CountingAnalysis.calls.append(subject["name"])
+        await asyncio.sleep(0.01)
+        return {"age": 30}
+
+    def instructions(self, analysis, cell):
+        return f"age {analysis['age']}"
+
+
+class FakeBackend:
+    active = {}
+    peak = {}
+    fail_once = set()
+
+    def __init__(self, model):
+        self.model = model
+
+    async def generate(self, cell, instructions, output_path):
+        assert instructions == "age 30"
+        active = FakeBackend.active
+        active[self.model.id] = active.get(self.model.id, 0) + 1
+        active["*"] = active.get("*", 0) + 1
+        for k in (self.model.id, "*"):
+            FakeBackend.peak[k] = max(FakeBackend.peak.get(k, 0), active[k])
+        await asyncio.sleep(0.01)
+        active[self.model.id] -= 1
+        active["*"] -= 1
+        if cell.key in FakeBackend.fail_once:
+            FakeBackend.fail_once.discard(cell.key)
+            raise RuntimeError("content blocked")
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.write_bytes(cell.prompt.encode())
+        return output_path
+
+
+def make_spec(tmp_path, **overrides):
+    data = {
+        "name": "test",
+        "output_dir": str(tmp_path / "out"),
+        "analysis": "counting",
+        "concurrency": 3,
+        "model_concurrency": {"slow": 1},
+        "subjects": [{"name": "Drake"}, {"name": "Yuki"}],
+        "targets": [{"character": "Subaru Natsuki", "anime": "Re:Zero"}, {"character": "Shinji Ikari", "anime": "Evangelion"}],
+        "models": [{"id": "fast", "backend": "fake"}, {"id": "slow", "backend": "fake"}],
+        "variants": [{"name": "2k", "prompt": "2K"}, {"name": "4k", "prompt": "4K"}],
+        **overrides,
+    }
+    return BatchSpec.from_dict(data)
+
+
+def run(spec, **kwargs):
+    engine = BatchEngine(spec, backends={"fake": FakeBackend}, analysis_providers={"counting": CountingAnalysis},
+                         retry_base_delay=0)
+    return asyncio.run(engine.run(**kwargs))
+
+
+def test_matrix_runs_with_one_analysis_per_subject_and_limits(tmp_path):
+    CountingAnalysis.calls = []
+    FakeBackend.peak = {}
+    report = run(make_spec(tmp_path))
+
+    assert (report.total, report.done, report.failed, report.skipped) == (16, 16, 0, 0)
+    assert sorted(CountingAnalysis.calls) == ["Drake", "Yuki"]
+    assert FakeBackend.peak["slow"] == 1 and FakeBackend.peak["*"] <= 3
+    assert (tmp_path / "out" / "fast" / "drake_subaru_natsuki_4k.png").read_bytes() == b"Cosplay of Subaru Natsuki from Re:Zero. 4K"
+
+
+def test_rerun_skips_done_retries_failed_and_reruns_changed(tmp_path):
+    CountingAnalysis.calls = []
+    FakeBackend.fail_once = {"drake|shinji_ikari|slow|2k|0"}
+    first = run(make_spec(tmp_path))
+    assert (first.done, first.failed) == (15, 1)
+
+    second = run(make_spec(tmp_path))
+    assert (second.skipped, second.done, second.failed) == (15, 1, 0)
+    assert second.analyses_run == 0 and second.analyses_reused == 1
+    assert sorted(CountingAnalysis.calls) == ["Drake", "Yuki"]
+
+    variants = [{"name": "2k", "prompt": "2K"}, {"name": "4k", "prompt": "4K, 8k textures"}]
+    changed = run(make_spec(tmp_path, variants=variants))
+    assert (changed.skipped, changed.done) == (8, 8)
+
+    (tmp_path / "out" / "slow" / "yuki_shinji_ikari_2k.png").unlink()
+    assert run(make_spec(tmp_path, variants=variants), dry_run=True).skipped == 15
+
+
+class FakePipeline:
+    """Names its own output file and keeps last_error on the instance, like V12.5 / V14."""
+
+    async def run(self, subject_name, target_character, subject_dir, output_dir, reference_path=None, bypass_lock=False):
+        self.last_error = None
+        await asyncio.sleep(0.01)
+        if not bypass_lock:
+            (output_dir / f"lock_{subject_name.lower()}.json").write_text("{}")
+        if "Shinji" in target_character:
+            self.last_error = "Stage 4: Image generation returned no data."
+            return None
+        (output_dir / f"render_{reference_path.stem}.png").write_bytes(target_character.encode())
+
+
+def test_pipeline_backend_records_written_file_and_needs_references(tmp_path):
+    models = [{"id": "v12_5", "backend": "pipeline_v12_5"}]
+    with pytest.raises(ValueError, match="Subaru Natsuki"):
+        make_spec(tmp_path, models=models, targets=[{"character": "Shinji Ikari", "reference": "refs/shinji.jpg"},
+                                                    {"character": "Subaru Natsuki"}])
+
+    refs = tmp_path / "refs"
+    refs.mkdir()
+    targets = []
+    for name in ("Subaru Natsuki", "Shinji Ikari", "Kazuma Satou"):
+        (refs / f"{name.split()[0].lower()}.jpg").write_bytes(b"ref")
+        targets.append({"character": name, "reference": str(refs / f"{name.split()[0].lower()}.jpg")})
+    spec = make_spec(tmp_path, models=models, targets=targets, variants=[{"name": "default"}],
+                     subjects=[{"name": "Drake", "dir": str(tmp_path)}])
+    engine = BatchEngine(spec, backends={"pipeline_v12_5": lambda m: PipelineBackend(m, FakePipeline)},
+                         analysis_providers={"counting": CountingAnalysis}, retry_base_delay=0)
+    report = asyncio.run(engine.run())
+
+    assert (report.done, report.failed) == (2, 1)
+    assert "no data" in report.errors["drake|shinji_ikari|v12_5|default|0"]
+    out = tmp_path / "out" / "v12_5"
+    assert (out / "drake_subaru_natsuki_default.png").read_bytes().startswith(b"Cosplay of Subaru")
+    assert (out / "lock_drake.json").exists() and not any((out / ".work").iterdir())
+    assert engine.manifest.cells["drake|kazuma_satou|v12_5|default|0"]["output"].endswith("drake_kazuma_satou_default.png")
+
+
+def test_only_transient_errors_are_retried_and_output_dir_follows_the_spec(tmp_path):
+    class ApiError(Exception):
+        def __init__(self, code, status):
+            super().__init__(f"{code} {status}")
+            self.code, self.status = code, status
+
+    assert is_transient(ApiError(429, "RESOURCE_EXHAUSTED"))
+    assert is_transient(ApiError(None, "DEADLINE_EXCEEDED"))
+    assert is_transient(RuntimeError("503 Service Unavailable"))
+    assert is_transient(TimeoutError())
+    assert not is_transient(RuntimeError("Failed to generate image"))
+    assert not is_transient(ApiError(400, "INVALID_ARGUMENT"))
+    assert not is_transient(ValueError("corrupted PNG at byte 4290"))
+
+    jobs = tmp_path / "jobs"
+    jobs.mkdir()
+    (jobs / "job.json").write_text(json.dumps({
+        "name": "drake", "output_dir": "renders", "subjects": ["Drake"],
+        "targets": ["Makima"], "models": ["gemini-3-pro-image-preview"]}), encoding="utf-8")
+    assert BatchSpec.from_file(jobs / "job.json").output_dir == jobs / "renders"
@@ -0,0 +1,107 @@
+import json
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("google.genai")
+
+from core.chat_stream import ChatCompletionStream
+from core.tool_executor import ToolExecutor
+
+
+def part(text=None, thought=False, call=None):
+    return SimpleNamespace(text=text, thought=thought, function_call=call)
+
+
+def chunk(*parts, usage=None):
+    content = SimpleNamespace(parts=list(parts))
+    return SimpleNamespace(candidates=[SimpleNamespace(content=content)] if parts else [], usage_metadata=usage)
+
+
+def usage(prompt, completion, thoughts=0):
+    return SimpleNamespace(prompt_token_count=prompt, candidates_token_count=completion, thoughts_token_count=thoughts)
+
+
+class FakeClient:
+    """client.aio.models.generate_content_stream returning one scripted turn per call."""
+
+    def __init__(self, turns):
+        self.turns = list(turns)
+        self.requests = []
+        self.aio = SimpleNamespace(models=SimpleNamespace(generate_content_stream=self.generate_content_stream))
+
+    async def generate_content_stream(self, model, contents, config):
+        self.requests.append(len(contents))
+        turn = self.turns.pop(0)
+        if isinstance(turn, Exception):
+            raise turn
+
+        async def chunks():
+            for item in turn:
+                yield item
+        return chunks()
+
+
+def collect(stream):
+    async def run():
+        return [event async for event in stream.events()]
+    frames = asyncio.run(run())
+    assert all(f.startswith("data: ") and f.endswith("\n\n") for f in frames)
+    assert frames[-1] == "data: [DONE]\n\n"
+    return [json.loads(f[len("data: "):]) for f in frames[:-1]]
+
+
+def deltas(events, key):
+    return [e["choices"][0]["delta"][key] for e in events if e["choices"] and key in e["choices"][0]["delta"]]
+
+
+def test_text_chunks_are_framed_and_end_with_usage_and_done():
+    client = FakeClient([[chunk(part("Kon")), chunk(part("thinking...", thought=True)),
+                          chunk(part("nichiwa!"), usage=usage(10, 4, 2))]])
+    logged = []
+    stream = ChatCompletionStream(client, "gemini-3-flash-preview", [], None, ToolExecutor({}),
+                                  response_model="yuki", on_usage=logged.append)
+    events = collect(stream)
+
+    assert {e["id"] for e in events} == {stream.completion_id}
+    assert all(e["object"] == "chat.completion.chunk" and e["model"] == "yuki" for e in events)
+    assert events[0]["choices"][0]["delta"] == {"role": "assistant", "content": ""}
+    assert deltas(events, "content")[1:] == ["Kon", "nichiwa!"]
+    assert deltas(events, "reasoning_content") == []              # include_thoughts off
+    assert events[-2]["choices"][0]["finish_reason"] == "stop"
+    assert events[-1]["usage"] == {"prompt_tokens": 10, "completion_tokens": 4, "thoughts_tokens": 2, "total_tokens": 16}
+    assert len(logged) == 1
+
+
+def test_tool_turn_mid_stream_runs_tools_and_continues():
+    call = SimpleNamespace(name="add_numbers", args={"a": 2, "b": 3})
+    client = FakeClient([
+        [chunk(part("Let me add that."), part(call=call), usage=usage(20, 5))],
+        [chunk(part("It's 5."), usage=usage(30, 3))],
+    ])
+    contents = [SimpleNamespace(role="user")]
+    logged = []
+    stream = ChatCompletionStream(client, "m", contents, None, ToolExecutor({"add_numbers": lambda a, b: a + b}),
+                                  include_thoughts=True, on_usage=logged.append)
+    events = collect(stream)
+
+    (tool_call,) = deltas(events, "tool_calls")
+    assert tool_call[0]["function"] == {"name": "add_numbers", "arguments": '{"a": 2, "b": 3}'}
+    (tool_result,) = deltas(events, "tool_result")
+    assert (tool_result["name"], tool_result["status"], tool_result["result"]) == ("add_numbers", "ok", 5)
+    assert deltas(events, "content")[1:] == ["Let me add that.", "It's 5."]
+    assert [c.role for c in contents] == ["user", "model", "tool"] and client.requests == [1, 3]
+    assert events[-1]["usage"]["total_tokens"] == 58 and len(logged) == 2
+
+
+def test_errors_become_an_error_event_before_done():
+    stream = ChatCompletionStream(FakeClient([RuntimeError("429 RESOURCE_EXHAUSTED")]), "m", [], None, ToolExecutor({}))
+    events = collect(stream)
+    assert deltas(events, "content")[-1] == "Internal Error: 429 RESOURCE_EXHAUSTED"
+    assert events[-2]["choices"][0]["finish_reason"] == "error"
+
+    empty = ChatCompletionStream(FakeClient([[chunk()]]), "m", [], None, ToolExecutor({}))
+    events = collect(empty)
+    assert deltas(events, "content")[-1] == "Error: No response from the model."
+    assert events[-2]["choices"][0]["finish_reason"] == "error"
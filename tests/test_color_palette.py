@@ -0,0 +1,72 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+PILImage = pytest.importorskip("PIL.Image")
+
+from analyzers.analysis_cache import AnalysisCache
+from analyzers.color_palette import extract_palette, extract_region_palettes, lab_to_srgb, palette_distance, srgb_to_lab
+from analyzers.compact_masks import CompactMask
+
+
+def two_tone(path, left=(200, 30, 40), right=(20, 40, 160), split=0.75, size=(200, 100)):
+    arr = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+    cut = int(size[0] * split)
+    arr[:, :cut], arr[:, cut:] = left, right
+    PILImage.fromarray(arr).save(path)
+    return path
+
+
+def test_lab_roundtrip():
+    rgb = np.random.default_rng(0).integers(0, 256, size=(500, 3), dtype=np.uint8)
+    assert np.abs(lab_to_srgb(srgb_to_lab(rgb)).astype(int) - rgb).max() <= 1
+    assert np.allclose(srgb_to_lab(np.array([[255, 255, 255]])), [[100, 0, 0]], atol=0.01)
+
+
+def test_palette_coverage_regions_cache_and_distance(tmp_path):
+    cache = AnalysisCache(tmp_path / "cache.db")
+    image = two_tone(tmp_path / "ref.png")
+
+    palette = extract_palette(image, k=4, cache=cache)
+    assert [s.hex for s in palette] == ["#c81e28", "#1428a0"]
+    assert [s.coverage for s in palette] == [0.75, 0.25]
+
+    box = extract_palette(image, region=(0, 160, 100, 200), k=3, cache=cache)
+    assert [s.hex for s in box] == ["#1428a0"]
+    half = extract_palette(image, region=(0, 80, 50, 100), frame_size=(100, 50), k=3, cache=cache)
+    assert [s.hex for s in half] == ["#1428a0"]
+
+    crop = np.zeros((100, 200), dtype=np.uint8)
+    crop[:, :10] = 255
+    masked = extract_palette(image, region=CompactMask.from_crop("sleeve", 0, 0, crop, (100, 200)), cache=cache)
+    assert [s.hex for s in masked] == ["#c81e28"]
+
+    assert extract_palette(image, k=4, cache=cache) == palette
+    assert cache.stats()["palette"]["memory_hits"] == 1
+
+    same = two_tone(tmp_path / "gen_same.png", split=0.7)
+    swapped = two_tone(tmp_path / "gen_swapped.png", split=0.25)
+    other = two_tone(tmp_path / "gen_other.png", left=(240, 240, 240), right=(10, 10, 10))
+    d_same, d_swapped, d_other = (palette_distance(palette, extract_palette(p, k=4, cache=cache)) for p in (same, swapped, other))
+    assert d_same < d_swapped < d_other and d_same < 10
+
+
+def test_region_palettes_decode_once_and_keep_duplicate_labels(tmp_path, monkeypatch):
+    from types import SimpleNamespace
+    import analyzers.color_palette as color_palette
+
+    cache = AnalysisCache(tmp_path / "cache.db")
+    image = two_tone(tmp_path / "ref.png")
+    gloves = [SimpleNamespace(label="glove", y1=0, x1=0, y2=50, x2=10),
+              SimpleNamespace(label="glove", y1=0, x1=85, y2=50, x2=100),
+              SimpleNamespace(label="sleeve", y1=0, x1=20, y2=25, x2=30)]
+    decodes = []
+    real = color_palette.frame_array
+    monkeypatch.setattr(color_palette, "frame_array", lambda img, frame=None: decodes.append(frame) or real(img, frame))
+
+    palettes = extract_region_palettes(image, gloves, k=2, frame_size=(100, 50), cache=cache)
+    assert list(palettes) == ["glove", "glove #2", "sleeve"]
+    assert [palettes["glove"][0].hex, palettes["glove #2"][0].hex] == ["#c81e28", "#1428a0"]
+    assert decodes == [(100, 50)]
+
+    assert extract_region_palettes(image, gloves, k=2, frame_size=(100, 50), cache=cache) == palettes
+    assert decodes == [(100, 50)]            # all cached: no decode at all
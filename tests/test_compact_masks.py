@@ -0,0 +1,72 @@
+import io
+import json
+import base64
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from analyzers.compact_masks import CompactMask, iou_matrix, load_masks, rle_decode, rle_encode, save_masks, union
+
+
+def random_masks(rng, n, frame=(120, 160)):
+    masks = []
+    for i in range(n):
+        y0, x0 = rng.integers(0, frame[0] - 20), rng.integers(0, frame[1] - 20)
+        h, w = rng.integers(1, frame[0] - y0), rng.integers(1, frame[1] - x0)
+        crop = rng.integers(0, 256, size=(h, w), dtype=np.uint8)
+        masks.append(CompactMask.from_crop(f"piece_{i}", int(y0), int(x0), crop, frame))
+    return masks
+
+
+def test_set_operations_match_full_frame_reference():
+    rng = np.random.default_rng(3)
+    a, b = random_masks(rng, 6), random_masks(rng, 5)
+    full_a = [m.to_full(binary=True) for m in a]
+    full_b = [m.to_full(binary=True) for m in b]
+
+    expected = np.array([[(fa & fb).sum() / (fa | fb).sum() if (fa | fb).any() else 0.0 for fb in full_b] for fa in full_a])
+    assert np.allclose(iou_matrix(a, b), expected)
+
+    merged = union(a)
+    assert np.array_equal(merged.to_full(binary=True), np.logical_or.reduce(full_a))
+    assert merged.nbytes <= 120 * 160
+
+    for m in a:
+        assert np.array_equal(rle_decode(rle_encode(m.binary()), m.crop.shape), m.binary())
+        assert np.array_equal(CompactMask.from_rle(m.label, m.to_rle()).binary(), m.binary())
+        assert np.array_equal(CompactMask.from_full(m.label, m.to_full(binary=True).astype(np.uint8) * 255).to_full(binary=True),
+                              m.to_full(binary=True))
+
+
+def test_save_load_roundtrip(tmp_path):
+    masks = random_masks(np.random.default_rng(5), 4)
+    save_masks(tmp_path / "packed.npz", masks)
+    save_masks(tmp_path / "soft.npz", masks, soft=True)
+
+    packed, soft = load_masks(tmp_path / "packed.npz"), load_masks(tmp_path / "soft.npz")
+    for original, p, s in zip(masks, packed, soft):
+        assert p.label == original.label and p.box == original.box and p.frame_shape == original.frame_shape
+        assert np.array_equal(p.binary(), original.binary())
+        assert np.array_equal(s.crop, original.crop)
+    save_masks(tmp_path / "empty.npz", [])
+    assert load_masks(tmp_path / "empty.npz") == []
+
+
+def test_spatial_analyzer_keeps_only_crops():
+    PIL = pytest.importorskip("PIL.Image")
+    pytest.importorskip("google.genai")
+    from yuki_spatial_analyzer import SegmentationMask, YukiSpatialAnalyzer
+
+    png = io.BytesIO()
+    PIL.new("L", (10, 10), 255).save(png, format="PNG")
+    item = {"box_2d": [100, 200, 300, 600], "label": "jacket",
+            "mask": "data:image/png;base64," + base64.b64encode(png.getvalue()).decode()}
+    analyzer = YukiSpatialAnalyzer.__new__(YukiSpatialAnalyzer)
+    [mask] = analyzer._parse_segmentation_masks(json.dumps([item]), 1000, 2000)
+
+    assert isinstance(mask, SegmentationMask) and mask.crop.shape == (200, 800)
+    assert mask.mask.shape == (1000, 2000) and mask.area == 200 * 800
+    assert "mask" not in mask.metadata
+    result = YukiSpatialAnalyzer.match_masks([mask], [mask])
+    assert result["mean_iou"] == 1.0 and result["unmatched"] == []
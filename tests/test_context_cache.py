@@ -0,0 +1,83 @@
+import time
+import threading
+
+from core.context_cache import ContextCacheManager, LocalCacheBackend
+
+PROMPT = "You are Yuki. " * 2000  # ~7k tokens, above min_tokens
+
+
+def make_manager(**kwargs):
+    backend = LocalCacheBackend()
+    return ContextCacheManager(backend=backend, **kwargs), backend
+
+
+def test_reuses_cache_for_same_prefix():
+    cache, backend = make_manager()
+    first = cache.get_or_create("gemini-3-flash-preview", system_instruction=PROMPT)
+    second = cache.get_or_create("gemini-3-flash-preview", system_instruction=PROMPT)
+    assert first and first == second
+    assert backend.calls == [f"create:{first}"]
+    assert cache.get_stats()["hits"] == 1
+
+
+def test_separate_cache_per_model_and_prefix():
+    cache, _ = make_manager()
+    a = cache.get_or_create("gemini-3-flash-preview", system_instruction=PROMPT)
+    b = cache.get_or_create("gemini-3-pro-preview", system_instruction=PROMPT)
+    c = cache.get_or_create("gemini-3-flash-preview", system_instruction=PROMPT + "v2")
+    assert len({a, b, c}) == 3
+
+
+def test_small_prefix_falls_back_inline():
+    cache, backend = make_manager(min_tokens=1024)
+    assert cache.get_or_create("gemini-3-flash-preview", system_instruction="short") is None
+    assert backend.calls == []
+    assert cache.get_stats()["fallbacks"] == 1
+
+
+def test_extends_near_expiry_and_recreates_after_intervals():
+    cache, backend = make_manager(ttl_seconds=120, refresh_margin_seconds=60, cache_intervals=3)
+    name = cache.get_or_create("m", system_instruction=PROMPT)
+    entry = next(iter(cache._entries.values()))
+    entry.expire_time = time.time() + 10
+    assert cache.get_or_create("m", system_instruction=PROMPT) == name
+    assert backend.calls[-1] == f"extend:{name}"
+
+    cache.get_or_create("m", system_instruction=PROMPT)
+    fresh = cache.get_or_create("m", system_instruction=PROMPT)
+    assert fresh != name
+    assert f"delete:{name}" in backend.calls
+
+
+def test_backend_refusal_is_remembered():
+    cache, backend = make_manager(min_tokens=0)
+    backend.min_tokens = 10**9
+    assert cache.get_or_create("m", system_instruction=PROMPT) is None
+    assert cache.get_or_create("m", system_instruction=PROMPT) is None
+    assert backend.calls == []
+
+
+def test_concurrent_callers_share_one_create_without_blocking_other_prefixes():
+    cache, backend = make_manager()
+    warm = cache.get_or_create("m", system_instruction=PROMPT + "warm")
+    started, release = threading.Event(), threading.Event()
+    real_create = backend.create
+
+    def slow_create(**kwargs):
+        started.set()
+        release.wait(5)
+        return real_create(**kwargs)
+
+    backend.create = slow_create
+    names = []
+    threads = [threading.Thread(target=lambda: names.append(cache.get_or_create("m", system_instruction=PROMPT)))
+               for _ in range(6)]
+    for t in threads:
+        t.start()
+    assert started.wait(5)
+    assert cache.get_or_create("m", system_instruction=PROMPT + "warm") == warm  # not stuck behind the create
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert len(names) == 6 and len(set(names)) == 1
+    assert sum(c.startswith("create:") for c in backend.calls) == 2
@@ -0,0 +1,59 @@
+import math
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from analyzers import face_geometry as fg
+
+
+def synthetic_face(seed=0, jitter=0.0):
+    rng = np.random.default_rng(seed)
+    base = np.random.default_rng(42).uniform(0, 100, size=(68, 2))
+    return base + rng.normal(0, jitter, size=base.shape)
+
+
+def transform(shape, angle, scale, shift):
+    c, s = math.cos(angle), math.sin(angle)
+    return (shape @ np.array([[c, -s], [s, c]])) * scale + np.asarray(shift)
+
+
+def test_vectorize_and_blend_match_dict_loop():
+    vectors = [{"a": 1.0, "b": 2.0, "label": "x"}, {"a": 3.0, "c": 4.0}]
+    keys, matrix = fg.vectorize_identity(vectors)
+    assert keys == ["a", "b", "c"]
+    blended = fg.blend_vectors(matrix, [0.25, 0.75])
+    assert blended.tolist() == [2.5, 0.5, 3.0]
+
+
+def test_procrustes_removes_similarity_transform():
+    ref = synthetic_face()
+    moved = np.stack([transform(ref, 0.3, 2.0, (10, -5)), transform(ref, -1.0, 0.5, (0, 7))])
+    aligned, disparity = fg.procrustes_align(moved, ref)
+    assert np.allclose(aligned, ref[None], atol=1e-6)
+    assert np.allclose(disparity, 0, atol=1e-9)
+
+
+def test_pairwise_distance_ranks_identities_and_ignores_missing_points():
+    ref = synthetic_face()
+    same = transform(synthetic_face(1, jitter=0.5), 0.2, 1.5, (3, 3))
+    other = synthetic_face(2, jitter=15.0)
+    partial = same.copy()
+    partial[:10] = np.nan
+
+    d = fg.pairwise_distance(np.stack([same, other, partial]), ref[None])[:, 0]
+    assert d[0] < d[1] and d[2] < d[1]
+    assert fg.pairwise_distance(ref[None], ref[None])[0, 0] == pytest.approx(0, abs=1e-6)
+
+
+def test_derived_ratios_are_scale_invariant_and_landmark_dicts_convert():
+    ref = synthetic_face()
+    ratios = fg.ratio_matrix(np.stack([ref, transform(ref, 0.7, 3.0, (50, 50))]))
+    assert ratios.shape == (2, len(fg.RATIO_NAMES))
+    assert np.allclose(ratios[0], ratios[1])
+
+    vision = [{"type": "NOSE_TIP", "x": 1, "y": 2, "z": 0}, {"type": "UNKNOWN", "x": 9, "y": 9}]
+    arr = fg.landmarks_to_array(vision)
+    assert arr.shape == (len(fg.CV_LANDMARK_TYPES), 2)
+    assert arr[fg.CV_LANDMARK_TYPES.index("NOSE_TIP")].tolist() == [1, 2]
+    assert np.isnan(arr).all(axis=1).sum() == len(fg.CV_LANDMARK_TYPES) - 1
@@ -0,0 +1,107 @@
+import re
+import json
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("google.genai")
+
+from agents.gemini_orchestrator import GeminiOrchestrator, OrchestratorSession, SubAgentTask
+
+
+class FakeClient:
+    """Sub-agent calls behave per task id: sleep, raise or hang; tracks concurrency."""
+
+    def __init__(self, behaviour=None, delay=0.05):
+        self.behaviour = behaviour or {}
+        self.delay = delay
+        self.running = 0
+        self.max_running = 0
+        self.prompts = []
+        self.models = SimpleNamespace(generate_content=self.generate_content)
+        self.aio = SimpleNamespace(models=SimpleNamespace(generate_content=self.agenerate_content,
+                                                          generate_content_stream=self.generate_content_stream))
+
+    async def agenerate_content(self, model, contents, config=None):
+        task_id = re.search(r"TASK ID: (\S+)", contents).group(1)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            action = self.behaviour.get(task_id, "ok")
+            await asyncio.sleep(30 if action == "hang" else self.delay)
+            if action == "error":
+                raise RuntimeError("503 UNAVAILABLE")
+            return SimpleNamespace(text=json.dumps({"task": task_id, "outfit": "red coat"}))
+        finally:
+            self.running -= 1
+
+    def generate_content(self, model, contents, config=None):
+        self.prompts.append(contents)
+        return SimpleNamespace(text="Synthesis")
+
+    async def generate_content_stream(self, model, contents, config=None):
+        self.prompts.append(contents)
+
+        async def chunks():
+            for text in ("Synth", "esis"):
+                yield SimpleNamespace(text=text)
+        return chunks()
+
+
+def make(tmp_path, monkeypatch, client, **kwargs):
+    monkeypatch.setattr(GeminiOrchestrator, "get_client", lambda self, location: client)
+    return GeminiOrchestrator(sessions_dir=str(tmp_path), **kwargs)
+
+
+def session_of(*task_ids):
+    tasks = [SubAgentTask(task_id=t, task_type="scrape", instructions=f"Research {t}", context={}) for t in task_ids]
+    return OrchestratorSession(session_id="s1", objective="Makima cosplay", total_tasks=len(tasks), tasks=tasks)
+
+
+def test_sub_agents_run_concurrently_up_to_the_limit(tmp_path, monkeypatch):
+    client = FakeClient()
+    orchestrator = make(tmp_path, monkeypatch, client, max_concurrency=2)
+    session = session_of(*(f"t{i}" for i in range(6)))
+    seen = []
+
+    summary = asyncio.run(orchestrator.execute_plan_parallel(session, on_result=lambda t: seen.append(t.task_id)))
+
+    assert client.max_running == 2
+    assert (summary["completed"], summary["failed"]) == (6, 0) and sorted(seen) == [f"t{i}" for i in range(6)]
+    assert summary["wall_time_seconds"] < 6 * client.delay
+    assert json.loads((tmp_path / "s1.json").read_text())["completed_tasks"] == 6
+
+
+def test_timeouts_and_failures_are_recorded_and_synthesised(tmp_path, monkeypatch):
+    client = FakeClient({"slow": "hang", "broken": "error"})
+    orchestrator = make(tmp_path, monkeypatch, client, task_timeout=0.2)
+    session = session_of("fast", "slow", "broken")
+
+    summary = asyncio.run(orchestrator.execute_plan_parallel(session))
+    fast, slow, broken = session.tasks
+
+    assert (summary["completed"], summary["failed"]) == (1, 2)
+    assert fast.status == "completed" and fast.result == {"task": "fast", "outfit": "red coat"}
+    assert slow.status == "failed" and slow.result == {"error": "Timed out after 0.2s"}
+    assert 0.2 <= slow.duration_seconds < 1.0
+    assert broken.status == "failed" and broken.result == {"error": "503 UNAVAILABLE"}
+
+    assert orchestrator.synthesize_results(session) == "Synthesis"
+    prompt = client.prompts[-1]
+    assert "(3/3 finished)" in prompt and "Timed out after 0.2s" in prompt and "503 UNAVAILABLE" in prompt
+    assert "red coat" in prompt and "STILL RUNNING:\n        None" in prompt
+
+
+def test_stream_synthesis_reports_tasks_then_streams_text(tmp_path, monkeypatch):
+    client = FakeClient({"broken": "error"})
+    orchestrator = make(tmp_path, monkeypatch, client)
+    session = session_of("fast", "broken")
+
+    async def collect():
+        return [piece async for piece in orchestrator.stream_synthesis(session)]
+
+    pieces = asyncio.run(collect())
+    assert sorted(p.split(" ")[0] for p in pieces[:2]) == ["[completed]", "[failed]"]
+    assert pieces[2:] == ["Synth", "esis"]
+    assert session.completed_at is not None
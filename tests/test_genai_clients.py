@@ -0,0 +1,67 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core.genai_clients import GenAIClientRegistry, location_for_model
+
+
+def make_registry(delay=0.0, fail=False):
+    built = []
+
+    def factory(key, api_key=None):
+        time.sleep(delay)
+        if fail:
+            raise RuntimeError("no credentials")
+        built.append(key)
+        return object()
+
+    return GenAIClientRegistry(factory=factory), built
+
+
+def test_reuses_client_per_key():
+    registry, built = make_registry()
+    a = registry.get(location="global")
+    b = registry.get(location="global")
+    c = registry.get(location="us-central1")
+    assert a is b and a is not c
+    assert len(built) == 2
+    stats = registry.get_stats()
+    assert stats["created"] == 2 and stats["reused"] == 1
+
+
+def test_concurrent_first_use_builds_one_client():
+    registry, built = make_registry(delay=0.05)
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        clients = list(pool.map(lambda _: registry.get(location="global"), range(32)))
+    assert len(built) == 1
+    assert all(c is clients[0] for c in clients)
+    assert registry.get_stats()["reused"] == 31
+
+
+def test_api_key_clients_are_keyed_by_fingerprint():
+    registry, _ = make_registry()
+    assert registry.get(api_key="key-a") is registry.get(api_key="key-a")
+    assert registry.get(api_key="key-a") is not registry.get(api_key="key-b")
+    assert all("key-a" not in label for label in registry.get_stats()["clients"])
+
+
+def test_warmup_reports_failures_without_raising():
+    registry, _ = make_registry(fail=True)
+    results = registry.warmup(locations=("global", "us-central1"))
+    assert len(results) == 2
+    assert all(v.startswith("error") for v in results.values())
+    assert registry.get_stats()["errors"] == 2
+
+
+def test_location_for_model():
+    assert location_for_model("gemini-3-pro-preview") == "global"
+    assert location_for_model("gemini-2.5-flash") == "us-central1"
+
+
+def test_set_factory_drops_clients_and_their_counts():
+    registry, _ = make_registry()
+    old = registry.get(location="global")
+    registry.get(location="global")
+    registry.set_factory(lambda key, api_key=None: "mock")
+    assert registry.get_stats()["clients"] == {}
+    assert registry.get(location="global") == "mock" and registry.get(location="global") is not old
+    assert list(registry.get_stats()["clients"].values()) == [{"created": 1, "reused": 1}]
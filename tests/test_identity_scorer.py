@@ -0,0 +1,70 @@
+import json
+import math
+import hashlib
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from analyzers import face_geometry
+from analyzers.identity_scorer import SubjectGeometry, score_directory, score_image, summarize
+
+
+def vision_landmarks(shape):
+    return [{"type": t, "x": float(x), "y": float(y), "z": 0.0}
+            for t, (x, y) in zip(face_geometry.CV_LANDMARK_TYPES, shape)]
+
+
+def subject_shape():
+    return np.random.default_rng(7).uniform(0, 200, size=(len(face_geometry.CV_LANDMARK_TYPES), 2))
+
+
+def rotate(shape, angle, scale, shift):
+    c, s = math.cos(angle), math.sin(angle)
+    return (shape @ np.array([[c, -s], [s, c]])) * scale + np.asarray(shift)
+
+
+def write_render(directory, name, landmarks, cache_dir=None):
+    path = directory / name
+    path.write_bytes(name.encode())
+    if cache_dir is None:
+        path.with_suffix(".landmarks.json").write_text(json.dumps({"landmarks_34": landmarks}))
+    else:
+        digest = hashlib.md5(path.read_bytes()).hexdigest()
+        (cache_dir / f"{digest}.json").write_text(json.dumps({"landmarks_34": landmarks}))
+    return path
+
+
+def test_same_face_scores_high_and_other_face_low(tmp_path):
+    shape = subject_shape()
+    subject = SubjectGeometry.from_landmarks(landmarks_34=vision_landmarks(shape))
+
+    same = write_render(tmp_path, "gen_same.png", vision_landmarks(rotate(shape, 0.2, 2.0, (40, 10))))
+    other = write_render(tmp_path, "gen_other.png", vision_landmarks(np.random.default_rng(1).uniform(0, 200, shape.shape)))
+
+    good = score_image(subject, same, cache_dir=tmp_path)
+    bad = score_image(subject, other, cache_dir=tmp_path)
+    assert good.status == "ok" and good.score == pytest.approx(1.0, abs=1e-3) and good.passed
+    assert bad.score < good.score and not bad.passed
+    assert all(abs(d) < 1e-3 for d in good.ratio_deltas.values())
+
+
+def test_directory_batch_with_vision_cache_and_pool(tmp_path):
+    renders, cache = tmp_path / "renders", tmp_path / "cache"
+    renders.mkdir()
+    cache.mkdir()
+    shape = subject_shape()
+    lock = {"identity_lock": {"geometric_signatures": {"key_ratios": {"eye_width_to_face": 0.2}}},
+            "subject_landmarks": {"landmarks_34": vision_landmarks(shape)}}
+    subject = SubjectGeometry.from_lock(lock)
+
+    for i in range(5):
+        write_render(renders, f"gen_{i}.png", vision_landmarks(rotate(shape, 0.1 * i, 1 + i, (i, i))), cache)
+    (renders / "gen_missing.png").write_bytes(b"no landmarks anywhere")
+    (renders / "v12_lock_x.json").write_text("{}")
+
+    results = score_directory(subject, renders, cache_dir=cache, workers=2, chunk_size=2)
+    assert [r.image.rsplit("/", 1)[-1] for r in results][-1] == "gen_missing.png"
+    summary = summarize(results)
+    assert summary == {"total": 6, "scored": 5, "no_landmarks": 1, "errors": 0, "passed": 5,
+                       "mean_score": pytest.approx(1.0, abs=1e-3), "min_score": pytest.approx(1.0, abs=1e-3)}
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("google.genai")
+
+from yuki_knowledge_base import BulkIndexer, KnowledgeCategory, LocalFileSearchStore, YukiKnowledgeBase
+
+
+def make_documents(count, per_anime=10):
+    return [
+        YukiKnowledgeBase.build_character_document(
+            {"mal_id": i, "name": f"Character {i}", "role": "Main", "about": "Black hair."},
+            {"mal_id": i // per_anime, "title": f"Anime {i // per_anime}"}
+        )
+        for i in range(count)
+    ]
+
+
+def run(indexer, documents):
+    store_name = indexer.get_store(KnowledgeCategory.ANIME_CHARACTERS, "Anime Characters Database")
+    return asyncio.run(indexer.index_documents(documents, store_name))
+
+
+def make_indexer(tmp_path, store, **kwargs):
+    kwargs.setdefault("poll_interval", 0.01)
+    return BulkIndexer(store, journal_path=tmp_path / "index.jsonl", **kwargs)
+
+
+def test_packs_documents_and_bounds_in_flight(tmp_path):
+    store = LocalFileSearchStore(upload_latency=0.01, import_latency=0.05)
+    indexer = make_indexer(tmp_path, store, docs_per_file=10, max_in_flight=3)
+    report = run(indexer, make_documents(95))
+
+    assert report.documents_indexed == 95
+    assert store.uploads == 10
+    assert store.max_in_flight <= 3
+    assert len(indexer.document_index) == 95
+    # Batches follow anime boundaries, so single-anime files carry anime_title metadata
+    uploaded = next(iter(store.stores.values()))
+    assert all(any(m["key"] == "anime_title" for m in f["metadata"]) for f in uploaded)
+
+
+def test_failed_import_is_retried(tmp_path):
+    store = LocalFileSearchStore(upload_latency=0, import_latency=0.01, fail_batches=2)
+    report = run(make_indexer(tmp_path, store, docs_per_file=5), make_documents(20))
+    assert report.documents_indexed == 20
+    assert report.documents_failed == 0
+    assert store.uploads == 6
+
+
+def test_restart_skips_indexed_documents(tmp_path):
+    store = LocalFileSearchStore(upload_latency=0, import_latency=0.01)
+    documents = make_documents(30)
+    run(make_indexer(tmp_path, store, docs_per_file=10), documents[:20])
+
+    resumed = make_indexer(tmp_path, store, docs_per_file=10)
+    assert len(resumed.document_index) == 20
+    assert resumed.stores[KnowledgeCategory.ANIME_CHARACTERS.value]["name"] in store.stores
+
+    report = run(resumed, documents)
+    assert report.documents_skipped == 20
+    assert report.documents_indexed == 10
+    assert store.uploads == 3
+    assert len(store.stores) == 1
+
+
+def test_restart_polls_journalled_uploads_instead_of_reuploading(tmp_path):
+    store = LocalFileSearchStore(upload_latency=0, import_latency=0.01)
+    documents = make_documents(10)
+    indexer = make_indexer(tmp_path, store, docs_per_file=10)
+    store_name = indexer.get_store(KnowledgeCategory.ANIME_CHARACTERS, "Anime Characters Database")
+    batch = indexer.pack(documents)[0]
+    op = store.upload(indexer._write_batch_file(batch), store_name, "interrupted", [])
+    indexer._journal({"event": "upload", "batch_id": batch.batch_id, "operation": op.name,
+                      "doc_ids": batch.doc_ids, "file_path": None})
+
+    report = run(make_indexer(tmp_path, store, docs_per_file=10), documents)
+    assert report.documents_indexed == 10
+    assert store.uploads == 1
+
+
+def test_restart_with_more_journalled_uploads_than_the_window(tmp_path):
+    store = LocalFileSearchStore(upload_latency=0, import_latency=0.01)
+    documents = make_documents(60)
+    indexer = make_indexer(tmp_path, store, docs_per_file=10)
+    store_name = indexer.get_store(KnowledgeCategory.ANIME_CHARACTERS, "Anime Characters Database")
+    for batch in indexer.pack(documents[:50]):
+        op = store.upload(indexer._write_batch_file(batch), store_name, "interrupted", [])
+        indexer._journal({"event": "upload", "batch_id": batch.batch_id, "operation": op.name,
+                          "doc_ids": batch.doc_ids, "file_path": None})
+
+    resumed = make_indexer(tmp_path, store, docs_per_file=10, max_in_flight=2)
+    report = asyncio.run(asyncio.wait_for(resumed.index_documents(documents, store_name), timeout=10))
+    assert report.documents_indexed == 60
+    assert store.uploads == 6          # 5 journalled + the one batch that was never uploaded
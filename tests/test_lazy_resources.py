@@ -0,0 +1,84 @@
+import threading
+
+import pytest
+
+from core.lazy_resources import ResourceRegistry, ResourceUnavailable
+from tools.cold_start_bench import START_MARKER, direct_imports, heavy_modules_loaded, parse_importtime
+
+
+def test_resource_built_once_across_threads():
+    calls = []
+    resources = ResourceRegistry()
+    client = resources.register("client", lambda: calls.append(1) or object())
+
+    assert not client.ready and calls == []
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(client.get())) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1 and len({id(r) for r in results}) == 1
+    assert client.status()["ready"] and client.status()["init_seconds"] is not None
+
+
+def test_failures_are_retried_and_reported_in_readiness():
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("metadata server not ready")
+        return "client"
+
+    resources = ResourceRegistry()
+    resources.register("genai_client", flaky)
+    resources.register("agent", lambda: None, required=False)
+
+    assert resources.warm() == {"genai_client": "error: metadata server not ready", "agent": "ok"}
+    report = resources.readiness()
+    assert not report["ready"]
+    assert report["resources"]["genai_client"]["error"] == "RuntimeError: metadata server not ready"
+
+    assert resources.get("genai_client").get_or_none() == "client"
+    assert resources.readiness()["ready"] and resources.readiness()["resources"]["genai_client"]["error"] is None
+
+
+def test_failed_optional_resource_backs_off(monkeypatch):
+    attempts = []
+
+    def broken_agent():
+        attempts.append(1)
+        raise RuntimeError("no credentials")
+
+    clock = [1000.0]
+    monkeypatch.setattr("core.lazy_resources.time.monotonic", lambda: clock[0])
+    agent = ResourceRegistry().register("yuki_agent", broken_agent, required=False, retry_backoff=300)
+
+    assert [agent.get_or_none() for _ in range(5)] == [None] * 5
+    assert len(attempts) == 1
+    with pytest.raises(ResourceUnavailable):
+        agent.get()
+
+    clock[0] += 301
+    assert agent.get_or_none() is None and len(attempts) == 2
+    clock[0] += 301                          # backoff doubled to 600s
+    assert agent.get_or_none() is None and len(attempts) == 2
+
+
+def test_parse_importtime():
+    stderr = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       500 |        500 | encodings",
+        START_MARKER,
+        "import time:       300 |        300 |     google.genai.types",
+        "import time:       900 |       1200 |   google.genai",
+        "import time:       100 |        100 |   core.persona",
+        "import time:       200 |       1500 | server",
+    ])
+    records = parse_importtime(stderr)
+    assert [r.module for r in records] == ["google.genai.types", "google.genai", "core.persona", "server"]
+    assert [r.depth for r in records] == [2, 1, 1, 0]
+    assert [r.module for r in direct_imports(records)] == ["google.genai", "core.persona"]
+    assert heavy_modules_loaded(records) == ["google.genai"]
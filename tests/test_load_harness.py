@@ -0,0 +1,90 @@
+import asyncio
+import random
+
+from tools.load_harness import Recorder, percentile, run_window, work_items
+from tools.mock_genai_server import LatencyModel, MockProfile, generate_response, synthesize_from_schema
+
+
+def test_percentile_interpolates():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50.5
+    assert percentile(values, 99) == 99.01
+    assert percentile([], 95) == 0.0
+
+
+def test_run_window_bounds_in_flight_and_pulls_lazily():
+    state = {"in_flight": 0, "peak": 0, "pulled": 0}
+
+    def items():
+        for i in range(50):
+            state["pulled"] += 1
+            # Never more than the window ahead of what has finished
+            assert state["pulled"] - done.count(True) <= 4
+            yield i
+
+    done = []
+
+    async def worker(i):
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        await asyncio.sleep(0.001 * (i % 3))
+        state["in_flight"] -= 1
+        done.append(True)
+        if i % 10 == 0:
+            raise RuntimeError("boom")
+
+    assert asyncio.run(run_window(items(), worker, concurrency=4)) == 50
+    assert state["peak"] == 4
+
+
+def test_recorder_stage_records_errors_and_latency():
+    recorder = Recorder()
+
+    async def run():
+        async with recorder.stage("ok"):
+            await asyncio.sleep(0)
+        try:
+            async with recorder.stage("bad"):
+                raise ValueError("x")
+        except ValueError:
+            pass
+
+    asyncio.run(run())
+    summary = recorder.summary(1.0)
+    assert summary["ok"]["ok"] == 1
+    assert summary["bad"]["errors"] == {"ValueError": 1}
+
+
+def test_work_items_by_count():
+    assert list(work_items(requests=3)) == [0, 1, 2]
+
+
+def test_schema_synthesis_matches_structure():
+    schema = {
+        "type": "OBJECT",
+        "properties": {
+            "confidence": {"type": "NUMBER"},
+            "points": {"type": "ARRAY", "items": {"$ref": "#/$defs/Point"}},
+            "label": {"anyOf": [{"type": "null"}, {"type": "STRING"}]},
+        },
+        "$defs": {"Point": {"type": "object", "properties": {"x": {"type": "integer"}}}},
+    }
+    value = synthesize_from_schema(schema, random.Random(1))
+    assert isinstance(value["confidence"], float)
+    assert isinstance(value["points"][0]["x"], int)
+    assert isinstance(value["label"], str)
+
+
+def test_image_models_return_inline_data():
+    response = generate_response("gemini-3-pro-image-preview", {"contents": []}, random.Random(1))
+    assert any("inlineData" in p for p in response["candidates"][0]["content"]["parts"])
+
+
+def test_latency_is_seeded_and_profile_overrides_merge():
+    model = LatencyModel(median_ms=100, p99_ms=400)
+    assert [model.sample(random.Random(7)) for _ in range(3)] == [model.sample(random.Random(7))] * 3
+
+    profile = MockProfile.from_dict({"speed": 0.5, "endpoints": {"embed": {"errors": {"429": 0.1}}}})
+    assert profile.speed == 0.5
+    assert profile.endpoints["embed"].errors == {429: 0.1}
+    assert profile.endpoints["embed"].latency.median_ms == 60
@@ -0,0 +1,50 @@
+import pytest
+
+from core.model_router import Budgets, BudgetExceededError, ModelRouter
+from yuki_cost_tracker import YukiCostTracker
+from yuki_models_spec import estimate_cost
+
+
+@pytest.fixture
+def tracker(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return YukiCostTracker(project_id="test")
+
+
+def test_rules_and_caller_caps():
+    router = ModelRouter()
+    assert (router.route("chat", "hi there!").model, router.route("chat", "hi there!").thinking_level) == \
+        ("gemini-3-flash-preview", "high")
+    deep = router.route("chat", "Research Makima's outfit and compare the manga and anime versions")
+    assert (deep.model, deep.thinking_level, deep.degraded) == ("gemini-3-pro-preview", "high", False)
+    assert router.route("chat", "research this", model="gemini-3-flash-preview").model == "gemini-3-flash-preview"
+    assert router.route("image", resolution="2K").resolution == "2K"
+    unknown = router.route("chat", "hi there!", model="gemini-2.5-flash")
+    assert unknown.model == "gemini-3-flash-preview" and "unroutable:gemini-2.5-flash" in unknown.reasons
+    assert estimate_cost("gemini_3_pro_image", images=2, resolution="4K") == 0.48
+
+
+def test_load_and_budgets_degrade_then_refuse(tracker):
+    router = ModelRouter(tracker, budgets=Budgets(global_daily_usd=10.0, user_daily_usd=0.55, soft_fraction=0.5))
+
+    # Slow Pro calls push chat to Flash
+    for _ in range(5):
+        tracker.log_generation("gemini-3-pro-preview", "chat_completion", tokens_in=1000, tokens_out=500, latency_s=45.0)
+    route = router.route("chat", "Explain the difference between these two wigs", user_id="u1")
+    assert route.model == "gemini-3-flash-preview" and route.degraded
+    assert tracker.live_stats()["gemini-3-pro-preview"]["p95_latency_s"] == 45.0
+
+    # Near the user's budget: one rung lower; past it: refused
+    tracker.log_generation("gemini-3-pro-image-preview", "generation", user_id="u1", resolution="4K")
+    tracker.log_generation("gemini-3-pro-image-preview", "generation", user_id="u1", resolution="1K")
+    assert tracker.spend_today("u1") == pytest.approx(0.374)
+    image = router.route("image", user_id="u1", resolution="4K")
+    assert image.resolution == "2K" and any(r.startswith("budget_soft") for r in image.reasons)
+
+    tracker.log_generation("gemini-3-pro-image-preview", "generation", user_id="u1", resolution="1K")
+    with pytest.raises(BudgetExceededError):
+        router.route("image", user_id="u1")
+    assert router.route("image", user_id="u2").resolution == "4K"
+
+    # Spend survives a restart (seeded from the JSON log)
+    assert YukiCostTracker(project_id="test").spend_today("u1") == tracker.spend_today("u1")
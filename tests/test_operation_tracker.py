@@ -0,0 +1,132 @@
+import json
+import time
+import asyncio
+import concurrent.futures
+
+import pytest
+
+from core.operation_tracker import OperationTracker, OperationFailed
+
+
+class FakeOp:
+    def __init__(self, name, polls_needed, error=None):
+        self.name = name
+        self.polls_needed = polls_needed
+        self.error = error
+        self.done = polls_needed == 0
+
+
+class FakeAdapter:
+    kind = "fake"
+    initial_interval = 0.01
+    max_interval = 0.05
+    backoff = 2.0
+
+    def __init__(self, polls_needed=3):
+        self.polls_needed = polls_needed
+        self.refreshes = 0
+        self.cancelled = []
+
+    def op_id(self, handle):
+        return handle.name
+
+    def restore(self, op_id):
+        return FakeOp(op_id, self.polls_needed)
+
+    def refresh(self, handle):
+        self.refreshes += 1
+        handle.polls_needed -= 1
+        handle.done = handle.polls_needed <= 0
+        return handle
+
+    def check(self, handle):
+        return handle.done, handle.error if handle.done else None
+
+    def cancel(self, handle):
+        self.cancelled.append(handle.name)
+
+
+def test_many_operations_share_one_loop(tmp_path):
+    tracker = OperationTracker(state_path=tmp_path / "ops.json")
+    adapter = FakeAdapter()
+    futures = [tracker.track(FakeOp(f"op{i}", 3), adapter) for i in range(50)]
+
+    results = [tracker.wait_sync(f, timeout=5) for f in futures]
+    assert [r.name for r in results] == [f"op{i}" for i in range(50)]
+    assert adapter.refreshes == 150
+    assert tracker.get_stats()["completed"] == 50 and tracker.get_stats()["in_flight"] == 0
+
+
+def test_failure_cancel_and_already_done(tmp_path):
+    tracker = OperationTracker(state_path=tmp_path / "ops.json")
+    adapter = FakeAdapter()
+
+    failing = tracker.track(FakeOp("bad", 1, error="quota"), adapter)
+    with pytest.raises(OperationFailed):
+        tracker.wait_sync(failing, timeout=5)
+
+    slow = tracker.track(FakeOp("slow", 10_000), adapter)
+    assert tracker.cancel("slow")
+    assert slow.cancelled() and adapter.cancelled == ["slow"]
+
+    assert tracker.track(FakeOp("instant", 0), adapter).result(timeout=0).name == "instant"
+
+
+def test_wait_timeout_keeps_tracking_and_deadline_expires(tmp_path):
+    tracker = OperationTracker(state_path=tmp_path / "ops.json")
+    adapter = FakeAdapter()
+
+    future = tracker.track(FakeOp("long", 8), adapter)
+
+    async def impatient():
+        with pytest.raises(asyncio.TimeoutError):
+            await tracker.wait(future, timeout=0.01)
+        return await tracker.wait(future, timeout=5)
+
+    assert asyncio.run(impatient()).name == "long"
+
+    doomed = tracker.track(FakeOp("doomed", 10_000), adapter, max_age_seconds=0.1)
+    start = time.perf_counter()
+    with pytest.raises(OperationFailed):
+        tracker.wait_sync(doomed, timeout=5)
+    assert time.perf_counter() - start < 1
+
+
+def test_persisted_operations_resume_after_restart(tmp_path):
+    state = tmp_path / "ops.json"
+    first = OperationTracker(state_path=state)
+    first.track(FakeOp("veo-123", 10_000), FakeAdapter(), metadata={"save_path": "out.mp4"}, persist=True)
+    first.track(FakeOp("upload-1", 10_000), FakeAdapter())  # not persisted
+    assert [r["op_id"] for r in first.pending() if r["op_id"] == "veo-123"]
+
+    # "Restart": a new tracker reads the state file once the adapter is registered
+    second = OperationTracker(state_path=state)
+    collected = concurrent.futures.Future()
+    resumed = second.register_adapter(FakeAdapter(polls_needed=2),
+                                      on_complete=lambda handle, meta: collected.set_result((handle.name, meta)))
+    assert resumed == 1
+    assert collected.result(timeout=5) == ("veo-123", {"save_path": "out.mp4"})
+
+    deadline = time.time() + 2
+    while second.pending() and time.time() < deadline:
+        time.sleep(0.01)
+    assert json.loads(state.read_text())["operations"] == []
+
+
+def test_keyed_completion_handlers_replace_instead_of_piling_up(tmp_path):
+    state = tmp_path / "ops.json"
+    OperationTracker(state_path=state).track(FakeOp("veo-9", 10_000), FakeAdapter(), persist=True)
+
+    tracker = OperationTracker(state_path=state)
+    calls = []
+    with tracker._lock:  # hold the poll loop off until all three are registered
+        for generator in range(3):  # e.g. three YukiVideoGenerator() constructions
+            tracker.register_adapter(FakeAdapter(polls_needed=1), key="save",
+                                     on_complete=lambda handle, meta, g=generator: calls.append(g))
+    assert len(tracker._on_complete[FakeAdapter.kind]) == 1
+
+    deadline = time.time() + 5
+    while not calls and time.time() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    assert calls == [2]
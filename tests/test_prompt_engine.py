@@ -0,0 +1,91 @@
+from prompts.prompt_engineering_system import (
+    PromptCategory,
+    PromptEngineering,
+    PromptTemplate,
+    compile_template,
+)
+from yuki_batch_engine import BatchSpec
+
+
+def linear_search(engine, category=None, tags=None, query=None):
+    results = list(engine.templates.values())
+    if category:
+        results = [t for t in results if t.category == category]
+    if tags:
+        results = [t for t in results if any(tag in t.tags for tag in tags)]
+    if query:
+        q = query.lower()
+        results = [t for t in results if q in t.name.lower() or q in t.description.lower()]
+    return [t.id for t in sorted(results, key=lambda t: t.quality_score, reverse=True)]
+
+
+def test_compiled_render_and_indexed_search_match_reference():
+    compiled = compile_template("{a} and {b}, {a} again; {missing} {}")
+    text, missing = compiled.render({"a": 1, "b": "two"})
+    assert text == "1 and two, 1 again; {missing} {}"
+    assert missing == ["missing"] and compiled.placeholders == ("a", "b", "missing")
+
+    engine = PromptEngineering()
+    engine.add_template(PromptTemplate(
+        id="cosplay_anime_character", name="Renamed Template", description="replaced entry",
+        category=PromptCategory.PORTRAIT, template="{x}", variables=["x"], tags=["sheet"],
+        quality_score=0.99,
+    ))
+    for category in [None, *PromptCategory]:
+        for tags in [None, ["anime"], ["cosplay", "sheet"], ["nope"]]:
+            for query in [None, "an", "cosplay", "Character", "renamed", "zzz"]:
+                found = [t.id for t in engine.search_templates(category, tags, query)]
+                assert found == linear_search(engine, category, tags, query), (category, tags, query)
+
+    assert engine.remove_template("manga_panel_generator")
+    assert "manga_panel_generator" not in [t.id for t in engine.search_templates(query="manga")]
+
+
+def test_batch_render_and_bounded_generated():
+    engine = PromptEngineering(max_generated=50)
+    template = engine.get_template("cosplay_anime_character")
+    example = template.examples[0]
+
+    requests = [("cosplay_anime_character", {**example, "pose": f"pose {i}"}) for i in range(2000)]
+    rendered = engine.render_many(requests)
+    assert rendered[7] == template.render(**requests[7][1])
+    assert template.usage_count == 2000
+
+    for i in range(200):
+        engine.generate_prompt("cosplay_anime_character", **{**example, "pose": f"pose {i}"})
+    assert len(engine.generated) == 50
+    generated = engine.generate_many(requests[:10], store=True)
+    assert [g.prompt for g in generated] == rendered[:10] and len(engine.generated) == 50
+    assert engine.score_prompt(rendered[0]) == engine.score_prompt(rendered[0]) > 0.5
+
+
+def test_batch_spec_renders_named_template():
+    spec = BatchSpec.from_dict({
+        "name": "templated",
+        "template": "manga_panel_generator",
+        "subjects": ["Drake"],
+        "targets": [{"character": "Subaru", "anime": "Re:Zero"}],
+        "models": ["m"],
+        "variants": [{"name": "a", "variables": {"action": "rooftop", "emotion": "4-koma"}}],
+    })
+    (cell,) = spec.cells()
+    assert "rooftop" in cell.prompt and "4-koma" in cell.prompt
+
+
+def test_search_cache_is_bounded_and_follows_direct_template_edits():
+    engine = PromptEngineering(max_searches=4)
+    for q in ("cos", "man", "pro", "ref", "por", "cha"):
+        engine.search_templates(query=q)
+    assert len(engine._search_cache) == 4
+
+    manga = engine.get_template("manga_panel_generator")
+    assert [t.id for t in engine.search_templates(tags=["shonen"])] == []
+    manga.tags.append("shonen")
+    assert [t.id for t in engine.search_templates(tags=["shonen"])] == ["manga_panel_generator"]
+    manga.tags = ["seinen"]
+    assert engine.search_templates(tags=["shonen"]) == []
+
+    engine.get_template("anime_merchandise_photo").quality_score = 0.99
+    for query in ({}, {"tags": ["anime"]}, {"category": PromptCategory.CHARACTER_COSPLAY}):
+        assert [t.id for t in engine.search_templates(**query)] == linear_search(engine, **query)
+    assert engine.search_templates(tags=["anime"])[0].id == "anime_merchandise_photo"
@@ -0,0 +1,94 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from core.response_cache import ConditionalGetMiddleware, FileSnapshot, ResponseCache
+
+
+def write_json(path, data, bump=0):
+    path.write_text(json.dumps(data))
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + bump))
+
+
+def make_app(data_path):
+    calls = {"items": 0, "item": 0}
+    snapshot = FileSnapshot(str(data_path))
+    cache = ResponseCache()
+    cache.register("/items", ttl=60, files=[str(data_path)], tags=["items"])
+    cache.register("/items/{item_id}", ttl=60, tags=["items"], invalidated_by=["/items"])
+
+    app = FastAPI()
+    app.add_middleware(ConditionalGetMiddleware, cache=cache)
+
+    @app.get("/items")
+    async def items(kind: str = None):
+        calls["items"] += 1
+        return [i for i in snapshot.get() if kind is None or i["kind"] == kind]
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: str):
+        calls["item"] += 1
+        for i in snapshot.get():
+            if i["id"] == item_id:
+                return i
+        raise HTTPException(status_code=404, detail="missing")
+
+    @app.post("/items")
+    async def add():
+        return {"ok": True}
+
+    return app, cache, snapshot, calls
+
+
+def test_etags_304_and_query_normalization(tmp_path):
+    data = tmp_path / "items.json"
+    write_json(data, [{"id": "a", "kind": "fix"}, {"id": "b", "kind": "new"}])
+    app, cache, snapshot, calls = make_app(data)
+    client = TestClient(app)
+
+    first = client.get("/items?kind=fix")
+    assert first.status_code == 200 and first.headers["x-yuki-cache"] == "miss"
+    etag = first.headers["etag"]
+    assert etag.startswith('"') and first.headers["cache-control"] == "no-cache"
+
+    again = client.get("/items?kind=fix", headers={"If-None-Match": f'W/{etag}, "other"'})
+    assert again.status_code == 304 and again.content == b"" and again.headers["etag"] == etag
+    assert client.get("/items?kind=fix&").json() == first.json()
+    assert calls["items"] == 1 and snapshot.loads == 1
+
+    assert client.get("/items/zzz").status_code == 404
+    assert client.get("/items/zzz").status_code == 404
+    assert calls["item"] == 2            # errors are never cached
+    assert cache.stats()["not_modified"] == 1
+
+
+def test_file_change_tags_and_unsafe_requests_invalidate(tmp_path):
+    data = tmp_path / "items.json"
+    write_json(data, [{"id": "a", "kind": "fix"}])
+    app, cache, snapshot, calls = make_app(data)
+    client = TestClient(app)
+
+    etag = client.get("/items").headers["etag"]
+    write_json(data, [{"id": "a", "kind": "fix"}, {"id": "c", "kind": "fix"}], bump=10_000_000)
+    changed = client.get("/items", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and len(changed.json()) == 2 and changed.headers["etag"] != etag
+    assert snapshot.loads == 2 and calls["items"] == 2
+
+    client.get("/items/a")
+    client.get("/items/a")
+    assert calls["item"] == 1
+    client.post("/items")
+    client.get("/items/a")
+    assert calls["item"] == 2
+
+    assert cache.invalidate("items") == 2
+    client.get("/items")
+    assert calls["items"] == 3
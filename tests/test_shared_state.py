@@ -0,0 +1,126 @@
+import os
+import time
+import multiprocessing
+
+import pytest
+
+from core.response_cache import ResponseCache
+from core.shared_state import SharedDict, SharedState, preload
+from yuki_cost_tracker import YukiCostTracker
+
+
+def spend(db_path, n):
+    tracker = YukiCostTracker(project_id="test", shared_state=SharedState(db_path))
+    for _ in range(n):   # the live half of log_generation (workers appending one JSON file would clobber it)
+        tracker._record_live("gemini-3-pro-image-preview", 0.134, None, "u1")
+
+
+def bump(db_path, n):
+    state = SharedState(db_path)
+    for _ in range(n):
+        state.incr("hits")
+        state.hit("rate:ip", limit=150, window_s=3600)
+    state.set_job(f"job-{os.getpid()}", "completed", worker=os.getpid())
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork()")
+def test_forked_workers_share_counters_and_jobs(tmp_path):
+    db_path = str(tmp_path / "shared.db")
+    state = SharedState(db_path)
+    state.set_job("gen-1", "processing", user_id="u1")
+    assert state.counter("hits") == 0       # master connection opened before the fork
+
+    ctx = multiprocessing.get_context("fork")
+    workers = [ctx.Process(target=bump, args=(db_path, 50)) for _ in range(4)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join(30)
+        assert w.exitcode == 0
+
+    assert state.counter("hits") == 200
+    assert state.counter("rate:ip", bucket_s=3600) == 200
+    assert not state.hit("rate:ip", limit=150, window_s=3600)
+    assert sum(1 for k in state.keys("jobs") if k.startswith("job-")) == 4
+    state.set_job("gen-1", "completed", cdn_url="x")
+    job = state.get_job("gen-1")
+    assert (job["status"], job["user_id"], job["cdn_url"]) == ("completed", "u1", "x")
+
+
+def test_kv_ttl_and_shared_dict(tmp_path):
+    state = SharedState(str(tmp_path / "shared.db"))
+    assert state.add("locks", "seed", True, ttl=0.05) and not state.add("locks", "seed", True)
+    time.sleep(0.06)
+    assert state.get("locks", "seed") is None and state.add("locks", "seed", True)
+
+    operations = SharedDict(state, "video-operations", ttl=60)
+    operations["op/1"] = {"prompt": "Makima walking", "status": "running"}
+    assert operations.update_fields("op/1", status="completed")["prompt"] == "Makima walking"
+    other_worker = SharedDict(SharedState(state.db_path), "video-operations")
+    assert other_worker["op/1"]["status"] == "completed" and len(other_worker) == 1
+    del other_worker["op/1"]
+    assert "op/1" not in operations and operations.get("op/1") is None
+
+    results = preload(["json", "functools:lru_cache", "no_such_module:build"], freeze=False)
+    assert results["json"].startswith("ok") and results["functools:lru_cache"].startswith("ok")
+    assert results["no_such_module:build"].startswith("failed")
+
+
+def test_invalidation_and_budgets_cross_workers(tmp_path, monkeypatch):
+    state_a = SharedState(str(tmp_path / "shared.db"))
+    state_b = SharedState(state_a.db_path)
+
+    cache_a, cache_b = ResponseCache(shared=state_a), ResponseCache(shared=state_b)
+    for cache in (cache_a, cache_b):
+        cache.register("/items", ttl=60, tags=["items"], invalidated_by=["/items"])
+    key = cache_a.key("/items", b"")
+    for cache in (cache_a, cache_b):
+        policy = cache.policy_for("/items")
+        cache.store(key, policy, 200, [], b"[]", policy.stamps(), cache.version(policy))
+    assert cache_b.lookup(key) is not None
+    cache_a.on_unsafe_request("/items")      # POST handled by worker A
+    assert cache_b.lookup(key) is None       # worker B's copy is stale too
+
+    monkeypatch.chdir(tmp_path)
+    worker_a = YukiCostTracker(project_id="test", shared_state=state_a)
+    worker_a.log_generation("gemini-3-pro-image-preview", "generation", user_id="u1", resolution="4K")
+    worker_b = YukiCostTracker(project_id="test", shared_state=state_b)
+    worker_b.log_generation("gemini-3-pro-image-preview", "generation", user_id="u1", resolution="1K")
+    assert worker_a.spend_today("u1") == worker_b.spend_today("u1") == pytest.approx(0.374)
+    assert worker_a.live_stats()["gemini-3-pro-image-preview"]["calls"] == 2
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork()")
+def test_spend_seeded_once_from_log_while_workers_record(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db_path = str(tmp_path / "shared.db")
+    YukiCostTracker(project_id="test").log_generation(
+        "gemini-3-pro-image-preview", "generation", user_id="u1", resolution="4K")   # before any worker: $0.24
+
+    ctx = multiprocessing.get_context("fork")
+    workers = [ctx.Process(target=spend, args=(db_path, 3)) for _ in range(4)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join(30)
+        assert w.exitcode == 0
+
+    tracker = YukiCostTracker(project_id="test", shared_state=SharedState(db_path))
+    assert tracker.spend_today("u1") == pytest.approx(0.24 + 12 * 0.134)
+    assert not tracker.shared_state.seed(f"cost-tracker:{time.strftime('%Y-%m-%d')}", lambda: {"x": 1.0})
+
+
+def test_bucketed_counters_include_the_partial_oldest_bucket(tmp_path, monkeypatch):
+    state = SharedState(str(tmp_path / "shared.db"))
+    clock = [60 * 20_000 + 30.0]      # 30s into a 60s bucket
+    monkeypatch.setattr("core.shared_state.time.time", lambda: clock[0])
+    state.incr("calls:m", 6, bucket_s=60, ttl=3600)   # bucket partly inside the 300s window below
+    clock[0] += 300
+    state.incr("calls:m", 4, bucket_s=60, ttl=3600)
+
+    assert state.counter("calls:m", span_s=300, bucket_s=60) == 10
+    assert state.counter("calls:m", bucket_s=60) == 4
+    assert SharedState.covered_span(300, 60, now=clock[0]) == 330
+
+    tracker = YukiCostTracker(project_id="test", shared_state=state)
+    assert tracker.live_stats(window_s=300)["m"]["rpm"] == round(10 / 5.5, 2)
@@ -0,0 +1,46 @@
+import json
+import hashlib
+
+import pytest
+
+np = pytest.importorskip("numpy")
+PILImage = pytest.importorskip("PIL.Image")
+
+from analyzers.analysis_cache import AnalysisCache
+from yuki_skin_analyzer import YukiSkinAnalyzer, histogram_median, measure_skin_rgb
+
+
+def test_histogram_median_matches_numpy():
+    rng = np.random.default_rng(2)
+    for n in (1, 2, 5, 1000, 1001):
+        values = rng.integers(0, 256, size=n).astype(np.uint8)
+        assert histogram_median(values) == int(np.median(values).astype(int))
+
+
+def test_face_box_from_vision_cache_and_batch(tmp_path):
+    vision = tmp_path / "vision"
+    vision.mkdir()
+    arr = np.full((2000, 3000, 3), (90, 120, 200), dtype=np.uint8)   # blue-ish background in the centre
+    arr[100:500, 200:600] = (180, 130, 100)                          # the face, off-centre
+    face = tmp_path / "face.png"
+    PILImage.fromarray(arr).save(face)
+    plain = tmp_path / "plain.png"
+    PILImage.fromarray(arr).resize((300, 200)).save(plain)
+
+    assert measure_skin_rgb(face, vision)["region"] == "center"
+    landmarks = [{"type": "LEFT_EYE", "x": 220.0, "y": 120.0, "z": 0.0}, {"type": "CHIN_GNATHION", "x": 580.0, "y": 480.0, "z": 0.0}]
+    digest = hashlib.md5(face.read_bytes()).hexdigest()
+    (vision / f"{digest}.json").write_text(json.dumps({"landmarks_34": landmarks}))
+
+    measured = measure_skin_rgb(face, vision)
+    assert measured["region"] == "face_landmarks"
+    assert np.abs(np.array(measured["dominant_rgb"]) - (180, 130, 100)).max() <= 2
+
+    analyzer = YukiSkinAnalyzer(cache=AnalysisCache(None), vision_cache_dir=vision)
+    results = analyzer.analyze_many([face, plain, tmp_path / "missing.png"], workers=2)
+    assert [r.get("region") for r in results] == ["face_landmarks", "center", None]
+    assert results[0]["undertone"] == "warm" and results[2] == analyzer._get_fallback_result()
+
+    again = analyzer.analyze_many([plain, face], workers=1)
+    assert again == json.loads(json.dumps([results[1], results[0]]))
+    assert analyzer.cache.stats()["skin"]["memory_hits"] == 2
@@ -0,0 +1,84 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("google.genai")
+
+from prompts.token_estimator import Calibration, TokenEstimator, fit_calibration, text_features
+from yuki_prompt_optimizer import YukiPromptOptimizer
+
+
+def fake_tokens(text):
+    # Stand-in tokenizer: a linear function of the estimator's features
+    words, long_chars, digits, punct, non_ascii, newlines = text_features(text)
+    return int(round(3 + 1.1 * words + 0.3 * long_chars + digits + 0.9 * punct + non_ascii + 0.4 * newlines))
+
+
+class FakeModels:
+    def __init__(self):
+        self.calls = 0
+
+    def count_tokens(self, model, contents):
+        self.calls += 1
+        return SimpleNamespace(total_tokens=fake_tokens(contents))
+
+
+def make_optimizer(calibration):
+    optimizer = YukiPromptOptimizer(api_key="test", token_estimator=TokenEstimator(calibration))
+    optimizer.client = SimpleNamespace(models=FakeModels())
+    return optimizer
+
+
+def corpus():
+    texts = []
+    for i in range(40):
+        texts.append(f"Cosplay of character {i} from anime #{i * 7}: detailed, 4K, studio lighting.\n" * (1 + i % 5))
+        texts.append("<role>\nYou are Yuki, an extraordinarily meticulous consultant.\n</role>\n" * (1 + i % 3) + "東京 ✨" * (i % 4))
+    return [(t, fake_tokens(t)) for t in texts]
+
+
+def test_calibration_fits_corpus_and_memoizes():
+    calibration = fit_calibration(corpus())
+    assert all(c >= 0 for c in calibration.coefficients.values())
+    estimator = TokenEstimator(calibration)
+    for text, tokens in corpus():
+        low, high = estimator.bounds(text)
+        assert low <= tokens <= high
+    hits = estimator.stats()["memo_hits"]
+    estimator.estimate(corpus()[0][0])
+    assert estimator.stats()["memo_hits"] == hits + 1
+
+    estimator.record("exact text", 42)
+    assert estimator.estimate("exact text") == 42 and estimator.bounds("exact text") == (42, 42)
+
+
+def test_optimizer_calls_count_tokens_only_near_budget():
+    optimizer = make_optimizer(Calibration(margin=0.1, samples=len(corpus())))
+    prompt = optimizer.generate_cosplay_prompt("Makima", "Chainsaw Man", "- White shirt, black tie")
+    tokens = fake_tokens(prompt)
+
+    assert optimizer.optimize_for_tokens(prompt, max_tokens=tokens * 3) == prompt
+    assert optimizer.optimize_for_tokens(prompt, max_tokens=tokens // 3) != prompt
+    assert optimizer.client.models.calls == 0
+
+    estimate = optimizer.estimate_tokens(prompt)
+    assert optimizer.fits_token_budget(prompt, estimate) == (tokens <= estimate)
+    assert optimizer.client.models.calls == 1
+    # Exact count is now memoized: no second round trip, no estimate used
+    assert optimizer.fits_token_budget(prompt, estimate) == (tokens <= estimate)
+    assert optimizer.client.models.calls == 1 and optimizer.token_estimator.is_exact(prompt)
+    assert optimizer.validate_prompt_quality(prompt)["token_count"] == tokens
+
+
+def test_unfitted_calibration_defers_every_decision_to_count_tokens():
+    estimator = TokenEstimator()
+    assert not estimator.calibration.fitted
+    assert estimator.fits("Makima, Chainsaw Man", 10_000) is None
+    assert estimator.fits("Makima, Chainsaw Man " * 500, 10) is None
+    assert estimator.stats()["decided_locally"] == 0
+
+    estimator.record("Makima, Chainsaw Man", 6)
+    assert estimator.fits("Makima, Chainsaw Man", 6) is True and estimator.fits("Makima, Chainsaw Man", 5) is False
+
+    optimizer = make_optimizer(Calibration())
+    assert optimizer.fits_token_budget("Makima", 1000) and optimizer.client.models.calls == 1
@@ -0,0 +1,52 @@
+import time
+import asyncio
+from types import SimpleNamespace
+
+from core.tool_executor import ToolExecutor
+
+
+def call(name, **args):
+    return SimpleNamespace(name=name, args=args)
+
+
+def nap(seconds: float = 0.2, tag: str = ""):
+    time.sleep(seconds)
+    return f"slept {seconds} {tag}".strip()
+
+
+def boom():
+    raise ValueError("no such cosplay")
+
+
+def test_turn_runs_calls_concurrently_in_call_order():
+    executor = ToolExecutor({"nap": nap}, max_workers=4)
+    report = asyncio.run(executor.run_turn([call("nap", tag=t) for t in "abc"], turn=1))
+    executor.shutdown()
+
+    assert [c.result for c in report.calls] == ["slept 0.2 a", "slept 0.2 b", "slept 0.2 c"]
+    assert report.wall_time < 0.5 <= report.serial_time
+    assert report.speedup > 1.5
+    assert executor.reports == [report] and report.to_dict()["turn"] == 1
+
+
+def test_timeout_counts_from_start_not_from_queueing():
+    executor = ToolExecutor({"nap": nap, "quick": nap}, max_workers=1,
+                            timeouts={"nap": 1.0, "quick": 0.2})
+    report = asyncio.run(executor.run_turn([call("nap", seconds=0.3), call("quick", seconds=0.05)]))
+    assert [c.status for c in report.calls] == ["ok", "ok"]   # quick waited 0.3s for the worker
+
+    report = asyncio.run(executor.run_turn([call("quick", seconds=0.5)]))
+    executor.shutdown()
+    (timed_out,) = report.calls
+    assert timed_out.status == "timeout" and timed_out.result == "Error: quick timed out after 0.2s"
+    assert 0.2 <= timed_out.duration < 0.4
+
+
+def test_errors_and_unknown_tools_become_tool_responses():
+    executor = ToolExecutor({"boom": boom, "nap": nap})
+    report = asyncio.run(executor.run_turn([call("boom"), call("missing"), call("nap", seconds=0)]))
+    executor.shutdown()
+
+    assert [c.status for c in report.calls] == ["error", "not_found", "ok"]
+    assert report.calls[0].result == "Error executing boom: no such cosplay"
+    assert report.calls[1].result == "Error: Tool missing not found."
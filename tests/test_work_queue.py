@@ -0,0 +1,85 @@
+import time
+import asyncio
+import threading
+
+from yuki_work_queue import WorkQueue, WorkKind, character_priority
+
+
+class Char:
+    def __init__(self, role, rank):
+        self.role = role
+        self.popularity_rank = rank
+
+
+def test_priority_order_and_batch_limit():
+    queue = WorkQueue()
+    queue.mark_dirty("bg", WorkKind.EXTRACT_SCHEMA, character_priority(Char("Background", 5), WorkKind.EXTRACT_SCHEMA))
+    queue.mark_dirty("main", WorkKind.EXTRACT_SCHEMA, character_priority(Char("Main", 900), WorkKind.EXTRACT_SCHEMA))
+    queue.mark_dirty("gen", WorkKind.GENERATE_COSPLAY, character_priority(Char("Main", 1), WorkKind.GENERATE_COSPLAY))
+
+    batch = queue.pull_batch(2)
+    assert [i.character_id for i in batch] == ["main", "bg"]
+    assert [i.character_id for i in queue.pull_batch(5)] == ["gen"]
+    assert queue.pull_batch(5) == []
+
+
+def test_duplicates_coalesce_and_rerun_while_in_flight():
+    queue = WorkQueue()
+    assert queue.mark_dirty("a", WorkKind.EXTRACT_SCHEMA, 10)
+    assert not queue.mark_dirty("a", WorkKind.EXTRACT_SCHEMA, 5)
+    assert len(queue) == 1
+
+    [item] = queue.pull_batch(10)
+    assert item.priority == 5
+    queue.mark_dirty("a", WorkKind.EXTRACT_SCHEMA, 5)  # changed while running
+    assert len(queue) == 0
+    queue.complete(item)
+    assert len(queue) == 1
+    assert queue.get_stats()["coalesced"] == 2
+
+
+def test_failures_back_off_then_dead_letter():
+    queue = WorkQueue(max_attempts=2, backoff_base_seconds=60)
+    queue.mark_dirty("a", WorkKind.GENERATE_COSPLAY, 0)
+
+    [item] = queue.pull_batch(1)
+    queue.fail(item, "quota")
+    assert queue.pull_batch(1) == []                       # backing off
+    assert 40 < queue.next_ready_in() <= 72
+    [item] = queue.pull_batch(1, now=time.time() + 100)
+    assert item.attempts == 1 and item.last_error == "quota"
+
+    queue.fail(item, "quota")
+    assert len(queue) == 0 and queue.get_stats()["dead_letters"] == 1
+
+    # A new change gives the character another chance
+    queue.mark_dirty("a", WorkKind.GENERATE_COSPLAY, 0)
+    assert queue.get_stats()["dead_letters"] == 0
+    assert queue.pull_batch(1)[0].attempts == 0
+
+
+def test_kind_filter_and_state_roundtrip(tmp_path):
+    path = tmp_path / "queue.json"
+    queue = WorkQueue(state_path=path)
+    queue.mark_dirty("a", WorkKind.EXTRACT_SCHEMA, 1)
+    queue.mark_dirty("b", WorkKind.GENERATE_COSPLAY, 0)
+    [gen] = queue.pull_batch(5, kind=WorkKind.GENERATE_COSPLAY)
+    assert gen.character_id == "b"
+    queue.save()
+
+    restored = WorkQueue(state_path=path)
+    assert restored.has_state
+    assert {i.key for i in restored.pull_batch(5)} == {"extract_schema:a", "generate_cosplay:b"}
+
+
+def test_wait_for_work_wakes_on_mark_from_another_thread():
+    queue = WorkQueue()
+
+    async def run():
+        threading.Timer(0.05, queue.mark_dirty, args=("a", WorkKind.EXTRACT_SCHEMA)).start()
+        start = time.perf_counter()
+        woke = await queue.wait_for_work(timeout=5)
+        return woke, time.perf_counter() - start
+
+    woke, elapsed = asyncio.run(run())
+    assert woke and elapsed < 1
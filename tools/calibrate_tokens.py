@@ -0,0 +1,133 @@
+"""
+Yuki Token Estimator Calibration
+Fits prompts/token_estimator.py against Gemini's count_tokens on our prompt corpus
+
+Corpus:
+- YukiPromptOptimizer prompts (cosplay, research, multi-reference, refinements)
+  for a set of characters
+- every PromptEngineering template rendered with its examples
+- optional extra text files (--files), split into paragraphs
+
+Each text is counted once with count_tokens; the fitted coefficients and the
+relative-error margin are written to prompts/token_calibration.json (or --out).
+With --check, an existing calibration is evaluated instead of refitted.
+
+Usage:
+    python tools/calibrate_tokens.py
+    python tools/calibrate_tokens.py --model gemini-3-pro-preview --files "prompts_archive/*.txt"
+    python tools/calibrate_tokens.py --check
+"""
+
+import os
+import sys
+import glob
+import json
+import argparse
+from typing import Iterable, List, Optional, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from prompts.token_estimator import (
+    DEFAULT_CALIBRATION_PATH,
+    Calibration,
+    TokenEstimator,
+    fit_calibration,
+)
+
+CHARACTERS = [
+    ("Makima", "Chainsaw Man"), ("Nezuko Kamado", "Demon Slayer"), ("Subaru Natsuki", "Re:Zero"),
+    ("Sung Jinwoo", "Solo Leveling"), ("Frieren", "Frieren: Beyond Journey's End"),
+    ("Anya Forger", "Spy x Family"), ("Satoru Gojo", "Jujutsu Kaisen"), ("Rem", "Re:Zero"),
+]
+
+
+def optimizer_corpus() -> List[str]:
+    from yuki_prompt_optimizer import YukiPromptOptimizer
+
+    # Prompt builders only; no client call is made
+    optimizer = YukiPromptOptimizer.__new__(YukiPromptOptimizer)
+    optimizer._init_character_templates()
+    optimizer._init_image_templates()
+    texts = []
+    for name, anime in CHARACTERS:
+        texts.append(optimizer.generate_cosplay_prompt(name, anime, f"- Signature outfit of {name}\n- Hair and eyes as in {anime}"))
+        texts.append(optimizer.generate_character_research_prompt(name, anime))
+        texts.append(optimizer.create_multi_reference_prompt(name, num_face_refs=2, num_character_refs=3))
+        texts.extend(optimizer.generate_iterative_refinement_prompts(
+            f"Cosplay photo as {name}", ["Warmer lighting", f"Closer match to {name}'s hair colour"]))
+    return texts
+
+
+def template_corpus() -> List[str]:
+    from prompts.prompt_engineering_system import PromptEngineering
+
+    engine = PromptEngineering()
+    return [
+        template.render(**example)
+        for template in engine.templates.values()
+        for example in template.examples
+    ]
+
+
+def file_corpus(patterns: Iterable[str]) -> List[str]:
+    texts = []
+    for pattern in patterns:
+        for path in glob.glob(pattern, recursive=True):
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                texts.extend(p.strip() for p in f.read().split("\n\n") if p.strip())
+    return texts
+
+
+def count_corpus(texts: List[str], model: str) -> List[Tuple[str, int]]:
+    from core.genai_clients import client_for_model
+
+    client = client_for_model(model)
+    samples = []
+    for i, text in enumerate(dict.fromkeys(texts), 1):
+        samples.append((text, client.models.count_tokens(model=model, contents=text).total_tokens))
+        if i % 25 == 0:
+            print(f"  counted {i} texts")
+    return samples
+
+
+def evaluate(calibration: Calibration, samples: List[Tuple[str, int]]) -> dict:
+    estimator = TokenEstimator(calibration)
+    errors = sorted(abs(estimator.estimate(text) - tokens) / max(tokens, 1) for text, tokens in samples)
+    within = sum(1 for e in errors if e <= calibration.margin)
+    return {
+        "samples": len(samples),
+        "mean_relative_error": round(sum(errors) / len(errors), 4),
+        "max_relative_error": round(errors[-1], 4),
+        "within_margin": round(within / len(errors), 4),
+        "margin": calibration.margin,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Calibrate the local token estimator against count_tokens")
+    parser.add_argument("--model", default="gemini-3-pro-preview")
+    parser.add_argument("--files", nargs="*", default=[], help="Extra text files (glob patterns)")
+    parser.add_argument("--out", default=str(DEFAULT_CALIBRATION_PATH))
+    parser.add_argument("--check", action="store_true", help="Evaluate the existing calibration only")
+    args = parser.parse_args(argv)
+
+    texts = optimizer_corpus() + template_corpus() + file_corpus(args.files)
+    print(f"Counting {len(texts)} texts with {args.model}...")
+    samples = count_corpus(texts, args.model)
+
+    if args.check:
+        calibration = Calibration.load(args.out) if os.path.exists(args.out) else Calibration()
+    else:
+        calibration = fit_calibration(samples, model=args.model)
+        calibration.save(args.out)
+        print(f"Wrote {args.out}")
+    print(json.dumps({"coefficients": calibration.coefficients, "intercept": calibration.intercept,
+                      **evaluate(calibration, samples)}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""
+Yuki Cold Start Benchmark
+Import-time profile of the server entry points (python -X importtime)
+
+Each target is imported in a fresh interpreter (what a Cloud Run cold start
+pays before the first request), repeated --repeat times. Reports wall time of
+the import, the heaviest modules by cumulative import time, and which of the
+known-heavy dependencies were pulled in at import (they should load lazily,
+see core/lazy_resources.py).
+
+Usage:
+    python tools/cold_start_bench.py                       # server, api, semantic_search
+    python tools/cold_start_bench.py --target server --repeat 5 --top 15
+    python tools/cold_start_bench.py --max-seconds 1.5 --forbid-heavy --out bench/cold_start.json
+"""
+
+import os
+import re
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+# What each entry point's import looks like in production
+TARGETS: Dict[str, str] = {
+    "server": "import server",
+    # api/yuki_api.py imports `tools` meaning core/tools.py (see load_harness.load_api_module)
+    "api": (
+        "import sys, importlib.util; sys.path.insert(0, 'core'); "
+        "spec = importlib.util.spec_from_file_location('yuki_api_app', 'api/yuki_api.py'); "
+        "spec.loader.exec_module(importlib.util.module_from_spec(spec))"
+    ),
+    "semantic_search": "import sys; sys.path.insert(0, 'tools'); import semantic_search",
+}
+
+# Dependencies that must not load at import time any more
+HEAVY_MODULES = (
+    "google.genai", "google.cloud.storage", "google.cloud.bigquery", "google.auth",
+    "vertexai", "yuki_tools", "tools", "agent", "aiohttp", "PIL",
+)
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+WALL_MARKER = "__YUKI_IMPORT_WALL__"
+START_MARKER = "__YUKI_IMPORT_START__"
+
+
+@dataclass
+class ImportRecord:
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(stderr: str) -> List[ImportRecord]:
+    """
+    Parse `-X importtime` output (one line per module, nesting shown by indentation).
+    Interpreter start-up imports before START_MARKER (site, encodings, ...) are skipped.
+    """
+    lines = stderr.splitlines()
+    if START_MARKER in lines:
+        lines = lines[lines.index(START_MARKER) + 1:]
+    records = []
+    for line in lines:
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            records.append(ImportRecord(module, int(self_us), int(cumulative_us), max(0, (len(indent) - 1) // 2)))
+    return records
+
+
+def direct_imports(records: List[ImportRecord]) -> List[ImportRecord]:
+    """What the entry point itself pulled in: top-level records, or the children of a single top-level module."""
+    if not records:
+        return []
+    top = min(r.depth for r in records)
+    level = [r for r in records if r.depth == top]
+    if len(level) == 1:
+        level = [r for r in records if r.depth == top + 1] or level
+    return level
+
+
+def heavy_modules_loaded(records: List[ImportRecord], heavy=HEAVY_MODULES) -> List[str]:
+    loaded = {r.module for r in records}
+    return [name for name in heavy if name in loaded]
+
+
+def profile_target(name: str, python: str = sys.executable, env: Optional[Dict[str, str]] = None) -> Dict:
+    """One fresh-interpreter import of a target: wall seconds plus the parsed importtime records."""
+    code = (
+        f"import sys as _s, time as _t; _s.stderr.write('{START_MARKER}\\n'); _s.stderr.flush()\n"
+        "_start = _t.perf_counter()\n"
+        f"{TARGETS[name]}\n"
+        f"print('{WALL_MARKER}', _t.perf_counter() - _start)"
+    )
+    run_env = {**os.environ, "YUKI_WARMUP": "0", **(env or {})}
+    proc = subprocess.run([python, "-X", "importtime", "-c", code], cwd=ROOT, env=run_env,
+                          capture_output=True, text=True)
+    wall = None
+    for line in proc.stdout.splitlines():
+        if line.startswith(WALL_MARKER):
+            wall = float(line.split()[1])
+    error = None
+    if proc.returncode != 0:
+        messages = [l for l in proc.stderr.splitlines() if not l.startswith("import time:")]
+        error = messages[-1] if messages else f"exit code {proc.returncode}"
+    return {"wall_seconds": wall, "records": parse_importtime(proc.stderr), "error": error}
+
+
+def summarize_target(name: str, runs: List[Dict], top: int) -> Dict:
+    walls = [r["wall_seconds"] for r in runs if r["wall_seconds"] is not None]
+    last = runs[-1]
+    ranked = sorted(direct_imports(last["records"]), key=lambda r: r.cumulative_us, reverse=True)
+    return {
+        "target": name,
+        "runs": len(runs),
+        "error": last["error"],
+        "wall_seconds_median": round(statistics.median(walls), 4) if walls else None,
+        "wall_seconds_min": round(min(walls), 4) if walls else None,
+        "modules_imported": len(last["records"]),
+        "heavy_loaded": heavy_modules_loaded(last["records"]),
+        "top_imports": [{"module": r.module, "cumulative_ms": round(r.cumulative_us / 1000, 1),
+                         "self_ms": round(r.self_us / 1000, 1)} for r in ranked[:top]],
+    }
+
+
+def run_benchmark(targets: List[str], repeat: int = 3, top: int = 10, python: str = sys.executable) -> List[Dict]:
+    return [summarize_target(name, [profile_target(name, python) for _ in range(repeat)], top) for name in targets]
+
+
+def print_report(results: List[Dict]):
+    for result in results:
+        print(f"\n=== {result['target']} ===")
+        if result["error"]:
+            print(f"  import failed: {result['error']}")
+        print(f"  import wall time: {result['wall_seconds_median']}s median ({result['runs']} runs), "
+              f"{result['modules_imported']} modules")
+        print(f"  heavy modules at import: {', '.join(result['heavy_loaded']) or 'none'}")
+        for item in result["top_imports"]:
+            print(f"    {item['cumulative_ms']:>9.1f} ms  {item['module']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Import-time (cold start) benchmark for the Yuki servers")
+    parser.add_argument("--target", help=f"Comma-separated: {', '.join(TARGETS)}")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10, help="Heaviest top-level imports to list")
+    parser.add_argument("--python", default=sys.executable)
+    parser.add_argument("--max-seconds", type=float, help="Fail if any target's median import exceeds this")
+    parser.add_argument("--forbid-heavy", action="store_true", help="Fail if a heavy dependency loads at import")
+    parser.add_argument("--out", help="Write results JSON here")
+    args = parser.parse_args(argv)
+
+    names = [n.strip() for n in args.target.split(",")] if args.target else list(TARGETS)
+    results = run_benchmark(names, repeat=args.repeat, top=args.top, python=args.python)
+    print_report(results)
+
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.out}")
+
+    failures = []
+    for result in results:
+        if result["error"]:
+            failures.append(f"{result['target']}: import failed")
+        if args.max_seconds is not None and (result["wall_seconds_median"] or 0) > args.max_seconds:
+            failures.append(f"{result['target']}: {result['wall_seconds_median']}s > {args.max_seconds}s")
+        if args.forbid_heavy and result["heavy_loaded"]:
+            failures.append(f"{result['target']}: loads {', '.join(result['heavy_loaded'])} at import")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,589 @@
+"""
+Yuki Load Harness
+Repeatable load benchmarks for the FastAPI apps and pipelines against the mock GenAI server
+
+Unlike comprehensive_stress_test.py (whole matrix built up front, gather barriers,
+asyncio.sleep stand-ins), this drives the real code paths:
+- server.py and api/yuki_api.py in-process over ASGI (or any running server via --url)
+- tools/semantic_search embeddings, the V12 Cloud Vision analyzer and V12 stages 2-4
+with every Gemini / Vision request answered by tools/mock_genai_server.py.
+
+Work items are generated lazily and fed through a sliding window: a new request
+starts as soon as one finishes, so the number in flight stays at --concurrency
+and memory does not grow with --requests.
+
+Reports throughput, p50/p95/p99 per stage, error counts and memory (peak RSS,
+optional tracemalloc peak); --out writes the JSON for comparing runs.
+
+Usage:
+    python tools/load_harness.py --scenario server_chat,embed --requests 500 --concurrency 32
+    python tools/load_harness.py --suite --speed 0.1 --out bench/baseline.json
+    python tools/load_harness.py --scenario server_chat --url http://localhost:8080
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import itertools
+import contextlib
+import importlib.util
+import tempfile
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+# Add parent directory to path (and tools/, for sibling modules as in build_embeddings.py)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+from mock_genai_server import MockProfile, MockServerThread, mock_vision_client
+
+
+# =============================================================================
+# METRICS
+# =============================================================================
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Linear-interpolated percentile of an already sorted list (q in 0..100)."""
+    if not sorted_values:
+        return 0.0
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    rank = (len(sorted_values) - 1) * q / 100.0
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+@dataclass
+class StageStats:
+    name: str
+    latencies: List[float] = field(default_factory=list)
+    errors: Dict[str, int] = field(default_factory=dict)
+
+    def summary(self, wall_time: float) -> Dict[str, Any]:
+        values = sorted(self.latencies)
+        failed = sum(self.errors.values())
+        return {
+            "count": len(values) + failed,
+            "ok": len(values),
+            "errors": dict(self.errors),
+            "throughput_rps": round(len(values) / wall_time, 2) if wall_time > 0 else 0.0,
+            "mean_ms": round(sum(values) / len(values) * 1000, 1) if values else 0.0,
+            "p50_ms": round(percentile(values, 50) * 1000, 1),
+            "p95_ms": round(percentile(values, 95) * 1000, 1),
+            "p99_ms": round(percentile(values, 99) * 1000, 1),
+            "max_ms": round(values[-1] * 1000, 1) if values else 0.0,
+        }
+
+
+class Recorder:
+    """Per-stage latency and error collection."""
+
+    def __init__(self):
+        self.stages: Dict[str, StageStats] = {}
+
+    def record(self, stage: str, seconds: Optional[float] = None, error: Optional[str] = None):
+        stats = self.stages.setdefault(stage, StageStats(stage))
+        if error:
+            stats.errors[error] = stats.errors.get(error, 0) + 1
+        else:
+            stats.latencies.append(seconds or 0.0)
+
+    @contextlib.asynccontextmanager
+    async def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.record(name, error=type(e).__name__)
+            raise
+        self.record(name, time.perf_counter() - start)
+
+    def reset(self):
+        self.stages.clear()
+
+    def summary(self, wall_time: float) -> Dict[str, Dict[str, Any]]:
+        return {name: stats.summary(wall_time) for name, stats in self.stages.items()}
+
+
+class StageFailed(Exception):
+    """A pipeline stage returned an empty result (the V12 stages swallow their own errors)."""
+
+
+class MemorySampler:
+    """Samples process RSS in the background; optional tracemalloc peak for Python allocations."""
+
+    def __init__(self, interval: float = 0.1, trace: bool = False):
+        self.interval = interval
+        self.trace = trace
+        self.peak_rss = 0
+        self.start_rss = 0
+        self._task: Optional[asyncio.Task] = None
+        try:
+            import psutil
+            self._process = psutil.Process()
+        except ImportError:
+            self._process = None
+
+    def rss(self) -> int:
+        if self._process is not None:
+            return self._process.memory_info().rss
+        try:
+            import resource
+            # ru_maxrss is KiB on Linux (already a peak, not a sample)
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except ImportError:
+            return 0
+
+    async def _sample(self):
+        while True:
+            self.peak_rss = max(self.peak_rss, self.rss())
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self.start_rss = self.peak_rss = self.rss()
+        if self.trace:
+            tracemalloc.start()
+        self._task = asyncio.create_task(self._sample())
+
+    async def stop(self) -> Dict[str, Any]:
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+        self.peak_rss = max(self.peak_rss, self.rss())
+        report = {
+            "rss_start_mb": round(self.start_rss / 2**20, 1),
+            "rss_peak_mb": round(self.peak_rss / 2**20, 1),
+            "rss_growth_mb": round((self.peak_rss - self.start_rss) / 2**20, 1),
+        }
+        if self.trace:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            report["tracemalloc_peak_mb"] = round(peak / 2**20, 1)
+        return report
+
+
+# =============================================================================
+# SLIDING WINDOW
+# =============================================================================
+
+def work_items(requests: Optional[int] = None, duration: Optional[float] = None) -> Iterable[int]:
+    """Lazy item indices: a fixed count, or as many as fit in `duration` seconds."""
+    if duration:
+        deadline = time.perf_counter() + duration
+        return itertools.takewhile(lambda _: time.perf_counter() < deadline, itertools.count())
+    return iter(range(requests or 0))
+
+
+async def run_window(
+    items: Iterable[Any],
+    worker: Callable[[Any], Awaitable[Any]],
+    concurrency: int,
+) -> int:
+    """
+    Run worker(item) for every item with at most `concurrency` in flight.
+    Items are pulled one at a time as slots free up; worker exceptions are
+    counted by the Recorder, not raised. Returns the number of items run.
+    """
+    iterator = iter(items)
+    in_flight: set = set()
+    started = 0
+
+    def refill():
+        nonlocal started
+        while len(in_flight) < concurrency:
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            in_flight.add(asyncio.create_task(worker(item)))
+            started += 1
+
+    refill()
+    while in_flight:
+        done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            in_flight.discard(task)
+            if not task.cancelled():
+                task.exception()  # retrieved so asyncio doesn't warn; already recorded
+        refill()
+    return started
+
+
+# =============================================================================
+# SCENARIOS
+# =============================================================================
+
+@dataclass
+class HarnessContext:
+    base_url: str
+    recorder: Recorder
+    work_dir: Path
+    target_url: Optional[str] = None
+    state: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class Scenario:
+    name: str
+    description: str
+    setup: Callable[[HarnessContext], Awaitable[None]]
+    run_one: Callable[[HarnessContext, int], Awaitable[None]]
+    teardown: Optional[Callable[[HarnessContext], Awaitable[None]]] = None
+
+
+SCENARIOS: Dict[str, Scenario] = {}
+
+
+def scenario(name: str, description: str, teardown: Optional[Callable] = None):
+    def register(setup_and_run):
+        setup, run_one = setup_and_run()
+        SCENARIOS[name] = Scenario(name, description, setup, run_one, teardown)
+        return setup_and_run
+    return register
+
+
+def load_api_module():
+    """api/yuki_api.py under its own name (a different yuki_api.py lives at the repo root).
+    It imports `tools` meaning core/tools.py, so core/ must lead sys.path."""
+    core_dir = os.path.join(ROOT, "core")
+    if core_dir not in sys.path:
+        sys.path.insert(0, core_dir)
+    spec = importlib.util.spec_from_file_location("yuki_api_app", os.path.join(ROOT, "api", "yuki_api.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+async def http_client(ctx: HarnessContext, app_loader: Callable[[], Any]):
+    import httpx
+    if ctx.target_url:
+        return httpx.AsyncClient(base_url=ctx.target_url, timeout=300)
+    app = app_loader()
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://yuki.local", timeout=300)
+
+
+def chat_payload(i: int, stream: bool = False) -> Dict[str, Any]:
+    return {
+        "model": "gemini-3-flash-preview",
+        "messages": [{"role": "user", "content": f"Load test #{i}: suggest a cosplay for a rainy day."}],
+        "stream": stream,
+    }
+
+
+async def _close_http(ctx: HarnessContext):
+    client = ctx.state.pop("http", None)
+    if client is not None:
+        await client.aclose()
+
+
+def _chat_scenario(app_loader: Callable[[], Any], stage: str):
+    async def setup(ctx: HarnessContext):
+        ctx.state["http"] = await http_client(ctx, app_loader)
+
+    async def run_one(ctx: HarnessContext, i: int):
+        async with ctx.recorder.stage(stage):
+            response = await ctx.state["http"].post("/v1/chat/completions", json=chat_payload(i))
+            response.raise_for_status()
+            if "error" in response.json():
+                raise StageFailed(response.json()["error"])
+
+    return setup, run_one
+
+
+def _server_app():
+    import server
+    return server.app
+
+
+@scenario("server_chat", "server.py /v1/chat/completions (blocking)", teardown=_close_http)
+def _server_chat():
+    return _chat_scenario(_server_app, "server_chat")
+
+
+@scenario("server_chat_stream", "server.py /v1/chat/completions (SSE): time-to-first-chunk and total",
+          teardown=_close_http)
+def _server_chat_stream():
+    async def setup(ctx: HarnessContext):
+        ctx.state["http"] = await http_client(ctx, _server_app)
+
+    async def run_one(ctx: HarnessContext, i: int):
+        start = time.perf_counter()
+        async with ctx.recorder.stage("server_chat_stream.total"):
+            async with ctx.state["http"].stream("POST", "/v1/chat/completions",
+                                                json=chat_payload(i, stream=True)) as response:
+                response.raise_for_status()
+                first = True
+                async for line in response.aiter_lines():
+                    if first and line.startswith("data:") and '"content": ""' not in line:
+                        ctx.recorder.record("server_chat_stream.ttft", time.perf_counter() - start)
+                        first = False
+
+    return setup, run_one
+
+
+@scenario("api_chat", "api/yuki_api.py /v1/chat/completions (blocking)", teardown=_close_http)
+def _api_chat():
+    return _chat_scenario(lambda: load_api_module().app, "api_chat")
+
+
+@scenario("embed", "tools/semantic_search.get_embedding (embed_content)")
+def _embed():
+    async def setup(ctx: HarnessContext):
+        import semantic_search
+        ctx.state["embed"] = semantic_search.get_embedding
+
+    async def run_one(ctx: HarnessContext, i: int):
+        async with ctx.recorder.stage("embed"):
+            vector = await asyncio.to_thread(ctx.state["embed"], f"Character #{i}: silver hair, red eyes")
+            if not vector:
+                raise StageFailed("empty embedding")
+
+    return setup, run_one
+
+
+def _subject_image(ctx: HarnessContext, i: int) -> Path:
+    """Unique bytes per item so the analyzer's on-disk cache never short-circuits the request."""
+    path = ctx.work_dir / f"subject_{i}.jpg"
+    path.write_bytes(b"\xff\xd8\xff\xe0" + os.urandom(2048) + b"\xff\xd9")
+    return path
+
+
+async def _vision_setup(ctx: HarnessContext):
+    from image_gen.v12_pipeline import CloudVisionAnalyzer
+    analyzer = CloudVisionAnalyzer(cache_dir=ctx.work_dir / "cloud_vision")
+    analyzer._client = mock_vision_client(ctx.base_url)
+    ctx.state["vision"] = analyzer
+
+
+async def _detect_face(ctx: HarnessContext, image_path: Path, stage: str) -> Dict[str, Any]:
+    async with ctx.recorder.stage(stage):
+        result = await asyncio.to_thread(ctx.state["vision"].detect_face, image_path)
+        if result.get("error"):
+            raise StageFailed(result["error"])
+    return result
+
+
+@scenario("vision", "V12 CloudVisionAnalyzer.detect_face (Vision face_detection)")
+def _vision():
+    async def run_one(ctx: HarnessContext, i: int):
+        image_path = await asyncio.to_thread(_subject_image, ctx, i)
+        await _detect_face(ctx, image_path, "vision")
+
+    return _vision_setup, run_one
+
+
+@scenario("pipeline_v12", "V12 stages: Vision -> 68-point expansion -> identity lock -> image generation")
+def _pipeline_v12():
+    async def setup(ctx: HarnessContext):
+        from core.genai_clients import get_genai_client
+        from image_gen.v12_pipeline import PROJECT_ID
+        await _vision_setup(ctx)
+        ctx.state["client"] = get_genai_client(location="global", project=PROJECT_ID)
+
+    async def run_one(ctx: HarnessContext, i: int):
+        from google.genai import types
+        from image_gen import v12_pipeline as v12
+
+        start = time.perf_counter()
+        client = ctx.state["client"]
+        image_path = await asyncio.to_thread(_subject_image, ctx, i)
+        parts = [types.Part.from_bytes(data=image_path.read_bytes(), mime_type="image/jpeg")]
+
+        cv_data = await _detect_face(ctx, image_path, "pipeline.vision")
+        async with ctx.recorder.stage("pipeline.expand_68"):
+            expansion = await v12.expand_to_68_points(client, cv_data, parts)
+            if not expansion:
+                raise StageFailed("expand_68")
+        async with ctx.recorder.stage("pipeline.identity_lock"):
+            lock = await v12.deep_analysis_pro(client, f"Subject {i}", cv_data, expansion, parts)
+            if not lock:
+                raise StageFailed("identity_lock")
+        async with ctx.recorder.stage("pipeline.generate_image"):
+            image = await v12.generate_image(client, f"Subject {i}", "Makima", lock, image_path, parts)
+            if not image:
+                raise StageFailed("generate_image")
+        ctx.recorder.record("pipeline.total", time.perf_counter() - start)
+
+    return setup, run_one
+
+
+DEFAULT_SUITE = ["server_chat", "server_chat_stream", "api_chat", "embed", "vision", "pipeline_v12"]
+
+
+# =============================================================================
+# RUNNER
+# =============================================================================
+
+@dataclass
+class ScenarioResult:
+    name: str
+    requests: int = 0
+    concurrency: int = 0
+    wall_time: float = 0.0
+    stages: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    memory: Dict[str, Any] = field(default_factory=dict)
+    skipped: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "requests": self.requests,
+            "concurrency": self.concurrency,
+            "wall_time_s": round(self.wall_time, 3),
+            "throughput_rps": round(self.requests / self.wall_time, 2) if self.wall_time > 0 else 0.0,
+            "stages": self.stages,
+            "memory": self.memory,
+            "skipped": self.skipped,
+        }
+
+
+async def run_scenario(
+    spec: Scenario,
+    ctx: HarnessContext,
+    requests: Optional[int],
+    concurrency: int,
+    duration: Optional[float] = None,
+    warmup: int = 0,
+    trace_memory: bool = False,
+) -> ScenarioResult:
+    result = ScenarioResult(spec.name, concurrency=concurrency)
+    try:
+        await spec.setup(ctx)
+    except Exception as e:
+        result.skipped = f"setup failed: {type(e).__name__}: {e}"
+        print(f"   ⚠️ {spec.name} skipped ({result.skipped})")
+        return result
+
+    try:
+        if warmup:
+            await run_window(range(-warmup, 0), lambda i: spec.run_one(ctx, i), concurrency)
+            ctx.recorder.reset()
+
+        memory = MemorySampler(trace=trace_memory)
+        memory.start()
+        start = time.perf_counter()
+        result.requests = await run_window(
+            work_items(requests, duration), lambda i: spec.run_one(ctx, i), concurrency
+        )
+        result.wall_time = time.perf_counter() - start
+        result.memory = await memory.stop()
+        result.stages = ctx.recorder.summary(result.wall_time)
+    finally:
+        ctx.recorder.reset()
+        if spec.teardown:
+            await spec.teardown(ctx)
+    return result
+
+
+def print_report(results: List[ScenarioResult]):
+    header = f"{'stage':<34}{'ok':>7}{'err':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    for result in results:
+        print(f"\n=== {result.name} ===")
+        if result.skipped:
+            print(f"   skipped: {result.skipped}")
+            continue
+        data = result.to_dict()
+        print(f"   {data['requests']} requests @ concurrency {data['concurrency']} in "
+              f"{data['wall_time_s']}s -> {data['throughput_rps']} req/s | memory {data['memory']}")
+        print(header)
+        for name, s in sorted(result.stages.items()):
+            errors = sum(s["errors"].values())
+            print(f"{name:<34}{s['ok']:>7}{errors:>6}{s['throughput_rps']:>9}"
+                  f"{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}{s['max_ms']:>10}")
+            if errors:
+                print(f"{'':<34}errors: {s['errors']}")
+
+
+async def run_suite(
+    names: List[str],
+    profile: MockProfile,
+    requests: Optional[int] = 200,
+    concurrency: int = 16,
+    duration: Optional[float] = None,
+    warmup: int = 0,
+    target_url: Optional[str] = None,
+    trace_memory: bool = False,
+    quiet: bool = True,
+) -> Dict[str, Any]:
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        raise ValueError(f"Unknown scenario(s) {unknown}; available: {sorted(SCENARIOS)}")
+
+    with MockServerThread(profile) as mock, tempfile.TemporaryDirectory() as tmp:
+        # Every genai client the apps build (core/genai_clients.py) now talks to the mock
+        os.environ["YUKI_GENAI_BASE_URL"] = mock.base_url
+        ctx = HarnessContext(base_url=mock.base_url, recorder=Recorder(),
+                             work_dir=Path(tmp), target_url=target_url)
+        results = []
+        for name in names:
+            print(f"▶ {name}: {SCENARIOS[name].description}")
+            sink = open(os.devnull, "w") if quiet else None
+            with contextlib.redirect_stdout(sink) if sink else contextlib.nullcontext():
+                results.append(await run_scenario(
+                    SCENARIOS[name], ctx, requests, concurrency, duration, warmup, trace_memory
+                ))
+            if sink:
+                sink.close()
+        mock_counts = mock.stats()
+
+    print_report(results)
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "profile": profile.to_dict(),
+        "settings": {"requests": requests, "duration": duration, "concurrency": concurrency,
+                     "warmup": warmup, "target_url": target_url},
+        "mock_requests": mock_counts,
+        "results": [r.to_dict() for r in results],
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Yuki load harness (mock GenAI / Vision backend)")
+    parser.add_argument("--scenario", help=f"Comma-separated: {', '.join(SCENARIOS)}")
+    parser.add_argument("--suite", action="store_true", help="Run the default benchmark suite")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--duration", type=float, help="Run each scenario for N seconds instead of --requests")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=0, help="Unmeasured requests before each scenario")
+    parser.add_argument("--profile", help="JSON MockProfile (latency/error distributions)")
+    parser.add_argument("--speed", type=float, help="Scale mock latencies (0 = no waiting)")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--url", help="Drive a running server instead of the in-process app "
+                                      "(start it with YUKI_GENAI_BASE_URL pointing at a mock server)")
+    parser.add_argument("--tracemalloc", action="store_true", help="Also report Python allocation peak")
+    parser.add_argument("--verbose", action="store_true", help="Keep app/pipeline stdout")
+    parser.add_argument("--out", help="Write results JSON here")
+    args = parser.parse_args(argv)
+
+    names = DEFAULT_SUITE if args.suite or not args.scenario else [n.strip() for n in args.scenario.split(",")]
+    profile = MockProfile.from_file(args.profile) if args.profile else MockProfile()
+    if args.speed is not None:
+        profile.speed = args.speed
+    if args.seed is not None:
+        profile.seed = args.seed
+
+    report = asyncio.run(run_suite(
+        names, profile, requests=args.requests, concurrency=args.concurrency,
+        duration=args.duration, warmup=args.warmup, target_url=args.url,
+        trace_memory=args.tracemalloc, quiet=not args.verbose,
+    ))
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
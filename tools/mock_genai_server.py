@@ -0,0 +1,494 @@
+"""
+Mock GenAI / Cloud Vision Server
+Local stand-in for the Gemini and Vision REST APIs, for load testing without cost
+
+Serves the endpoints Yuki's clients actually call:
+- POST /v1beta/models/{model}:generateContent        (text, JSON schema, image models)
+- POST /v1beta/models/{model}:streamGenerateContent  (?alt=sse)
+- POST /v1beta/models/{model}:embedContent / :batchEmbedContents
+- POST /v1beta/models/{model}:countTokens
+- POST /v1/images:annotate                           (Vision FACE_DETECTION)
+
+Latency and error rates are drawn per endpoint from a seeded MockProfile, so a
+benchmark run is repeatable. Real SDK clients are pointed at it with
+mock_genai_client() / mock_vision_client(), or process-wide by setting
+YUKI_GENAI_BASE_URL (see core/genai_clients.py).
+
+Run standalone:
+    python tools/mock_genai_server.py --port 8765 --profile profile.json
+"""
+
+import json
+import math
+import time
+import base64
+import random
+import socket
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("YukiMockGenAI")
+
+# 1x1 PNG returned by image models
+TINY_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=="
+)
+
+ERROR_STATUS = {
+    400: "INVALID_ARGUMENT",
+    429: "RESOURCE_EXHAUSTED",
+    500: "INTERNAL",
+    503: "UNAVAILABLE",
+    504: "DEADLINE_EXCEEDED",
+}
+
+FACE_LANDMARKS = [
+    "LEFT_EYE", "RIGHT_EYE", "LEFT_OF_LEFT_EYEBROW", "RIGHT_OF_LEFT_EYEBROW",
+    "LEFT_OF_RIGHT_EYEBROW", "RIGHT_OF_RIGHT_EYEBROW", "MIDPOINT_BETWEEN_EYES", "NOSE_TIP",
+    "UPPER_LIP", "LOWER_LIP", "MOUTH_LEFT", "MOUTH_RIGHT", "MOUTH_CENTER",
+    "NOSE_BOTTOM_RIGHT", "NOSE_BOTTOM_LEFT", "NOSE_BOTTOM_CENTER", "LEFT_EYE_TOP_BOUNDARY",
+    "LEFT_EYE_RIGHT_CORNER", "LEFT_EYE_BOTTOM_BOUNDARY", "LEFT_EYE_LEFT_CORNER",
+    "RIGHT_EYE_TOP_BOUNDARY", "RIGHT_EYE_RIGHT_CORNER", "RIGHT_EYE_BOTTOM_BOUNDARY",
+    "RIGHT_EYE_LEFT_CORNER", "LEFT_EYEBROW_UPPER_MIDPOINT", "RIGHT_EYEBROW_UPPER_MIDPOINT",
+    "LEFT_EAR_TRAGION", "RIGHT_EAR_TRAGION", "FOREHEAD_GLABELLA", "CHIN_GNATHION",
+    "CHIN_LEFT_GONION", "CHIN_RIGHT_GONION", "LEFT_CHEEK_CENTER", "RIGHT_CHEEK_CENTER",
+]
+
+
+# =============================================================================
+# PROFILE
+# =============================================================================
+
+@dataclass
+class LatencyModel:
+    """
+    Per-endpoint latency: lognormal fitted to a median and p99, clipped to max_ms.
+    kind="fixed" always returns median_ms; kind="uniform" draws in [min_ms, p99_ms].
+    """
+    median_ms: float = 200.0
+    p99_ms: float = 800.0
+    min_ms: float = 0.0
+    max_ms: float = 30000.0
+    kind: str = "lognormal"
+
+    def sample(self, rng: random.Random) -> float:
+        """Seconds to wait for one request."""
+        if self.kind == "fixed":
+            ms = self.median_ms
+        elif self.kind == "uniform":
+            ms = rng.uniform(self.min_ms, self.p99_ms)
+        else:
+            sigma = math.log(max(self.p99_ms, self.median_ms) / max(self.median_ms, 1e-3)) / 2.326
+            ms = rng.lognormvariate(math.log(max(self.median_ms, 1e-3)), sigma)
+        return min(max(ms, self.min_ms), self.max_ms) / 1000.0
+
+
+@dataclass
+class EndpointProfile:
+    latency: LatencyModel = field(default_factory=LatencyModel)
+    errors: Dict[int, float] = field(default_factory=dict)  # status code -> probability
+
+    def draw_error(self, rng: random.Random) -> Optional[int]:
+        roll = rng.random()
+        for code, probability in sorted(self.errors.items()):
+            if roll < probability:
+                return int(code)
+            roll -= probability
+        return None
+
+
+def _default_endpoints() -> Dict[str, EndpointProfile]:
+    return {
+        "generate": EndpointProfile(LatencyModel(median_ms=800, p99_ms=3000)),
+        "generate_image": EndpointProfile(LatencyModel(median_ms=6000, p99_ms=15000)),
+        "stream_first_chunk": EndpointProfile(LatencyModel(median_ms=400, p99_ms=1500)),
+        "stream_chunk": EndpointProfile(LatencyModel(median_ms=30, p99_ms=120)),
+        "embed": EndpointProfile(LatencyModel(median_ms=60, p99_ms=250)),
+        "count_tokens": EndpointProfile(LatencyModel(median_ms=40, p99_ms=150)),
+        "vision": EndpointProfile(LatencyModel(median_ms=300, p99_ms=900)),
+    }
+
+
+@dataclass
+class MockProfile:
+    """Latency/error distributions per endpoint. speed scales every latency (0 = no waiting)."""
+    endpoints: Dict[str, EndpointProfile] = field(default_factory=_default_endpoints)
+    seed: int = 1234
+    speed: float = 1.0
+    stream_chunks: int = 8
+    embedding_dimensions: int = 768
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MockProfile":
+        profile = cls(**{k: v for k, v in data.items() if k != "endpoints"})
+        for name, spec in (data.get("endpoints") or {}).items():
+            base = profile.endpoints.get(name, EndpointProfile())
+            latency = {**asdict(base.latency), **(spec.get("latency") or {})}
+            errors = {int(k): float(v) for k, v in (spec.get("errors") or base.errors).items()}
+            profile.endpoints[name] = EndpointProfile(LatencyModel(**latency), errors)
+        return profile
+
+    @classmethod
+    def from_file(cls, path: str) -> "MockProfile":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+# =============================================================================
+# RESPONSE SYNTHESIS
+# =============================================================================
+
+def synthesize_from_schema(
+    schema: Optional[Dict[str, Any]],
+    rng: random.Random,
+    depth: int = 0,
+    defs: Optional[Dict[str, Any]] = None,
+) -> Any:
+    """
+    Minimal instance of an OpenAPI (responseSchema) or JSON Schema (responseJsonSchema),
+    so structured-output callers can validate the mock response with their Pydantic models.
+    """
+    if not schema or depth > 12:
+        return None
+    if defs is None:
+        defs = schema.get("$defs") or schema.get("definitions") or {}
+    if "$ref" in schema:
+        return synthesize_from_schema(defs.get(schema["$ref"].rsplit("/", 1)[-1]), rng, depth + 1, defs)
+    for combinator in ("anyOf", "any_of", "oneOf"):
+        options = [s for s in schema.get(combinator) or [] if str(s.get("type", "")).lower() != "null"]
+        if options:
+            return synthesize_from_schema(options[0], rng, depth + 1, defs)
+    if schema.get("enum"):
+        return schema["enum"][0]
+
+    kind = schema.get("type")
+    if isinstance(kind, list):
+        kind = next((k for k in kind if str(k).lower() != "null"), "string")
+    kind = str(kind or ("object" if "properties" in schema else "string")).lower()
+
+    if kind == "object":
+        return {
+            name: synthesize_from_schema(sub, rng, depth + 1, defs)
+            for name, sub in (schema.get("properties") or {}).items()
+        }
+    if kind == "array":
+        count = max(int(schema.get("minItems", schema.get("min_items", 1)) or 1), 1)
+        return [synthesize_from_schema(schema.get("items") or {}, rng, depth + 1, defs) for _ in range(count)]
+    if kind == "integer":
+        return rng.randint(int(schema.get("minimum", 0)), int(schema.get("maximum", 100)))
+    if kind == "number":
+        return round(rng.uniform(float(schema.get("minimum", 0.0)), float(schema.get("maximum", 1.0))), 4)
+    if kind == "boolean":
+        return True
+    return schema.get("description", "mock")[:40] or "mock"
+
+
+def _prompt_chars(body: Dict[str, Any]) -> int:
+    chars = 0
+    for content in body.get("contents") or []:
+        for part in content.get("parts") or []:
+            chars += len(part.get("text") or "")
+    system = body.get("systemInstruction") or body.get("system_instruction") or {}
+    for part in system.get("parts") or []:
+        chars += len(part.get("text") or "")
+    return chars
+
+
+def _usage(body: Dict[str, Any], completion_chars: int, images: int = 0) -> Dict[str, int]:
+    prompt = _prompt_chars(body) // 4 + images * 258
+    completion = max(completion_chars // 4, 1)
+    return {"promptTokenCount": prompt, "candidatesTokenCount": completion,
+            "totalTokenCount": prompt + completion}
+
+
+def _count_images(body: Dict[str, Any]) -> int:
+    return sum(
+        1 for content in body.get("contents") or []
+        for part in content.get("parts") or [] if part.get("inlineData") or part.get("inline_data")
+    )
+
+
+def generate_response(model: str, body: Dict[str, Any], rng: random.Random) -> Dict[str, Any]:
+    config = body.get("generationConfig") or body.get("generation_config") or {}
+    schema = config.get("responseJsonSchema") or config.get("responseSchema")
+    modalities = [m.upper() for m in config.get("responseModalities") or []]
+
+    if "image" in model or "IMAGE" in modalities:
+        parts = [{"text": "Mock image."},
+                 {"inlineData": {"mimeType": "image/png", "data": base64.b64encode(TINY_PNG).decode()}}]
+        text_len = 11
+    elif schema:
+        text = json.dumps(synthesize_from_schema(schema, rng))
+        parts, text_len = [{"text": text}], len(text)
+    else:
+        text = f"Mock response from {model} ({rng.randint(0, 1_000_000)})."
+        parts, text_len = [{"text": text}], len(text)
+
+    return {
+        "candidates": [{"content": {"role": "model", "parts": parts}, "finishReason": "STOP", "index": 0}],
+        "usageMetadata": _usage(body, text_len, _count_images(body)),
+        "modelVersion": model,
+    }
+
+
+def face_annotation(rng: random.Random) -> Dict[str, Any]:
+    return {
+        "boundingPoly": {"vertices": [{"x": 100, "y": 80}, {"x": 420, "y": 80},
+                                      {"x": 420, "y": 460}, {"x": 100, "y": 460}]},
+        "landmarks": [
+            {"type": name, "position": {"x": rng.uniform(120, 400), "y": rng.uniform(100, 440),
+                                        "z": rng.uniform(-30, 30)}}
+            for name in FACE_LANDMARKS
+        ],
+        "rollAngle": rng.uniform(-10, 10),
+        "panAngle": rng.uniform(-20, 20),
+        "tiltAngle": rng.uniform(-10, 10),
+        "detectionConfidence": round(rng.uniform(0.9, 0.999), 4),
+        "landmarkingConfidence": round(rng.uniform(0.6, 0.9), 4),
+        "joyLikelihood": "UNLIKELY",
+        "sorrowLikelihood": "VERY_UNLIKELY",
+        "angerLikelihood": "VERY_UNLIKELY",
+        "surpriseLikelihood": "VERY_UNLIKELY",
+    }
+
+
+# =============================================================================
+# APP
+# =============================================================================
+
+class MockState:
+    """Profile + seeded RNG + per-endpoint request counters shared by the handlers."""
+
+    def __init__(self, profile: MockProfile):
+        self.profile = profile
+        self.rng = random.Random(profile.seed)
+        self.lock = threading.Lock()
+        self.counts: Dict[str, Dict[str, int]] = {}
+
+    def draw(self, endpoint: str):
+        """(seconds to wait, error status or None) for one request, from the seeded stream."""
+        spec = self.profile.endpoints.get(endpoint) or EndpointProfile()
+        with self.lock:
+            delay = spec.latency.sample(self.rng) * self.profile.speed
+            error = spec.draw_error(self.rng)
+            counts = self.counts.setdefault(endpoint, {"requests": 0, "errors": 0})
+            counts["requests"] += 1
+            counts["errors"] += 1 if error else 0
+        return delay, error
+
+    def child_rng(self) -> random.Random:
+        with self.lock:
+            return random.Random(self.rng.random())
+
+
+def create_app(profile: Optional[MockProfile] = None):
+    """FastAPI app implementing the mocked endpoints."""
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    state = MockState(profile or MockProfile())
+    app = FastAPI(title="Yuki Mock GenAI")
+    app.state.mock = state
+
+    def error_response(code: int) -> JSONResponse:
+        status = ERROR_STATUS.get(code, "UNKNOWN")
+        return JSONResponse(status_code=code, content={"error": {
+            "code": code, "message": f"Mock {status}", "status": status}})
+
+    async def delayed(endpoint: str) -> Optional[JSONResponse]:
+        delay, error = state.draw(endpoint)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return error_response(error) if error else None
+
+    @app.get("/mock/stats")
+    async def stats():
+        with state.lock:
+            return {"profile": state.profile.to_dict(), "counts": dict(state.counts)}
+
+    @app.post("/{version}/models/{model_action:path}")
+    async def models(version: str, model_action: str, request: Request):
+        model, _, action = model_action.rpartition(":")
+        model = model.split("/")[-1]
+        body = await request.json()
+
+        if action == "generateContent":
+            endpoint = "generate_image" if "image" in model else "generate"
+            failure = await delayed(endpoint)
+            return failure or generate_response(model, body, state.child_rng())
+
+        if action == "streamGenerateContent":
+            failure = await delayed("stream_first_chunk")
+            if failure:
+                return failure
+            response = generate_response(model, body, state.child_rng())
+            text = "".join(p.get("text", "") for p in response["candidates"][0]["content"]["parts"])
+            pieces = max(1, min(state.profile.stream_chunks, len(text)))
+            step = math.ceil(len(text) / pieces) if text else 1
+
+            async def sse():
+                for i in range(0, max(len(text), 1), step):
+                    if i:
+                        delay, _ = state.draw("stream_chunk")
+                        await asyncio.sleep(delay)
+                    chunk = {"candidates": [{"content": {"role": "model", "parts": [{"text": text[i:i + step]}]},
+                                             "index": 0}]}
+                    if i + step >= len(text):
+                        chunk["candidates"][0]["finishReason"] = "STOP"
+                        chunk["usageMetadata"] = response["usageMetadata"]
+                    yield f"data: {json.dumps(chunk)}\n\n"
+
+            return StreamingResponse(sse(), media_type="text/event-stream")
+
+        if action in ("embedContent", "batchEmbedContents"):
+            requests = body.get("requests") or [body]
+            failure = await delayed("embed")
+            if failure:
+                return failure
+            rng = state.child_rng()
+            embeddings = []
+            for req in requests:
+                dims = int(req.get("outputDimensionality") or state.profile.embedding_dimensions)
+                vector = [rng.gauss(0.0, 1.0) for _ in range(dims)]
+                norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+                embeddings.append({"values": [v / norm for v in vector]})
+            if action == "embedContent" and "requests" not in body:
+                return {"embedding": embeddings[0]}
+            return {"embeddings": embeddings}
+
+        if action == "countTokens":
+            failure = await delayed("count_tokens")
+            return failure or {"totalTokens": _prompt_chars(body) // 4 + _count_images(body) * 258}
+
+        return error_response(400)
+
+    @app.post("/v1/images:annotate")
+    async def annotate(request: Request):
+        body = await request.json()
+        failure = await delayed("vision")
+        if failure:
+            return failure
+        rng = state.child_rng()
+        responses = []
+        for req in body.get("requests") or []:
+            features = {f.get("type") for f in req.get("features") or []}
+            responses.append({"faceAnnotations": [face_annotation(rng)]} if "FACE_DETECTION" in features else {})
+        return {"responses": responses}
+
+    return app
+
+
+# =============================================================================
+# RUNNING + CLIENTS
+# =============================================================================
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class MockServerThread:
+    """
+    Runs the mock app under uvicorn in a daemon thread.
+
+    Usage:
+        with MockServerThread(MockProfile(speed=0.1)) as server:
+            client = mock_genai_client(server.base_url)
+    """
+
+    def __init__(self, profile: Optional[MockProfile] = None, host: str = "127.0.0.1", port: int = 0):
+        self.profile = profile or MockProfile()
+        self.host = host
+        self.port = port or free_port()
+        self.app = None
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self, timeout: float = 10.0) -> "MockServerThread":
+        import uvicorn
+
+        self.app = create_app(self.profile)
+        config = uvicorn.Config(self.app, host=self.host, port=self.port,
+                                log_level="warning", access_log=False)
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, name="yuki-mock-genai", daemon=True)
+        self._thread.start()
+        deadline = time.time() + timeout
+        while not self._server.started:
+            if time.time() > deadline:
+                raise RuntimeError(f"Mock GenAI server did not start on {self.base_url}")
+            time.sleep(0.02)
+        logger.info(f"Mock GenAI server on {self.base_url}")
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.should_exit = True
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def stats(self) -> Dict[str, Any]:
+        state: MockState = self.app.state.mock
+        with state.lock:
+            return {k: dict(v) for k, v in state.counts.items()}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def mock_genai_client(base_url: str):
+    """Real google-genai client (API-key mode) whose requests go to the mock server."""
+    from google import genai
+    from google.genai import types
+    return genai.Client(api_key="mock-key", http_options=types.HttpOptions(base_url=base_url))
+
+
+def mock_vision_client(base_url: str):
+    """Real Vision client on the REST transport, pointed at the mock server."""
+    from google.auth.credentials import AnonymousCredentials
+    from google.cloud import vision
+    return vision.ImageAnnotatorClient(
+        credentials=AnonymousCredentials(),
+        transport="rest",
+        client_options={"api_endpoint": base_url},
+    )
+
+
+def main(argv: Optional[List[str]] = None):
+    import argparse
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Mock Gemini / Cloud Vision API server for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--profile", help="JSON MockProfile (latency/error per endpoint)")
+    parser.add_argument("--speed", type=float, help="Scale all latencies (0 disables waiting)")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    profile = MockProfile.from_file(args.profile) if args.profile else MockProfile()
+    if args.speed is not None:
+        profile.speed = args.speed
+    if args.seed is not None:
+        profile.seed = args.seed
+
+    print(f"Mock GenAI server: http://{args.host}:{args.port}  (export YUKI_GENAI_BASE_URL to use it)")
+    uvicorn.run(create_app(profile), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,10 +7,11 @@ import os
 import json
 import sqlite3
 import hashlib
+import threading
 import numpy as np
 from typing import List, Dict, Any, Optional
-from google import genai
-from google.genai import types
+
+from core.genai_clients import get_genai_client
 
 # Configuration
 EMBEDDING_MODEL = "gemini-embedding-001"
@@ -21,8 +22,23 @@ DB_PATH = os.path.join(os.path.dirname(__file__), "..", "database", "yuki_knowle
 PROJECT_ID = "gifted-cooler-479623-r7"
 LOCATION = "us-central1"
 
-# Initialize Gemini client with Vertex AI
-client = genai.Client(vertexai=True, project=PROJECT_ID, location=LOCATION)
+_initialized_dbs = set()
+_init_lock = threading.Lock()
+
+
+def get_client():
+    """Gemini client with Vertex AI (shared process-wide client, built on first use)."""
+    return get_genai_client(location=LOCATION, project=PROJECT_ID)
+
+
+def ensure_embeddings_table(db_path: str = DB_PATH):
+    """init_embeddings_table once per database per process (instead of on import)."""
+    if db_path in _initialized_dbs:
+        return
+    with _init_lock:
+        if db_path not in _initialized_dbs:
+            init_embeddings_table(db_path)
+            _initialized_dbs.add(db_path)
 
 
 def get_embedding(text: str, task_type: str = "RETRIEVAL_DOCUMENT") -> List[float]:
@@ -36,7 +52,9 @@ def get_embedding(text: str, task_type: str = "RETRIEVAL_DOCUMENT") -> List[floa
     Returns:
         List of floats representing the embedding vector
     """
-    result = client.models.embed_content(
+    from google.genai import types
+
+    result = get_client().models.embed_content(
         model=EMBEDDING_MODEL,
         contents=text,
         config=types.EmbedContentConfig(
@@ -86,6 +104,7 @@ def init_embeddings_table(db_path: str = DB_PATH):
 
 def store_embedding(entity_type: str, entity_id: int, text: str, embedding: List[float], db_path: str = DB_PATH):
     """Store an embedding in the database."""
+    ensure_embeddings_table(db_path)
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     cursor.execute("""
@@ -98,6 +117,7 @@ def store_embedding(entity_type: str, entity_id: int, text: str, embedding: List
 
 def get_all_embeddings(entity_type: str, db_path: str = DB_PATH) -> List[Dict]:
     """Get all embeddings of a given type."""
+    ensure_embeddings_table(db_path)
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     cursor.execute("""
@@ -249,6 +269,3 @@ def hybrid_search(
     
     return results
 
-
-# Initialize on import
-init_embeddings_table()
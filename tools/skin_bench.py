@@ -0,0 +1,115 @@
+"""
+Yuki Skin Analyzer Benchmark
+Images/sec of the skin-tone measurement on large (4K) inputs
+
+Compares:
+- legacy:   full-resolution decode, centre 50% crop, np.median (the old _analyze_skin_sync)
+- fast:     reduced decode (draft / reduce), landmark or centre box, histogram median
+- batch:    YukiSkinAnalyzer.analyze_many on a process pool (empty analysis cache)
+
+Without --images, synthetic 3840x2160 JPEGs are generated in a temp directory.
+
+Usage:
+    python tools/skin_bench.py                          # 16 synthetic 4K images
+    python tools/skin_bench.py --count 64 --workers 8
+    python tools/skin_bench.py --images "C:/Yuki_Local/dave test images" --out bench/skin.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import numpy as np
+from PIL import Image
+
+from analyzers.analysis_cache import AnalysisCache
+from yuki_skin_analyzer import YukiSkinAnalyzer, measure_skin_rgb
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+
+
+def legacy_measure(image_path: Path):
+    """The pre-optimization pixel path, for comparison"""
+    img_array = np.array(Image.open(image_path).convert("RGB"))
+    height, width, _ = img_array.shape
+    face_region = img_array[int(height * 0.25):int(height * 0.75), int(width * 0.25):int(width * 0.75)]
+    pixels = face_region.reshape(-1, 3)
+    brightness = np.mean(pixels, axis=1)
+    filtered = pixels[(brightness > 50) & (brightness < 240)]
+    return tuple(np.median(filtered, axis=0).astype(int)) if len(filtered) else None
+
+
+def make_images(directory: Path, count: int, size=(3840, 2160)) -> List[Path]:
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        base = rng.integers(60, 220, size=3)
+        noise = rng.integers(-25, 25, size=(size[1] // 8, size[0] // 8, 3))
+        small = np.clip(base + noise, 0, 255).astype(np.uint8)
+        path = directory / f"bench_{i:03d}.jpg"
+        Image.fromarray(small).resize(size, Image.Resampling.BILINEAR).save(path, quality=92)
+        paths.append(path)
+    return paths
+
+
+def timed(label: str, fn, n: int) -> Dict:
+    start = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - start
+    return {"path": label, "images": n, "seconds": round(seconds, 3), "images_per_sec": round(n / seconds, 2)}
+
+
+def run_benchmark(paths: List[Path], workers: Optional[int] = None) -> List[Dict]:
+    n = len(paths)
+    results = [
+        timed("legacy", lambda: [legacy_measure(p) for p in paths], n),
+        timed("fast", lambda: [measure_skin_rgb(p) for p in paths], n),
+    ]
+    analyzer = YukiSkinAnalyzer(cache=AnalysisCache(None))
+    results.append(timed(f"batch (workers={workers or os.cpu_count()})", lambda: analyzer.analyze_many(paths, workers=workers), n))
+    results.append(timed("batch (cached)", lambda: analyzer.analyze_many(paths, workers=workers), n))
+
+    agreement = [abs(np.array(legacy_measure(p)) - np.array(measure_skin_rgb(p)["dominant_rgb"])).max() for p in paths[:8]]
+    results.append({"path": "max_rgb_difference_vs_legacy", "value": int(max(agreement))})
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Skin analyzer throughput on 4K images")
+    parser.add_argument("--images", help="Directory of real images (default: synthetic 4K JPEGs)")
+    parser.add_argument("--count", type=int, default=16)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--out", help="Write results JSON here")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.images:
+            paths = sorted(p for p in Path(args.images).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)[:args.count]
+        else:
+            paths = make_images(Path(tmp), args.count)
+        results = run_benchmark(paths, args.workers)
+
+    for r in results:
+        if "images_per_sec" in r:
+            print(f"  {r['path']:<24} {r['images_per_sec']:>8.2f} images/sec  ({r['seconds']}s for {r['images']})")
+        else:
+            print(f"  {r['path']:<24} {r['value']}")
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
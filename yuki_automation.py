@@ -7,11 +7,12 @@ Complete end-to-end automation: Scrape → Extract → Generate → Test
 import asyncio
 import json
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional
 from gemini_orchestrator import GeminiOrchestrator, SubAgentTask, OrchestratorSession
 from anime_database import AnimeDatabase
 from face_math import FaceMathArchitect
 from tools import generate_cosplay_image
+from yuki_work_queue import WorkQueue, WorkKind, WorkItem, character_priority
 import datetime
 
 class YukiAutomationEngine:
@@ -26,6 +27,53 @@ class YukiAutomationEngine:
         self.face_math = FaceMathArchitect()
         self.automation_logs = Path("c:/Yuki_Local/automation_logs")
         self.automation_logs.mkdir(exist_ok=True)
+        
+        # Change-driven scheduling: the database tells us which characters changed
+        self.work_queue = WorkQueue(state_path=self.automation_logs / "work_queue.json")
+        self.db.on_change(self._on_character_changed)
+    
+    def _on_character_changed(self, character_id: str, reason: str):
+        """Decide what (if anything) a changed character needs - looks at this character only"""
+        character = self.db.characters.get(character_id)
+        if character is None:
+            return
+        if not character.face_schema.extracted and character.reference_images:
+            kind = WorkKind.EXTRACT_SCHEMA
+        elif character.face_schema.extracted and not character.cosplay_generations:
+            kind = WorkKind.GENERATE_COSPLAY
+        else:
+            return
+        self.work_queue.mark_dirty(character_id, kind, character_priority(character, kind), reason=reason)
+    
+    def _bootstrap_queue(self):
+        """One-time scan when there is no saved queue state (first run / state file deleted)"""
+        for character_id in list(self.db.characters):
+            self._on_character_changed(character_id, "bootstrap")
+        print(f"  Bootstrapped work queue: {len(self.work_queue)} items")
+    
+    async def _run_batch(self, kind: WorkKind, batch: List[WorkItem], default_targets: List[str]):
+        """Run one bounded batch through the orchestrator and settle every item"""
+        character_ids = [item.character_id for item in batch]
+        if kind == WorkKind.EXTRACT_SCHEMA:
+            objective = f"Auto-extract {len(batch)} missing schemas"
+            context = {"character_ids": character_ids, "operation": "auto_extract"}
+        else:
+            objective = f"Auto-generate cosplays for {len(batch)} characters"
+            context = {"character_ids": character_ids, "default_targets": default_targets, "operation": "auto_generate"}
+        
+        try:
+            session = self.orchestrator.create_orchestration_plan(objective=objective, context=context)
+            await self.orchestrator.execute_plan_parallel(session)
+            error = f"{session.failed_tasks}/{session.total_tasks} sub-agent tasks failed" if session.failed_tasks else None
+        except Exception as e:
+            error = str(e)
+        
+        for item in batch:
+            if error:
+                self.work_queue.fail(item, error)
+            else:
+                self.work_queue.complete(item)
+        print(f"  {'❌' if error else '✅'} {kind.value}: {len(batch)} characters" + (f" ({error})" if error else ""))
     
     async def full_pipeline_automation(
         self,
@@ -227,63 +275,51 @@ class YukiAutomationEngine:
         
         return log
 
-    async def continuous_monitoring_automation(self, interval_seconds: int = 3600):
+    async def continuous_monitoring_automation(
+        self,
+        interval_seconds: int = 3600,
+        batch_size: int = 8,
+        default_targets: Optional[List[str]] = None
+    ):
         """
         Continuous automation loop
         "Build the system that builds the system"
         
-        Monitors database for:
+        Event-driven: characters are queued when the database reports a change
+        (add_character, schema extraction), so new work is picked up within
+        seconds instead of on the next full scan.
         - New characters without face schemas → Auto-extract
         - Characters with schemas but no cosplays → Auto-generate
-        - Failed extractions → Retry with different models
+        - Failed batches → Retried per item with exponential backoff
+        
+        interval_seconds is now only the idle heartbeat (queue state is saved and stats printed).
         """
-        print(f"\n[♾️ CONTINUOUS AUTOMATION] Starting monitoring loop...")
-        print(f"  Checking every {interval_seconds}s")
+        default_targets = default_targets or ["Dante", "Cloud Strife", "Kirito"]
+        print(f"\n[♾️ CONTINUOUS AUTOMATION] Starting change-driven loop...")
+        print(f"  Batch size {batch_size}, idle heartbeat every {interval_seconds}s")
+        
+        if not self.work_queue.has_state:
+            self._bootstrap_queue()
         
         while True:
-            print(f"\n[{datetime.datetime.now().strftime('%H:%M:%S')}] Scanning database...")
-            
-            # Check for characters needing schema extraction
-            needs_extraction = [
-                c for c in self.db.characters.values()
-                if not c.face_schema.extracted and c.reference_images
-            ]
-            
-            if needs_extraction:
-                print(f"  Found {len(needs_extraction)} characters needing extraction")
-                session = self.orchestrator.create_orchestration_plan(
-                    objective=f"Auto-extract {len(needs_extraction)} missing schemas",
-                    context={
-                        "character_ids": [c.id for c in needs_extraction],
-                        "operation": "auto_extract"
-                    }
-                )
-                await self.orchestrator.execute_plan_parallel(session)
-            
-            # Check for characters with schemas but no generations
-            needs_generation = [
-                c for c in self.db.characters.values()
-                if c.face_schema.extracted and len(c.cosplay_generations) == 0
-            ]
-            
-            if needs_generation:
-                print(f"  Found {len(needs_generation)} characters ready for generation")
-                # Auto-generate with default target characters
-                session = self.orchestrator.create_orchestration_plan(
-                    objective=f"Auto-generate cosplays for {len(needs_generation)} characters",
-                    context={
-                        "character_ids": [c.id for c in needs_generation],
-                        "default_targets": ["Dante", "Cloud Strife", "Kirito"],
-                        "operation": "auto_generate"
-                    }
-                )
-                await self.orchestrator.execute_plan_parallel(session)
+            ran = False
+            # Extraction first: every finished schema queues its character for generation
+            for kind in (WorkKind.EXTRACT_SCHEMA, WorkKind.GENERATE_COSPLAY):
+                batch = self.work_queue.pull_batch(batch_size, kind=kind)
+                if batch:
+                    print(f"\n[{datetime.datetime.now().strftime('%H:%M:%S')}] {kind.value}: {len(batch)} characters")
+                    await self._run_batch(kind, batch, default_targets)
+                    ran = True
             
-            if not needs_extraction and not needs_generation:
-                print(f"  ✓ Database is up-to-date")
+            self.work_queue.save()
+            if ran:
+                continue
             
-            print(f"  Sleeping for {interval_seconds}s...")
-            await asyncio.sleep(interval_seconds)
+            woke = await self.work_queue.wait_for_work(timeout=interval_seconds)
+            if not woke:
+                stats = self.work_queue.get_stats()
+                print(f"\n[{datetime.datetime.now().strftime('%H:%M:%S')}] Idle - "
+                      f"queued {stats['queued']}, backing off {stats['backing_off']}, dead letters {stats['dead_letters']}")
 
 # =============================================================================
 # CLI INTERFACE
@@ -305,7 +341,7 @@ async def main():
             # Continuous monitoring (runs forever)
             python yuki_automation.py monitor
             
-            # Custom interval (in seconds)
+            # Custom idle heartbeat (in seconds)
             python yuki_automation.py monitor 1800
         """)
         return
@@ -0,0 +1,679 @@
+"""
+Yuki Batch Engine
+Declarative subjects x targets x models x variants generation runs
+
+Replaces the hand-rolled run_*_batch*.py / yuki_real_gen*.py loops. A job file
+(JSON, or YAML when PyYAML is installed) describes the matrix; the engine:
+
+- analyzes each subject once (DNA analysis or nothing), shared by all its cells
+  and stored in the manifest, so reruns don't analyze again
+- fans cells out as tasks under a global limit and per-model limits
+  (a cell waits for its model's slot before taking a global one)
+- retries transient failures with exponential backoff
+- appends every result to <output_dir>/manifest.jsonl; on rerun, cells whose
+  parameters are unchanged and whose output exists are skipped
+
+Job file:
+    {
+      "name": "drake_winter",
+      "output_dir": "C:/Yuki_Local/Renders_Drake",
+      "concurrency": 4,
+      "model_concurrency": {"gemini-3-pro-image-preview": 2},
+      "analysis": "dna",
+      "subjects": [{"name": "Drake", "image": "C:/.../drake_01.jpg", "dir": "C:/.../Drake"}],
+      "targets": [{"character": "Subaru Natsuki", "anime": "Re:Zero", "reference": "refs/subaru.jpg"}],
+      "models": ["gemini-3-pro-image-preview", {"id": "v12_5", "backend": "pipeline_v12_5"}],
+      "variants": [{"name": "2k", "prompt": "2K resolution"}, {"name": "4k", "prompt": "4K, 8k textures"}],
+      "prompt": "Cosplay of {character} from {anime}. {variant_prompt}",
+      "repeats": 1
+    }
+
+A target's "reference" is a local image path or an http(s) URL (downloaded once
+into <output_dir>/_references). pipeline_v12_5 models need one for every target;
+the job is rejected when it is loaded otherwise.
+
+Instead of "prompt", "template" names a PromptEngineering template
+(prompt_engineering_system.py, e.g. "cosplay_anime_character"); all cells are
+rendered in one render_many() call, with the target's fields plus
+subject / variant / variant_prompt and the variant's "variables" as values.
+
+Usage:
+    python yuki_batch_engine.py batch_jobs/drake_winter.json [--dry-run] [--skip-failed] [--concurrency N]
+"""
+
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import argparse
+import shutil
+import urllib.request
+from urllib.parse import urlparse
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger("YukiBatchEngine")
+
+MANIFEST_NAME = "manifest.jsonl"
+DEFAULT_PROMPT = "Cosplay of {character} from {anime}. {variant_prompt}"
+# Retryable failures: HTTP codes / RPC statuses from google-genai and google-api-core errors,
+# and the same words as whole tokens when a backend only passes the message on
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+TRANSIENT_STATUSES = {"RESOURCE_EXHAUSTED", "UNAVAILABLE", "DEADLINE_EXCEEDED"}
+TRANSIENT_PATTERN = re.compile(
+    r"\b(?:408|429|500|502|503|504|resource[_ ]exhausted|unavailable|deadline[_ ]exceeded|"
+    r"rate[_ -]limit(?:ed)?|quota|timed out|timeout)\b",
+    re.IGNORECASE,
+)
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg", ".webp")
+REFERENCE_DIR = "_references"
+# Backends that can't run without a character reference image
+REQUIRES_REFERENCE = {"pipeline_v12_5"}
+DOWNLOAD_HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
+
+
+def slug(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", str(text).lower()).strip("_") or "x"
+
+
+def is_transient(error: Exception) -> bool:
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    code = getattr(error, "code", None)
+    if isinstance(code, int) and code in TRANSIENT_STATUS_CODES:
+        return True
+    if str(getattr(error, "status", "") or "").upper() in TRANSIENT_STATUSES:
+        return True
+    return TRANSIENT_PATTERN.search(str(error)) is not None
+
+
+def is_url(value: Any) -> bool:
+    return str(value).startswith(("http://", "https://"))
+
+
+def download_reference(url: str, cache_dir: Path) -> Path:
+    """Download a reference image once; later runs reuse the cached copy."""
+    suffix = os.path.splitext(urlparse(url).path)[1].lower()
+    path = cache_dir / f"{hashlib.sha1(url.encode('utf-8')).hexdigest()[:12]}{suffix if suffix in IMAGE_SUFFIXES else '.jpg'}"
+    if path.exists():
+        return path
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    request = urllib.request.Request(url, headers=DOWNLOAD_HEADERS)
+    with urllib.request.urlopen(request, timeout=30) as response:
+        data = response.read()
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_bytes(data)
+    tmp.replace(path)
+    return path
+
+
+# =============================================================================
+# JOB SPEC
+# =============================================================================
+
+@dataclass
+class ModelSpec:
+    id: str
+    backend: str = "gemini_image"
+    options: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def parse(cls, raw) -> "ModelSpec":
+        if isinstance(raw, str):
+            return cls(id=raw)
+        raw = dict(raw)
+        return cls(id=raw.pop("id"), backend=raw.pop("backend", "gemini_image"), options=raw)
+
+
+@dataclass
+class BatchSpec:
+    name: str
+    output_dir: Path
+    subjects: List[Dict[str, Any]]
+    targets: List[Dict[str, Any]]
+    models: List[ModelSpec]
+    variants: List[Dict[str, Any]] = field(default_factory=lambda: [{"name": "default"}])
+    prompt: str = DEFAULT_PROMPT
+    template: Optional[str] = None
+    analysis: str = "none"
+    repeats: int = 1
+    concurrency: int = 4
+    model_concurrency: Dict[str, int] = field(default_factory=dict)
+    max_attempts: int = 3
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], base_dir: Optional[Path] = None) -> "BatchSpec":
+        missing = [k for k in ("name", "subjects", "targets", "models") if not data.get(k)]
+        if missing:
+            raise ValueError(f"Batch spec is missing: {', '.join(missing)}")
+        targets = [t if isinstance(t, dict) else {"character": t} for t in data["targets"]]
+        models = [ModelSpec.parse(m) for m in data["models"]]
+        for model in models:
+            if model.backend in REQUIRES_REFERENCE:
+                unreferenced = [t.get("character", "?") for t in targets if not t.get("reference")]
+                if unreferenced:
+                    raise ValueError(f"Model {model.id} ({model.backend}) needs a 'reference' image for every "
+                                     f"target; missing for: {', '.join(unreferenced)}")
+        output_dir = Path(data.get("output_dir") or f"batch_results/{slug(data['name'])}")
+        if base_dir is not None and not output_dir.is_absolute():
+            output_dir = base_dir / output_dir
+        return cls(
+            name=data["name"],
+            output_dir=output_dir,
+            subjects=[s if isinstance(s, dict) else {"name": s} for s in data["subjects"]],
+            targets=targets,
+            models=models,
+            variants=[v if isinstance(v, dict) else {"name": v, "prompt": v} for v in data.get("variants") or [{"name": "default"}]],
+            prompt=data.get("prompt", DEFAULT_PROMPT),
+            template=data.get("template"),
+            analysis=data.get("analysis", "none"),
+            repeats=int(data.get("repeats", 1)),
+            concurrency=int(data.get("concurrency", 4)),
+            model_concurrency={k: int(v) for k, v in (data.get("model_concurrency") or {}).items()},
+            max_attempts=int(data.get("max_attempts", 3)),
+        )
+
+    @classmethod
+    def from_file(cls, path) -> "BatchSpec":
+        path = Path(path)
+        text = path.read_text(encoding="utf-8")
+        if path.suffix.lower() in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError:
+                raise RuntimeError("PyYAML is required for YAML job files (pip install pyyaml), or use JSON")
+            data = yaml.safe_load(text)
+        else:
+            data = json.loads(text)
+        return cls.from_dict(data, base_dir=path.parent)
+
+    def cells(self) -> List["BatchCell"]:
+        cells = [
+            BatchCell(subject, target, model, variant, repeat, self.prompt)
+            for subject in self.subjects
+            for target in self.targets
+            for model in self.models
+            for variant in self.variants
+            for repeat in range(self.repeats)
+        ]
+        if self.template:
+            from prompts.prompt_engineering_system import get_prompt_engineering
+            rendered = get_prompt_engineering().render_many(
+                (self.template, cell.prompt_values()) for cell in cells
+            )
+            for cell, text in zip(cells, rendered):
+                cell.rendered_prompt = text.strip()
+        return cells
+
+
+@dataclass
+class BatchCell:
+    subject: Dict[str, Any]
+    target: Dict[str, Any]
+    model: ModelSpec
+    variant: Dict[str, Any]
+    repeat: int
+    prompt_template: str = DEFAULT_PROMPT
+    rendered_prompt: Optional[str] = None
+    reference_path: Optional[Path] = None   # local copy of a URL reference (BatchEngine.fetch_references)
+
+    @property
+    def subject_name(self) -> str:
+        return self.subject["name"]
+
+    @property
+    def key(self) -> str:
+        return "|".join([slug(self.subject_name), slug(self.target.get("character", "")),
+                         slug(self.model.id), slug(self.variant.get("name", "default")), str(self.repeat)])
+
+    def reference(self) -> Optional[Path]:
+        """Local reference image: the downloaded copy of a URL, or the target's path."""
+        if self.reference_path is not None:
+            return self.reference_path
+        reference = self.target.get("reference")
+        return Path(reference) if reference and not is_url(reference) else None
+
+    def prompt_values(self) -> Dict[str, Any]:
+        return {"anime": "", **self.target, "variant_prompt": self.variant.get("prompt", ""),
+                "subject": self.subject_name, "variant": self.variant.get("name", ""),
+                **self.variant.get("variables", {})}
+
+    @property
+    def prompt(self) -> str:
+        if self.rendered_prompt is not None:
+            return self.rendered_prompt
+        return self.prompt_template.format(**self.prompt_values()).strip()
+
+    @property
+    def fingerprint(self) -> str:
+        """Changes whenever anything that affects the output does (prompt, model options, inputs)."""
+        payload = json.dumps([self.subject, self.target, asdict(self.model), self.variant, self.prompt],
+                             sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+    def output_path(self, output_dir: Path) -> Path:
+        suffix = f"_r{self.repeat}" if self.repeat else ""
+        name = f"{slug(self.subject_name)}_{slug(self.target.get('character', ''))}_{slug(self.variant.get('name', 'default'))}{suffix}.png"
+        return output_dir / slug(self.model.id) / name
+
+
+# =============================================================================
+# MANIFEST
+# =============================================================================
+
+class Manifest:
+    """Append-only JSONL log of cell results and subject analyses; last record per key wins."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.cells: Dict[str, Dict[str, Any]] = {}
+        self.analyses: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            for line in self.path.read_text(encoding="utf-8").splitlines():
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line from an interrupted run
+                if record.get("type") == "analysis":
+                    self.analyses[record["subject"]] = record
+                elif record.get("type") == "cell":
+                    self.cells[record["key"]] = record
+
+    def _append(self, record: Dict[str, Any]):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+
+    def is_done(self, cell: BatchCell, output_dir: Path) -> bool:
+        record = self.cells.get(cell.key)
+        if not record or record["status"] != "done" or record.get("fingerprint") != cell.fingerprint:
+            return False
+        output = record.get("output")
+        return not output or Path(output).exists()
+
+    def record_cell(self, cell: BatchCell, status: str, **fields):
+        record = {"type": "cell", "key": cell.key, "fingerprint": cell.fingerprint,
+                  "status": status, "ts": time.time(), **fields}
+        self.cells[cell.key] = record
+        self._append(record)
+
+    def get_analysis(self, subject: Dict[str, Any], provider: str) -> Optional[Dict[str, Any]]:
+        record = self.analyses.get(slug(subject["name"]))
+        if record and record.get("provider") == provider and record.get("fingerprint") == _subject_fingerprint(subject):
+            return record["data"]
+        return None
+
+    def record_analysis(self, subject: Dict[str, Any], provider: str, data: Dict[str, Any]):
+        record = {"type": "analysis", "subject": slug(subject["name"]), "provider": provider,
+                  "fingerprint": _subject_fingerprint(subject), "data": data, "ts": time.time()}
+        self.analyses[record["subject"]] = record
+        self._append(record)
+
+
+def _subject_fingerprint(subject: Dict[str, Any]) -> str:
+    payload = dict(subject)
+    image = subject.get("image")
+    if image and os.path.exists(image):
+        st = os.stat(image)
+        payload["_image_version"] = f"{st.st_mtime_ns}:{st.st_size}"
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:12]
+
+
+# =============================================================================
+# SUBJECT ANALYSIS
+# =============================================================================
+
+class NoAnalysis:
+    name = "none"
+
+    async def analyze(self, subject: Dict[str, Any]) -> Dict[str, Any]:
+        return {}
+
+    def instructions(self, analysis: Dict[str, Any], cell: BatchCell) -> str:
+        return ""
+
+
+class DnaAnalysis:
+    """Age / skin / facial analysis of the subject image (YukiRealGen's DNA-authentic protocol)."""
+    name = "dna"
+
+    def __init__(self, project_id: str = "gifted-cooler-479623-r7"):
+        from yuki_age_estimator import YukiAgeEstimator
+        from yuki_skin_analyzer import YukiSkinAnalyzer
+        from yuki_facial_analyzer import YukiFacialAnalyzer
+        self.age_estimator = YukiAgeEstimator(project_id=project_id)
+        self.skin_analyzer = YukiSkinAnalyzer()
+        self.facial_analyzer = YukiFacialAnalyzer(project_id=project_id)
+
+    async def analyze(self, subject: Dict[str, Any]) -> Dict[str, Any]:
+        image = Path(subject["image"])
+        age, skin, facial = await asyncio.gather(
+            self.age_estimator.estimate_age(image),
+            self.skin_analyzer.analyze_skin_tone(image),
+            self.facial_analyzer.analyze_all_features(image),
+        )
+        return {"age": age, "skin": skin, "facial": facial}
+
+    def instructions(self, analysis: Dict[str, Any], cell: BatchCell) -> str:
+        if not analysis:
+            return ""
+        character = cell.target.get("character", "character")
+        return "\n\n".join([
+            "=== DNA-AUTHENTIC TRANSFORMATION PROTOCOL ===",
+            self.age_estimator.get_age_appropriate_instruction(analysis.get("age", {}), character),
+            analysis.get("skin", {}).get("preservation_prompt", ""),
+            analysis.get("facial", {}).get("combined_prompt", ""),
+        ]).strip()
+
+
+ANALYSIS_PROVIDERS: Dict[str, Callable[[], Any]] = {"none": NoAnalysis, "dna": DnaAnalysis}
+
+
+# =============================================================================
+# MODEL BACKENDS
+# =============================================================================
+
+class GeminiImageBackend:
+    """Single generate_content call with the subject photo (gemini-3-pro-image-preview and friends)."""
+
+    def __init__(self, model: ModelSpec):
+        self.model = model
+
+    async def generate(self, cell: BatchCell, instructions: str, output_path: Path) -> Path:
+        from PIL import Image
+        from google.genai import types
+        from core.genai_clients import client_for_model
+
+        prompt = f"Transform this person into: {cell.prompt}"
+        if instructions:
+            prompt = f"{prompt}\n\n{instructions}"
+        contents = [prompt]
+        image = cell.subject.get("image")
+        if image:
+            contents.insert(0, Image.open(image))
+        reference = cell.reference()
+        if reference and reference.exists():
+            contents += ["=== CHARACTER REFERENCE ===", Image.open(reference)]
+
+        response = await client_for_model(self.model.id).aio.models.generate_content(
+            model=self.model.id,
+            contents=contents,
+            config=types.GenerateContentConfig(response_modalities=["IMAGE"], **self.model.options.get("config", {})),
+        )
+        for candidate in response.candidates or []:
+            for part in (candidate.content.parts if candidate.content else None) or []:
+                if getattr(part, "inline_data", None) and part.inline_data.data:
+                    output_path.parent.mkdir(parents=True, exist_ok=True)
+                    output_path.write_bytes(part.inline_data.data)
+                    return output_path
+        raise RuntimeError("No image in response")
+
+
+class PipelineBackend:
+    """
+    V12.5 / V14 pipelines. The pipeline builds its identity lock on the first run for a
+    subject; later runs pass bypass_lock=True, so other cells of that subject wait for it.
+
+    Pipelines keep per-run state (last_error) on the instance, so each run takes its own
+    instance from a pool, and runs in its own work directory: the pipeline names its
+    output file itself, and the file it wrote is moved to the cell's output path.
+    """
+
+    def __init__(self, model: ModelSpec, pipeline_factory: Callable[[], Any], wants_reference: bool = True):
+        self.model = model
+        self.pipeline_factory = pipeline_factory
+        self.wants_reference = wants_reference
+        self.requires_reference = model.backend in REQUIRES_REFERENCE
+        self._idle: List[Any] = []
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._locked_subjects = set()
+
+    async def generate(self, cell: BatchCell, instructions: str, output_path: Path) -> Path:
+        subject = cell.subject_name
+        lock = self._locks.setdefault(subject, asyncio.Lock())
+        if subject in self._locked_subjects:
+            return await self._run(cell, output_path, bypass_lock=True)
+        async with lock:
+            if subject not in self._locked_subjects:
+                result = await self._run(cell, output_path, bypass_lock=False)
+                self._locked_subjects.add(subject)
+                return result
+        return await self._run(cell, output_path, bypass_lock=True)
+
+    async def _run(self, cell: BatchCell, output_path: Path, bypass_lock: bool) -> Path:
+        reference = cell.reference()
+        if self.requires_reference and (reference is None or not reference.exists()):
+            raise ValueError(f"{self.model.id} needs a reference image for {cell.target.get('character')} "
+                             f"(got {cell.target.get('reference')!r})")
+
+        # Identity locks are shared per model directory; images are written per cell
+        shared_dir = output_path.parent
+        work_dir = shared_dir / ".work" / output_path.stem
+        if work_dir.exists():
+            shutil.rmtree(work_dir)
+        work_dir.mkdir(parents=True)
+        for lock_file in shared_dir.glob("*.json"):
+            shutil.copy2(lock_file, work_dir / lock_file.name)
+
+        kwargs = dict(subject_name=cell.subject_name, target_character=cell.prompt,
+                      subject_dir=Path(cell.subject.get("dir") or Path(cell.subject["image"]).parent),
+                      output_dir=work_dir, bypass_lock=bypass_lock)
+        if self.wants_reference:
+            kwargs["reference_path"] = reference
+        pipeline = self._idle.pop() if self._idle else self.pipeline_factory()
+        try:
+            try:
+                result = await pipeline.run(**kwargs)
+                error = getattr(pipeline, "last_error", None)
+            finally:
+                self._idle.append(pipeline)
+
+            for lock_file in work_dir.glob("*.json"):
+                if not (shared_dir / lock_file.name).exists():
+                    shutil.copy2(lock_file, shared_dir / lock_file.name)
+            if isinstance(result, (bytes, bytearray)) and result:
+                output_path.write_bytes(result)
+                return output_path
+            images = sorted((f for f in work_dir.iterdir() if f.suffix.lower() in IMAGE_SUFFIXES),
+                            key=lambda f: f.stat().st_mtime)
+            if not images:
+                raise RuntimeError(error or f"{self.model.id} wrote no image")
+            images[-1].replace(output_path)
+            return output_path
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _v12_5_factory():
+    from image_gen.v12_5_pipeline import V12_5Pipeline
+    return V12_5Pipeline()
+
+
+def _v14_factory():
+    from image_gen.v14_pipeline import V12Pipeline
+    return V12Pipeline()
+
+
+BACKENDS: Dict[str, Callable[[ModelSpec], Any]] = {
+    "gemini_image": GeminiImageBackend,
+    "pipeline_v12_5": lambda model: PipelineBackend(model, _v12_5_factory),
+    "pipeline_v14": lambda model: PipelineBackend(model, _v14_factory),
+}
+
+
+# =============================================================================
+# ENGINE
+# =============================================================================
+
+@dataclass
+class BatchReport:
+    total: int = 0
+    skipped: int = 0
+    done: int = 0
+    failed: int = 0
+    analyses_run: int = 0
+    analyses_reused: int = 0
+    seconds: float = 0.0
+    errors: Dict[str, str] = field(default_factory=dict)
+
+
+class BatchEngine:
+    def __init__(self, spec: BatchSpec, backends: Optional[Dict[str, Callable]] = None,
+                 analysis_providers: Optional[Dict[str, Callable]] = None, retry_base_delay: float = 2.0):
+        self.spec = spec
+        self.output_dir = Path(spec.output_dir)
+        self.manifest = Manifest(self.output_dir / MANIFEST_NAME)
+        self.backend_factories = {**BACKENDS, **(backends or {})}
+        self.analysis_factories = {**ANALYSIS_PROVIDERS, **(analysis_providers or {})}
+        self.retry_base_delay = retry_base_delay
+        self._backends: Dict[str, Any] = {}
+        self._analysis = None
+        self._analysis_futures: Dict[str, asyncio.Future] = {}
+        self.report = BatchReport()
+
+    def pending_cells(self, retry_failed: bool = True) -> List[BatchCell]:
+        pending = []
+        for cell in self.spec.cells():
+            if self.manifest.is_done(cell, self.output_dir):
+                continue
+            record = self.manifest.cells.get(cell.key)
+            if not retry_failed and record and record["status"] == "failed" and record.get("fingerprint") == cell.fingerprint:
+                continue
+            pending.append(cell)
+        return pending
+
+    def backend_for(self, model: ModelSpec):
+        if model.id not in self._backends:
+            factory = self.backend_factories.get(model.backend)
+            if factory is None:
+                raise ValueError(f"Unknown backend '{model.backend}' for model {model.id}")
+            self._backends[model.id] = factory(model)
+        return self._backends[model.id]
+
+    @property
+    def analysis(self):
+        if self._analysis is None:
+            factory = self.analysis_factories.get(self.spec.analysis)
+            if factory is None:
+                raise ValueError(f"Unknown analysis provider '{self.spec.analysis}'")
+            self._analysis = factory()
+        return self._analysis
+
+    async def subject_analysis(self, subject: Dict[str, Any]) -> Dict[str, Any]:
+        """Once per subject per run (concurrent cells share the same future), and reused from the manifest."""
+        key = slug(subject["name"])
+        future = self._analysis_futures.get(key)
+        if future is None:
+            future = self._analysis_futures[key] = asyncio.ensure_future(self._analyze(subject))
+        return await future
+
+    async def _analyze(self, subject: Dict[str, Any]) -> Dict[str, Any]:
+        cached = self.manifest.get_analysis(subject, self.spec.analysis)
+        if cached is not None:
+            self.report.analyses_reused += 1
+            return cached
+        logger.info(f"   🔬 Analyzing subject {subject['name']} ({self.spec.analysis})")
+        data = await self.analysis.analyze(subject)
+        self.manifest.record_analysis(subject, self.spec.analysis, data)
+        self.report.analyses_run += 1
+        return data
+
+    async def run_cell(self, cell: BatchCell, global_slots: asyncio.Semaphore, model_slots: Dict[str, asyncio.Semaphore]):
+        output_path = cell.output_path(self.output_dir)
+        try:
+            analysis = await self.subject_analysis(cell.subject)
+        except Exception as e:
+            self.manifest.record_cell(cell, "failed", error=f"analysis: {e}", attempts=0)
+            self.report.failed += 1
+            self.report.errors[cell.key] = f"analysis: {e}"
+            return
+        instructions = self.analysis.instructions(analysis, cell)
+        backend = self.backend_for(cell.model)
+
+        attempt = 0
+        while True:
+            attempt += 1
+            start = time.perf_counter()
+            try:
+                async with model_slots[cell.model.id]:
+                    async with global_slots:
+                        output = await backend.generate(cell, instructions, output_path)
+            except Exception as e:
+                if attempt < self.spec.max_attempts and is_transient(e):
+                    delay = self.retry_base_delay * (2 ** (attempt - 1)) * random.uniform(0.8, 1.2)
+                    logger.warning(f"   ⏳ {cell.key}: {e} (retry {attempt}/{self.spec.max_attempts - 1} in {delay:.1f}s)")
+                    await asyncio.sleep(delay)
+                    continue
+                logger.error(f"   ❌ {cell.key}: {e}")
+                self.manifest.record_cell(cell, "failed", error=str(e), attempts=attempt,
+                                          seconds=round(time.perf_counter() - start, 3))
+                self.report.failed += 1
+                self.report.errors[cell.key] = str(e)
+                return
+            self.manifest.record_cell(cell, "done", output=str(output) if output else None, attempts=attempt,
+                                      seconds=round(time.perf_counter() - start, 3))
+            self.report.done += 1
+            logger.info(f"   ✅ {cell.key}")
+            return
+
+    async def fetch_references(self, cells: List[BatchCell]):
+        """Download URL references once per run (cached in <output_dir>/_references)."""
+        urls = sorted({c.target["reference"] for c in cells if is_url(c.target.get("reference", ""))})
+        if not urls:
+            return
+        cache_dir = self.output_dir / REFERENCE_DIR
+        results = await asyncio.gather(*(asyncio.to_thread(download_reference, url, cache_dir) for url in urls),
+                                       return_exceptions=True)
+        local = {}
+        for url, result in zip(urls, results):
+            if isinstance(result, Exception):
+                logger.warning(f"   ⚠️ Reference download failed for {url}: {result}")
+            else:
+                local[url] = result
+        for cell in cells:
+            cell.reference_path = local.get(cell.target.get("reference"))
+
+    async def run(self, retry_failed: bool = True, dry_run: bool = False) -> BatchReport:
+        start = time.perf_counter()
+        cells = self.spec.cells()
+        pending = self.pending_cells(retry_failed)
+        self.report = BatchReport(total=len(cells), skipped=len(cells) - len(pending))
+        logger.info(f"=== 🦊 BATCH {self.spec.name}: {len(pending)}/{len(cells)} cells to run ===")
+        if dry_run or not pending:
+            return self.report
+
+        await self.fetch_references(pending)
+        global_slots = asyncio.Semaphore(self.spec.concurrency)
+        model_slots = {m.id: asyncio.Semaphore(self.spec.model_concurrency.get(m.id, self.spec.concurrency))
+                       for m in self.spec.models}
+        await asyncio.gather(*(self.run_cell(cell, global_slots, model_slots) for cell in pending))
+
+        self.report.seconds = round(time.perf_counter() - start, 3)
+        logger.info(f"=== ✨ BATCH {self.spec.name}: {self.report.done} done, {self.report.failed} failed, "
+                    f"{self.report.skipped} skipped in {self.report.seconds}s ===")
+        return self.report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Yuki declarative batch generation")
+    parser.add_argument("job", type=str, help="Job file (.json, or .yaml with PyYAML)")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would run")
+    parser.add_argument("--skip-failed", action="store_true", help="Don't retry cells that failed last time")
+    parser.add_argument("--concurrency", type=int, help="Override the job's global concurrency")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    spec = BatchSpec.from_file(args.job)
+    if args.concurrency:
+        spec.concurrency = args.concurrency
+    report = asyncio.run(BatchEngine(spec).run(retry_failed=not args.skip_failed, dry_run=args.dry_run))
+    print(json.dumps(asdict(report), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,13 +7,29 @@ NOTE: Yuki and Unk have SEPARATE project IDs but SHARE the billing account
 - Unk Project: Different project ID
 - Billing: Same billing account (all costs pool together)
 - Quotas: Separate per project
+
+Besides the JSON log, the tracker keeps in-memory live stats for routing
+(core/model_router.py): recent calls per model (rpm, latency percentiles,
+cost) and today's spend, globally and per user.
+
+With a shared_state (core/shared_state.py) today's spend and the per-model
+call counts live in shared counters instead, so budgets and rpm limits hold
+across gunicorn workers; latency percentiles stay per process.
 """
 
 import logging
+import threading
+from collections import defaultdict, deque
 from datetime import datetime
 from pathlib import Path
+from typing import Any, Dict, Optional
 import json
 
+LIVE_WINDOW_EVENTS = 5000
+SPEND_COUNTER_TTL = 2 * 24 * 3600
+CALLS_BUCKET_S = 60
+LIVE_WINDOW_TTL = 3600
+
 logger = logging.getLogger("YukiCostTracker")
 
 class YukiCostTracker:
@@ -22,11 +38,20 @@ class YukiCostTracker:
     Uses Who Visions LLC contract pricing (shared with Unk via billing account)
     """
     
-    def __init__(self, project_id: str):
+    def __init__(self, project_id: str, shared_state: Optional[Any] = None):
         self.project_id = project_id
+        self.shared_state = shared_state
         self.cost_log_path = Path("data/yuki_costs.json")
         self.cost_log_path.parent.mkdir(exist_ok=True)
         
+        # Live stats: (timestamp, model, cost, latency_s) of recent calls, spend per day / user
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=LIVE_WINDOW_EVENTS)
+        self._spend_day = None
+        self._spend: Dict[Optional[str], float] = defaultdict(float)
+        self._spend_loaded = False
+        self._shared_seeded_day = None
+        
         # OFFICIAL GEMINI 3 PRICING (December 2025)
         self.pricing = {
             "gemini_3_flash": {
@@ -72,15 +97,26 @@ class YukiCostTracker:
                        tokens_in: int = 0,
                        tokens_out: int = 0,
                        thoughts_tokens: int = 0,
-                       metadata: dict = None):
+                       metadata: dict = None,
+                       cached_tokens: int = 0,
+                       user_id: Optional[str] = None,
+                       latency_s: Optional[float] = None,
+                       resolution: Optional[str] = None):
         """
         Log a generation operation and its cost
+        
+        cached_tokens: part of tokens_in served from a context cache
+        (usage_metadata.cached_content_token_count), billed at caching_input_per_1m
+        user_id / latency_s: feed the per-user budgets and live latency stats
+        resolution: image size ("4K" is billed at image_output_4k)
         """
         timestamp = datetime.now().isoformat()
         
         tokens_in = tokens_in or 0
         tokens_out = tokens_out or 0
         thoughts_tokens = thoughts_tokens or 0
+        cached_tokens = min(cached_tokens or 0, tokens_in)
+        fresh_tokens = tokens_in - cached_tokens
         
         # Calculate cost
         cost = 0.0
@@ -88,15 +124,18 @@ class YukiCostTracker:
         if "flash" in model_key:
             p = self.pricing.get("gemini_3_flash", {})
             total_output = tokens_out + thoughts_tokens
-            cost = (tokens_in / 1_000_000 * p.get("input_per_1m", 0) +
+            cost = (fresh_tokens / 1_000_000 * p.get("input_per_1m", 0) +
+                   cached_tokens / 1_000_000 * p.get("caching_input_per_1m", 0) +
                    total_output / 1_000_000 * p.get("output_per_1m", 0))
         elif "image" in model_key:
             p = self.pricing.get("gemini_3_pro_image", {})
-            cost = count * p.get("image_output", 0.134) + (tokens_in / 1_000_000 * p.get("text_input_per_1m", 0))
+            per_image = p.get("image_output_4k", 0.24) if (resolution or "").upper() == "4K" else p.get("image_output_1k_2k", 0.134)
+            cost = count * per_image + (tokens_in / 1_000_000 * p.get("text_input_per_1m", 0))
         elif "pro" in model_key:
             p = self.pricing.get("gemini_3_pro", {})
             total_output = tokens_out + thoughts_tokens
-            cost = (tokens_in / 1_000_000 * p.get("input_per_1m", 0) +
+            cost = (fresh_tokens / 1_000_000 * p.get("input_per_1m", 0) +
+                   cached_tokens / 1_000_000 * p.get("caching_input_per_1m", 0) +
                    total_output / 1_000_000 * p.get("output_per_1m", 0))
         
         entry = {
@@ -108,9 +147,17 @@ class YukiCostTracker:
             "tokens_in": tokens_in,
             "tokens_out": tokens_out,
             "thoughts_tokens": thoughts_tokens,
+            "cached_tokens": cached_tokens,
             "cost_usd": round(cost, 6),
             "metadata": metadata or {}
         }
+        if user_id is not None:
+            entry["user_id"] = user_id
+        if latency_s is not None:
+            entry["latency_s"] = round(latency_s, 3)
+        if resolution is not None:
+            entry["resolution"] = resolution
+        self._record_live(model, cost, latency_s, user_id)
         
         # Load existing
         if self.cost_log_path.exists():
@@ -128,6 +175,112 @@ class YukiCostTracker:
         logger.info(f"💰 Cost logged: ${cost:.6f} ({operation})")
         return cost
     
+    def _roll_day(self):
+        """Reset today's spend at midnight; seed it from the log on first use (lock held)."""
+        today = datetime.now().date()
+        if self._spend_day != today:
+            self._spend_day = today
+            self._spend.clear()
+            if not self._spend_loaded:
+                self._spend.update(self._spend_from_log(today))
+            self._spend_loaded = True
+    
+    def _spend_from_log(self, today) -> Dict[Optional[str], float]:
+        """Today's spend per user (None = everyone) from the JSON log"""
+        spend = defaultdict(float)
+        if not self.cost_log_path.exists():
+            return spend
+        try:
+            with open(self.cost_log_path, 'r') as f:
+                logs = json.load(f)
+        except (OSError, ValueError):
+            logs = []
+        for l in logs:
+            if datetime.fromisoformat(l['timestamp']).date() == today:
+                spend[None] += l['cost_usd']
+                if l.get('user_id') is not None:
+                    spend[l['user_id']] += l['cost_usd']
+        return spend
+    
+    @staticmethod
+    def _spend_key(today, user_id: Optional[str]) -> str:
+        return f"spend:{today.isoformat()}:" + ("*" if user_id is None else f"user:{user_id}")
+    
+    def _seed_shared(self, today):
+        """
+        Seed today's shared spend counters from the log, once across all processes (lock held).
+        Runs in the same transaction as the seeded check, so other workers' increments wait
+        for it; _record_live increments before the log is written, so nothing counts twice.
+        """
+        if self._shared_seeded_day == today:
+            return
+        self.shared_state.seed(
+            f"cost-tracker:{today.isoformat()}",
+            lambda: {self._spend_key(today, user_id): amount
+                     for user_id, amount in self._spend_from_log(today).items()},
+            ttl=SPEND_COUNTER_TTL,
+        )
+        self._shared_seeded_day = today
+    
+    def _record_live(self, model: str, cost: float, latency_s: Optional[float], user_id: Optional[str]):
+        now = datetime.now()
+        with self._lock:
+            self._recent.append((now.timestamp(), model, cost, latency_s))
+            if self.shared_state is not None:
+                today = now.date()
+                self._seed_shared(today)
+                self.shared_state.incr(f"calls:{model}", 1, bucket_s=CALLS_BUCKET_S, ttl=LIVE_WINDOW_TTL)
+                self.shared_state.incr(self._spend_key(today, None), cost, ttl=SPEND_COUNTER_TTL)
+                if user_id is not None:
+                    self.shared_state.incr(self._spend_key(today, user_id), cost, ttl=SPEND_COUNTER_TTL)
+                return
+            self._roll_day()
+            self._spend[None] += cost
+            if user_id is not None:
+                self._spend[user_id] += cost
+    
+    def spend_today(self, user_id: Optional[str] = None) -> float:
+        """Today's spend (USD) for one user, or for everyone with user_id=None"""
+        with self._lock:
+            if self.shared_state is not None:
+                today = datetime.now().date()
+                self._seed_shared(today)
+                return round(self.shared_state.counter(self._spend_key(today, user_id)), 6)
+            self._roll_day()
+            return round(self._spend.get(user_id, 0.0), 6)
+    
+    def live_stats(self, window_s: float = 300.0) -> Dict[str, dict]:
+        """Per model over the last window_s seconds: calls, rpm, cost, p50 / p95 latency"""
+        cutoff = datetime.now().timestamp() - window_s
+        with self._lock:
+            recent = [e for e in self._recent if e[0] >= cutoff]
+        by_model = defaultdict(list)
+        for event in recent:
+            by_model[event[1]].append(event)
+        # Call counts across every worker sharing the state (latencies / cost: this process)
+        shared_calls, shared_span_s = {}, window_s
+        if self.shared_state is not None:
+            shared_span_s = self.shared_state.covered_span(window_s, CALLS_BUCKET_S)
+            shared_calls = {name[len("calls:"):]: count for name, count in
+                            self.shared_state.counters("calls:", span_s=window_s, bucket_s=CALLS_BUCKET_S).items()}
+            for model in shared_calls:
+                by_model.setdefault(model, [])
+        stats = {}
+        for model, events in by_model.items():
+            latencies = sorted(e[3] for e in events if e[3] is not None)
+            shared = int(shared_calls.get(model, 0))
+            calls = max(len(events), shared)
+            # Shared buckets cover a little more than window_s (the oldest is partial)
+            rpm = max(len(events) / (window_s / 60.0), shared / (shared_span_s / 60.0))
+            stats[model] = {
+                "calls": calls,
+                "rpm": round(rpm, 2),
+                "cost": round(sum(e[2] for e in events), 6),
+                "p50_latency_s": latencies[len(latencies) // 2] if latencies else None,
+                "p95_latency_s": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None,
+            }
+        return stats
+    
     def get_session_cost(self, hours: int = 24) -> dict:
         """Get total cost for recent session"""
         if not self.cost_log_path.exists():
@@ -13,6 +13,8 @@ from typing import Dict, List
 from google import genai
 from google.genai import types
 
+from analyzers.analysis_cache import AnalysisCache, get_analysis_cache
+
 logger = logging.getLogger("YukiFacialAnalyzer")
 
 class YukiFacialAnalyzer:
@@ -21,9 +23,14 @@ class YukiFacialAnalyzer:
     Preserves: Hair, Eyes, Nose, Mouth, Face Shape
     """
     
-    def __init__(self, project_id: str = "gifted-cooler-479623-r7"):
+    # Bump when a feature prompt changes (invalidates cached results)
+    ANALYSIS_VERSION = "1"
+    FALLBACK_MARKER = "_fallback"
+    
+    def __init__(self, project_id: str = "gifted-cooler-479623-r7", cache: AnalysisCache = None):
         self.project_id = project_id
         self.model_id = "gemini-3-pro-preview"  # Analysis model
+        self.cache = cache or get_analysis_cache()
         
         # Initialize Gemini client for feature analysis
         try:
@@ -50,58 +57,71 @@ class YukiFacialAnalyzer:
                 - face_shape: dict (shape, jawline, cheekbones)
                 - body: dict (build, height_estimate, proportions)
                 - combined_prompt: str (unified preservation instructions)
+                - complete: bool (False if any feature fell back to defaults; only complete results are cached)
         """
         if not self.client:
             return self._get_fallback_features()
         
         try:
-            # Load image once
-            img = Image.open(image_path)
-            
-            # Run all analyzers in parallel for speed
-            hair_task = self._analyze_hair(img)
-            eyes_task = self._analyze_eyes(img)
-            nose_task = self._analyze_nose(img)
-            mouth_task = self._analyze_mouth(img)
-            face_task = self._analyze_face_shape(img)
-            body_task = self._analyze_body_composition(img)
-            gender_task = self._analyze_gender(img)
-            
-            # Await all tasks concurrently
-            hair, eyes, nose, mouth, face_shape, body, gender = await asyncio.gather(
-                hair_task, eyes_task, nose_task, mouth_task, face_task, body_task, gender_task,
-                return_exceptions=True
+            return await self.cache.get_or_compute(
+                "facial", f"{self.ANALYSIS_VERSION}:{self.model_id}", image_path,
+                lambda: self._analyze_all_uncached(image_path),
+                cacheable=lambda result: result.get("complete", False)
             )
-            
-            # Handle any failures
-            hair = hair if not isinstance(hair, Exception) else {"color": "natural", "texture": "standard"}
-            eyes = eyes if not isinstance(eyes, Exception) else {"color": "natural", "shape": "standard"}
-            nose = nose if not isinstance(nose, Exception) else {"shape": "standard"}
-            mouth = mouth if not isinstance(mouth, Exception) else {"lip_shape": "standard"}
-            face_shape = face_shape if not isinstance(face_shape, Exception) else {"shape": "oval"}
-            body = body if not isinstance(body, Exception) else {"build": "average", "proportions": "balanced"}
-            gender = gender if not isinstance(gender, Exception) else {"detected": "neutral", "confidence": "low"}
-            
-            # Build combined preservation prompt
-            combined_prompt = self._build_combined_prompt(hair, eyes, nose, mouth, face_shape, body, gender)
-            
-            logger.info(f"      🔬 Features: Gender({gender.get('detected', 'N/A')}), Body({body.get('build', 'N/A')})")
-            
-            return {
-                "hair": hair,
-                "eyes": eyes,
-                "nose": nose,
-                "mouth": mouth,
-                "face_shape": face_shape,
-                "body": body,
-                "gender": gender,
-                "combined_prompt": combined_prompt
-            }
-            
         except Exception as e:
             logger.error(f"      ❌ Facial analysis failed: {e}")
             return self._get_fallback_features()
     
+    async def _analyze_all_uncached(self, image_path: Path) -> Dict:
+        """The seven feature queries for one image"""
+        # Load image once
+        img = Image.open(image_path)
+        
+        # Run all analyzers in parallel for speed
+        hair_task = self._analyze_hair(img)
+        eyes_task = self._analyze_eyes(img)
+        nose_task = self._analyze_nose(img)
+        mouth_task = self._analyze_mouth(img)
+        face_task = self._analyze_face_shape(img)
+        body_task = self._analyze_body_composition(img)
+        gender_task = self._analyze_gender(img)
+        
+        # Await all tasks concurrently
+        features = await asyncio.gather(
+            hair_task, eyes_task, nose_task, mouth_task, face_task, body_task, gender_task,
+            return_exceptions=True
+        )
+        # Feature defaults carry FALLBACK_MARKER (query failed)
+        fell_back = [isinstance(f, Exception) or (isinstance(f, dict) and bool(f.pop(self.FALLBACK_MARKER, False))) for f in features]
+        complete = not any(fell_back)
+        hair, eyes, nose, mouth, face_shape, body, gender = features
+        
+        # Handle any failures
+        hair = hair if not isinstance(hair, Exception) else {"color": "natural", "texture": "standard"}
+        eyes = eyes if not isinstance(eyes, Exception) else {"color": "natural", "shape": "standard"}
+        nose = nose if not isinstance(nose, Exception) else {"shape": "standard"}
+        mouth = mouth if not isinstance(mouth, Exception) else {"lip_shape": "standard"}
+        face_shape = face_shape if not isinstance(face_shape, Exception) else {"shape": "oval"}
+        body = body if not isinstance(body, Exception) else {"build": "average", "proportions": "balanced"}
+        gender = gender if not isinstance(gender, Exception) else {"detected": "neutral", "confidence": "low"}
+        
+        # Build combined preservation prompt
+        combined_prompt = self._build_combined_prompt(hair, eyes, nose, mouth, face_shape, body, gender)
+        
+        logger.info(f"      🔬 Features: Gender({gender.get('detected', 'N/A')}), Body({body.get('build', 'N/A')})")
+        
+        return {
+            "hair": hair,
+            "eyes": eyes,
+            "nose": nose,
+            "mouth": mouth,
+            "face_shape": face_shape,
+            "body": body,
+            "gender": gender,
+            "combined_prompt": combined_prompt,
+            "complete": complete
+        }
+    
     async def _analyze_hair(self, img: Image.Image) -> Dict:
         """Analyze hair characteristics"""
         prompt = """Analyze ONLY the hair in this image. Provide:
@@ -119,7 +139,7 @@ Respond in JSON:
 }"""
         
         result = await self._query_gemini(img, prompt)
-        return result if result else {"color": "natural", "texture": "standard", "length": "medium", "style": "natural"}
+        return result if result else {self.FALLBACK_MARKER: True, "color": "natural", "texture": "standard", "length": "medium", "style": "natural"}
     
     async def _analyze_eyes(self, img: Image.Image) -> Dict:
         """Analyze eye characteristics"""
@@ -136,7 +156,7 @@ Respond in JSON:
 }"""
         
         result = await self._query_gemini(img, prompt)
-        return result if result else {"color": "brown", "shape": "almond", "size": "medium"}
+        return result if result else {self.FALLBACK_MARKER: True, "color": "brown", "shape": "almond", "size": "medium"}
     
     async def _analyze_nose(self, img: Image.Image) -> Dict:
         """Analyze nose structure"""
@@ -153,7 +173,7 @@ Respond in JSON:
 }"""
         
         result = await self._query_gemini(img, prompt)
-        return result if result else {"shape": "standard", "bridge": "medium", "tip": "rounded"}
+        return result if result else {self.FALLBACK_MARKER: True, "shape": "standard", "bridge": "medium", "tip": "rounded"}
     
     async def _analyze_mouth(self, img: Image.Image) -> Dict:
         """Analyze mouth and lip characteristics"""
@@ -170,7 +190,7 @@ Respond in JSON:
 }"""
         
         result = await self._query_gemini(img, prompt)
-        return result if result else {"lip_shape": "medium", "size": "medium", "width": "medium"}
+        return result if result else {self.FALLBACK_MARKER: True, "lip_shape": "medium", "size": "medium", "width": "medium"}
     
     async def _analyze_face_shape(self, img: Image.Image) -> Dict:
         """Analyze overall face structure"""
@@ -187,7 +207,7 @@ Respond in JSON:
 }"""
         
         result = await self._query_gemini(img, prompt)
-        return result if result else {"shape": "oval", "jawline": "soft", "cheekbones": "medium"}
+        return result if result else {self.FALLBACK_MARKER: True, "shape": "oval", "jawline": "soft", "cheekbones": "medium"}
     
     async def _analyze_body_composition(self, img: Image.Image) -> Dict:
         """Analyze body type and proportions"""
@@ -206,7 +226,7 @@ Respond in JSON:
 }"""
         
         result = await self._query_gemini(img, prompt)
-        return result if result else {"build": "average", "proportions": "balanced", "height_estimate": "proportional", "notes": "natural"}
+        return result if result else {self.FALLBACK_MARKER: True, "build": "average", "proportions": "balanced", "height_estimate": "proportional", "notes": "natural"}
     
     async def _analyze_gender(self, img: Image.Image) -> Dict:
         """Analyze apparent gender presentation"""
@@ -223,7 +243,7 @@ Respond in JSON:
 }"""
         
         result = await self._query_gemini(img, prompt)
-        return result if result else {"detected": "neutral", "markers": "ambiguous", "confidence": "low"}
+        return result if result else {self.FALLBACK_MARKER: True, "detected": "neutral", "markers": "ambiguous", "confidence": "low"}
 
     async def _query_gemini(self, img: Image.Image, prompt: str) -> Dict:
         """Query Gemini for feature analysis"""
@@ -317,5 +337,6 @@ CRITICAL PRESERVATION RULES:
             "face_shape": {"shape": "oval", "jawline": "natural", "cheekbones": "natural"},
             "body": {"build": "average", "proportions": "balanced", "height_estimate": "proportional", "notes": "natural"},
             "gender": {"detected": "neutral", "markers": "ambiguous", "confidence": "low"},
-            "combined_prompt": "Preserve all natural facial features, body proportions, gender presentation, and physique."
+            "combined_prompt": "Preserve all natural facial features, body proportions, gender presentation, and physique.",
+            "complete": False
         }
@@ -5,13 +5,14 @@ Incorporates ALL Gemini API best practices for optimal results
 Features:
 - Gemini 3 Pro optimized prompts
 - Multi-turn conversational refinement
-- Token counting and optimization
+- Token counting and optimization (local estimates, count_tokens only near the budget)
 - Media resolution control
 - Thinking mode integration
 - Character consistency for cosplay
 """
 
 import re
+from collections import OrderedDict
 from dataclasses import dataclass, field
 from typing import List, Dict, Any, Optional, Literal
 from enum import Enum
@@ -19,6 +20,8 @@ from google import genai
 from google.genai import types
 from PIL import Image as PILImage
 
+from prompts.token_estimator import TokenEstimator, get_token_estimator, prompt_hash
+
 
 class PromptType(Enum):
     """Types of prompts for different use cases"""
@@ -65,8 +68,11 @@ class YukiPromptOptimizer:
     - Character consistency prompts
     """
     
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, token_estimator: Optional[TokenEstimator] = None):
         self.client = genai.Client(api_key=api_key)
+        self.token_estimator = token_estimator or get_token_estimator()
+        self._token_counts: "OrderedDict[tuple, int]" = OrderedDict()
+        self.remote_token_counts = 0
         
         # Character consistency templates
         self._init_character_templates()
@@ -367,12 +373,45 @@ Be extremely precise with visual details - "blue eyes" is not enough, specify "b
         Returns:
             Total token count
         """
+        key = (model, prompt_hash(content)) if isinstance(content, str) else None
+        if key is not None and key in self._token_counts:
+            self._token_counts.move_to_end(key)
+            return self._token_counts[key]
+        
         result = self.client.models.count_tokens(
             model=model,
             contents=content
         )
+        self.remote_token_counts += 1
+        if key is not None:
+            self._token_counts[key] = result.total_tokens
+            while len(self._token_counts) > self.token_estimator.memo_size:
+                self._token_counts.popitem(last=False)
+            if model == self.token_estimator.calibration.model:
+                self.token_estimator.record(content, result.total_tokens)
         return result.total_tokens
     
+    def estimate_tokens(self, text: str) -> int:
+        """Local token estimate (no network); exact if count_tokens already saw this text"""
+        return self.token_estimator.estimate(text)
+    
+    def fits_token_budget(
+        self,
+        text: str,
+        max_tokens: int,
+        model: str = "gemini-3-pro-preview"
+    ) -> bool:
+        """
+        Whether text fits in max_tokens
+        
+        Decided from the local estimate when it is outside the calibrated margin
+        of the budget; only borderline prompts cost a count_tokens call.
+        """
+        decision = self.token_estimator.fits(text, max_tokens)
+        if decision is None:
+            return self.count_tokens(text, model) <= max_tokens
+        return decision
+    
     def optimize_for_tokens(
         self,
         prompt: str,
@@ -386,19 +425,19 @@ Be extremely precise with visual details - "blue eyes" is not enough, specify "b
         2. Condense examples
         3. Use abbreviations where clear
         4. Keep critical instructions
-        """
         
-        current_tokens = self.count_tokens(prompt)
+        Budget checks use fits_token_budget (local estimate, count_tokens only
+        when the estimate is within the margin of max_tokens).
+        """
         
-        if current_tokens <= max_tokens:
+        if self.fits_token_budget(prompt, max_tokens):
             return prompt  # Already optimized
         
         # Strategy 1: Remove extra whitespace
         optimized = re.sub(r'\n\s*\n\s*\n', '\n\n', prompt)
         optimized = re.sub(r' +', ' ', optimized)
         
-        current_tokens = self.count_tokens(optimized)
-        if current_tokens <= max_tokens:
+        if self.fits_token_budget(optimized, max_tokens):
             return optimized
         
         # Strategy 2: Condense verbose sections
@@ -529,11 +568,12 @@ Every viewer should recognize the user's face immediately.
 """
         return prompt.strip()
     
-    def validate_prompt_quality(self, prompt: str) -> Dict[str, Any]:
+    def validate_prompt_quality(self, prompt: str, exact_tokens: bool = False) -> Dict[str, Any]:
         """
         Validate prompt against Gemini 3 best practices
         
-        Returns quality score and suggestions
+        Returns quality score and suggestions; token_count is the local
+        estimate unless exact_tokens=True (count_tokens round trip)
         """
         
         score = 0.0
@@ -602,7 +642,7 @@ Every viewer should recognize the user's face immediately.
             "percentage": (score / max_score) * 100,
             "grade": "A" if score >= 8 else "B" if score >= 6 else "C" if score >= 4 else "D",
             "suggestions": suggestions,
-            "token_count": self.count_tokens(prompt)
+            "token_count": self.count_tokens(prompt) if exact_tokens else self.estimate_tokens(prompt)
         }
 
 
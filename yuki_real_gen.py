@@ -272,6 +272,7 @@ Apply the character's aesthetic while maintaining content boundaries."""
         
         logger.info("\n=== ✨ DAVE SCENARIO COMPLETE ===")
         logger.info(f"   📊 Total Transformations: {total_gens}")
+        self.age_estimator.cache.log_stats()
 
 
 if __name__ == "__main__":
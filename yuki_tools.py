@@ -2,6 +2,8 @@ import datetime
 import os
 from google import genai
 from google.genai import types
+from core.genai_clients import get_genai_client
+from core.operation_tracker import get_operation_tracker, FileProcessingAdapter
 import base64
 import urllib.request
 from html.parser import HTMLParser
@@ -13,6 +15,8 @@ from PIL import Image, ImageDraw
 import numpy as np
 import wave
 
+PROJECT_ID = "gifted-cooler-479623-r7"
+
 def get_current_time() -> str:
     """Returns the current time in UTC."""
     return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
@@ -52,7 +56,7 @@ def generate_cosplay_image(prompt: str, aspect_ratio: str = "3:4", resolution: s
         if "gemini-3" in model:
             location = "global"
             
-        client = genai.Client(vertexai=True, project="gifted-cooler-479623-r7", location=location)
+        client = get_genai_client(location=location, project=PROJECT_ID)
         
         if "gemini" in model:
             # Gemini 3.0 Image Generation (Nano Banana Pro)
@@ -160,7 +164,7 @@ def generate_cosplay_video(prompt: str, image_path: str = None, aspect_ratio: st
     print(f"    Aspect Ratio: {aspect_ratio}")
     
     try:
-        client = genai.Client(vertexai=True, project="gifted-cooler-479623-r7", location="us-central1")
+        client = get_genai_client(location="us-central1", project=PROJECT_ID)
         
         if image_path:
             # Image-to-Video
@@ -220,7 +224,7 @@ def research_topic(topic: str) -> str:
     
     try:
         # Gemini 3.0 requires global location
-        client = genai.Client(vertexai=True, project="gifted-cooler-479623-r7", location="global")
+        client = get_genai_client(location="global", project=PROJECT_ID)
         
         response = client.models.generate_content(
             model="gemini-3-pro-preview",
@@ -381,7 +385,7 @@ def search_web(query: str) -> str:
     """
     print(f"\n[🔍 SEARCHING WEB] Query: {query[:50]}...")
     try:
-        client = genai.Client(vertexai=True, project="gifted-cooler-479623-r7", location="global")
+        client = get_genai_client(location="global", project=PROJECT_ID)
         
         response = client.models.generate_content(
             model="gemini-3-pro-preview",
@@ -524,7 +528,7 @@ def detect_objects(image_path: str, prompt: str = "Detect all prominent items.")
         if not os.path.exists(image_path):
             return f"Error: File not found at {image_path}"
             
-        client = genai.Client(vertexai=True, project="gifted-cooler-479623-r7", location="global")
+        client = get_genai_client(location="global", project=PROJECT_ID)
         
         # Load image
         image = Image.open(image_path)
@@ -563,7 +567,7 @@ def segment_image(image_path: str, prompt: str = "Segment all prominent items.")
         if not os.path.exists(image_path):
             return f"Error: File not found at {image_path}"
             
-        client = genai.Client(vertexai=True, project="gifted-cooler-479623-r7", location="global")
+        client = get_genai_client(location="global", project=PROJECT_ID)
         
         # Load and resize image (max 1024 for segmentation)
         im = Image.open(image_path)
@@ -648,7 +652,7 @@ def analyze_video(video_path: str, prompt: str = "Describe this video in detail.
     """
     print(f"\n[🎥 ANALYZING VIDEO] Source: {video_path} | Prompt: {prompt}")
     try:
-        client = genai.Client(vertexai=True, project="gifted-cooler-479623-r7", location="global")
+        client = get_genai_client(location="global", project=PROJECT_ID)
         
         contents = [prompt]
         
@@ -665,16 +669,17 @@ def analyze_video(video_path: str, prompt: str = "Describe this video in detail.
             # Upload file using File API (best for videos)
             video_file = client.files.upload(file=video_path)
             
-            # Wait for processing to complete (simple check)
-            import time
-            while video_file.state.name == "PROCESSING":
-                print(".", end="", flush=True)
-                time.sleep(2)
-                video_file = client.files.get(name=video_file.name)
-            print(" Done.")
-            
-            if video_file.state.name == "FAILED":
+            # Wait for processing on the shared operation tracker (adaptive polling)
+            tracker = get_operation_tracker()
+            try:
+                video_file = tracker.wait_sync(
+                    tracker.track(video_file, FileProcessingAdapter(client), max_age_seconds=900), timeout=600
+                )
+            except TimeoutError:
+                return "Error: Video is still processing after 10 minutes."
+            except Exception:
                 return "Error: Video processing failed."
+            print("    Done.")
                 
             contents.append(video_file)
         else:
@@ -703,7 +708,7 @@ def analyze_pdf(pdf_path: str, prompt: str = "Summarize this document.") -> str:
     """
     print(f"\n[📄 ANALYZING PDF] Source: {pdf_path} | Prompt: {prompt}")
     try:
-        client = genai.Client(vertexai=True, project="gifted-cooler-479623-r7", location="global")
+        client = get_genai_client(location="global", project=PROJECT_ID)
         
         contents = [prompt]
         
@@ -760,7 +765,7 @@ def generate_audio(text: str, voice: str = "Kore", speaker_map: dict = None) ->
     """
     print(f"\n[🔊 GENERATING AUDIO] Voice: {voice} | Text: {text[:50]}...")
     try:
-        client = genai.Client(vertexai=True, project="gifted-cooler-479623-r7", location="global")
+        client = get_genai_client(location="global", project=PROJECT_ID)
         
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"generated_audio/yuki_audio_{timestamp}.wav"
@@ -831,7 +836,7 @@ def analyze_audio(audio_path: str, prompt: str = "Describe this audio clip.") ->
         if not os.path.exists(audio_path):
             return f"Error: File not found at {audio_path}"
             
-        client = genai.Client(vertexai=True, project="gifted-cooler-479623-r7", location="global")
+        client = get_genai_client(location="global", project=PROJECT_ID)
         
         print("    Uploading audio to File API...")
         audio_file = client.files.upload(file=audio_path)
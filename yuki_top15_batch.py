@@ -12,8 +12,11 @@ from google.genai import types
 from google.api_core import retry
 from PIL import Image
 
+from analyzers.analysis_cache import get_analysis_cache
+
 # Configuration
 PROJECT_ID = "gifted-cooler-479623-r7"
+ANALYSIS_VERSION = "1:gemini-2.5-flash"  # bump when the analysis prompt changes
 INPUT_DIR = Path("C:/Yuki_Local/dave test images")
 OUTPUT_DIR = Path("real_gen_results_top15")
 
@@ -32,6 +35,7 @@ class YukiTop15Batch:
     def __init__(self):
         self.output_dir = OUTPUT_DIR
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.analysis_cache = get_analysis_cache()
         
         logger.info("\n=== 🚀 YUKI TOP 15 BATCH TEST (HYBRID) ===")
         
@@ -43,6 +47,14 @@ class YukiTop15Batch:
         logger.info("   🎨 Gemini 3 Pro Image Preview Online (Generation)")
 
     async def analyze_dna_features(self, image_path: Path) -> dict:
+        """DNA analysis, once per photo (content-hash cache; fallbacks are not stored)"""
+        return await self.analysis_cache.get_or_compute(
+            "dna_flash_top15", ANALYSIS_VERSION, image_path,
+            lambda: self._analyze_dna_uncached(image_path),
+            cacheable=lambda result: result["raw_analysis"] != "Analysis unavailable"
+        )
+
+    async def _analyze_dna_uncached(self, image_path: Path) -> dict:
         """Fast comprehensive analysis using Gemini 2.5 Flash"""
         img = Image.open(image_path)
         
@@ -236,6 +248,7 @@ QUALITY: 4K resolution, highly detailed, photorealistic masterpiece, 8k textures
         avg_time = total_time / len(targets)
         
         logger.info("\n=== ✨ BATCH COMPLETE ===")
+        self.analysis_cache.log_stats()
         logger.info(f"   📊 Total: 15 Images")
         logger.info(f"   ✅ Successful: {successful}")
         logger.info(f"   ⏱️  Total Time: {total_time:.2f}s ({total_time/60:.2f} min)")
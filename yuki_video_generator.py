@@ -32,6 +32,12 @@ from google import genai
 from google.genai import types
 from PIL import Image as PILImage
 
+from core.operation_tracker import get_operation_tracker, VeoOperationAdapter, FileProcessingAdapter
+from core.shared_state import get_shared_state, SharedDict
+
+# Veo generations are billed whether or not anyone collects them: keep tracking for up to an hour
+VEO_MAX_AGE_SECONDS = 3600
+
 
 class VeoModel(Enum):
     """Available Veo models"""
@@ -98,8 +104,14 @@ class YukiVideoGenerator:
         self.client = genai.Client(api_key=api_key)
         self.default_model = VeoModel.VEO_3_1
         
-        # Track operations for monitoring
-        self.operations: Dict[str, Any] = {}
+        # Track operations for monitoring (shared poll loop, persisted across restarts);
+        # the status records are visible to every worker, not just the one that started them
+        self.operations: Dict[str, Any] = SharedDict(get_shared_state(), "video-operations", ttl=VEO_MAX_AGE_SECONDS)
+        self.tracker = get_operation_tracker()
+        self.veo_adapter = VeoOperationAdapter(self.client)
+        # Keyed: constructing another generator replaces this callback rather than adding one
+        self.tracker.register_adapter(self.veo_adapter, on_complete=self._save_resumed_video,
+                                      key="yuki_video_generator.save_resumed_video")
     
     async def generate_text_to_video(
         self,
@@ -152,14 +164,21 @@ class YukiVideoGenerator:
         )
         
         # Store operation for monitoring
-        self.operations[operation.name] ={"prompt": prompt,
+        metadata = {"prompt": prompt,
             "started_at": time.time(),
-            "model": model.value
+            "model": model.value,
+            "save_path": save_path
         }
+        self.operations[operation.name] = {**metadata, "status": "running"}
         
         # Poll until complete
         print(f"🎬 Generating video: {prompt[:50]}...")
-        operation = await self._wait_for_completion(operation)
+        try:
+            operation = await self._wait_for_completion(operation, metadata=metadata)
+        except Exception as e:
+            self.operations.update_fields(operation.name, status="failed", error=str(e))
+            raise
+        self.operations.update_fields(operation.name, status="completed", completed_at=time.time())
         
         # Extract video
         generated_video = operation.response.generated_videos[0]
@@ -191,27 +210,42 @@ class YukiVideoGenerator:
     async def _wait_for_completion(
         self,
         operation: Any,
-        poll_interval: int = 10
+        metadata: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None
     ) -> Any:
         """
-        Poll operation until video generation completes
+        Wait for video generation through the shared operation tracker
         
         Args:
             operation: Operation object from generate call
-            poll_interval: Seconds between status checks
+            metadata: Persisted with the operation ID (prompt, model, save_path)
+            timeout: Seconds to wait; the generation keeps being tracked after a timeout
             
         Returns:
             Completed operation object
         """
         
-        while not operation.done:
-            print(f"   ⏳ Waiting for video generation... (polling in {poll_interval}s)")
-            await asyncio.sleep(poll_interval)
-            operation = self.client.operations.get(operation)
+        future = self.tracker.track(
+            operation, self.veo_adapter, metadata=metadata,
+            persist=True, max_age_seconds=VEO_MAX_AGE_SECONDS
+        )
+        print(f"   ⏳ Waiting for video generation... ({operation.name})")
+        operation = await self.tracker.wait(future, timeout=timeout)
         
         print("   ✅ Video generation complete!")
         return operation
     
+    def _save_resumed_video(self, operation: Any, metadata: Dict[str, Any]):
+        """Collect a generation that finished after the process that started it exited"""
+        save_path = metadata.get("save_path")
+        if not save_path or not operation.response or not operation.response.generated_videos:
+            print(f"   ⚠️ Resumed video {operation.name} finished with nowhere to save it")
+            return
+        video = operation.response.generated_videos[0].video
+        self.client.files.download(file=video)
+        video.save(save_path)
+        print(f"   ✅ Resumed video saved: {save_path}")
+    
     def build_cosplay_tutorial_prompt(
         self,
         character_name: str,
@@ -341,14 +375,15 @@ class YukiVideoAnalyzer:
         print(f"📤 Uploading {video_path}...")
         video_file = self.client.files.upload(file=video_path)
         
-        # Wait for processing
-        while video_file.state == "PROCESSING":
-            print("   ⏳ Processing video...")
-            await asyncio.sleep(10)
-            video_file = self.client.files.get(name=video_file.name)
-        
-        if video_file.state == "FAILED":
-            raise ValueError(f"Video processing failed: {video_file.state}")
+        # Wait for processing (shared poll loop, short adaptive intervals)
+        print("   ⏳ Processing video...")
+        tracker = get_operation_tracker()
+        try:
+            video_file = await tracker.wait(
+                tracker.track(video_file, FileProcessingAdapter(self.client), max_age_seconds=900)
+            )
+        except Exception as e:
+            raise ValueError(f"Video processing failed: {e}")
         
         print(f"   ✅ Ready: {video_file.uri}")
         return video_file
@@ -0,0 +1,269 @@
+"""
+Yuki Work Queue
+Change-driven work scheduling for the automation engine
+
+Characters are marked dirty when they change (AnimeDatabase.add_character,
+set_face_schema, add_cosplay_generation) instead of being found by rescanning
+the whole database. The queue then hands work out in bounded batches:
+
+- one entry per (kind, character): re-marking a queued character only raises its priority
+- lower priority value runs first (main characters and popular ones ahead of background)
+- failures back off exponentially with jitter; after max_attempts the item is parked
+  in the dead-letter list until it changes again
+- state (pending, retry counters, dead letters) is saved to JSON so a restart
+  resumes without a full scan
+"""
+
+import json
+import time
+import heapq
+import random
+import asyncio
+import threading
+from dataclasses import dataclass, asdict
+from enum import Enum
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+class WorkKind(Enum):
+    EXTRACT_SCHEMA = "extract_schema"
+    GENERATE_COSPLAY = "generate_cosplay"
+
+
+# Extraction unlocks generation, so it always sorts first
+KIND_PRIORITY = {WorkKind.EXTRACT_SCHEMA: 0, WorkKind.GENERATE_COSPLAY: 1}
+ROLE_PRIORITY = {"Main": 0, "Supporting": 1}
+
+
+def character_priority(character, kind: WorkKind) -> float:
+    """Lower runs sooner: kind, then role, then popularity rank."""
+    role = ROLE_PRIORITY.get(getattr(character, "role", None), 2)
+    rank = getattr(character, "popularity_rank", None) or 999_999
+    return KIND_PRIORITY[kind] * 10_000_000 + role * 1_000_000 + min(rank, 999_999)
+
+
+@dataclass
+class WorkItem:
+    kind: str
+    character_id: str
+    priority: float
+    reason: str = ""
+    enqueued_at: float = 0.0
+    attempts: int = 0
+    next_attempt_at: float = 0.0
+    last_error: Optional[str] = None
+    rerun: bool = False  # marked dirty again while in flight
+
+    @property
+    def key(self) -> str:
+        return f"{self.kind}:{self.character_id}"
+
+
+class WorkQueue:
+    """
+    Priority work queue with per-item retry/backoff state.
+
+    Usage:
+        queue = WorkQueue(state_path=Path("work_queue.json"))
+        queue.mark_dirty("abc123", WorkKind.EXTRACT_SCHEMA, priority=0, reason="added")
+        batch = queue.pull_batch(8)
+        ...
+        queue.complete(item) / queue.fail(item, "error")
+    """
+
+    def __init__(
+        self,
+        state_path: Optional[Path] = None,
+        max_attempts: int = 5,
+        backoff_base_seconds: float = 30.0,
+        backoff_max_seconds: float = 3600.0,
+    ):
+        self.state_path = Path(state_path) if state_path else None
+        self.max_attempts = max_attempts
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+
+        self.items: Dict[str, WorkItem] = {}       # queued (ready or backing off)
+        self.in_flight: Dict[str, WorkItem] = {}
+        self.dead_letters: Dict[str, WorkItem] = {}
+        self._heap: List[tuple] = []               # (priority, ready_at, seq, key); stale entries skipped
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = {"marked": 0, "coalesced": 0, "completed": 0, "retried": 0, "dead_lettered": 0}
+        self.load()
+
+    # ------------------------------------------------------------------ intake
+
+    def mark_dirty(self, character_id: str, kind: WorkKind, priority: float = 0.0, reason: str = "") -> bool:
+        """Queue work for a character. Thread-safe; wakes a waiting scheduler. Returns True if newly queued."""
+        key = f"{kind.value}:{character_id}"
+        with self._lock:
+            self.stats["marked"] += 1
+            self.dead_letters.pop(key, None)  # a change earns a fresh set of attempts
+
+            if key in self.in_flight:
+                self.in_flight[key].rerun = True
+                self.stats["coalesced"] += 1
+                return False
+
+            existing = self.items.get(key)
+            if existing:
+                self.stats["coalesced"] += 1
+                if priority < existing.priority or existing.attempts:
+                    # Higher priority, or fresh data for an item that was backing off: run it sooner
+                    existing.priority = min(priority, existing.priority)
+                    existing.next_attempt_at = 0.0
+                    existing.reason = reason or existing.reason
+                    self._push(existing)
+                return False
+
+            item = WorkItem(kind=kind.value, character_id=character_id, priority=priority,
+                            reason=reason, enqueued_at=time.time())
+            self.items[key] = item
+            self._push(item)
+        self._notify()
+        return True
+
+    def _push(self, item: WorkItem):
+        self._seq += 1
+        heapq.heappush(self._heap, (item.priority, item.next_attempt_at, self._seq, item.key))
+
+    def _notify(self):
+        if self._wakeup is None or self._loop is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            pass  # loop already closed
+
+    # ------------------------------------------------------------------ dispatch
+
+    def pull_batch(self, max_items: int, kind: Optional[WorkKind] = None, now: Optional[float] = None) -> List[WorkItem]:
+        """Highest-priority ready items (optionally of one kind), moved to in-flight."""
+        now = now if now is not None else time.time()
+        batch: List[WorkItem] = []
+        deferred: List[tuple] = []
+        with self._lock:
+            while self._heap and len(batch) < max_items:
+                entry = heapq.heappop(self._heap)
+                priority, ready_at, _, key = entry
+                item = self.items.get(key)
+                if item is None or (item.priority, item.next_attempt_at) != (priority, ready_at):
+                    continue  # stale heap entry
+                if item.next_attempt_at > now or (kind and item.kind != kind.value):
+                    deferred.append(entry)
+                    continue
+                del self.items[key]
+                self.in_flight[key] = item
+                batch.append(item)
+            for entry in deferred:
+                heapq.heappush(self._heap, entry)
+        return batch
+
+    def complete(self, item: WorkItem):
+        with self._lock:
+            self.in_flight.pop(item.key, None)
+            self.stats["completed"] += 1
+            rerun = item.rerun
+        if rerun:
+            self.mark_dirty(item.character_id, WorkKind(item.kind), item.priority, reason="changed while running")
+
+    def fail(self, item: WorkItem, error: str):
+        """Schedule a retry with exponential backoff + jitter, or dead-letter after max_attempts."""
+        with self._lock:
+            self.in_flight.pop(item.key, None)
+            item.attempts += 1
+            item.last_error = error[:500]
+            if item.rerun:
+                item.rerun, item.attempts, item.next_attempt_at = False, 0, 0.0
+            elif item.attempts >= self.max_attempts:
+                self.dead_letters[item.key] = item
+                self.stats["dead_lettered"] += 1
+                return
+            else:
+                delay = min(self.backoff_base_seconds * 2 ** (item.attempts - 1), self.backoff_max_seconds)
+                item.next_attempt_at = time.time() + delay * random.uniform(0.8, 1.2)
+                self.stats["retried"] += 1
+            self.items[item.key] = item
+            self._push(item)
+
+    def next_ready_in(self, now: Optional[float] = None) -> Optional[float]:
+        """Seconds until the earliest queued item is ready (0 if one is ready, None if empty)."""
+        now = now if now is not None else time.time()
+        with self._lock:
+            if not self.items:
+                return None
+            return max(0.0, min(i.next_attempt_at for i in self.items.values()) - now)
+
+    async def wait_for_work(self, timeout: Optional[float] = None) -> bool:
+        """Sleep until something is marked dirty, a backoff expires, or timeout. True if woken early."""
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+            self._loop = asyncio.get_running_loop()
+        self._wakeup.clear()  # clear before checking, so a mark in between still wakes us
+        ready_in = self.next_ready_in()
+        if ready_in == 0:
+            return True
+        if ready_in is not None:
+            timeout = ready_in if timeout is None else min(timeout, ready_in)
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    # ------------------------------------------------------------------ state
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "queued": len(self.items),
+                "in_flight": len(self.in_flight),
+                "dead_letters": len(self.dead_letters),
+                "backing_off": sum(1 for i in self.items.values() if i.attempts),
+            }
+
+    def save(self):
+        if not self.state_path:
+            return
+        with self._lock:
+            # In-flight items go back to pending: if we die mid-batch they must run again
+            data = {
+                "saved_at": time.time(),
+                "pending": [asdict(i) for i in [*self.items.values(), *self.in_flight.values()]],
+                "dead_letters": [asdict(i) for i in self.dead_letters.values()],
+                "stats": self.stats,
+            }
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        tmp.replace(self.state_path)
+
+    def load(self) -> bool:
+        """Restore queue state; False when there is none (caller should bootstrap)."""
+        if not self.state_path or not self.state_path.exists():
+            return False
+        with open(self.state_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        with self._lock:
+            for raw in data.get("pending", []):
+                item = WorkItem(**{**raw, "rerun": False})
+                self.items[item.key] = item
+                self._push(item)
+            for raw in data.get("dead_letters", []):
+                item = WorkItem(**raw)
+                self.dead_letters[item.key] = item
+            self.stats.update(data.get("stats", {}))
+        return True
+
+    @property
+    def has_state(self) -> bool:
+        return bool(self.state_path and self.state_path.exists())